@@ -8,7 +8,7 @@ Bot made by Burny
 
 # Base imports
 import random
-from typing import Set
+from typing import List, Set
 
 # SC2 imports
 from sc2 import maps
@@ -22,18 +22,24 @@ from sc2.position import Point2
 from sc2.unit import Unit
 from sc2.units import Units
 
+# Additional imports
+import numpy as np
+
 # Local imports
+from common.unit_snapshot import ATTACK_GROUND, ENEMY, FLYING, STRUCTURE
 from common.void_bot_base import VoidBotBase
 
-# pylint: disable=W0231
 class MassReaperBot(VoidBotBase):
 
-    def __init__(self):
-        # Select distance calculation method 0, which is the pure python distance calculation without caching or indexing, using math.hypot(), for more info see bot_ai_internal.py _distances_override_functions() function
-        self.distance_calculation_method = 3
-
-    async def custom_on_start(self):
-        pass
+    def gather_idle_workers(self):
+        """ Manage idle scvs, would be taken care by distribute workers aswell. """
+        if self.townhalls:
+            for w in self.workers.idle:
+                th: Unit = self.townhalls.closest_to(w)
+                mfs: Units = self.bases.minerals(th)
+                if mfs:
+                    mf: Unit = mfs.closest_to(w)
+                    w.gather(mf)
 
     # pylint: disable=R0912,R0914
     async def custom_on_step(self, iteration):
@@ -43,11 +49,11 @@ class MassReaperBot(VoidBotBase):
         - build depots when low on remaining supply
         - townhalls contains commandcenter and orbitalcommand
         - self.units(TYPE).not_ready.amount selects all units of that type, filters incomplete units, and then counts the amount
-        - self.already_pending(TYPE) counts how many units are queued
+        - self.counters.pending(TYPE) counts how many units are queued, kept live from the unit events
         """
         if (
             self.supply_left < 5 and self.townhalls and self.supply_used >= 14
-            and self.can_afford(UnitTypeId.SUPPLYDEPOT) and self.already_pending(UnitTypeId.SUPPLYDEPOT) < 1
+            and self.can_afford(UnitTypeId.SUPPLYDEPOT) and self.counters.pending(UnitTypeId.SUPPLYDEPOT) < 1
         ):
             workers: Units = self.workers.gathering
             # If workers were found
@@ -75,7 +81,7 @@ class MassReaperBot(VoidBotBase):
 
         # Expand if we can afford (400 minerals) and have less than 2 bases
         if (
-            1 <= self.townhalls.amount < 2 and self.already_pending(UnitTypeId.COMMANDCENTER) == 0
+            1 <= self.townhalls.amount < 2 and self.counters.pending(UnitTypeId.COMMANDCENTER) == 0
             and self.can_afford(UnitTypeId.COMMANDCENTER)
         ):
             # get_next_expansion returns the position of the next possible expansion location where you can place a command center
@@ -95,7 +101,7 @@ class MassReaperBot(VoidBotBase):
             # self.structures.of_type(
             #     [UnitTypeId.SUPPLYDEPOT, UnitTypeId.SUPPLYDEPOTLOWERED, UnitTypeId.SUPPLYDEPOTDROP]
             # ).ready
-            and self.structures(UnitTypeId.BARRACKS).ready.amount + self.already_pending(UnitTypeId.BARRACKS) < 4 and
+            and self.counters.ready(UnitTypeId.BARRACKS) + self.counters.pending(UnitTypeId.BARRACKS) < 4 and
             self.can_afford(UnitTypeId.BARRACKS)
         ):
             workers: Units = self.workers.gathering
@@ -112,13 +118,13 @@ class MassReaperBot(VoidBotBase):
 
         # Build refineries (on nearby vespene) when at least one barracks is in construction
         if (
-            self.structures(UnitTypeId.BARRACKS).ready.amount + self.already_pending(UnitTypeId.BARRACKS) > 0
-            and self.already_pending(UnitTypeId.REFINERY) < 1
+            self.counters.ready(UnitTypeId.BARRACKS) + self.counters.pending(UnitTypeId.BARRACKS) > 0
+            and self.counters.pending(UnitTypeId.REFINERY) < 1
         ):
             # Loop over all townhalls that are 100% complete
             for th in self.townhalls.ready:
-                # Find all vespene geysers that are closer than range 10 to this townhall
-                vgs: Units = self.vespene_geyser.closer_than(10, th)
+                # Find all vespene geysers of this townhall's base
+                vgs: Units = self.bases.geysers(th)
                 for vg in vgs:
                     if await self.can_place_single(UnitTypeId.REFINERY,
                                                    vg.position) and self.can_afford(UnitTypeId.REFINERY):
@@ -136,7 +142,7 @@ class MassReaperBot(VoidBotBase):
     # pylint: disable=R0916
         if (
             self.can_afford(UnitTypeId.SCV) and self.supply_left > 0 and self.supply_workers < 22 and (
-                self.structures(UnitTypeId.BARRACKS).ready.amount < 1 and self.townhalls(UnitTypeId.COMMANDCENTER).idle
+                self.counters.ready(UnitTypeId.BARRACKS) < 1 and self.townhalls(UnitTypeId.COMMANDCENTER).idle
                 or self.townhalls(UnitTypeId.ORBITALCOMMAND).idle
             )
         ):
@@ -154,54 +160,63 @@ class MassReaperBot(VoidBotBase):
         if iteration % 25 == 0:
             await self.my_distribute_workers()
 
-        # Reaper micro
-        enemies: Units = self.enemy_units | self.enemy_structures
-        enemies_can_attack: Units = enemies.filter(lambda unit: unit.can_attack_ground)
-        for r in self.units(UnitTypeId.REAPER):
+        # Reaper micro, every reaper to enemy distance comes from one snapshot matrix instead of per reaper filters
+        self.alloc_mark("reaper micro")
+        snap = self.snapshot
+        enemy_rows: np.ndarray = np.flatnonzero(snap.mask(ENEMY))
+        enemy_flags: np.ndarray = snap.data["flags"][enemy_rows]
+        can_attack: np.ndarray = (enemy_flags & ATTACK_GROUND) != 0
+        not_flying: np.ndarray = (enemy_flags & FLYING) == 0
+        ground_units: np.ndarray = (enemy_flags & (FLYING | STRUCTURE)) == 0
+        grenade_targets: np.ndarray = can_attack & ground_units & ~np.isin(
+            snap.data["type"][enemy_rows], [UnitTypeId.LARVA.value, UnitTypeId.EGG.value]
+        )
+        enemies_can_attack: Units = snap.select(enemy_rows[can_attack])
+        # Retreat the whole group, not only hurt reapers, when the fight around them is expected to be lost
+        losing = False
+        reapers: Units = self.units(UnitTypeId.REAPER)
+        if reapers and enemies_can_attack:
+            center: Point2 = reapers.center
+            enemy_group: Units = enemies_can_attack.closer_than(15, center)
+            losing = bool(enemy_group) and not self.combat.engage(reapers.closer_than(15, center), enemy_group)
+        reaper_rows: List[int] = [snap.rows[r.tag] for r in reapers]
+        distances: np.ndarray = snap.distances(reaper_rows, enemy_rows)
+        # pylint: disable=W0212
+        reaper_grenade_range: float = (
+            self.game_data.abilities[AbilityId.KD8CHARGE_KD8CHARGE.value]._proto.cast_range
+        )
+        for r, row, d in zip(reapers, reaper_rows, distances):
+            closest = lambda mask: snap.units[enemy_rows[mask][np.argmin(d[mask])]]
+            hp, hp_max, cooldown = snap.data[["hp", "hp_max", "cooldown"]][row]
 
             # Move to range 15 of closest unit if reaper is below 20 hp and not regenerating
-            enemy_threats_close: Units = enemies_can_attack.filter(
-                lambda unit: unit.distance_to(r) < 15
-            )  # Threats that can attack the reaper
+            enemy_threats_close: np.ndarray = can_attack & (d < 15)  # Threats that can attack the reaper
 
-            if r.health_percentage < 2 / 5 and enemy_threats_close:
+            if (hp < 2 / 5 * hp_max or losing) and enemy_threats_close.any():
                 retreat_points: Set[Point2] = self.neighbors8(r.position,
                                                               distance=2) | self.neighbors8(r.position, distance=4)
                 # Filter points that are pathable
                 retreat_points: Set[Point2] = {x for x in retreat_points if self.in_pathing_grid(x)}
                 if retreat_points:
-                    closest_enemy: Unit = enemy_threats_close.closest_to(r)
+                    closest_enemy: Unit = closest(enemy_threats_close)
                     retreat_point: Unit = closest_enemy.position.furthest(retreat_points)
                     r.move(retreat_point)
                     continue  # Continue for loop, dont execute any of the following
 
             # Reaper is ready to attack, shoot nearest ground unit
-            enemy_ground_units: Units = enemies.filter(
-                lambda unit: unit.distance_to(r) < 5 and not unit.is_flying
-            )  # Hardcoded attackrange of 5
-            if r.weapon_cooldown == 0 and enemy_ground_units:
-                enemy_ground_units: Units = enemy_ground_units.sorted(lambda x: x.distance_to(r))
-                closest_enemy: Unit = enemy_ground_units[0]
-                r.attack(closest_enemy)
+            enemy_ground_units: np.ndarray = not_flying & (d < 5)  # Hardcoded attackrange of 5
+            if cooldown == 0 and enemy_ground_units.any():
+                r.attack(closest(enemy_ground_units))
                 continue  # Continue for loop, dont execute any of the following
 
             # Attack is on cooldown, check if grenade is on cooldown, if not then throw it to furthest enemy in range 5
-            # pylint: disable=W0212
-            reaper_grenade_range: float = (
-                self.game_data.abilities[AbilityId.KD8CHARGE_KD8CHARGE.value]._proto.cast_range
-            )
-            enemy_ground_units_in_grenade_range: Units = enemies_can_attack.filter(
-                lambda unit: not unit.is_structure and not unit.is_flying and unit.type_id not in
-                {UnitTypeId.LARVA, UnitTypeId.EGG} and unit.distance_to(r) < reaper_grenade_range
-            )
-            if enemy_ground_units_in_grenade_range and (r.is_attacking or r.is_moving):
+            in_grenade_range: np.ndarray = np.flatnonzero(grenade_targets & (d < reaper_grenade_range))
+            if in_grenade_range.size and (r.is_attacking or r.is_moving):
                 # If AbilityId.KD8CHARGE_KD8CHARGE in abilities, we check that to see if the reaper grenade is off cooldown
                 abilities = await self.get_available_abilities(r)
-                enemy_ground_units_in_grenade_range = enemy_ground_units_in_grenade_range.sorted(
-                    lambda x: x.distance_to(r), reverse=True
-                )
                 furthest_enemy: Unit = None
-                for enemy in enemy_ground_units_in_grenade_range:
+                for i in in_grenade_range[np.argsort(-d[in_grenade_range], kind="stable")]:
+                    enemy: Unit = snap.units[enemy_rows[i]]
                     if await self.can_cast(r, AbilityId.KD8CHARGE_KD8CHARGE, enemy, cached_abilities_of_unit=abilities):
                         furthest_enemy: Unit = enemy
                         break
@@ -210,17 +225,15 @@ class MassReaperBot(VoidBotBase):
                     continue  # Continue for loop, don't execute any of the following
 
             # Move to max unit range if enemy is closer than 4
-            enemy_threats_very_close: Units = enemies.filter(
-                lambda unit: unit.can_attack_ground and unit.distance_to(r) < 4.5
-            )  # Hardcoded attackrange minus 0.5
+            enemy_threats_very_close: np.ndarray = can_attack & (d < 4.5)  # Hardcoded attackrange minus 0.5
             # Threats that can attack the reaper
-            if r.weapon_cooldown != 0 and enemy_threats_very_close:
+            if cooldown != 0 and enemy_threats_very_close.any():
                 retreat_points: Set[Point2] = self.neighbors8(r.position,
                                                               distance=2) | self.neighbors8(r.position, distance=4)
                 # Filter points that are pathable by a reaper
                 retreat_points: Set[Point2] = {x for x in retreat_points if self.in_pathing_grid(x)}
                 if retreat_points:
-                    closest_enemy: Unit = enemy_threats_very_close.closest_to(r)
+                    closest_enemy: Unit = closest(enemy_threats_very_close)
                     retreat_point: Point2 = max(
                         retreat_points, key=lambda x: x.distance_to(closest_enemy) - x.distance_to(r)
                     )
@@ -228,30 +241,22 @@ class MassReaperBot(VoidBotBase):
                     continue  # Continue for loop, don't execute any of the following
 
             # Move to nearest enemy ground unit/building because no enemy unit is closer than 5
-            all_enemy_ground_units: Units = self.enemy_units.not_flying
-            if all_enemy_ground_units:
-                closest_enemy: Unit = all_enemy_ground_units.closest_to(r)
-                r.move(closest_enemy)
+            if ground_units.any():
+                r.move(closest(ground_units))
                 continue  # Continue for loop, don't execute any of the following
 
             # Move to random enemy start location if no enemy buildings have been seen
             r.move(random.choice(self.enemy_start_locations))
 
-        # Manage idle scvs, would be taken care by distribute workers aswell
-        if self.townhalls:
-            for w in self.workers.idle:
-                th: Unit = self.townhalls.closest_to(w)
-                mfs: Units = self.mineral_field.closer_than(10, th)
-                if mfs:
-                    mf: Unit = mfs.closest_to(w)
-                    w.gather(mf)
+        self.alloc_mark("custom_on_step")
+        self.gather_idle_workers()
 
         # Manage orbital energy and drop mules
         for oc in self.townhalls(UnitTypeId.ORBITALCOMMAND).filter(lambda x: x.energy >= 50):
-            mfs: Units = self.mineral_field.closer_than(10, oc)
+            mfs: Units = self.bases.minerals(oc)
             if mfs:
-                mf: Unit = max(mfs, key=lambda x: x.mineral_contents)
-                oc(AbilityId.CALLDOWNMULE_CALLDOWNMULE, mf)
+                # Sorted by contents, the first field is the richest
+                oc(AbilityId.CALLDOWNMULE_CALLDOWNMULE, mfs.first)
 
         # When running out of mineral fields near command center, fly to next base with minerals
 
@@ -384,7 +389,7 @@ class MassReaperBot(VoidBotBase):
                 for _ in range(townhall_info["deficit"]):
                     if worker_pool.amount > 0:
                         w = worker_pool.pop()
-                        mf = self.mineral_field.closer_than(10, townhall_info["unit"]).closest_to(w)
+                        mf = self.bases.minerals(townhall_info["unit"]).closest_to(w)
                         if len(w.orders) == 1 and w.orders[0].ability.id in [AbilityId.HARVEST_RETURN]:
                             w.gather(mf, queue=True)
                         else:
@@ -14,13 +14,102 @@ from sc2.unit import Unit
 from sc2.units import Units
 
 # Local imports
+from common.build_order import BuildOrder, BuildStep, ORDERS, STRUCTURES, UNITS
+from common.step_scheduler import Priority
 from common.void_bot_base import VoidBotBase
 
 
 class BCRushBot(VoidBotBase):
 
     async def custom_on_start(self):
-        pass
+        self.cc = None
+        has_tech = lambda bot, item: bot.tech_requirement_progress(item) == 1
+        towards_center = lambda bot: bot.cc.position.towards(bot.game_info.map_center, 8)
+        self.macro = BuildOrder(self, [
+            # Build more SCVs until 22
+            BuildStep(
+                "scv", UnitTypeId.SCV,
+                guard=lambda bot: bot.supply_workers < 22 and bot.cc.is_idle,
+                action=lambda bot: bot.cc.train(UnitTypeId.SCV), depends=(UNITS, ORDERS),
+                watch=(lambda bot: bot.cc.tag, lambda bot: bot.cc.is_idle),
+            ),
+            # Build more BCs
+            BuildStep(
+                "battlecruisers", UnitTypeId.BATTLECRUISER,
+                guard=lambda bot: bool(bot.structures(UnitTypeId.FUSIONCORE)),
+                action=lambda bot: bot.train_battlecruisers(), depends=(STRUCTURES,),
+            ),
+            # Build more supply depots
+            BuildStep(
+                "supply depot", UnitTypeId.SUPPLYDEPOT,
+                guard=lambda bot: bot.supply_left < 6 and bot.supply_used >= 14
+                and not bot.counters.pending(UnitTypeId.SUPPLYDEPOT),
+                near=towards_center, depends=(STRUCTURES, ORDERS),
+                watch=(lambda bot: bot.supply_left, lambda bot: bot.supply_used, lambda bot: bot.cc.tag),
+            ),
+            # Build barracks if we have none
+            BuildStep(
+                "barracks", UnitTypeId.BARRACKS,
+                guard=lambda bot: has_tech(bot, UnitTypeId.BARRACKS) and not bot.structures(UnitTypeId.BARRACKS),
+                near=towards_center, depends=(STRUCTURES,), watch=(lambda bot: bot.cc.tag,),
+            ),
+            # Build refineries
+            BuildStep(
+                "refinery", UnitTypeId.REFINERY,
+                guard=lambda bot: has_tech(bot, UnitTypeId.BARRACKS) and bot.structures(UnitTypeId.BARRACKS)
+                and bot.gas_buildings.amount < 2,
+                action=lambda bot: bot.build_refinery(), depends=(STRUCTURES, ORDERS),
+                watch=(lambda bot: bot.cc.tag,),
+            ),
+            # Build factory if we dont have one
+            BuildStep(
+                "factory", UnitTypeId.FACTORY,
+                guard=lambda bot: has_tech(bot, UnitTypeId.BARRACKS) and has_tech(bot, UnitTypeId.FACTORY)
+                and not bot.structures(UnitTypeId.FACTORY),
+                near=towards_center, depends=(STRUCTURES,), watch=(lambda bot: bot.cc.tag,),
+            ),
+            # Build starport once we can build starports, up to 2
+            BuildStep(
+                "starport", UnitTypeId.STARPORT,
+                guard=lambda bot: has_tech(bot, UnitTypeId.BARRACKS) and has_tech(bot, UnitTypeId.FACTORY)
+                and bot.structures(UnitTypeId.FACTORY).ready
+                and bot.counters.ready(UnitTypeId.STARPORT) + bot.counters.ready(UnitTypeId.STARPORTFLYING)
+                + bot.counters.pending(UnitTypeId.STARPORT) < 2,
+                near=lambda bot: bot.cc.position.towards(bot.game_info.map_center, 15).random_on_distance(8),
+                depends=(STRUCTURES, ORDERS), watch=(lambda bot: bot.cc.tag,),
+            ),
+        ])
+        # Runs after the starport addons are handled, like before
+        self.fusion = BuildOrder(self, [
+            BuildStep(
+                "fusion core", UnitTypeId.FUSIONCORE,
+                guard=lambda bot: bot.structures(UnitTypeId.STARPORT).ready
+                and not bot.structures(UnitTypeId.FUSIONCORE),
+                near=towards_center, depends=(STRUCTURES,), watch=(lambda bot: bot.cc.tag,),
+            ),
+        ])
+        # Debug drawing gives way to micro when the step runs long
+        self.add_task("draw flying starports", self.draw_flying_starports, Priority.DEBUG)
+
+    def train_battlecruisers(self):
+        for sp in self.structures(UnitTypeId.STARPORT).idle:
+            if sp.has_add_on:
+                if not self.can_afford(UnitTypeId.BATTLECRUISER):
+                    break
+                sp.train(UnitTypeId.BATTLECRUISER)
+
+    def build_refinery(self):
+        vgs: Units = self.bases.geysers(self.cc)
+        for vg in vgs:
+            if self.gas_buildings.filter(lambda unit: unit.distance_to(vg) < 1):
+                break
+
+            worker: Unit = self.select_build_worker(vg.position)
+            if worker is None:
+                break
+
+            worker.build_gas(vg)
+            break
 
     def select_target(self) -> Tuple[Point2, bool]:
         """ Select an enemy target the units should attack. """
@@ -49,75 +138,36 @@ class BCRushBot(VoidBotBase):
             return
 
         cc: Unit = ccs.random
+        self.cc = cc
 
         # Send all BCs to attack a target.
         bcs: Units = self.units(UnitTypeId.BATTLECRUISER)
         if bcs:
             target, target_is_enemy_unit = self.select_target()
-            bc: Unit
-            for bc in bcs:
-                # Order the BC to attack-move the target
-                if target_is_enemy_unit and (bc.is_idle or bc.is_moving):
-                    bc.attack(target)
-                # Order the BC to move to the target, and once the select_target returns an attack-target, change it to attack-move
-                elif bc.is_idle:
-                    bc.move(target)
-
-        # Build more SCVs until 22
-        if self.can_afford(UnitTypeId.SCV) and self.supply_workers < 22 and cc.is_idle:
-            cc.train(UnitTypeId.SCV)
-
-        # Build more BCs
-        if self.structures(UnitTypeId.FUSIONCORE) and self.can_afford(UnitTypeId.BATTLECRUISER):
-            for sp in self.structures(UnitTypeId.STARPORT).idle:
-                if sp.has_add_on:
-                    if not self.can_afford(UnitTypeId.BATTLECRUISER):
-                        break
-                    sp.train(UnitTypeId.BATTLECRUISER)
-
-        # Build more supply depots
-        if self.supply_left < 6 and self.supply_used >= 14 and not self.already_pending(UnitTypeId.SUPPLYDEPOT):
-            if self.can_afford(UnitTypeId.SUPPLYDEPOT):
-                await self.build(UnitTypeId.SUPPLYDEPOT, near=cc.position.towards(self.game_info.map_center, 8))
-
-        # Build barracks if we have none
-        if self.tech_requirement_progress(UnitTypeId.BARRACKS) == 1:
-            if not self.structures(UnitTypeId.BARRACKS):
-                if self.can_afford(UnitTypeId.BARRACKS):
-                    await self.build(UnitTypeId.BARRACKS, near=cc.position.towards(self.game_info.map_center, 8))
-
-            # Build refineries
-            elif self.structures(UnitTypeId.BARRACKS) and self.gas_buildings.amount < 2:
-                if self.can_afford(UnitTypeId.REFINERY):
-                    vgs: Units = self.vespene_geyser.closer_than(20, cc)
-                    for vg in vgs:
-                        if self.gas_buildings.filter(lambda unit: unit.distance_to(vg) < 1):
-                            break
-
-                        worker: Unit = self.select_build_worker(vg.position)
-                        if worker is None:
-                            break
-
-                        worker.build_gas(vg)
-                        break
-
-            # Build factory if we dont have one
-            if self.tech_requirement_progress(UnitTypeId.FACTORY) == 1:
-                factories: Units = self.structures(UnitTypeId.FACTORY)
-                if not factories:
-                    if self.can_afford(UnitTypeId.FACTORY):
-                        await self.build(UnitTypeId.FACTORY, near=cc.position.towards(self.game_info.map_center, 8))
-                # Build starport once we can build starports, up to 2
-                elif (
-                    factories.ready
-                    and self.structures.of_type({UnitTypeId.STARPORT, UnitTypeId.STARPORTFLYING}).ready.amount +
-                    self.already_pending(UnitTypeId.STARPORT) < 2
-                ):
-                    if self.can_afford(UnitTypeId.STARPORT):
-                        await self.build(
-                            UnitTypeId.STARPORT,
-                            near=cc.position.towards(self.game_info.map_center, 15).random_on_distance(8),
-                        )
+            threats: Units = (self.enemy_units | self.enemy_structures).filter(
+                lambda unit: unit.can_attack_air and unit.distance_to(bcs.center) < 15
+            )
+            # Pull back to the command center when the fight around the BCs is expected to be lost
+            if threats and bcs.center.distance_to(cc) > 15 and not self.combat.engage(bcs, threats):
+                for bc in bcs:
+                    bc.move(cc.position)
+            else:
+                focus = self.targeting.assign(bcs, max_distance=15)
+                bc: Unit
+                for bc in bcs:
+                    # Focus fire on the BC's assigned enemy when one is close
+                    focus_target = focus.get(bc.tag)
+                    if focus_target:
+                        if bc.order_target != focus_target.tag:
+                            bc.attack(focus_target)
+                    # Order the BC to attack-move the target
+                    elif target_is_enemy_unit and (bc.is_idle or bc.is_moving):
+                        bc.attack(target)
+                    # Order the BC to move to the target, and once the select_target returns an attack-target, change it to attack-move
+                    elif bc.is_idle:
+                        bc.move(target)
+
+        await self.macro.run()
 
         def starport_points_to_build_addon(sp_position: Point2) -> List[Point2]:
             """ Return all points that need to be checked when trying to build an addon. Returns 4 points. """
@@ -163,17 +213,22 @@ class BCRushBot(VoidBotBase):
                     sp(AbilityId.LAND, target_land_position)
                     break
 
-        # Show where it is flying to and show grid
-        unit: Unit
+        # Build fusion core
+        await self.fusion.run()
+
+        # Saturate refineries and send idle workers back to mine
+        self.manage_workers()
+
+    def draw_flying_starports(self):
+        """ Show where flying starports are headed. """
         for sp in self.structures(UnitTypeId.STARPORTFLYING).filter(lambda unit: not unit.is_idle):
             if isinstance(sp.order_target, Point2):
                 p: Point3 = Point3((*sp.order_target, self.get_terrain_z_height(sp.order_target)))
                 self.client.debug_box2_out(p, color=Point3((255, 0, 0)))
 
-        # Build fusion core
-        if self.structures(UnitTypeId.STARPORT).ready:
-            if self.can_afford(UnitTypeId.FUSIONCORE) and not self.structures(UnitTypeId.FUSIONCORE):
-                await self.build(UnitTypeId.FUSIONCORE, near=cc.position.towards(self.game_info.map_center, 8))
+    def manage_workers(self):
+        if not self.townhalls:
+            return
 
         # Saturate refineries
         for refinery in self.gas_buildings:
@@ -184,7 +239,7 @@ class BCRushBot(VoidBotBase):
 
         # Send workers back to mine if they are idle
         for scv in self.workers.idle:
-            scv.gather(self.mineral_field.closest_to(cc))
+            scv.gather(self.mineral_field.closest_to(self.cc))
 
     async def custom_on_end(self, game_result):
             pass
@@ -9,7 +9,11 @@ from sc2.position import Point2
 from sc2.unit import Unit
 from sc2.units import Units
 
+# Additional imports
+import numpy as np
+
 # Local imports
+from common.build_order import ORDERS, STRUCTURES, UNITS, BuildOrder, BuildStep
 from common.void_bot_base import VoidBotBase
 
 class ProxyRaxBot(VoidBotBase):
@@ -17,6 +21,65 @@ class ProxyRaxBot(VoidBotBase):
     async def custom_on_start(self):
         self.client.game_step = 2
 
+        # Macro chain, the first step whose guard holds takes the turn like the old if/elif chain
+        supply = lambda bot: (bot.supply_used, bot.supply_cap)
+        self.macro = BuildOrder(self, [
+            # Train more SCVs
+            BuildStep(
+                "scv", UnitTypeId.SCV,
+                guard=lambda bot: bot.can_afford(UnitTypeId.SCV) and bot.supply_workers < 16 and bot.cc.is_idle,
+                afford=False,
+                action=lambda bot: bot.cc.train(UnitTypeId.SCV),
+                depends=(UNITS, ORDERS),
+                watch=(supply, lambda bot: bot.cc.tag),
+            ),
+            # Build more depots
+            BuildStep(
+                "depot", UnitTypeId.SUPPLYDEPOT,
+                guard=lambda bot: bot.supply_left < (2 if bot.counters.amount(UnitTypeId.BARRACKS) < 3 else 4)
+                and bot.supply_used >= 14,
+                condition=lambda bot: bot.counters.pending(UnitTypeId.SUPPLYDEPOT) < 2,
+                near=lambda bot: bot.cc.position.towards(bot.game_info.map_center, 5),
+                depends=(STRUCTURES, UNITS, ORDERS),
+                watch=(supply, lambda bot: bot.cc.tag),
+            ),
+            # Build proxy barracks
+            BuildStep(
+                "proxy barracks", UnitTypeId.BARRACKS,
+                guard=lambda bot: bot.counters.amount(UnitTypeId.BARRACKS) < 3
+                or (bot.minerals > 400 and bot.counters.amount(UnitTypeId.BARRACKS) < 5),
+                near=lambda bot: bot.game_info.map_center.towards(bot.enemy_start_locations[0], 25),
+                depends=(STRUCTURES,),
+                watch=(lambda bot: bot.minerals > 400,),
+            ),
+        ], chain=True)
+
+    def gather_idle_workers(self):
+        """ Send idle workers to gather minerals near the command center. """
+        if self.townhalls(UnitTypeId.COMMANDCENTER):
+            for scv in self.workers.idle:
+                scv.gather(self.mineral_field.closest_to(self.cc))
+
+    def wave_for(self, idle: Units, target: Point2) -> Units:
+        """ Marines to send at target: the idle wave, the wave plus every other marine, or none yet. """
+        defenders = (self.enemy_units | self.enemy_structures).filter(
+            lambda unit: unit.can_attack_ground and unit.distance_to(target) < 15
+        )
+        if not defenders:
+            return idle
+        marines = self.units(UnitTypeId.MARINE)
+        wave_tags = idle.tags
+        # Candidate 0 fights with the idle wave only, candidate 1 also waits for the others to walk over
+        arrival = np.array([0 if m.tag in wave_tags else m.distance_to(target) / max(m.real_speed, 0.1)
+                            for m in marines])
+        delays = np.stack([np.where(arrival == 0, 0.0, np.inf), arrival])
+        result = self.combat.simulate(marines, defenders, own_delay=delays, distance=10)
+        if result.win[0]:
+            return idle
+        if result.win[1]:
+            return marines
+        return Units([], self)
+
     # pylint: disable=R0912
     async def custom_on_step(self, iteration):
         # If we don't have a townhall anymore, send all units to attack
@@ -29,30 +92,19 @@ class ProxyRaxBot(VoidBotBase):
 
         cc: Unit = ccs.first
 
-        # Send marines in waves of 15, each time 15 are idle, send them to their death
+        # Send marines in waves of 15 once the wave is expected to win the fight at the target
         marines: Units = self.units(UnitTypeId.MARINE).idle
         if marines.amount > 15:
             target: Point2 = self.enemy_structures.random_or(self.enemy_start_locations[0]).position
-            for marine in marines:
-                marine.attack(target)
-
-        # Train more SCVs
-        if self.can_afford(UnitTypeId.SCV) and self.supply_workers < 16 and cc.is_idle:
-            cc.train(UnitTypeId.SCV)
-
-        # Build more depots
-        elif (
-            self.supply_left < (2 if self.structures(UnitTypeId.BARRACKS).amount < 3 else 4) and self.supply_used >= 14
-        ):
-            if self.can_afford(UnitTypeId.SUPPLYDEPOT) and self.already_pending(UnitTypeId.SUPPLYDEPOT) < 2:
-                await self.build(UnitTypeId.SUPPLYDEPOT, near=cc.position.towards(self.game_info.map_center, 5))
-
-        # Build proxy barracks
-        elif self.structures(UnitTypeId.BARRACKS
-                             ).amount < 3 or (self.minerals > 400 and self.structures(UnitTypeId.BARRACKS).amount < 5):
-            if self.can_afford(UnitTypeId.BARRACKS):
-                p: Point2 = self.game_info.map_center.towards(self.enemy_start_locations[0], 25)
-                await self.build(UnitTypeId.BARRACKS, near=p)
+            wave = self.wave_for(marines, target)
+            # Focus fire on enemies already near the wave, the rest of the wave heads for the target
+            focus = self.targeting.assign(wave, max_distance=15)
+            for marine in wave:
+                marine.attack(focus.get(marine.tag, target))
+
+        # Train SCVs, depots or proxy barracks
+        self.cc = cc
+        await self.macro.run()
 
         # Train marines
         for rax in self.structures(UnitTypeId.BARRACKS).ready.idle:
@@ -60,8 +112,7 @@ class ProxyRaxBot(VoidBotBase):
                 rax.train(UnitTypeId.MARINE)
 
         # Send idle workers to gather minerals near command center
-        for scv in self.workers.idle:
-            scv.gather(self.mineral_field.closest_to(cc))
+        self.gather_idle_workers()
 
     async def custom_on_end(self, game_result):
         pass
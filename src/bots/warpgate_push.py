@@ -13,6 +13,8 @@ from sc2.main import run_game
 from sc2.player import Bot, Computer
 
 # Local imports
+from common.build_order import BuildOrder, BuildStep, ORDERS, STRUCTURES, UNITS, UPGRADES
+from common.power_field import PowerField
 from common.void_bot_base import VoidBotBase
 
 # pylint: disable=W0231
@@ -22,18 +24,109 @@ class WarpGateBot(VoidBotBase):
         # Initialize inherited class
         self.proxy_built = False
 
+    async def custom_on_start(self):
+        self.power_field = PowerField(self)
+        self.nexus = None
+        # Workers and pylons, a supply block halts the rest of the step
+        self.opening = BuildOrder(self, [
+            BuildStep(
+                "supply pylon", UnitTypeId.PYLON,
+                guard=lambda bot: bot.supply_left < 2 and bot.counters.pending(UnitTypeId.PYLON) == 0,
+                near=lambda bot: bot.nexus, depends=(STRUCTURES, ORDERS),
+                watch=(lambda bot: bot.supply_left, lambda bot: bot.nexus.tag), halt=True,
+            ),
+            BuildStep(
+                "probe", UnitTypeId.PROBE,
+                guard=lambda bot: bot.workers.amount < bot.townhalls.amount * 22 and bot.nexus.is_idle,
+                action=lambda bot: bot.nexus.train(UnitTypeId.PROBE), depends=(UNITS, STRUCTURES, ORDERS),
+                watch=(lambda bot: bot.nexus.tag, lambda bot: bot.nexus.is_idle),
+            ),
+            BuildStep(
+                "pylon", UnitTypeId.PYLON,
+                guard=lambda bot: bot.counters.amount(UnitTypeId.PYLON) < 5
+                and bot.counters.pending(UnitTypeId.PYLON) == 0,
+                near=lambda bot: bot.nexus.position.towards(bot.game_info.map_center, 5), depends=(STRUCTURES, ORDERS),
+                watch=(lambda bot: bot.nexus.tag,),
+            ),
+        ], chain=True)
+        self.macro = BuildOrder(self, [
+            BuildStep(
+                "cybernetics core", UnitTypeId.CYBERNETICSCORE,
+                guard=lambda bot: bot.structures(UnitTypeId.PYLON).ready and bot.structures(UnitTypeId.GATEWAY).ready
+                and not bot.counters.amount(UnitTypeId.CYBERNETICSCORE),
+                condition=lambda bot: bot.counters.pending(UnitTypeId.CYBERNETICSCORE) == 0,
+                near=lambda bot: bot.structures(UnitTypeId.PYLON).ready.random, depends=(STRUCTURES, ORDERS),
+            ),
+            # Build up to 4 gates
+            BuildStep(
+                "gateway", UnitTypeId.GATEWAY,
+                guard=lambda bot: bot.structures(UnitTypeId.PYLON).ready
+                and bot.counters.amount(UnitTypeId.WARPGATE) + bot.counters.amount(UnitTypeId.GATEWAY) < 4,
+                near=lambda bot: bot.structures(UnitTypeId.PYLON).ready.random, depends=(STRUCTURES,),
+            ),
+            BuildStep("gas", UnitTypeId.ASSIMILATOR, afford=False, action=lambda bot: bot.build_gas()),
+            # Research warp gate if cybercore is completed
+            BuildStep(
+                "warpgate research", UpgradeId.WARPGATERESEARCH,
+                guard=lambda bot: bot.counters.ready(UnitTypeId.CYBERNETICSCORE)
+                and not bot.counters.started(UpgradeId.WARPGATERESEARCH),
+                action=lambda bot: bot.structures(UnitTypeId.CYBERNETICSCORE).ready.first.research(
+                    UpgradeId.WARPGATERESEARCH),
+                depends=(STRUCTURES, UPGRADES, ORDERS),
+            ),
+            # Morph to warp gate when research is complete
+            BuildStep(
+                "warpgate morph",
+                guard=lambda bot: bot.counters.ready(UpgradeId.WARPGATERESEARCH),
+                action=lambda bot: bot.morph_warpgates(), depends=(UPGRADES,),
+            ),
+            BuildStep(
+                "proxy pylon", UnitTypeId.PYLON,
+                guard=lambda bot: bot.counters.amount(UnitTypeId.CYBERNETICSCORE) >= 1 and not bot.proxy_built,
+                action=lambda bot: bot.build_proxy_pylon(), depends=(STRUCTURES,),
+                watch=(lambda bot: bot.proxy_built,),
+            ),
+        ])
+
+    def build_gas(self):
+        for nexus in self.townhalls.ready:
+            vgs = self.bases.geysers(nexus)
+            for vg in vgs:
+                if not self.can_afford(UnitTypeId.ASSIMILATOR):
+                    break
+                worker = self.select_build_worker(vg.position)
+                if worker is None:
+                    break
+                if not self.gas_buildings or not self.gas_buildings.closer_than(1, vg):
+                    worker.build_gas(vg)
+                    worker.stop(queue=True)
+
+    def morph_warpgates(self):
+        for gateway in self.structures(UnitTypeId.GATEWAY).ready.idle:
+            gateway(AbilityId.MORPH_WARPGATE)
+
+    async def build_proxy_pylon(self):
+        p = self.game_info.map_center.towards(self.enemy_start_locations[0], 20)
+        await self.build(UnitTypeId.PYLON, near=p)
+        self.proxy_built = True
+
     async def warp_new_units(self, proxy):
-        for warpgate in self.structures(UnitTypeId.WARPGATE).ready:
-            abilities = await self.get_available_abilities(warpgate)
-            # all the units have the same cooldown anyway so let's just look at ZEALOT
-            if AbilityId.WARPGATETRAIN_STALKER in abilities:
-                pos = proxy.position.to2.random_on_distance(4)
-                placement = await self.find_placement(AbilityId.WARPGATETRAIN_STALKER, pos, placement_step=1)
-                if placement is None:
-                    # return ActionResult.CantFindPlacementLocation
-                    logger.info("can't place")
-                    return
-                warpgate.warp_in(UnitTypeId.STALKER, placement)
+        warpgates = self.structures(UnitTypeId.WARPGATE).ready
+        if not warpgates:
+            return
+        # One query for all gates, all the units have the same cooldown anyway so let's just look at STALKER
+        abilities = await self.get_available_abilities(warpgates)
+        ready = [gate for gate, gate_abilities in zip(warpgates, abilities)
+                 if AbilityId.WARPGATETRAIN_STALKER in gate_abilities]
+        if not ready:
+            return
+        # Pick every warp-in spot for this step from the cached power field raster
+        placements = self.power_field.warp_in_positions(len(ready), near=proxy.position, min_distance=2)
+        if len(placements) < len(ready):
+            # return ActionResult.CantFindPlacementLocation
+            logger.info("can't place")
+        for warpgate, placement in zip(ready, placements):
+            warpgate.warp_in(UnitTypeId.STALKER, placement)
 
     # pylint: disable=R0912
     async def custom_on_step(self, iteration):
@@ -46,89 +139,30 @@ class WarpGateBot(VoidBotBase):
             return
 
         nexus = self.townhalls.ready.random
+        self.nexus = nexus
 
-        # Build pylon when on low supply
-        if self.supply_left < 2 and self.already_pending(UnitTypeId.PYLON) == 0:
-            # Always check if you can afford something before you build it
-            if self.can_afford(UnitTypeId.PYLON):
-                await self.build(UnitTypeId.PYLON, near=nexus)
+        if await self.opening.run():
             return
-
-        if self.workers.amount < self.townhalls.amount * 22 and nexus.is_idle:
-            if self.can_afford(UnitTypeId.PROBE):
-                nexus.train(UnitTypeId.PROBE)
-
-        elif self.structures(UnitTypeId.PYLON).amount < 5 and self.already_pending(UnitTypeId.PYLON) == 0:
-            if self.can_afford(UnitTypeId.PYLON):
-                await self.build(UnitTypeId.PYLON, near=nexus.position.towards(self.game_info.map_center, 5))
+        await self.macro.run()
 
         proxy = None
         if self.structures(UnitTypeId.PYLON).ready:
             proxy = self.structures(UnitTypeId.PYLON).closest_to(self.enemy_start_locations[0])
-            pylon = self.structures(UnitTypeId.PYLON).ready.random
-            if self.structures(UnitTypeId.GATEWAY).ready:
-                # If we have no cyber core, build one
-                if not self.structures(UnitTypeId.CYBERNETICSCORE):
-                    if (
-                        self.can_afford(UnitTypeId.CYBERNETICSCORE)
-                        and self.already_pending(UnitTypeId.CYBERNETICSCORE) == 0
-                    ):
-                        await self.build(UnitTypeId.CYBERNETICSCORE, near=pylon)
-            # Build up to 4 gates
-            if (
-                self.can_afford(UnitTypeId.GATEWAY)
-                and self.structures(UnitTypeId.WARPGATE).amount + self.structures(UnitTypeId.GATEWAY).amount < 4
-            ):
-                await self.build(UnitTypeId.GATEWAY, near=pylon)
-
-        # Build gas
-        for nexus in self.townhalls.ready:
-            vgs = self.vespene_geyser.closer_than(15, nexus)
-            for vg in vgs:
-                if not self.can_afford(UnitTypeId.ASSIMILATOR):
-                    break
-                worker = self.select_build_worker(vg.position)
-                if worker is None:
-                    break
-                if not self.gas_buildings or not self.gas_buildings.closer_than(1, vg):
-                    worker.build_gas(vg)
-                    worker.stop(queue=True)
-
-        # Research warp gate if cybercore is completed
-        if (
-            self.structures(UnitTypeId.CYBERNETICSCORE).ready and self.can_afford(AbilityId.RESEARCH_WARPGATE)
-            and self.already_pending_upgrade(UpgradeId.WARPGATERESEARCH) == 0
-        ):
-            ccore = self.structures(UnitTypeId.CYBERNETICSCORE).ready.first
-            ccore.research(UpgradeId.WARPGATERESEARCH)
-
-        # Morph to warp gate when research is complete
-        for gateway in self.structures(UnitTypeId.GATEWAY).ready.idle:
-            if self.already_pending_upgrade(UpgradeId.WARPGATERESEARCH) == 1:
-                gateway(AbilityId.MORPH_WARPGATE)
 
         if self.proxy_built and proxy:
             await self.warp_new_units(proxy)
 
-        # Make stalkers attack either closest enemy unit or enemy spawn location
-        if self.units(UnitTypeId.STALKER).amount > 3:
-            for stalker in self.units(UnitTypeId.STALKER).ready.idle:
-                targets = (self.enemy_units | self.enemy_structures).filter(lambda unit: unit.can_be_attacked)
-                if targets:
-                    target = targets.closest_to(stalker)
+        # Make stalkers focus fire on their assigned enemy or attack the enemy spawn location
+        if self.counters.amount(UnitTypeId.STALKER) > 3:
+            stalkers = self.units(UnitTypeId.STALKER).ready.idle
+            focus = self.targeting.assign(stalkers)
+            for stalker in stalkers:
+                target = focus.get(stalker.tag)
+                if target:
                     stalker.attack(target)
                 else:
                     stalker.attack(self.enemy_start_locations[0])
 
-        # Build proxy pylon
-        if (
-            self.structures(UnitTypeId.CYBERNETICSCORE).amount >= 1 and not self.proxy_built
-            and self.can_afford(UnitTypeId.PYLON)
-        ):
-            p = self.game_info.map_center.towards(self.enemy_start_locations[0], 20)
-            await self.build(UnitTypeId.PYLON, near=p)
-            self.proxy_built = True
-
         # Chrono nexus if cybercore is not ready, else chrono cybercore
         if not self.structures(UnitTypeId.CYBERNETICSCORE).ready:
             if not nexus.has_buff(BuffId.CHRONOBOOSTENERGYCOST) and not nexus.is_idle:
@@ -57,30 +57,29 @@ class ZergRushBot(VoidBotBase):
                 queen(AbilityId.EFFECT_INJECTLARVA, hatch)
 
         # Pull workers out of gas if we have almost enough gas mined, this will stop mining when we reached 100 gas mined
-        if self.vespene >= 88 or self.already_pending_upgrade(UpgradeId.ZERGLINGMOVEMENTSPEED) > 0:
+        if self.vespene >= 88 or self.counters.started(UpgradeId.ZERGLINGMOVEMENTSPEED):
             gas_drones: Units = self.workers.filter(lambda w: w.is_carrying_vespene and len(w.orders) < 2)
             drone: Unit
             for drone in gas_drones:
-                minerals: Units = self.mineral_field.closer_than(10, hatch)
+                minerals: Units = self.bases.minerals(hatch)
                 if minerals:
                     mineral: Unit = minerals.closest_to(drone)
                     drone.gather(mineral, queue=True)
 
         # If we have 100 vespene, this will try to research zergling speed once the spawning pool is at 100% completion
-        if self.already_pending_upgrade(UpgradeId.ZERGLINGMOVEMENTSPEED
-                                        ) == 0 and self.can_afford(UpgradeId.ZERGLINGMOVEMENTSPEED):
+        if not self.counters.started(UpgradeId.ZERGLINGMOVEMENTSPEED) and self.can_afford(UpgradeId.ZERGLINGMOVEMENTSPEED):
             spawning_pools_ready: Units = self.structures(UnitTypeId.SPAWNINGPOOL).ready
             if spawning_pools_ready:
                 self.research(UpgradeId.ZERGLINGMOVEMENTSPEED)
 
         # If we have less than 2 supply left and no overlord is in the queue: train an overlord
-        if self.supply_left < 2 and self.already_pending(UnitTypeId.OVERLORD) < 1:
+        if self.supply_left < 2 and self.counters.pending(UnitTypeId.OVERLORD) < 1:
             self.train(UnitTypeId.OVERLORD, 1)
 
         # While we have less than 88 vespene mined: send drones into extractor one frame at a time
         if (
             self.gas_buildings.ready and self.vespene < 88
-            and self.already_pending_upgrade(UpgradeId.ZERGLINGMOVEMENTSPEED) == 0
+            and not self.counters.started(UpgradeId.ZERGLINGMOVEMENTSPEED)
         ):
             extractor: Unit = self.gas_buildings.first
             if extractor.surplus_harvesters < 0:
@@ -104,7 +103,7 @@ class ZergRushBot(VoidBotBase):
 
         # If we have no extractor, build extractor
         if (
-            self.gas_buildings.amount + self.already_pending(UnitTypeId.EXTRACTOR) == 0
+            self.gas_buildings.amount + self.counters.pending(UnitTypeId.EXTRACTOR) == 0
             and self.can_afford(UnitTypeId.EXTRACTOR) and self.workers
         ):
             drone: Unit = self.workers.random
@@ -112,7 +111,7 @@ class ZergRushBot(VoidBotBase):
             drone.build_gas(target)
 
         # If we have no spawning pool, try to build spawning pool
-        elif self.structures(UnitTypeId.SPAWNINGPOOL).amount + self.already_pending(UnitTypeId.SPAWNINGPOOL) == 0:
+        elif self.counters.amount(UnitTypeId.SPAWNINGPOOL) + self.counters.pending(UnitTypeId.SPAWNINGPOOL) == 0:
             if self.can_afford(UnitTypeId.SPAWNINGPOOL):
                 for d in range(4, 15):
                     pos: Point2 = hatch.position.towards(self.game_info.map_center, d)
@@ -122,7 +121,7 @@ class ZergRushBot(VoidBotBase):
 
         # If we have no queen, try to build a queen if we have a spawning pool compelted
         elif (
-            self.units(UnitTypeId.QUEEN).amount + self.already_pending(UnitTypeId.QUEEN) < self.townhalls.amount
+            self.counters.amount(UnitTypeId.QUEEN) + self.counters.pending(UnitTypeId.QUEEN) < self.townhalls.amount
             and self.structures(UnitTypeId.SPAWNINGPOOL).ready
         ):
             if self.can_afford(UnitTypeId.QUEEN):
@@ -0,0 +1,126 @@
+# Base imports
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+# Additional imports
+from scipy.stats import beta
+
+
+class Cell:
+    """ Running win/loss tally for one (bot, map) matchup. """
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.wins = 0
+        self.games = 0
+        # Started but not recorded yet, games in flight under runner.py --concurrent
+        self.pending = 0
+        self.decided = False
+        self.verdict = ""
+
+    @property
+    def losses(self) -> int:
+        return self.games - self.wins
+
+    def interval(self, confidence: float) -> Tuple[float, float]:
+        # Equal tailed credible interval of the Beta(1 + wins, 1 + losses) posterior (uniform prior)
+        tail = (1 - confidence) / 2
+        a, b = 1 + self.wins, 1 + self.losses
+        return float(beta.ppf(tail, a, b)), float(beta.ppf(1 - tail, a, b))
+
+
+class AdaptiveScheduler:
+    """ Decides which matchup to play next.
+
+    In fixed mode every cell is played games_per_cell times, in rounds: the cell with the fewest games goes next, so
+    the cells are interleaved rather than each played out in list order. In adaptive mode a cell stops as soon as the
+    credible interval of its win rate lies entirely above or below the threshold, and the games it didn't
+    need go to cells that are still undecided (up to max_games per cell) until the total budget is spent. With
+    early_stop they are saved instead: no cell plays more than games_per_cell, the evaluation ends once every cell is
+    decided or played out, and the total shrinks by what the decided cells didn't need.
+
+    With several games in flight, start() each cell handed out so it counts against the budget and the cap until
+    its result is recorded. """
+
+    def __init__(
+        self,
+        keys: Iterable[Hashable],
+        games_per_cell: int = 1,
+        adaptive: bool = False,
+        confidence: float = 0.95,
+        threshold: float = 0.5,
+        min_games: int = 3,
+        max_games: Optional[int] = None,
+        early_stop: bool = False,
+    ):
+        self.cells: Dict[Hashable, Cell] = {key: Cell(key) for key in keys}
+        self.games_per_cell = games_per_cell
+        self.adaptive = adaptive
+        self.confidence = confidence
+        self.threshold = threshold
+        self.min_games = min_games
+        self.max_games = max_games if max_games is not None else max(games_per_cell * 3, min_games)
+        self.early_stop = early_stop
+        self.budget = games_per_cell * len(self.cells)
+        self.games_played = 0
+        self.pending = 0
+
+    def _cap(self) -> int:
+        return self.max_games if self.adaptive and not self.early_stop else self.games_per_cell
+
+    def next_cell(self) -> Optional[Hashable]:
+        """ Key of the next cell to play, or None when the evaluation is finished. """
+        if self.games_played + self.pending >= self.budget:
+            return None
+        open_cells = [c for c in self.cells.values() if not c.decided and c.games + c.pending < self._cap()]
+        if not open_cells:
+            return None
+        # Fewest games first, widest interval breaks ties, so every cell reaches min_games before any extra spend
+        cell = min(open_cells, key=lambda c: (c.games + c.pending, -self._width(c)))
+        return cell.key
+
+    def start(self, key: Hashable):
+        self.cells[key].pending += 1
+        self.pending += 1
+
+    def _width(self, cell: Cell) -> float:
+        lo, hi = cell.interval(self.confidence)
+        return hi - lo
+
+    def record(self, key: Hashable, won: bool):
+        cell = self.cells[key]
+        if cell.pending:
+            cell.pending -= 1
+            self.pending -= 1
+        cell.games += 1
+        cell.wins += int(won)
+        self.games_played += 1
+
+        if not self.adaptive:
+            cell.decided = cell.games >= self.games_per_cell
+            return
+
+        if cell.games < self.min_games:
+            return
+        lo, hi = cell.interval(self.confidence)
+        if lo > self.threshold:
+            cell.decided, cell.verdict = True, "above"
+        elif hi < self.threshold:
+            cell.decided, cell.verdict = True, "below"
+        elif cell.games >= self._cap():
+            cell.decided, cell.verdict = True, "capped"
+
+    def summary(self):
+        """ One dict per cell with its tally, credible interval and verdict. """
+        rows = []
+        for cell in self.cells.values():
+            lo, hi = cell.interval(self.confidence)
+            rows.append({
+                "cell": cell.key,
+                "games": cell.games,
+                "wins": cell.wins,
+                "win_rate": cell.wins / cell.games if cell.games else float("nan"),
+                "ci_low": lo,
+                "ci_high": hi,
+                "verdict": cell.verdict or ("undecided" if self.adaptive else ""),
+            })
+        return rows
@@ -0,0 +1,293 @@
+# Base imports
+import argparse
+import gc
+import glob
+import json
+import os
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+# Additional imports
+import numpy as np
+from loguru import logger
+
+# Local imports
+from common.sampling_profiler import short_path
+
+# Collections that happen while no step runs, mostly burnysc2 parsing the observation into Units
+BETWEEN_STEPS = "between steps"
+
+# Allocations of the tracker itself and of tracemalloc's snapshots are left out
+_IGNORE = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+           tracemalloc.Filter(False, "<unknown>")]
+
+
+class Section:
+    """ What one named part of the step allocated and collected over a game. """
+
+    def __init__(self):
+        self.steps = 0
+        self.snapshots = 0
+        self.collections = [0, 0, 0]
+        self.gc_pause = 0.0
+        # Bytes and blocks still alive at the end of the section per allocation site, summed over snapshot steps
+        self.site_bytes: Counter = Counter()
+        self.site_blocks: Counter = Counter()
+
+    def report(self, top: int) -> dict:
+        return {"steps": self.steps, "snapshots": self.snapshots, "net_bytes": sum(self.site_bytes.values()),
+                "collections": self.collections, "gc_pause_ms": round(self.gc_pause * 1e3, 3),
+                "sites": [[site, size, self.site_blocks[site]] for site, size in self.site_bytes.most_common(top)]}
+
+
+class AllocationTracker:
+    """ Allocations and garbage collections of one game, per named section of on_step.
+
+    The step is cut into sections: VoidBotBase marks its own parts (stats, counters, custom_on_step, tasks) and a bot
+    can mark finer ones with alloc_mark, a mark ends the section before it. Every every-th step tracemalloc traces
+    each section on its own, started at the mark and snapshotted right before the next one, so the snapshot holds
+    exactly what the section allocated and left alive: the lines behind it are the section's allocation sites.
+    Temporaries freed before the next mark leave no trace, but objects that survive are what fills generation 0 and
+    triggers collections. Tracing only runs during those steps, whole heap snapshots of a running bot take seconds.
+    A gc callback times every collection, every step, and charges it to the section running, or to between steps.
+
+    Games sharing a process each have their own tracker and collections go to the one resumed. tracemalloc is
+    process wide: one game traces at a time, and a section that awaits the server also sees what other games
+    allocated meanwhile, use --concurrent 1 for site attribution. every 0 records collections only. """
+
+    _current: Optional["AllocationTracker"] = None
+    _last: Optional["AllocationTracker"] = None
+    _tracing: Optional["AllocationTracker"] = None
+    _hooked = False
+
+    def __init__(self, every: int = 10, frames: int = 1, top: int = 25):
+        if every and tracemalloc.is_tracing() and AllocationTracker._tracing is None:
+            logger.warning("tracemalloc is already tracing, allocation sites disabled")
+            every = 0
+        self.every = every
+        self.frames = frames
+        self.top = top
+        self.sections: Dict[str, Section] = defaultdict(Section)
+        self.steps = 0
+        self.snapshot_steps = 0
+        # (game_loop, collections, pause seconds) of every step with a collection
+        self.gc_steps: List[tuple] = []
+        self.pauses: List[List[float]] = [[], [], []]
+        self.game_loop = 0
+        self._section: Optional[str] = None
+        self._sampling = False
+        self._step_collections = 0
+        self._step_pause = 0.0
+        self._gc_started = 0.0
+        if not AllocationTracker._hooked:
+            gc.callbacks.append(AllocationTracker._gc)
+            AllocationTracker._hooked = True
+
+    @staticmethod
+    def _gc(phase, info):
+        tracker = AllocationTracker._current or AllocationTracker._last
+        if tracker is None:
+            return
+        if phase == "start":
+            tracker._gc_started = time.perf_counter()  # pylint: disable=W0212
+            return
+        pause = time.perf_counter() - tracker._gc_started  # pylint: disable=W0212
+        generation = info["generation"]
+        tracker.pauses[generation].append(pause)
+        section = tracker.sections[tracker._section or BETWEEN_STEPS]  # pylint: disable=W0212
+        section.collections[generation] += 1
+        section.gc_pause += pause
+        if tracker._section is not None:  # pylint: disable=W0212
+            tracker._step_collections += 1  # pylint: disable=W0212
+            tracker._step_pause += pause  # pylint: disable=W0212
+
+    def _open(self, name: str):
+        self._section = name
+        self.sections[name].steps += 1
+        if self._sampling and AllocationTracker._tracing is None:
+            AllocationTracker._tracing = self
+            tracemalloc.start(self.frames)
+
+    def _close(self):
+        """ Charge what the current section left alive to it. """
+        if AllocationTracker._tracing is not self:
+            return
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        AllocationTracker._tracing = None
+        section = self.sections[self._section]
+        section.snapshots += 1
+        for stat in snapshot.filter_traces(_IGNORE).statistics("lineno"):
+            frame = stat.traceback[0]
+            site = f"{short_path(frame.filename)}:{frame.lineno}"
+            section.site_bytes[site] += stat.size
+            section.site_blocks[site] += stat.count
+
+    def mark(self, name: str):
+        """ End the current section and start name, no-op outside a step. """
+        if self._section is None:
+            return
+        self._close()
+        self._open(name)
+
+    @contextmanager
+    def section(self, name: str):
+        """ Charge the block to name, then return to the section it was started in. """
+        outer = self._section
+        self.mark(name)
+        try:
+            yield
+        finally:
+            if outer is not None:
+                self.mark(outer)
+
+    def resume(self, game_loop: int):
+        """ Start of on_step, the part of the step outside any section is charged to "step". """
+        AllocationTracker._current = AllocationTracker._last = self
+        self.game_loop = game_loop
+        self._step_collections = 0
+        self._step_pause = 0.0
+        self._sampling = bool(self.every) and not self.steps % self.every
+        self._open("step")
+
+    def pause(self):
+        """ End of on_step. """
+        self._close()
+        self._section = None
+        self.snapshot_steps += self._sampling
+        self.steps += 1
+        if self._step_collections:
+            self.gc_steps.append((self.game_loop, self._step_collections, self._step_pause))
+        AllocationTracker._current = None
+
+    def report(self) -> dict:
+        pauses = np.array([p for generation in self.pauses for p in generation]) * 1e3
+        step_pauses = np.array([p for _, _, p in self.gc_steps]) * 1e3
+        worst = sorted(self.gc_steps, key=lambda s: s[2], reverse=True)[:10]
+        return {
+            "steps": self.steps, "every": self.every, "snapshot_steps": self.snapshot_steps,
+            "sections": {name: s.report(self.top) for name, s in sorted(self.sections.items())},
+            "gc": {
+                "collections": [len(p) for p in self.pauses],
+                "pause_ms": _summary(pauses),
+                "steps_with_gc": len(self.gc_steps),
+                "step_pause_ms": _summary(step_pauses),
+                "worst_steps": [[loop, count, round(pause * 1e3, 3)] for loop, count, pause in worst],
+            },
+        }
+
+    def write(self, path: str) -> dict:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+        return report
+
+    def close(self):
+        """ End of the game, stop being charged for collections between steps. """
+        if AllocationTracker._last is self:
+            AllocationTracker._last = None
+
+    @classmethod
+    def from_env(cls) -> Optional["AllocationTracker"]:
+        """ Tracker snapshotting every VOID_BOT_ALLOC steps, None when the variable is unset (runner.py --alloc). """
+        every = os.getenv("VOID_BOT_ALLOC")
+        if not every:
+            return None
+        return cls(int(every), frames=int(os.getenv("VOID_BOT_ALLOC_FRAMES", "1")))
+
+
+def _summary(ms: np.ndarray) -> dict:
+    if not ms.size:
+        return {"count": 0}
+    return {"count": int(ms.size), "total": round(float(ms.sum()), 3), "p50": round(float(np.percentile(ms, 50)), 3),
+            "p99": round(float(np.percentile(ms, 99)), 3), "max": round(float(ms.max()), 3)}
+
+
+def alloc_path(bot_name: str, map_name: str) -> str:
+    """ One report per game, grouped in a folder per bot and map. """
+    root = os.getenv("VOID_BOT_ALLOC_DIR") or os.path.join(os.getenv("VOID_BOT_HOME", "."), "allocations")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(root, f"{bot_name}_{map_name.replace(' ', '_')}", f"{timestamp}_{os.getpid()}.json")
+
+
+def log_summary(report: dict, top: int = 5):
+    gc_stats = report["gc"]
+    pause = gc_stats["pause_ms"]
+    logger.info(f"GC: {gc_stats['collections']} collections by generation, "
+                f"{gc_stats['steps_with_gc']}/{report['steps']} steps with a collection"
+                + (f", pause p50 {pause['p50']} ms p99 {pause['p99']} ms max {pause['max']} ms" if pause["count"] else ""))
+    sites = Counter()
+    for name, section in report["sections"].items():
+        for site, size, _ in section["sites"]:
+            sites[f"{name} {site}"] += size
+    for site, size in sites.most_common(top):
+        logger.info(f"Allocated {size / 1024:.1f} KiB net at {site}")
+
+
+def merge(paths: Iterable[str]) -> dict:
+    """ Sum per game reports. Directories are searched recursively for .json files. """
+    games = steps = snapshot_steps = 0
+    sections: Dict[str, dict] = defaultdict(lambda: {"steps": 0, "snapshots": 0, "net_bytes": 0, "collections": [0, 0, 0],
+                                                     "gc_pause_ms": 0.0, "bytes": Counter(), "blocks": Counter()})
+    collections = [0, 0, 0]
+    step_pauses = []
+    for path in paths:
+        files = glob.glob(os.path.join(path, "**", "*.json"), recursive=True) if os.path.isdir(path) else [path]
+        for file in files:
+            with open(file) as f:
+                report = json.load(f)
+            games += 1
+            steps += report["steps"]
+            snapshot_steps += report["snapshot_steps"]
+            collections = [a + b for a, b in zip(collections, report["gc"]["collections"])]
+            step_pauses.append(report["gc"]["step_pause_ms"])
+            for name, section in report["sections"].items():
+                merged = sections[name]
+                merged["steps"] += section["steps"]
+                merged["snapshots"] += section["snapshots"]
+                merged["net_bytes"] += section["net_bytes"]
+                merged["collections"] = [a + b for a, b in zip(merged["collections"], section["collections"])]
+                merged["gc_pause_ms"] += section["gc_pause_ms"]
+                for site, size, blocks in section["sites"]:
+                    merged["bytes"][site] += size
+                    merged["blocks"][site] += blocks
+    return {"games": games, "steps": steps, "snapshot_steps": snapshot_steps, "collections": collections,
+            "step_pauses": step_pauses, "sections": dict(sections)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge allocation reports and print the top allocation sites per section")
+    parser.add_argument("paths", nargs="+", help="Report files or directories (searched recursively)")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    merged = merge(args.paths)
+    if not merged["games"]:
+        print("No reports found")
+        return
+    steps = merged["steps"]
+    print(f"{merged['games']} games, {steps} steps, {merged['snapshot_steps']} with snapshots, "
+          f"collections by generation {merged['collections']}")
+    worst = max((p.get("max", 0) for p in merged["step_pauses"]), default=0)
+    steps_with_gc = sum(p.get("count", 0) for p in merged["step_pauses"])
+    print(f"{steps_with_gc} steps with a collection, worst step pause {worst} ms")
+
+    print("\nSections (net KiB per snapshot, collections, GC pause ms per step):")
+    by_pause = sorted(merged["sections"].items(), key=lambda s: s[1]["gc_pause_ms"], reverse=True)
+    for name, section in by_pause:
+        print(f"  {name:24s} {section['net_bytes'] / 1024 / max(section['snapshots'], 1):9.2f} KiB  "
+              f"{str(section['collections']):14s} {section['gc_pause_ms'] / max(steps, 1):8.4f} ms")
+    for name, section in by_pause:
+        if not section["bytes"]:
+            continue
+        snapshots = max(section["snapshots"], 1)
+        print(f"\n{name}, per snapshot:")
+        for site, size in section["bytes"].most_common(args.top):
+            print(f"  {size / 1024 / snapshots:9.2f} KiB  {section['blocks'][site] / snapshots:8.1f} blocks  {site}")
+
+if __name__ == "__main__":
+    main()
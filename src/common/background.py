@@ -0,0 +1,74 @@
+# Base imports
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+# Additional imports
+from loguru import logger
+
+
+@dataclass
+class Stamped:
+    """ A background result with the game loops it was submitted and picked up at. """
+    value: Any
+    game_loop: int
+    received_loop: int
+
+    def age(self, game_loop: int) -> int:
+        """ Game loops between the state the result was computed from and game_loop. """
+        return game_loop - self.game_loop
+
+
+class BackgroundExecutor:
+    """ Runs heavy numpy / scipy work off the event loop so the step never waits on it.
+
+    Jobs are keyed, one in flight per key. latest(key) returns the last finished result while a newer one is still
+    running, so a bot keeps acting on slightly stale analysis instead of blocking. Every result is stamped with the
+    game loop it was submitted at. Threads are the default, numpy and scipy release the GIL in the heavy parts; pass
+    processes=True for pure python work, then fn and its arguments must be picklable. Jobs must not read the bot,
+    pass them copies of the arrays they need. """
+
+    def __init__(self, bot, workers: int = 2, processes: bool = False):
+        self.bot = bot
+        pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self._pool: Executor = pool(max_workers=workers)
+        self._running: Dict[str, tuple] = {}
+        self._results: Dict[str, Stamped] = {}
+
+    def submit(self, key: str, fn: Callable, *args, **kwargs) -> Future:
+        """ Start fn(*args, **kwargs), or return the future of the job already running under key. """
+        if key in self._running:
+            return self._running[key][0]
+        future = self._pool.submit(fn, *args, **kwargs)
+        self._running[key] = (future, self.bot.state.game_loop)
+        return future
+
+    def _collect(self, key: str):
+        running = self._running.get(key)
+        if running is None or not running[0].done():
+            return
+        future, loop = self._running.pop(key)
+        if future.exception() is not None:
+            logger.error(f"Background job {key} submitted at loop {loop} failed: {future.exception()!r}")
+            return
+        self._results[key] = Stamped(future.result(), loop, self.bot.state.game_loop)
+
+    def latest(self, key: str) -> Optional[Stamped]:
+        """ The most recent finished result for key, None until the first one is done. """
+        self._collect(key)
+        return self._results.get(key)
+
+    def busy(self, key: str) -> bool:
+        self._collect(key)
+        return key in self._running
+
+    def refresh(self, key: str, every_loops: int, fn: Callable, *args, **kwargs) -> Optional[Stamped]:
+        """ latest(key), resubmitting the job once the last result is every_loops old and none is running. """
+        result = self.latest(key)
+        if key not in self._running and (result is None or result.age(self.bot.state.game_loop) >= every_loops):
+            self.submit(key, fn, *args, **kwargs)
+        return result
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+        self._running.clear()
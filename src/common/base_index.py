@@ -0,0 +1,147 @@
+# SC2 imports
+from sc2.bot_ai import BotAI
+from sc2.data import race_townhalls
+from sc2.position import Point2
+from sc2.unit import Unit
+from sc2.units import Units
+
+# Base imports
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple, Union
+
+# Additional imports
+import numpy as np
+
+# Local imports
+from common.map_data import map_key
+
+# Resources and townhalls further than this from every expansion location belong to no base
+BASE_RADIUS = 10.0
+
+
+class BaseIndex:
+    """ Mineral fields and geysers grouped by expansion location.
+
+    Resources never move, so each resource position is assigned to its expansion once per map and the assignment is
+    shared by every game in the process. The buckets hold resource tags and are kept between game loops: depleted
+    fields leave through on_unit_destroyed, and only tags the index has not seen yet, or that are gone without a death
+    event (a snapshot replaced when the base is seen again), change them. The library makes new Unit objects every
+    game loop, so tags are turned into the current ones on first use per loop. Own townhalls are assigned to their
+    base by the construction complete, type changed and destroyed hooks, other units and positions by a nearest
+    lookup. minerals(th) is sorted by contents, richest first, once per base and game loop. The returned Units are
+    shared until the next game loop, callers must not modify them. """
+
+    _maps: Dict[str, Dict[Tuple[float, float], Point2]] = {}
+
+    def __init__(self, bot: BotAI, radius: float = BASE_RADIUS):
+        self.bot = bot
+        self.radius = radius
+        self.locations: List[Point2] = list(bot.expansion_locations_list)
+        self._centers = np.array([(p.x, p.y) for p in self.locations]).reshape(-1, 2)
+        key = map_key(bot.game_info)
+        if key not in BaseIndex._maps:
+            BaseIndex._maps[key] = {r.position_tuple: b for r in bot.resources
+                                    if (b := self._nearest(r.position_tuple)) is not None}
+        self._resource_base = BaseIndex._maps[key]
+        # base -> tags of its mineral fields / geysers, resource tag -> its base or None away from every base
+        self._mineral_tags: Dict[Point2, set] = defaultdict(set)
+        self._geyser_tags: Dict[Point2, set] = defaultdict(set)
+        self._resource_tags: Dict[int, Optional[Point2]] = {}
+        self._townhall_base: Dict[int, Optional[Point2]] = {}
+        self.game_loop = -1
+        self._units: Dict[int, Unit] = {}
+        self._minerals: Dict[Point2, Units] = {}
+        self._geysers: Dict[Point2, Units] = {}
+        for townhall in bot.townhalls:
+            self._assign(townhall)
+
+    def _nearest(self, position: Tuple[float, float]) -> Optional[Point2]:
+        if not len(self._centers):
+            return None
+        d2 = ((self._centers - position) ** 2).sum(axis=1)
+        i = int(d2.argmin())
+        return self.locations[i] if d2[i] <= self.radius ** 2 else None
+
+    def _refresh(self):
+        if self.game_loop == self.bot.state.game_loop:
+            return
+        self.game_loop = self.bot.state.game_loop
+        self._units = {unit.tag: unit for unit in self.bot.mineral_field}
+        self._units.update((unit.tag, unit) for unit in self.bot.vespene_geyser)
+        self._minerals = {}
+        self._geysers = {}
+        if not self._units.keys() <= self._resource_tags.keys():
+            for tag in self._units.keys() - self._resource_tags.keys():
+                self._track(self._units[tag])
+
+    def _track(self, resource: Unit):
+        base = self._resource_tags[resource.tag] = self._resource_base.get(resource.position_tuple)
+        if base is not None:
+            (self._mineral_tags if resource.is_mineral_field else self._geyser_tags)[base].add(resource.tag)
+
+    def _forget(self, tag: int):
+        base = self._resource_tags.pop(tag, None)
+        if base is not None:
+            self._mineral_tags[base].discard(tag)
+            self._geyser_tags[base].discard(tag)
+
+    def _current(self, tags: set) -> List[Unit]:
+        """ This game loop's Units of tags, tags gone without a death event are forgotten. """
+        units = [self._units[tag] for tag in tags if tag in self._units]
+        if len(units) != len(tags):
+            for tag in [tag for tag in tags if tag not in self._units]:
+                self._forget(tag)
+        return units
+
+    def _assign(self, townhall: Unit):
+        if townhall.is_flying:
+            self._townhall_base.pop(townhall.tag, None)
+        else:
+            self._townhall_base[townhall.tag] = self._nearest(townhall.position_tuple)
+
+    # Event hooks
+
+    def on_building_construction_complete(self, unit: Unit):
+        if unit.type_id in race_townhalls[self.bot.race]:
+            self._assign(unit)
+
+    def on_unit_type_changed(self, unit: Unit):
+        # Lifted off, landed somewhere else or morphed in place
+        if unit.type_id in race_townhalls[self.bot.race]:
+            self._assign(unit)
+
+    def on_unit_destroyed(self, unit_tag: int):
+        self._townhall_base.pop(unit_tag, None)
+        self._forget(unit_tag)
+
+    # Lookups
+
+    def base_of(self, where: Union[Unit, Point2]) -> Optional[Point2]:
+        """ Expansion location a townhall (or any position) belongs to, None away from every base. """
+        if isinstance(where, Unit):
+            base = self._townhall_base.get(where.tag, False)
+            return self._nearest(where.position_tuple) if base is False else base
+        return self._nearest((where[0], where[1]))
+
+    def minerals(self, where: Union[Unit, Point2]) -> Units:
+        """ Mineral fields of the base at where, richest first. """
+        base = self.base_of(where)
+        if base is None:
+            return Units([], self.bot)
+        self._refresh()
+        fields = self._minerals.get(base)
+        if fields is None:
+            fields = self._minerals[base] = Units(sorted(self._current(self._mineral_tags[base]),
+                                                         key=lambda f: f.mineral_contents, reverse=True), self.bot)
+        return fields
+
+    def geysers(self, where: Union[Unit, Point2]) -> Units:
+        """ Vespene geysers of the base at where, with or without a gas building on top. """
+        base = self.base_of(where)
+        if base is None:
+            return Units([], self.bot)
+        self._refresh()
+        geysers = self._geysers.get(base)
+        if geysers is None:
+            geysers = self._geysers[base] = Units(self._current(self._geyser_tags[base]), self.bot)
+        return geysers
@@ -0,0 +1,189 @@
+# SC2 imports
+from sc2.bot_ai import BotAI
+from sc2.dicts.unit_train_build_abilities import TRAIN_INFO
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.ids.upgrade_id import UpgradeId
+from sc2.position import Point2
+
+# Base imports
+import inspect
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+# State channels bumped by VoidBotBase event hooks, a step re-checks its conditions only when one it reads changed
+STRUCTURES = "structures"
+UNITS = "units"
+UPGRADES = "upgrades"
+ORDERS = "orders"
+ALL_CHANNELS = (STRUCTURES, UNITS, UPGRADES, ORDERS)
+
+
+class StateVersions:
+    """ Version counter per state channel. """
+
+    def __init__(self):
+        self._versions = Counter()
+
+    def bump(self, *channels: str):
+        for channel in channels:
+            self._versions[channel] += 1
+
+    def get(self, channels: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._versions[c] for c in channels)
+
+
+@dataclass
+class BuildStep:
+    """ One declared build item.
+
+    guard: prerequisites, when True the step owns its turn (in a chain, later steps are skipped; with halt the
+        whole on_step stops after it, like an early return)
+    condition: extra check before acting, e.g. pending counts
+    afford: also require can_afford(item) before acting
+    near: placement hint, the default action is `await bot.build(item, near=near(bot))`
+    action: custom action instead of the default build
+    depends: state channels the guard and condition read
+    watch: cheap extra values the conditions read (supply, resource thresholds, the chosen townhall's tag) """
+
+    name: str
+    item: Optional[Union[UnitTypeId, UpgradeId]] = None
+    guard: Callable[[Any], bool] = lambda bot: True
+    condition: Callable[[Any], bool] = lambda bot: True
+    afford: bool = True
+    near: Optional[Callable[[Any], Point2]] = None
+    action: Optional[Callable[[Any], Any]] = None
+    depends: Tuple[str, ...] = ALL_CHANNELS
+    watch: Tuple[Callable[[Any], Any], ...] = ()
+    halt: bool = False
+    _cache: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+
+class BuildOrder:
+    """ Runs declared build steps, re-evaluating a step's conditions only when the state it depends on changed.
+
+    A step's cache key is made of the versions of the channels it depends on, its watch values and whether the
+    item's cost is affordable, so a step whose inputs did not move since the last step costs a tuple compare
+    instead of a walk over units and orders. Conditions are still fully re-checked every refresh_loops game
+    loops as a safety net for changes no event reports. """
+
+    def __init__(self, bot: BotAI, steps: List[BuildStep], chain: bool = False, refresh_loops: int = 22):
+        self.bot = bot
+        self.steps = steps
+        self.chain = chain
+        self.refresh_loops = refresh_loops
+        self.evaluations = 0
+        self.cache_hits = 0
+        self._last_refresh = -refresh_loops
+        self._costs: Dict[Any, Tuple[int, int, float]] = {}
+
+    def _cost(self, item) -> Tuple[int, int, float]:
+        if item not in self._costs:
+            cost = self.bot.calculate_cost(item)
+            supply = self.bot.calculate_supply_cost(item) if isinstance(item, UnitTypeId) else 0
+            self._costs[item] = (cost.minerals, cost.vespene, supply)
+        return self._costs[item]
+
+    def _key(self, step: BuildStep) -> tuple:
+        bot = self.bot
+        affordable = None
+        if step.item is not None:
+            minerals, vespene, supply = self._cost(step.item)
+            affordable = (minerals <= bot.minerals, vespene <= bot.vespene, not supply or supply <= bot.supply_left)
+        return bot.state_versions.get(step.depends), tuple(w(bot) for w in step.watch), affordable
+
+    def _evaluate(self, step: BuildStep, refresh: bool) -> Tuple[bool, bool]:
+        """ (guard, condition) for the step, from cache when its inputs did not change. """
+        key = self._key(step)
+        cache = step._cache
+        if not refresh and cache.get("key") == key:
+            self.cache_hits += 1
+            return cache["guard"], cache["condition"]
+
+        self.evaluations += 1
+        guard = bool(step.guard(self.bot))
+        condition = guard and bool(step.condition(self.bot))
+        if guard and condition and step.afford and step.item is not None:
+            condition = self.bot.can_afford(step.item)
+        cache.update(key=key, guard=guard, condition=condition)
+        return guard, condition
+
+    async def _act(self, step: BuildStep):
+        if step.action is not None:
+            result = step.action(self.bot)
+            if inspect.isawaitable(result):
+                await result
+        else:
+            await self.bot.build(step.item, near=step.near(self.bot))
+        # Commands change pending counts and resources, steps after this one must look again
+        self.bot.state_versions.bump(ORDERS)
+
+    async def run(self) -> bool:
+        """ Evaluate the steps in order and act on the ready ones. Returns True when a halting step fired. """
+        loop = self.bot.state.game_loop
+        refresh = loop - self._last_refresh >= self.refresh_loops
+        if refresh:
+            self._last_refresh = loop
+
+        for step in self.steps:
+            guard, condition = self._evaluate(step, refresh)
+            if not guard:
+                continue
+            if condition:
+                await self._act(step)
+            if step.halt:
+                return True
+            if self.chain:
+                break
+        return False
+
+
+def _build_gas(bot, item: UnitTypeId):
+    for townhall in bot.townhalls.ready:
+        for geyser in bot.bases.geysers(townhall):
+            if bot.gas_buildings.closer_than(1, geyser):
+                continue
+            worker = bot.select_build_worker(geyser.position)
+            if worker is not None:
+                worker.build_gas(geyser)
+                return
+
+
+def _build_addon(bot, item: UnitTypeId):
+    producer = UnitTypeId[item.name.replace("TECHLAB", "").replace("REACTOR", "")]
+    for structure in bot.structures(producer).ready.idle:
+        if not structure.has_add_on:
+            structure.build(item)
+            return
+
+
+def plan_steps(plan: dict, near: Callable[[Any], Point2], start_counts: Optional[Dict[str, int]] = None) -> List[BuildStep]:
+    """ Build steps for a searched plan (see common.build_search), to run with BuildOrder(chain=True).
+
+    Step i owns its turn until the bot has as many of its item (done, in progress or ordered) as the plan has up
+    to step i, so the plan is followed strictly in order like the simulator did. """
+    worker = plan.get("worker", "SCV")
+    counts = dict(start_counts or {worker: 12})
+    worker_built = set(TRAIN_INFO[UnitTypeId[worker]])
+    steps = []
+    for index, step in enumerate(plan["steps"]):
+        item = UnitTypeId[step["item"]]
+        counts[item.name] = counts.get(item.name, 0) + 1
+        target = counts[item.name]
+
+        def guard(bot, item=item, target=target):
+            return bot.counters.amount(item) + bot.counters.ordered[item] < target
+
+        if item in (UnitTypeId.REFINERY, UnitTypeId.ASSIMILATOR, UnitTypeId.EXTRACTOR):
+            action = lambda bot, item=item: _build_gas(bot, item)
+        elif "TECHLAB" in item.name or "REACTOR" in item.name:
+            action = lambda bot, item=item: _build_addon(bot, item)
+        elif item in worker_built:
+            action = None
+        else:
+            action = lambda bot, item=item: bot.train(item)
+        steps.append(BuildStep(
+            f"{index} {item.name}", item, guard=guard, near=near if action is None else None, action=action,
+            depends=(STRUCTURES, UNITS, ORDERS),
+        ))
+    return steps
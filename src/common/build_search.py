@@ -0,0 +1,190 @@
+# SC2 imports
+from sc2.ids.unit_typeid import UnitTypeId
+
+# Base imports
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+# Local imports
+from common.economy_sim import ADDONS, GAS_BUILDINGS, EconomyData, EconomySimulator
+
+SUPPLY_PROVIDER = {UnitTypeId.SCV: UnitTypeId.SUPPLYDEPOT, UnitTypeId.PROBE: UnitTypeId.PYLON}
+GAS_BUILDING = {UnitTypeId.SCV: UnitTypeId.REFINERY, UnitTypeId.PROBE: UnitTypeId.ASSIMILATOR}
+
+# Per process simulator, set up once by the pool initializer
+_sim: Optional[EconomySimulator] = None
+_goal: Tuple[Optional[UnitTypeId], int] = (None, 0)
+
+
+def _init_worker(data_path: Optional[str], worker: int, max_time: float, goal: int, goal_count: int):
+    global _sim, _goal
+    data = EconomyData.load(data_path) if data_path else EconomyData.default()
+    _sim = EconomySimulator(data, UnitTypeId(worker), max_time=max_time)
+    _goal = (UnitTypeId(goal), goal_count)
+
+
+def _evaluate(orders: List[Tuple[int, ...]]) -> List[float]:
+    goal, count = _goal
+    return [_sim.run([UnitTypeId(i) for i in order], goal, count).goal_time for order in orders]
+
+
+class BuildSearch:
+    """ Evolutionary search for the build order reaching goal_count units of goal the fastest.
+
+    Each generation is scored on all cores by the forward economy simulator; the best orders survive unchanged,
+    the rest of the population is bred from tournament winners by crossover and mutations (insert, delete, move,
+    swap). Orders the simulator can't finish score inf and die out. """
+
+    def __init__(self, goal: UnitTypeId, goal_count: int, race_worker: UnitTypeId = UnitTypeId.SCV,
+                 data_path: Optional[str] = None, population: int = 1000, generations: int = 200, elite: int = 20,
+                 workers: Optional[int] = None, max_time: float = 600.0, seed: int = 0):
+        self.goal = goal
+        self.goal_count = goal_count
+        self.worker = race_worker
+        self.data_path = data_path
+        self.data = EconomyData.load(data_path) if data_path else EconomyData.default()
+        self.population = population
+        self.generations = generations
+        self.elite = elite
+        self.workers = workers or os.cpu_count()
+        self.max_time = max_time
+        self.rng = random.Random(seed)
+        self.evaluations = 0
+
+        self.requirements = self.data.requirements(goal)
+        self.supply = SUPPLY_PROVIDER[race_worker]
+        self.gas = GAS_BUILDING[race_worker]
+        goal_data = self.data.items[goal]
+        extra = [UnitTypeId[goal_data.producer]] if goal_data.producer else []
+        # Genes a mutation may insert
+        self.genes = [race_worker, self.supply, self.gas, goal] + extra + \
+            [r for r in self.requirements if r not in ADDONS and r not in extra]
+
+    def _needs_gas(self) -> bool:
+        return any(self.data.items[i].vespene for i in self.requirements + [self.goal])
+
+    def random_order(self) -> List[UnitTypeId]:
+        rng = self.rng
+        order = list(self.requirements) + [self.goal] * self.goal_count
+        workers = rng.randint(0, 14)
+        supply_needed = self.goal_count * self.data.items[self.goal].supply + workers + 12 - 15
+        inserts = [self.worker] * workers + [self.supply] * max(math.ceil(supply_needed / 8), 0)
+        if self._needs_gas():
+            inserts += [self.gas] * rng.randint(1, 2)
+        inserts += [UnitTypeId[self.data.items[self.goal].producer]] * rng.randint(0, 3)
+        for item in inserts:
+            order.insert(rng.randint(0, len(order)), item)
+        return order
+
+    def mutate(self, order: List[UnitTypeId]) -> List[UnitTypeId]:
+        rng = self.rng
+        order = list(order)
+        for _ in range(rng.randint(1, 3)):
+            op = rng.random()
+            i = rng.randrange(len(order))
+            if op < 0.3:
+                order.insert(rng.randint(0, len(order)), rng.choice(self.genes))
+            elif op < 0.5 and len(order) > 1:
+                del order[i]
+            elif op < 0.8:
+                item = order.pop(i)
+                order.insert(rng.randint(0, len(order)), item)
+            else:
+                j = min(i + 1, len(order) - 1)
+                order[i], order[j] = order[j], order[i]
+        return order
+
+    def crossover(self, a: List[UnitTypeId], b: List[UnitTypeId]) -> List[UnitTypeId]:
+        cut = self.rng.randint(0, min(len(a), len(b)))
+        return a[:cut] + b[cut:]
+
+    def _score(self, pool: ProcessPoolExecutor, orders: Sequence[List[UnitTypeId]]) -> List[float]:
+        encoded = [tuple(i.value for i in order) for order in orders]
+        chunk = max(len(encoded) // (self.workers * 4), 1)
+        chunks = [encoded[i:i + chunk] for i in range(0, len(encoded), chunk)]
+        scores = [s for part in pool.map(_evaluate, chunks) for s in part]
+        self.evaluations += len(orders)
+        return scores
+
+    def _tournament(self, ranked: List[Tuple[float, List[UnitTypeId]]]) -> List[UnitTypeId]:
+        return min(self.rng.sample(ranked, 3), key=lambda r: r[0])[1]
+
+    def run(self, log_every: int = 10) -> Tuple[float, List[UnitTypeId]]:
+        population = [self.random_order() for _ in range(self.population)]
+        best: Tuple[float, List[UnitTypeId]] = (math.inf, [])
+        t0 = time.perf_counter()
+        init = (self.data_path, self.worker.value, self.max_time, self.goal.value, self.goal_count)
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=init) as pool:
+            for generation in range(self.generations):
+                scores = self._score(pool, population)
+                ranked = sorted(zip(scores, population), key=lambda r: (r[0], len(r[1])))
+                if ranked[0][0] < best[0]:
+                    best = ranked[0]
+                if log_every and generation % log_every == 0:
+                    rate = self.evaluations / (time.perf_counter() - t0)
+                    print(f"gen {generation}: best {best[0]:.1f}s, {self.evaluations} orders, {rate:.0f}/s")
+
+                children = [order for _, order in ranked[:self.elite]]
+                while len(children) < self.population:
+                    child = self._tournament(ranked)
+                    if self.rng.random() < 0.3:
+                        child = self.crossover(child, self._tournament(ranked))
+                    children.append(self.mutate(child))
+                population = children
+        return best
+
+
+def plan_dict(search: BuildSearch, goal_time: float, order: List[UnitTypeId]) -> dict:
+    """ Plan in the format build_order.plan_steps consumes, with the simulated start time of every step. """
+    sim = EconomySimulator(search.data, search.worker, max_time=search.max_time)
+    result = sim.run(order, search.goal, search.goal_count)
+    return {
+        "goal": search.goal.name,
+        "count": search.goal_count,
+        "worker": search.worker.name,
+        "goal_time": round(goal_time, 2),
+        "evaluations": search.evaluations,
+        "steps": [{"item": item.name, "start": round(start, 2)} for item, start in zip(order, result.starts)],
+    }
+
+
+def load_plan(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the fastest build order to N units without SC2")
+    parser.add_argument("--goal", required=True, help="UnitTypeId name, e.g. MARINE")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--race", choices=["terran", "protoss"], default="terran")
+    parser.add_argument("--data", help="Game data dump written by EconomyData.save, defaults to built-in values")
+    parser.add_argument("--population", type=int, default=1000)
+    parser.add_argument("--generations", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Where to write the plan json")
+    args = parser.parse_args()
+
+    worker = UnitTypeId.SCV if args.race == "terran" else UnitTypeId.PROBE
+    search = BuildSearch(UnitTypeId[args.goal], args.count, worker, args.data, args.population, args.generations,
+                         workers=args.workers, seed=args.seed)
+    goal_time, order = search.run()
+    plan = plan_dict(search, goal_time, order)
+    print(f"{args.count} {args.goal} at {goal_time:.1f}s after {search.evaluations} orders")
+    for step in plan["steps"]:
+        print(f"  {step['start']:6.1f}  {step['item']}")
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(plan, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# SC2 imports
+from s2clientprotocol import sc2api_pb2 as sc_pb
+from sc2.controller import Controller
+from sc2.data import Result, Status
+from sc2.main import _play_game, _setup_host_game
+from sc2.player import Human
+from sc2.protocol import ConnectionAlreadyClosedError, ProtocolError
+from sc2.sc2process import KillSwitch, SC2Process
+
+# Base imports
+import asyncio
+from typing import Callable, List, Optional
+
+# Additional imports
+import aiohttp
+import psutil
+from loguru import logger
+
+
+class ExternalProcess:
+    """ Stand-in for SC2Process that attaches to a server that is already listening (a local test server or a
+    manually started SC2) instead of launching one. Exposes the bits of SC2Process the pool and Controller use. """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5000, pid: Optional[int] = None):
+        self._host = host
+        self._port = port
+        self.pid = pid
+        self._session = None
+        self._ws = None
+        # Controller.running looks at this
+        self._process = None
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self._host}:{self._port}/sc2api"
+
+    async def __aenter__(self) -> Controller:
+        self._session = aiohttp.ClientSession()
+        try:
+            self._ws = await self._session.ws_connect(self.ws_url, timeout=120)
+        except Exception:
+            await self._session.close()
+            raise
+        self._process = self
+        return Controller(self._ws, self)
+
+    async def __aexit__(self, *args):
+        await self._close_connection()
+
+    async def _close_connection(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._session is not None:
+            await self._session.close()
+
+    def _clean(self, verbose: bool = True):
+        self._process = None
+        self._ws = None
+
+
+class PooledClient:
+    """ One warm game process plus its bookkeeping. """
+
+    def __init__(self, slot: int, process, controller: Controller):
+        self.slot = slot
+        self.process = process
+        self.controller = controller
+        self.games = 0
+        self.base_rss = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        popen = getattr(self.process, "_process", None)
+        return getattr(popen, "pid", None)
+
+    def rss_mb(self) -> Optional[float]:
+        """ Resident memory of the game process and its children (Wine spawns a few), None if unknown. """
+        if self.pid is None:
+            return None
+        try:
+            proc = psutil.Process(self.pid)
+            procs = [proc] + proc.children(recursive=True)
+            return sum(p.memory_info().rss for p in procs) / 2**20
+        except psutil.Error:
+            return None
+
+
+class ClientPool:
+    """ Keeps up to `size` game processes alive and hands them to successive games.
+
+    Each game runs create -> join -> play -> leave on a warm process, so the multi second SC2 boot is paid once per
+    process instead of once per game. A process is health checked with a ping before it is handed out and is
+    recycled after `recycle_after` games or once its RSS grew by more than `max_rss_growth_mb`. """
+
+    def __init__(
+        self,
+        size: int = 1,
+        recycle_after: int = 20,
+        max_rss_growth_mb: Optional[float] = None,
+        process_factory: Optional[Callable[[int], object]] = None,
+        ping_timeout: float = 10,
+    ):
+        self.size = size
+        self.recycle_after = recycle_after
+        self.max_rss_growth_mb = max_rss_growth_mb
+        self.process_factory = process_factory or (lambda _slot: SC2Process())
+        self.ping_timeout = ping_timeout
+        self._idle: List[PooledClient] = []
+        self._playing: List[PooledClient] = []
+        self._free_slots = list(range(size))
+        self._available = asyncio.Condition()
+        self.launched = 0
+        self.recycled = 0
+
+    async def _launch(self, slot: int) -> PooledClient:
+        process = self.process_factory(slot)
+        controller = await process.__aenter__()
+        client = PooledClient(slot, process, controller)
+        client.base_rss = client.rss_mb()
+        self.launched += 1
+        logger.info(f"Client pool: launched slot {slot} ({self.launched} launches total)")
+        return client
+
+    async def _retire(self, client: PooledClient):
+        process = client.process
+        try:
+            await process._close_connection()
+        finally:
+            process._clean(verbose=False)
+            if process in KillSwitch._to_kill:
+                KillSwitch._to_kill.remove(process)
+
+    async def _healthy(self, client: PooledClient) -> bool:
+        controller = client.controller
+        if controller._ws.closed:
+            return False
+        try:
+            await asyncio.wait_for(controller.ping(), timeout=self.ping_timeout)
+            # Still attached to a finished game, leave so create_game is accepted
+            if controller._status not in {Status.launched, None}:
+                await controller._execute(leave_game=sc_pb.RequestLeaveGame())
+        except (asyncio.TimeoutError, ProtocolError, ConnectionAlreadyClosedError, ConnectionResetError):
+            return False
+        return True
+
+    def _should_recycle(self, client: PooledClient) -> bool:
+        if client.games >= self.recycle_after:
+            return True
+        if self.max_rss_growth_mb is not None and client.base_rss is not None:
+            rss = client.rss_mb()
+            if rss is not None and rss - client.base_rss > self.max_rss_growth_mb:
+                logger.info(f"Client pool: slot {client.slot} grew to {rss:.0f} MB, recycling")
+                return True
+        return False
+
+    async def acquire(self) -> PooledClient:
+        """ Hand out a healthy warm client, launching one into a free slot if none is idle. """
+        async with self._available:
+            while not self._idle and not self._free_slots:
+                await self._available.wait()
+            client = self._idle.pop() if self._idle else None
+            slot = self._free_slots.pop(0) if client is None else client.slot
+
+        # Pings and launches happen outside the lock so other games can release meanwhile
+        if client is not None:
+            if await self._healthy(client):
+                self._playing.append(client)
+                return client
+            logger.warning(f"Client pool: slot {slot} failed health check, relaunching")
+            await self._retire(client)
+        try:
+            client = await self._launch(slot)
+            self._playing.append(client)
+            return client
+        except Exception:
+            async with self._available:
+                self._free_slots.append(slot)
+                self._available.notify()
+            raise
+
+    async def release(self, client: PooledClient, broken: bool = False):
+        """ Return a client after a game, retiring it if it is broken or due for recycling. """
+        client.games += 1
+        if client in self._playing:
+            self._playing.remove(client)
+        if broken or self._should_recycle(client):
+            self.recycled += 1
+            await self._retire(client)
+            async with self._available:
+                self._free_slots.append(client.slot)
+                self._available.notify()
+        else:
+            async with self._available:
+                self._idle.append(client)
+                self._available.notify()
+
+    def pids(self) -> List[int]:
+        """ Pids of the game processes running a game right now, the ones attached through an ExternalProcess without
+        a pid are unknown and left out. """
+        return [client.pid for client in self._playing if client.pid is not None]
+
+    async def play(self, map_settings, players, realtime: bool = False, save_replay_as: Optional[str] = None,
+                   game_time_limit: Optional[int] = None, random_seed: Optional[int] = None) -> Result:
+        """ Play one game against the built-in AI on a pooled client, same contract as sc2.main.run_game. """
+        assert sum(p.needs_sc2 for p in players) == 1, "The pool only hosts games against the built-in AI"
+        client = await self.acquire()
+        broken = False
+        try:
+            game = await _setup_host_game(client.controller, map_settings, players, realtime, random_seed,
+                                          save_replay_as=save_replay_as)
+            if not isinstance(players[0], Human) and getattr(players[0].ai, "raw_affects_selection", None) is not None:
+                game.raw_affects_selection = players[0].ai.raw_affects_selection
+            result = await _play_game(players[0], game, realtime, None, game_time_limit)
+            # Leaving saves the replay and puts the process back in the launched state for the next create_game
+            await game.leave()
+            return result
+        except (ProtocolError, ConnectionAlreadyClosedError, ConnectionResetError, asyncio.TimeoutError):
+            broken = True
+            raise
+        finally:
+            await self.release(client, broken=broken)
+
+    async def close(self):
+        async with self._available:
+            while self._idle:
+                await self._retire(self._idle.pop())
+            self._free_slots = list(range(self.size))
+
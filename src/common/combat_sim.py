@@ -0,0 +1,193 @@
+# SC2 imports
+from sc2.bot_ai import BotAI
+from sc2.constants import TARGET_AIR, TARGET_GROUND
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.unit import Unit
+
+# Base imports
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+# Additional imports
+import numpy as np
+
+# Local imports
+from common.targeting import ABILITY_ATTACK_DPS
+
+# Damage per hit of the ability attacks in ABILITY_ATTACK_DPS, (ground, air), used to apply armor
+ABILITY_ATTACK_HIT = {
+    UnitTypeId.BATTLECRUISER: (8.0, 5.0),
+    UnitTypeId.ORACLE: (15.0, 0.0),
+}
+
+
+@dataclass
+class CombatResult:
+    """ Outcome of each simulated candidate engagement, all arrays have one entry per candidate. """
+
+    own_value_lost: np.ndarray
+    enemy_value_lost: np.ndarray
+    own_survivors: np.ndarray
+    enemy_survivors: np.ndarray
+    duration: np.ndarray
+
+    @property
+    def win(self) -> np.ndarray:
+        return (self.enemy_survivors == 0) & (self.own_survivors > 0)
+
+    @property
+    def score(self) -> np.ndarray:
+        """ Resource trade, positive when the enemy loses more than we do. """
+        return self.enemy_value_lost - self.own_value_lost
+
+
+class CombatSimulator:
+    """ Time-stepped Lanchester style fight estimate between two groups of units.
+
+    Every unit spreads its dps over the enemies it can hit (air/ground from its weapons, damage per hit reduced by
+    armor, attribute bonuses included). Units start shooting once they closed the given gap to their range, and
+    each own/enemy unit can be delayed or left out per candidate, so one call scores many engagements at once:
+    subsets of the army, waiting for reinforcements, or taking the fight now. Per unit type pair dps is cached
+    for the whole game. """
+
+    def __init__(self, bot: BotAI, dt: float = 0.5, max_time: float = 30.0):
+        self.bot = bot
+        self.dt = dt
+        self.max_time = max_time
+        self._pair_dps: Dict[tuple, float] = {}
+        self._values: Dict[UnitTypeId, float] = {}
+
+    def _hit_dps(self, attacker: Unit, target: Unit) -> float:
+        """ dps of attacker against target after armor and bonuses, 0 when it can't hit it. """
+        key = (attacker.type_id, attacker.attack_upgrade_level, target.type_id, target.armor_upgrade_level,
+               target.is_flying)
+        if key in self._pair_dps:
+            return self._pair_dps[key]
+
+        armor = target.armor + target.armor_upgrade_level
+        targets = TARGET_AIR if target.is_flying else TARGET_GROUND
+        dps = 0.0
+        if attacker.type_id in ABILITY_ATTACK_DPS:
+            side = 1 if target.is_flying else 0
+            base, hit = ABILITY_ATTACK_DPS[attacker.type_id][side], ABILITY_ATTACK_HIT[attacker.type_id][side]
+            if hit:
+                dps = base * max(hit - armor, 0.5) / hit
+        else:
+            attributes = set(target._type_data.attributes)  # pylint: disable=W0212
+            for weapon in attacker._weapons:  # pylint: disable=W0212
+                if weapon.type not in targets:
+                    continue
+                damage = weapon.damage + attacker.attack_upgrade_level
+                damage += sum(b.bonus for b in weapon.damage_bonus if b.attribute in attributes)
+                dps = max(dps, weapon.attacks * max(damage - armor, 0.5) / weapon.speed)
+        self._pair_dps[key] = dps
+        return dps
+
+    def _value(self, unit: Unit) -> float:
+        if unit.type_id not in self._values:
+            cost = self.bot.calculate_cost(unit.type_id)
+            self._values[unit.type_id] = float(cost.minerals + cost.vespene)
+        return self._values[unit.type_id]
+
+    def _columns(self, units: Sequence[Unit]) -> Dict[str, np.ndarray]:
+        return {
+            "hp": np.array([u.health + u.shield for u in units], dtype=float),
+            "hp_max": np.array([max(u.health_max + u.shield_max, 1) for u in units], dtype=float),
+            "value": np.array([self._value(u) for u in units], dtype=float),
+            "speed": np.array([u.real_speed for u in units], dtype=float),
+            "range": np.array([max(u.ground_range, u.air_range) + u.radius for u in units], dtype=float),
+        }
+
+    def dps_matrix(self, attackers: Sequence[Unit], targets: Sequence[Unit]) -> np.ndarray:
+        """ attacker x target dps after armor, 0 where the attacker can't hit the target. """
+        # Fill the matrix per distinct attacker / target kind, armies are mostly a few unit types
+        a_kinds: Dict[tuple, int] = {}
+        t_kinds: Dict[tuple, int] = {}
+        a_index = [a_kinds.setdefault((a.type_id, a.attack_upgrade_level), len(a_kinds)) for a in attackers]
+        t_index = [t_kinds.setdefault((t.type_id, t.armor_upgrade_level, t.is_flying), len(t_kinds)) for t in targets]
+        a_first = {i: a for a, i in zip(attackers, a_index)}
+        t_first = {i: t for t, i in zip(targets, t_index)}
+        kinds = np.array([[self._hit_dps(a_first[i], t_first[j]) for j in range(len(t_kinds))]
+                          for i in range(len(a_kinds))], dtype=float).reshape(len(a_kinds), len(t_kinds))
+        return kinds[np.ix_(a_index, t_index)]
+
+    @staticmethod
+    def _closing(cols: Dict[str, np.ndarray], distance: float) -> np.ndarray:
+        """ Seconds until each unit is in range, inf for units that can't move and are out of range. """
+        gap = np.maximum(distance - cols["range"], 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            closing = np.where(gap > 0, gap / cols["speed"], 0.0)
+        return np.nan_to_num(closing, nan=np.inf)
+
+    def simulate(self, own: Sequence[Unit], enemy: Sequence[Unit], own_delay: Optional[np.ndarray] = None,
+                 enemy_delay: Optional[np.ndarray] = None, distance: float = 0.0) -> CombatResult:
+        """ Simulate K candidate engagements at once.
+
+        own_delay / enemy_delay: (K, n) / (K, m) arrival time in seconds of each unit per candidate, np.inf leaves
+            the unit out. Defaults to one candidate with everyone there at the start.
+        distance: gap between the two groups when the fight starts. """
+        own, enemy = list(own), list(enemy)
+        n, m = len(own), len(enemy)
+        if own_delay is None and enemy_delay is None:
+            k = 1
+        else:
+            k = len(own_delay) if own_delay is not None else len(enemy_delay)
+        own_delay = np.zeros((k, n)) if own_delay is None else np.asarray(own_delay, dtype=float).reshape(k, n)
+        enemy_delay = np.zeros((k, m)) if enemy_delay is None else np.asarray(enemy_delay, dtype=float).reshape(k, m)
+
+        oc, ec = self._columns(own), self._columns(enemy)
+        d_oe, d_eo = self.dps_matrix(own, enemy), self.dps_matrix(enemy, own)
+        hit_oe, hit_eo = d_oe > 0, d_eo > 0
+        # Arrival makes a unit a target, closing the gap on top of it makes it shoot
+        own_start = own_delay + self._closing(oc, distance)[None, :]
+        enemy_start = enemy_delay + self._closing(ec, distance)[None, :]
+
+        hp_o = np.where(np.isfinite(own_delay), oc["hp"][None, :], 0.0)
+        hp_e = np.where(np.isfinite(enemy_delay), ec["hp"][None, :], 0.0)
+        hp_o0, hp_e0 = hp_o.copy(), hp_e.copy()
+        duration = np.zeros(k)
+        done = ~(hp_o > 0).any(axis=1) | ~(hp_e > 0).any(axis=1)
+
+        t = 0.0
+        while t < self.max_time and not done.all():
+            alive_o, alive_e = hp_o > 0, hp_e > 0
+            present_o, present_e = alive_o & (own_delay <= t), alive_e & (enemy_delay <= t)
+            shoot_o = alive_o & (own_start <= t) & ~done[:, None]
+            shoot_e = alive_e & (enemy_start <= t) & ~done[:, None]
+
+            dmg_e = self._spread(shoot_o, hit_oe, d_oe, present_e)
+            dmg_o = self._spread(shoot_e, hit_eo, d_eo, present_o)
+            hp_e = np.maximum(hp_e - dmg_e * self.dt, 0)
+            hp_o = np.maximum(hp_o - dmg_o * self.dt, 0)
+
+            t += self.dt
+            duration = np.where(done, duration, t)
+            done |= ~(hp_o > 0).any(axis=1) | ~(hp_e > 0).any(axis=1)
+
+        lost_o = (hp_o0 - hp_o) / oc["hp_max"][None, :] * oc["value"][None, :]
+        lost_e = (hp_e0 - hp_e) / ec["hp_max"][None, :] * ec["value"][None, :]
+        return CombatResult(
+            own_value_lost=lost_o.sum(axis=1),
+            enemy_value_lost=lost_e.sum(axis=1),
+            own_survivors=(hp_o > 0).sum(axis=1),
+            enemy_survivors=(hp_e > 0).sum(axis=1),
+            duration=duration,
+        )
+
+    @staticmethod
+    def _spread(shooting: np.ndarray, hit: np.ndarray, dps: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """ (K, m) incoming dps when every shooter splits its dps evenly over the targets it can hit. """
+        valid = hit[None, :, :] & targets[:, None, :]
+        count = valid.sum(axis=2)
+        share = np.where(shooting & (count > 0), 1.0 / np.maximum(count, 1), 0.0)
+        return np.einsum("kn,nm,knm->km", share, dps, valid)
+
+    def engage(self, own: Sequence[Unit], enemy: Sequence[Unit], distance: float = 0.0,
+               margin: float = 0.0) -> bool:
+        """ True when taking the fight now is expected to trade at least margin resources in our favor. """
+        if not enemy:
+            return True
+        if not own:
+            return False
+        result = self.simulate(own, enemy, distance=distance)
+        return bool(result.win[0] or result.score[0] > margin)
@@ -0,0 +1,186 @@
+# SC2 imports
+from sc2 import maps
+from sc2.data import Difficulty, Race
+from sc2.player import Bot, Computer
+
+# Base imports
+import argparse
+import asyncio
+import importlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+# Additional imports
+from loguru import logger
+
+# Local imports
+from common.client_pool import ClientPool, ExternalProcess
+
+Job = TypeVar("Job")
+Outcome = TypeVar("Outcome")
+
+
+async def run_concurrent(next_job: Callable[[], Optional[Job]], play: Callable[[Job], Awaitable[Outcome]],
+                         concurrency: int, on_done: Optional[Callable[[Job, Outcome], None]] = None) -> int:
+    """ Keep up to concurrency games in flight on the running event loop, each on its own pooled game server.
+
+    Every lane asks next_job for work whenever its game ends, so a scheduler sees the results recorded so far before
+    handing out the next game; None means nothing is left to start. Bots mostly await the server during a step,
+    while one game waits the others run. Returns games played. """
+    played = 0
+
+    async def lane():
+        nonlocal played
+        while (job := next_job()) is not None:
+            outcome = await play(job)
+            played += 1
+            if on_done is not None:
+                on_done(job, outcome)
+
+    await asyncio.gather(*(lane() for _ in range(concurrency)))
+    return played
+
+
+def load_bot(spec: str):
+    """ "package.module:Class" -> the bot class. """
+    module, name = spec.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+async def _play_games(bot: str, race: str, opponent: str, map_name: str, games: int, concurrency: int,
+                      servers: List[str]) -> int:
+    """ games games of bot, concurrency at a time on one event loop, every game with a fresh bot instance. """
+    if servers:
+        addresses = [a.rsplit(":", 1) for a in servers]
+        pool = ClientPool(size=concurrency, process_factory=lambda slot: ExternalProcess(addresses[slot][0],
+                                                                                          int(addresses[slot][1])))
+    else:
+        pool = ClientPool(size=concurrency)
+    bot_class = load_bot(bot)
+    opponent_race, difficulty = opponent.split(":")
+    left = iter(range(games))
+
+    async def play(_game):
+        players = [Bot(Race[race], bot_class()), Computer(Race[opponent_race], Difficulty[difficulty])]
+        return await pool.play(maps.get(map_name), players, realtime=False)
+
+    try:
+        return await run_concurrent(lambda: next(left, None), play, concurrency)
+    finally:
+        await pool.close()
+
+
+def _play_shard(bot: str, race: str, opponent: str, map_name: str, games: int, server: Optional[str]) -> int:
+    # One process of the process pool mode, sequential games on its own server
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    return asyncio.run(_play_games(bot, race, opponent, map_name, games, 1, [server] if server else []))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_fake_servers(count: int, minutes: float) -> List[Tuple[subprocess.Popen, str]]:
+    """ count local fake servers in their own processes, (process, host:port) once they all accept connections. """
+    servers = []
+    for _ in range(count):
+        port = _free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "common.fake_sc2", "--port", str(port), "--minutes", str(minutes)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        servers.append((process, f"127.0.0.1:{port}"))
+    for _, address in servers:
+        host, port = address.split(":")
+        deadline = time.time() + 30
+        while True:
+            try:
+                socket.create_connection((host, int(port)), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+    return servers
+
+
+def bench(bot: str, race: str, opponent: str, map_name: str, games: int, concurrency: int,
+          servers: List[str]) -> List[dict]:
+    """ Games/hour for the same games played sequentially, concurrency at a time on one event loop, and over a
+    process pool of concurrency processes each playing its share sequentially. Needs concurrency servers, or
+    launches SC2 when servers is empty. """
+    results = []
+
+    def timed(mode: str, run: Callable[[], int]):
+        started = time.time()
+        played = run()
+        wall = time.time() - started
+        results.append({"mode": mode, "games": played, "wall_s": round(wall, 2),
+                        "games_per_hour": round(3600 * played / wall, 1)})
+        print(f"  {mode:12s} {played} games in {wall:7.1f} s, {results[-1]['games_per_hour']:8.1f} games/hour")
+
+    timed("sequential", lambda: asyncio.run(_play_games(bot, race, opponent, map_name, games, 1, servers[:1])))
+    timed("event loop", lambda: asyncio.run(_play_games(bot, race, opponent, map_name, games, concurrency, servers)))
+
+    def process_pool() -> int:
+        shares = [games // concurrency + (i < games % concurrency) for i in range(concurrency)]
+        with ProcessPoolExecutor(concurrency) as executor:
+            futures = [executor.submit(_play_shard, bot, race, opponent, map_name, share,
+                                       servers[i] if servers else None) for i, share in enumerate(shares) if share]
+            return sum(f.result() for f in futures)
+
+    timed("processes", process_pool)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Games/hour sequential vs concurrent on one event loop vs processes")
+    parser.add_argument("--bot", default="bots.proxy_rax:ProxyRaxBot", help="Bot class as package.module:Class")
+    parser.add_argument("--race", default="Terran", help="Race of --bot")
+    parser.add_argument("--opponent", default="Protoss:Easy", help="Built-in AI as Race:Difficulty")
+    parser.add_argument("--map", default=None, help="Map to play (default the fake server's map with --fake)")
+    parser.add_argument("--games", type=int, default=8, help="Games per mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="Games in flight, and processes in the pool")
+    parser.add_argument("--server", action="append", default=[], help="host:port of a running server (repeatable)")
+    parser.add_argument("--fake", action="store_true", help="Start --concurrency local fake SC2 servers and use them")
+    parser.add_argument("--minutes", type=float, default=3.0, help="Game length on the fake servers")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    fake_servers = []
+    map_name = args.map
+    if args.fake:
+        # Imported here, the fake server is a test tool and not needed against real SC2
+        from common.fake_sc2 import FAKE_MAP, make_sc2path
+        os.environ["SC2PATH"] = make_sc2path(os.path.join(tempfile.gettempdir(), "void_bot_fake_sc2"))
+        fake_servers = _start_fake_servers(args.concurrency, args.minutes)
+        args.server = [address for _, address in fake_servers]
+        map_name = map_name or FAKE_MAP
+    if args.server and len(args.server) < args.concurrency:
+        parser.error(f"--concurrency {args.concurrency} needs as many servers, got {len(args.server)}")
+    if map_name is None:
+        parser.error("--map is required without --fake")
+
+    print(f"{args.games} games of {args.bot} vs {args.opponent} on {map_name}, concurrency {args.concurrency}")
+    try:
+        results = bench(args.bot, args.race, args.opponent, map_name, args.games, args.concurrency, args.server)
+    finally:
+        for process, _ in fake_servers:
+            process.terminate()
+            process.wait()
+    base = results[0]["games_per_hour"]
+    for r in results[1:]:
+        print(f"  {r['mode']:12s} {r['games_per_hour'] / base:.2f}x sequential")
+
+
+if __name__ == "__main__":
+    main()
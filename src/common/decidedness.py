@@ -0,0 +1,130 @@
+# SC2 imports
+from sc2.data import race_townhalls
+from sc2.ids.unit_typeid import UnitTypeId
+
+# Base imports
+import math
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# Additional imports
+from loguru import logger
+
+WORKERS = {UnitTypeId.SCV, UnitTypeId.PROBE, UnitTypeId.DRONE, UnitTypeId.MULE}
+TOWNHALLS = set().union(*race_townhalls.values())
+
+# Weights of the log ratios in the logit, army value counts most since it decides the next fight
+ARMY_WEIGHT = 1.5
+SUPPLY_WEIGHT = 1.0
+STRUCTURE_WEIGHT = 1.0
+
+
+@dataclass
+class Verdict:
+    """ Why a game was called: who won, how sure the detector was and when. """
+    winner: str
+    confidence: float
+    game_time: float
+    army_ratio: float
+    supply_ratio: float
+    structures: int
+    enemy_structures: int
+
+
+class DecidednessDetector:
+    """ Calls a game whose outcome is settled so the bot can leave instead of hunting down the last building.
+
+    Evidence is the log ratio of our army value to the enemy army we can see, the same for supply, and our remaining
+    structures against the enemy structures we still know of, combined into a logistic confidence that we win. A
+    side only loses once it is out of townhalls: us from bot.townhalls, the enemy when its main is scouted, no
+    townhall of theirs is known and the score shows we razed structures. The verdict has to hold for hold seconds in
+    a row past min_time, a single lopsided fight doesn't end the game. """
+
+    def __init__(self, bot, threshold: float = 0.95, hold: float = 20.0, min_time: float = 180.0,
+                 interval: float = 1.0):
+        self.bot = bot
+        self.threshold = threshold
+        self.hold = hold
+        self.min_time = min_time
+        self.interval = interval
+        self.confidence = 0.5
+        self._since: Optional[float] = None
+        self._last_check = -math.inf
+        self._stats: Dict[UnitTypeId, Tuple[int, float]] = {}
+
+    def _type_stats(self, unit_type: UnitTypeId) -> Tuple[int, float]:
+        # (resource value, supply) per type, looked up once per game
+        stats = self._stats.get(unit_type)
+        if stats is None:
+            cost = self.bot.calculate_unit_value(unit_type)
+            proto = self.bot.game_data.units[unit_type.value]._proto  # pylint: disable=W0212
+            stats = self._stats[unit_type] = (cost.minerals + cost.vespene, proto.food_required)
+        return stats
+
+    def _army(self, units) -> Tuple[int, float]:
+        """ (army value, supply) of units, workers count for supply only. """
+        value, supply = 0, 0.0
+        for unit in units:
+            if unit.is_structure:
+                continue
+            unit_value, food = self._type_stats(unit.type_id)
+            supply += food
+            if unit.type_id not in WORKERS:
+                value += unit_value
+        return value, supply
+
+    def evaluate(self) -> Optional[Verdict]:
+        """ The verdict if the game is decided right now, None otherwise. Updates self.confidence. """
+        bot = self.bot
+        army, supply = self._army(bot.units)
+        enemy_army, enemy_supply = self._army(bot.enemy_units)
+        structures = len(bot.structures)
+        enemy_structures = len(bot.enemy_structures)
+
+        # Smoothed so an empty side on both ends reads as even
+        army_ratio = math.log((army + 100) / (enemy_army + 100))
+        supply_ratio = math.log((supply + 1) / (enemy_supply + 1))
+        structure_ratio = math.log((structures + 1) / (enemy_structures + 1))
+        logit = ARMY_WEIGHT * army_ratio + SUPPLY_WEIGHT * supply_ratio + STRUCTURE_WEIGHT * structure_ratio
+        self.confidence = 1 / (1 + math.exp(-max(min(logit, 50), -50)))
+
+        if self.confidence >= self.threshold and self._enemy_broken():
+            winner, confidence = "us", self.confidence
+        elif 1 - self.confidence >= self.threshold and not bot.townhalls:
+            winner, confidence = "them", 1 - self.confidence
+        else:
+            return None
+        return Verdict(winner, round(confidence, 4), round(bot.time, 1), round(army_ratio, 3), round(supply_ratio, 3),
+                       structures, enemy_structures)
+
+    def _enemy_broken(self) -> bool:
+        bot = self.bot
+        if not bot.enemy_start_locations or not bot.is_visible(bot.enemy_start_locations[0]):
+            return False
+        if bot.enemy_structures.filter(lambda s: s.type_id in TOWNHALLS):
+            return False
+        return bot.state.score.killed_value_structures > 0
+
+    def check(self) -> Optional[Verdict]:
+        """ Call once per step, evaluates every interval seconds and returns the verdict once it held long enough. """
+        now = self.bot.time
+        if now < self.min_time or now - self._last_check < self.interval:
+            return None
+        self._last_check = now
+        verdict = self.evaluate()
+        if verdict is None:
+            self._since = None
+            return None
+        if self._since is None:
+            self._since = now
+            logger.info(f"Game looks decided for {verdict.winner} at {now:.0f}s ({verdict.confidence:.3f})")
+        return verdict if now - self._since >= self.hold else None
+
+    @classmethod
+    def from_env(cls, bot) -> Optional["DecidednessDetector"]:
+        """ Detector ending games past confidence VOID_BOT_DECIDED, None when unset (runner.py --end-decided). """
+        threshold = os.getenv("VOID_BOT_DECIDED")
+        if not threshold:
+            return None
+        return cls(bot, threshold=float(threshold))
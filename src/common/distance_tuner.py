@@ -0,0 +1,114 @@
+# SC2 imports
+from sc2.bot_ai import BotAI
+
+# Base imports
+import random
+import time
+from typing import Dict
+
+# Additional imports
+from loguru import logger
+
+# burnysc2's unit to unit distance backends: 0 math.hypot per call, 1 scipy pdist, 2 cdist, 3 cdist without asserts
+METHODS = (0, 1, 2, 3)
+
+
+
+class DistanceTuner:
+    """ Picks the fastest of burnysc2's distance_calculation_method backends on the live game state.
+
+    The choice trades a per step all-pairs precompute (methods 1-3) against the cost of each unit to unit distance
+    the bot asks for (method 0 computes every one with math.hypot). For sample_steps steps the tuner counts how many
+    unit to unit distances the bot's steps ask for, then times every method on the current units: the precompute plus
+    that many lookups on random live unit pairs, best of a few repeats. It switches to the cheapest and logs the
+    table. The measurement is repeated once all_units grew or shrank by a factor of growth since the last one
+    (precomputing is O(n^2), and maps start with very different neutral unit counts), at most once every cooldown
+    game seconds. """
+
+    def __init__(self, bot: BotAI, sample_steps: int = 20, probes: int = 200, repeats: int = 3,
+                 growth: float = 1.5, cooldown: float = 30.0):
+        self.bot = bot
+        self.sample_steps = sample_steps
+        self.growth = growth
+        self.cooldown = cooldown
+        self.probes = probes
+        self.repeats = repeats
+        self.method = bot.distance_calculation_method
+        self._tuned_count = 0
+        self._tuned_at = -cooldown
+        self._sampling = 0
+        self._calls = 0
+        self._rng = random.Random(0)
+
+    def _count_calls(self):
+        # Wrap the bot's current distance function, _distances_override_functions puts the plain one back
+        distance = self.bot._distance_squared_unit_to_unit  # pylint: disable=W0212
+
+        def counted(unit1, unit2):
+            self._calls += 1
+            return distance(unit1, unit2)
+
+        self.bot._distance_squared_unit_to_unit = counted  # pylint: disable=W0212
+
+    def _use(self, method: int):
+        bot = self.bot
+        bot.distance_calculation_method = method
+        bot._distances_override_functions(method)  # pylint: disable=W0212
+        # The cache of this game loop belongs to the previous method, rebuild it for the rest of the step
+        bot._generated_frame = -1  # pylint: disable=W0212
+        if method:
+            bot.calculate_distances()
+
+    def benchmark(self, calls: float) -> Dict[int, float]:
+        """ Seconds per step of each method on the current units for calls unit to unit distances. """
+        bot = self.bot
+        units = bot.all_units
+        if len(units) < 2:
+            return {}
+        pairs = [tuple(self._rng.sample(range(len(units)), 2)) for _ in range(self.probes)]
+        pairs = [(units[i], units[j]) for i, j in pairs]
+        costs = {}
+        for method in METHODS:
+            best = float("inf")
+            for _ in range(self.repeats):
+                bot._distances_override_functions(method)  # pylint: disable=W0212
+                bot._generated_frame = -1  # pylint: disable=W0212
+                started = time.perf_counter()
+                if method:
+                    bot.calculate_distances()
+                prepared = time.perf_counter()
+                distance = bot._distance_squared_unit_to_unit  # pylint: disable=W0212
+                for unit1, unit2 in pairs:
+                    distance(unit1, unit2)
+                done = time.perf_counter()
+                best = min(best, prepared - started + (done - prepared) / len(pairs) * calls)
+            costs[method] = best
+        return costs
+
+    def step(self):
+        """ Call at the start of every step. """
+        if self._sampling:
+            self._sampling -= 1
+            if self._sampling:
+                return
+            calls = self._calls / self.sample_steps
+            costs = self.benchmark(calls)
+            if costs:
+                method = min(costs, key=costs.get)
+                self._use(method)
+                table = ", ".join(f"{m}: {c * 1e3:.3f} ms" for m, c in sorted(costs.items()))
+                logger.info(f"Distance method {method} at {len(self.bot.all_units)} units, "
+                            f"{calls:.0f} lookups per step ({table})")
+                self.method = method
+            else:
+                self._use(self.method)
+            return
+
+        count = len(self.bot.all_units)
+        crossed = not self._tuned_count or not self._tuned_count / self.growth < count < self._tuned_count * self.growth
+        if crossed and self.bot.time - self._tuned_at >= self.cooldown:
+            self._tuned_count = count
+            self._tuned_at = self.bot.time
+            self._sampling = self.sample_steps
+            self._calls = 0
+            self._count_calls()
@@ -0,0 +1,302 @@
+# SC2 imports
+from sc2.dicts.unit_train_build_abilities import TRAIN_INFO
+from sc2.ids.unit_typeid import UnitTypeId
+
+# Base imports
+import heapq
+import json
+import math
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+WORKERS = {UnitTypeId.SCV, UnitTypeId.PROBE}
+TOWNHALLS = {UnitTypeId.COMMANDCENTER, UnitTypeId.NEXUS}
+GAS_BUILDINGS = {UnitTypeId.REFINERY, UnitTypeId.ASSIMILATOR}
+ADDONS = {UnitTypeId.BARRACKSTECHLAB: UnitTypeId.BARRACKS, UnitTypeId.FACTORYTECHLAB: UnitTypeId.FACTORY,
+          UnitTypeId.STARPORTTECHLAB: UnitTypeId.STARPORT}
+
+# Mining per worker per second on faster speed, the third worker on a mineral patch adds much less
+MINERAL_RATE = 0.93
+MINERAL_RATE_OVERSATURATED = 0.35
+GAS_RATE = 0.89
+PATCHES = 8
+WORKERS_PER_GAS = 3
+# Walk from the mineral line to a building site and back
+BUILD_TRAVEL = 4.0
+
+
+@dataclass
+class ItemData:
+    """ What it takes to make one unit or structure. time is in seconds on faster speed. """
+
+    minerals: int
+    vespene: int
+    time: float
+    supply: float = 0
+    provides: float = 0
+    producer: Optional[str] = None
+    requires: Optional[str] = None
+    requires_techlab: bool = False
+
+
+# Fallback when no dump of the game data is around, values of the current ladder patch
+DEFAULT_COSTS = {
+    # Terran
+    UnitTypeId.SCV: (50, 0, 12, 1, 0),
+    UnitTypeId.MARINE: (50, 0, 18, 1, 0),
+    UnitTypeId.REAPER: (50, 50, 32, 1, 0),
+    UnitTypeId.MARAUDER: (100, 25, 21, 2, 0),
+    UnitTypeId.BATTLECRUISER: (400, 300, 64, 6, 0),
+    UnitTypeId.VIKINGFIGHTER: (150, 75, 30, 2, 0),
+    UnitTypeId.COMMANDCENTER: (400, 0, 71, 0, 15),
+    UnitTypeId.SUPPLYDEPOT: (100, 0, 21, 0, 8),
+    UnitTypeId.REFINERY: (75, 0, 21, 0, 0),
+    UnitTypeId.BARRACKS: (150, 0, 46, 0, 0),
+    UnitTypeId.FACTORY: (150, 100, 43, 0, 0),
+    UnitTypeId.STARPORT: (150, 100, 36, 0, 0),
+    UnitTypeId.FUSIONCORE: (150, 150, 46, 0, 0),
+    UnitTypeId.ENGINEERINGBAY: (125, 0, 25, 0, 0),
+    UnitTypeId.BARRACKSTECHLAB: (50, 25, 18, 0, 0),
+    UnitTypeId.STARPORTTECHLAB: (50, 25, 18, 0, 0),
+    # Protoss
+    UnitTypeId.PROBE: (50, 0, 12, 1, 0),
+    UnitTypeId.ZEALOT: (100, 0, 27, 2, 0),
+    UnitTypeId.STALKER: (125, 50, 30, 2, 0),
+    UnitTypeId.ADEPT: (100, 25, 27, 2, 0),
+    UnitTypeId.NEXUS: (400, 0, 71, 0, 15),
+    UnitTypeId.PYLON: (100, 0, 18, 0, 8),
+    UnitTypeId.ASSIMILATOR: (75, 0, 21, 0, 0),
+    UnitTypeId.GATEWAY: (150, 0, 46, 0, 0),
+    UnitTypeId.CYBERNETICSCORE: (150, 0, 36, 0, 0),
+    UnitTypeId.FORGE: (150, 0, 32, 0, 0),
+}
+
+
+def _tech_tree() -> Dict[UnitTypeId, Tuple[UnitTypeId, Optional[UnitTypeId], bool]]:
+    """ item -> (producer, required building, requires techlab) from the library's train info. """
+    tree = {}
+    for producer, items in TRAIN_INFO.items():
+        for item, info in items.items():
+            # Keep the base producer, e.g. COMMANDCENTER over ORBITALCOMMAND for SCVs, BARRACKS over BARRACKSFLYING
+            if item in tree or producer.name.endswith("FLYING"):
+                continue
+            tree[item] = (producer, info.get("required_building"), bool(info.get("requires_techlab")))
+    for addon, producer in ADDONS.items():
+        tree[addon] = (producer, None, False)
+    return tree
+
+
+class EconomyData:
+    """ Costs, build times, supply and tech requirements of the items a build order can contain.
+
+    Built from a live game's game_data (see from_game_data / save) or from DEFAULT_COSTS, so searches run
+    without SC2. Producers and requirements come from the library's TRAIN_INFO. """
+
+    def __init__(self, items: Dict[UnitTypeId, ItemData]):
+        self.items = items
+
+    @classmethod
+    def _with_tree(cls, costs: Dict[UnitTypeId, tuple]) -> "EconomyData":
+        tree = _tech_tree()
+        items = {}
+        for item, (minerals, vespene, time, supply, provides) in costs.items():
+            producer, requires, techlab = tree.get(item, (None, None, False))
+            items[item] = ItemData(minerals, vespene, time, supply, provides,
+                                   producer.name if producer else None, requires.name if requires else None, techlab)
+        return cls(items)
+
+    @classmethod
+    def default(cls) -> "EconomyData":
+        return cls._with_tree(DEFAULT_COSTS)
+
+    @classmethod
+    def from_game_data(cls, game_data, items: Iterable[UnitTypeId] = DEFAULT_COSTS) -> "EconomyData":
+        costs = {}
+        for item in items:
+            data = game_data.units[item.value]
+            cost = data.cost
+            proto = data._proto  # pylint: disable=W0212
+            # Build times are in game loops, 22.4 per second on faster
+            costs[item] = (cost.minerals, cost.vespene, cost.time / 22.4, proto.food_required, proto.food_provided)
+        return cls._with_tree(costs)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({item.name: asdict(data) for item, data in self.items.items()}, f, indent=1)
+
+    @classmethod
+    def load(cls, path: str) -> "EconomyData":
+        with open(path) as f:
+            raw = json.load(f)
+        return cls({UnitTypeId[name]: ItemData(**data) for name, data in raw.items()})
+
+    def requirements(self, item: UnitTypeId) -> List[UnitTypeId]:
+        """ Everything item needs before it can be started, deepest first, excluding the starting townhall. """
+        chain = []
+        data = self.items[item]
+        for name in (data.requires, data.producer):
+            if name is None:
+                continue
+            dep = UnitTypeId[name]
+            if dep in WORKERS or dep in TOWNHALLS or dep not in self.items:
+                continue
+            for sub in self.requirements(dep) + [dep]:
+                if sub not in chain:
+                    chain.append(sub)
+        if data.requires_techlab:
+            addon = next(a for a, p in ADDONS.items() if p.name == data.producer)
+            if addon not in chain:
+                chain.append(addon)
+        return chain
+
+
+@dataclass
+class SimResult:
+    goal_time: float
+    starts: List[float]
+    feasible: bool
+
+
+class EconomySimulator:
+    """ Event driven forward simulation of mining, supply and production for one build order.
+
+    Items are started strictly in order, each as soon as its producer is free, its requirements are done, supply
+    allows and the bank covers it. Income is constant between events (completions, workers leaving for or
+    returning from a build), so waiting for money is solved in closed form instead of ticking. Workers
+    automatically fill finished gas buildings. Zerg larva is not modeled. """
+
+    def __init__(self, data: EconomyData, race_worker: UnitTypeId = UnitTypeId.SCV, start_workers: int = 12,
+                 max_time: float = 600.0):
+        self.data = data
+        self.worker = race_worker
+        self.townhall = UnitTypeId.COMMANDCENTER if race_worker == UnitTypeId.SCV else UnitTypeId.NEXUS
+        self.start_workers = start_workers
+        self.max_time = max_time
+        # Terran workers stay on the site for the whole build
+        self.worker_builds = race_worker == UnitTypeId.SCV
+        self._producers = {info.producer for info in data.items.values() if info.producer}
+
+    def run(self, order: Sequence[UnitTypeId], goal: Optional[UnitTypeId] = None, goal_count: int = 0) -> SimResult:
+        data = self.data.items
+        t = 0.0
+        minerals, vespene = 50.0, 0.0
+        mining, gas_workers, gas_slots = self.start_workers, 0, 0
+        supply_used, supply_cap = float(self.start_workers), 15.0
+        done = {self.townhall.name: 1, self.worker.name: self.start_workers}
+        started: Dict[str, int] = {}
+        # producer name -> list of [free at, has techlab]
+        producers: Dict[str, List[list]] = {self.townhall.name: [[0.0, False]]}
+        events: List[Tuple[float, int, str, str]] = []
+        seq = 0
+        starts: List[float] = []
+        goal_name = goal.name if goal else None
+        goal_time = math.inf
+
+        def income() -> Tuple[float, float]:
+            near = min(mining, 2 * PATCHES)
+            far = min(max(mining - 2 * PATCHES, 0), PATCHES)
+            return near * MINERAL_RATE + far * MINERAL_RATE_OVERSATURATED, gas_workers * GAS_RATE
+
+        def advance(to: float):
+            nonlocal t, minerals, vespene
+            m_rate, g_rate = income()
+            minerals += (to - t) * m_rate
+            vespene += (to - t) * g_rate
+            t = to
+
+        def apply(kind: str, name: str):
+            nonlocal mining, gas_workers, gas_slots, supply_cap, goal_time
+            if kind == "worker_back":
+                mining += 1
+                return
+            done[name] = done.get(name, 0) + 1
+            item = UnitTypeId[name]
+            info = data[item]
+            supply_cap = min(supply_cap + info.provides, 200)
+            if item in WORKERS:
+                mining += 1
+            if item in GAS_BUILDINGS:
+                gas_slots += WORKERS_PER_GAS
+            if item in ADDONS:
+                for slot in producers.get(info.producer, []):
+                    if not slot[1]:
+                        slot[1] = True
+                        break
+            elif name in self._producers:
+                producers.setdefault(name, []).append([t, False])
+            if name == goal_name and done[name] >= goal_count and goal_time == math.inf:
+                goal_time = t
+            # Fill gas from the mineral line
+            moved = min(gas_slots - gas_workers, max(mining - 1, 0))
+            if moved > 0:
+                mining -= moved
+                gas_workers += moved
+
+        def pop_event():
+            time, _, kind, name = heapq.heappop(events)
+            advance(time)
+            apply(kind, name)
+
+        for item in order:
+            info = data.get(item)
+            if info is None:
+                return SimResult(math.inf, starts, False)
+            name = item.name
+            while True:
+                blocked = False
+                if info.requires and done.get(info.requires, 0) == 0:
+                    blocked = True
+                slots = [s for s in producers.get(info.producer, [])
+                         if (s[1] or not info.requires_techlab) and not (item in ADDONS and s[1])]
+                if info.producer and not slots and info.producer not in (self.worker.name,):
+                    blocked = True
+                if info.producer == self.worker.name and mining < 1:
+                    blocked = True
+                if info.supply and supply_used + info.supply > supply_cap:
+                    blocked = True
+                if blocked:
+                    # Only a pending completion can unblock it
+                    if not events or events[0][0] > self.max_time:
+                        return SimResult(goal_time, starts, False)
+                    pop_event()
+                    continue
+
+                ready_at = t
+                slot = None
+                if info.producer != self.worker.name and slots:
+                    slot = min(slots, key=lambda s: s[0])
+                    ready_at = max(ready_at, slot[0])
+                m_rate, g_rate = income()
+                for need, have, rate in ((info.minerals, minerals, m_rate), (info.vespene, vespene, g_rate)):
+                    if need > have:
+                        ready_at = max(ready_at, t + (need - have) / rate if rate > 0 else math.inf)
+                if events and events[0][0] < ready_at:
+                    pop_event()
+                    continue
+                if ready_at > self.max_time:
+                    return SimResult(goal_time, starts, False)
+                advance(ready_at)
+                break
+
+            minerals -= info.minerals
+            vespene -= info.vespene
+            supply_used += info.supply
+            started[name] = started.get(name, 0) + 1
+            starts.append(t)
+            finish = t + info.time
+            if info.producer == self.worker.name:
+                finish += BUILD_TRAVEL / 2
+                mining -= 1
+                back = finish if self.worker_builds else t + BUILD_TRAVEL
+                seq += 1
+                heapq.heappush(events, (back, seq, "worker_back", self.worker.name))
+            elif slot is not None:
+                slot[0] = finish
+            seq += 1
+            heapq.heappush(events, (finish, seq, "done", name))
+
+        # Let everything queued finish to see when the goal is reached
+        while events and goal_time == math.inf and events[0][0] <= self.max_time:
+            pop_event()
+        feasible = goal is None or goal_time < math.inf
+        return SimResult(goal_time, starts, feasible)
@@ -0,0 +1,1588 @@
+# SC2 imports
+from sc2.dicts.unit_research_abilities import RESEARCH_INFO
+from sc2.dicts.unit_train_build_abilities import TRAIN_INFO
+from sc2.ids.ability_id import AbilityId
+from sc2.ids.buff_id import BuffId
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.ids.upgrade_id import UpgradeId
+
+# Base imports
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Additional imports
+import numpy as np
+from aiohttp import WSCloseCode, WSMsgType, web
+from loguru import logger
+from s2clientprotocol import common_pb2, error_pb2, raw_pb2, sc2api_pb2
+
+# Local imports
+from common.economy_sim import GAS_RATE, MINERAL_RATE, MINERAL_RATE_OVERSATURATED, WORKERS_PER_GAS
+from common.fake_sc2_data import (ADDONS, AIR, ANY, CREEPLESS, EXTRA_INFO, FLYING, GAS_BUILDINGS, GEYSERS, LANDED,
+                                  LOOPS_PER_SECOND, MINERALS, REACTORS, STRUCTURES, TECH_ALIAS, TECHLABS, TOWNHALLS,
+                                  UNPOWERED, VARIANTS, WORKERS, game_data, generic, recipe, stats, upgrade_cost)
+
+U = UnitTypeId
+A = AbilityId
+SUCCESS = error_pb2.Success
+
+# Any version past the library's minimum works, the client only compares against it
+BASE_BUILD = 94137
+FAKE_MAP = "FakeMap"
+
+TERRAN, ZERG, PROTOSS = common_pb2.Terran, common_pb2.Zerg, common_pb2.Protoss
+RACE_UNITS = {
+    # townhall, worker, supply, production, army
+    TERRAN: (U.COMMANDCENTER, U.SCV, U.SUPPLYDEPOT, U.BARRACKS, U.MARINE),
+    ZERG: (U.HATCHERY, U.DRONE, U.OVERLORD, U.SPAWNINGPOOL, U.ZERGLING),
+    PROTOSS: (U.NEXUS, U.PROBE, U.PYLON, U.GATEWAY, U.ZEALOT),
+}
+
+PYLON_RADIUS = 6.5
+CREEP_RADIUS = 12
+ENERGY_REGEN = 0.7875
+LARVA_INTERVAL = 11
+INJECT_TIME = 29
+CHRONO_TIME = 20
+MULE_TIME = 64
+MULE_RATE = 225 / 64
+WARP_IN_TIME = 5
+KD8_COOLDOWN = 14
+# Seconds between the scripted opponent's decisions
+AI_INTERVAL = 0.75
+
+
+def loops(seconds: float) -> float:
+    return seconds * LOOPS_PER_SECOND
+
+
+def make_sc2path(root: str, maps: Tuple[str, ...] = (FAKE_MAP,), map_dir: str = "2025S2Maps") -> str:
+    """ Minimal SC2PATH the library and runner.py accept: an empty Versions/Base<n> folder and placeholder map files
+    under Maps/<map_dir>. The fake server ignores the map file, it only uses the name. """
+    os.makedirs(os.path.join(root, "Versions", f"Base{BASE_BUILD}"), exist_ok=True)
+    os.makedirs(os.path.join(root, "Maps", map_dir), exist_ok=True)
+    for name in maps:
+        path = os.path.join(root, "Maps", map_dir, f"{name}.SC2Map")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(b"fake sc2 map placeholder\n")
+    return root
+
+
+class FakeMap:
+    """ Small flat two player map: both mains in opposite corners plus two more bases, eight mineral patches and two
+    geysers each, facing away from the center like a ladder map's bases. Grids are indexed [y, x]. """
+
+    def __init__(self, name: str = FAKE_MAP, size: int = 96, border: int = 4):
+        self.name = name
+        self.size = size
+        self.playable = (border, border, size - border, size - border)
+        self.pathing = np.zeros((size, size), dtype=bool)
+        self.pathing[border:size - border, border:size - border] = True
+        self.placement = self.pathing.copy()
+        self.terrain = np.full((size, size), 128, dtype=np.uint8)
+        low, high = border + 20.5, size - border - 20.5
+        self.starts = [(low, low), (high, high)]
+        self.bases = [self._base(c) for c in self.starts + [(low, high), (high, low)]]
+
+    def _base(self, center):
+        """ (center, [(type, x, y)] minerals, [(x, y)] geysers). Minerals are 2x1 so their x is whole, y half. """
+        mid = self.size / 2
+        away = math.atan2(center[1] - mid, center[0] - mid)
+        minerals = []
+        for i in range(8):
+            angle = away + math.radians(-63 + 18 * i)
+            radius = 7 if i % 2 else 8
+            x, y = round(center[0] + radius * math.cos(angle)), math.floor(center[1] + radius * math.sin(angle)) + 0.5
+            minerals.append((U.MINERALFIELD if i % 2 else U.MINERALFIELD750, x, y))
+        geysers = []
+        for side in (-1, 1):
+            angle = away + side * math.radians(100)
+            geysers.append((math.floor(center[0] + 7 * math.cos(angle)) + 0.5,
+                            math.floor(center[1] + 7 * math.sin(angle)) + 0.5))
+        return center, minerals, geysers
+
+    def in_bounds(self, x: float, y: float) -> bool:
+        x0, y0, x1, y1 = self.playable
+        return x0 <= x < x1 and y0 <= y < y1
+
+    def clamp(self, x: float, y: float) -> Tuple[float, float]:
+        x0, y0, x1, y1 = self.playable
+        return min(max(x, x0 + 0.5), x1 - 0.5), min(max(y, y0 + 0.5), y1 - 0.5)
+
+
+@dataclass
+class Order:
+    ability: AbilityId
+    kind: str
+    point: Optional[Tuple[float, float]] = None
+    tag: int = 0
+    item: object = None
+    left: float = 0
+    total: float = 0
+    food: float = 0
+    cost: Tuple[int, int] = (0, 0)
+
+    @property
+    def progress(self) -> float:
+        return 1 - self.left / self.total if self.total else 0.0
+
+
+@dataclass
+class SimUnit:
+    tag: int
+    type: UnitTypeId
+    owner: int
+    x: float
+    y: float
+    hp: float
+    hp_max: float
+    shield: float = 0
+    shield_max: float = 0
+    energy: float = 0
+    energy_max: float = 0
+    progress: float = 1.0
+    build_time: float = 0
+    flying: bool = False
+    structure: bool = False
+    radius: float = 0.5
+    minerals: int = 0
+    vespene: float = 0
+    add_on: int = 0
+    cooldown: float = 0
+    engaged: int = 0
+    home: int = 0
+    timer: float = 0
+    expires: float = 0
+    orders: List[Order] = field(default_factory=list)
+    buffs: Dict[int, float] = field(default_factory=dict)
+    ready_at: Dict[AbilityId, float] = field(default_factory=dict)
+
+    @property
+    def pos(self) -> Tuple[float, float]:
+        return self.x, self.y
+
+    def distance(self, other) -> float:
+        x, y = (other.x, other.y) if isinstance(other, SimUnit) else other
+        return math.hypot(self.x - x, self.y - y)
+
+
+@dataclass
+class PlayerState:
+    race: int
+    start: Tuple[float, float]
+    minerals: float = 50
+    vespene: float = 0
+    upgrades: set = field(default_factory=set)
+    collected: List[float] = field(default_factory=lambda: [0.0, 0.0])
+    spent: List[float] = field(default_factory=lambda: [0.0, 0.0])
+    # Resource value of enemy units and structures this player destroyed
+    killed: List[float] = field(default_factory=lambda: [0.0, 0.0])
+    dead: List[int] = field(default_factory=list)
+
+
+class World:
+    """ Deterministic stand-in for a running game: mining, supply, training, construction, research, a few morphs
+    and abilities the bots use, movement in straight lines and simple weapon fights. Everything is visible to
+    everyone. Player 1 is the bot, player 2 a ScriptedOpponent. Ground units ignore pathing around structures and
+    there is no collision, good enough to drive the game loop end to end and nothing more. """
+
+    def __init__(self, fake_map: FakeMap, races: Dict[int, int], difficulty: int = 3, seed: int = 0,
+                 max_loops: int = int(loops(30 * 60))):
+        self.map = fake_map
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.max_loops = max_loops
+        self.loop = 0
+        self.units: Dict[int, SimUnit] = {}
+        self.blocked = np.zeros_like(fake_map.pathing)
+        self.result: Optional[Dict[int, int]] = None
+        self.commands = 0
+        self.digest = hashlib.sha1()
+        self._next_tag = 0x100000000
+        self._creep: Tuple[tuple, Optional[np.ndarray]] = ((), None)
+        self._miners: Counter = Counter()
+        self._last_miners: Counter = Counter()
+        self._by_owner: Dict[int, List[SimUnit]] = {}
+        self._protos: Dict[int, tuple] = {}
+
+        starts = list(fake_map.starts)
+        if seed % 2:
+            starts.reverse()
+        races = {p: r if r in RACE_UNITS else self.rng.choice(list(RACE_UNITS)) for p, r in races.items()}
+        self.players = {p: PlayerState(races[p], starts[i]) for i, p in enumerate(sorted(races))}
+        for _center, minerals, geysers in fake_map.bases:
+            for mineral_type, x, y in minerals:
+                self.spawn(mineral_type, 0, x, y).minerals = 1800 if mineral_type == U.MINERALFIELD else 900
+            for x, y in geysers:
+                self.spawn(U.VESPENEGEYSER, 0, x, y).vespene = 2250
+        for p, player in self.players.items():
+            townhall, worker = RACE_UNITS[player.race][:2]
+            hall = self.spawn(townhall, p, *player.start)
+            for i in range(12):
+                angle = math.atan2(48 - hall.y, 48 - hall.x) + math.pi + (i - 5.5) * 0.15
+                self.spawn(worker, p, hall.x + 4 * math.cos(angle), hall.y + 4 * math.sin(angle))
+            if player.race == ZERG:
+                self.spawn(U.OVERLORD, p, hall.x, hall.y + 4)
+                for _ in range(3):
+                    self._spawn_larva(hall)
+            for unit in self.owned(p):
+                if unit.type == worker:
+                    mineral = self._nearest(unit, lambda u: u.type in MINERALS)
+                    unit.orders = [Order(A.HARVEST_GATHER, "gather", tag=mineral.tag)]
+        self.ai = ScriptedOpponent(self, 2, difficulty)
+
+    # Units
+
+    def spawn(self, unit_type: UnitTypeId, owner: int, x: float, y: float, progress: float = 1.0,
+              tag: Optional[int] = None) -> SimUnit:
+        """ A new unit, or one taking over tag (a drone becoming a building keeps its tag like in the game). """
+        s = stats(unit_type)
+        structure = unit_type in STRUCTURES
+        if tag is None:
+            tag = self._next_tag
+            self._next_tag += 1
+        unit = SimUnit(tag, unit_type, owner, x, y, s.hp * (0.1 + 0.9 * progress), s.hp, s.shield, s.shield,
+                       s.energy, 200 if s.energy else 0, progress, loops(s.time), s.flying, structure, s.radius)
+        self.units[unit.tag] = unit
+        if structure and not unit.flying:
+            self._block(unit, True)
+        return unit
+
+    def remove(self, unit: SimUnit, died: bool = True):
+        if self.units.pop(unit.tag, None) is None:
+            return
+        self._protos.pop(unit.tag, None)
+        if unit.structure and not unit.flying:
+            self._block(unit, False)
+        if unit.progress < 1:
+            # The SCV constructing it stops in the same observation, like on completion
+            self._release(unit)
+        if died:
+            s = stats(unit.type)
+            for owner, player in self.players.items():
+                player.dead.append(unit.tag)
+                if owner != unit.owner and unit.owner in self.players:
+                    player.killed[unit.structure] += s.minerals + s.vespene
+
+    def owned(self, owner: int) -> List[SimUnit]:
+        return [u for u in self.units.values() if u.owner == owner]
+
+    def _cells(self, unit_type: UnitTypeId, x: float, y: float) -> Tuple[slice, slice]:
+        if unit_type in MINERALS:
+            return slice(int(round(y - 0.5)), int(round(y + 0.5))), slice(int(round(x - 1)), int(round(x + 1)))
+        half = stats(unit_type).size / 2
+        return slice(int(round(y - half)), int(round(y + half))), slice(int(round(x - half)), int(round(x + half)))
+
+    def _block(self, unit: SimUnit, blocked: bool):
+        if unit.type in GAS_BUILDINGS:
+            return
+        self.blocked[self._cells(unit.type, unit.x, unit.y)] = blocked
+
+    def _nearest(self, unit: SimUnit, pick, max_distance: float = math.inf) -> Optional[SimUnit]:
+        best, best_distance = None, max_distance
+        for other in self.units.values():
+            if other is not unit and pick(other):
+                d = unit.distance(other)
+                if d < best_distance:
+                    best, best_distance = other, d
+        return best
+
+    def _spawn_larva(self, hatchery: SimUnit):
+        larva = self.spawn(U.LARVA, hatchery.owner, hatchery.x + self.rng.uniform(-1.5, 1.5), hatchery.y - 2.5)
+        larva.home = hatchery.tag
+
+    def _has(self, owner: int, unit_type: UnitTypeId) -> bool:
+        """ A ready unit of unit_type or anything that counts as it, e.g. an orbital for a command center. """
+        for unit in self.units.values():
+            if unit.owner == owner and unit.progress >= 1:
+                base = VARIANTS.get(unit.type, unit.type)
+                if base == unit_type or unit_type in TECH_ALIAS.get(base, ()):
+                    return True
+        return False
+
+    def powered(self, owner: int, x: float, y: float) -> bool:
+        return any(u.owner == owner and u.type == U.PYLON and u.progress >= 1
+                   and math.hypot(u.x - x, u.y - y) <= PYLON_RADIUS for u in self.units.values())
+
+    def creep(self) -> np.ndarray:
+        """ Creep around every hatchery, rebuilt only when the hatcheries change. """
+        sources = tuple(sorted(u.pos for u in self.units.values() if u.type in (U.HATCHERY, U.LAIR, U.HIVE)))
+        if self._creep[1] is None or self._creep[0] != sources:
+            grid = np.zeros_like(self.blocked)
+            ys, xs = np.ogrid[:grid.shape[0], :grid.shape[1]]
+            for x, y in sources:
+                grid |= (xs + 0.5 - x) ** 2 + (ys + 0.5 - y) ** 2 <= CREEP_RADIUS ** 2
+            self._creep = (sources, grid & self.map.pathing)
+        return self._creep[1]
+
+    def pathing(self) -> np.ndarray:
+        return self.map.pathing & ~self.blocked
+
+    # Supply and money
+
+    def food_used(self, owner: int) -> float:
+        total = 0.0
+        for unit in self.units.values():
+            if unit.owner == owner:
+                if not unit.structure and unit.type != U.EGG:
+                    total += stats(unit.type).food
+                total += sum(o.food for o in unit.orders)
+        return total
+
+    def food_cap(self, owner: int) -> float:
+        return min(200.0, sum(stats(u.type).provides for u in self.units.values()
+                              if u.owner == owner and u.progress >= 1))
+
+    def _pay(self, owner: int, minerals: float, vespene: float, food: float = 0) -> int:
+        player = self.players[owner]
+        if player.minerals < minerals:
+            return error_pb2.NotEnoughMinerals
+        if player.vespene < vespene:
+            return error_pb2.NotEnoughVespene
+        if food and self.food_used(owner) + food > self.food_cap(owner):
+            return error_pb2.NotEnoughFood
+        player.minerals -= minerals
+        player.vespene -= vespene
+        player.spent[0] += minerals
+        player.spent[1] += vespene
+        return SUCCESS
+
+    def _refund(self, owner: int, cost: Tuple[int, int]):
+        player = self.players[owner]
+        player.minerals += cost[0]
+        player.vespene += cost[1]
+        player.spent[0] -= cost[0]
+        player.spent[1] -= cost[1]
+
+    def cost(self, owner: int, item: UnitTypeId) -> Tuple[int, int]:
+        """ What making item takes from the bank: morphs pay the difference, zerg structures get the drone back. """
+        s = stats(item)
+        minerals, vespene = s.minerals, s.vespene
+        if item in TECH_ALIAS:
+            minerals -= max(stats(t).minerals for t in TECH_ALIAS[item])
+            vespene -= max(stats(t).vespene for t in TECH_ALIAS[item])
+        elif item in STRUCTURES and self.players[owner].race == ZERG:
+            minerals -= 50
+        return max(minerals, 0), max(vespene, 0)
+
+    def _requirements(self, unit: SimUnit, info: dict) -> int:
+        owner = unit.owner
+        if "required_building" in info and not self._has(owner, info["required_building"]):
+            return error_pb2.TechRequirementsNotMet
+        if "required_upgrade" in info and info["required_upgrade"] not in self.players[owner].upgrades:
+            return error_pb2.TechRequirementsNotMet
+        if info.get("requires_techlab"):
+            addon = self.units.get(unit.add_on)
+            if addon is None or addon.type not in TECHLABS or addon.progress < 1:
+                return error_pb2.TechRequirementsNotMet
+        return SUCCESS
+
+    def placement_error(self, owner: int, unit_type: UnitTypeId, x: float, y: float) -> int:
+        """ SUCCESS if unit_type fits at (x, y) for owner: free placeable cells, power for protoss and creep for zerg. """
+        if unit_type in GAS_BUILDINGS:
+            free = [u for u in self.units.values() if u.type in GEYSERS and u.distance((x, y)) < 0.5
+                    and self._gas_on(u) is None]
+            return SUCCESS if free else error_pb2.CantBuildLocationInvalid
+        rows, cols = self._cells(unit_type, x, y)
+        size = self.map.size
+        if rows.start < 0 or cols.start < 0 or rows.stop > size or cols.stop > size:
+            return error_pb2.CantBuildLocationInvalid
+        if not self.map.placement[rows, cols].all() or self.blocked[rows, cols].any():
+            return error_pb2.CantBuildLocationInvalid
+        if unit_type in TOWNHALLS:
+            # Resources keep townhalls at a distance
+            for unit in self.units.values():
+                if unit.owner == 0 and unit.distance((x, y)) < (7 if unit.type in GEYSERS else 6):
+                    return error_pb2.CantBuildLocationInvalid
+        race = self.players[owner].race
+        if race == PROTOSS and unit_type not in UNPOWERED and not self.powered(owner, x, y):
+            return error_pb2.CantBuildTooFarFromBuildPowerSource
+        if race == ZERG and unit_type not in CREEPLESS and not self.creep()[int(y), int(x)]:
+            return error_pb2.CantBuildTooFarFromCreepSource
+        return SUCCESS
+
+    # Commands
+
+    def command(self, owner: int, tags, ability: AbilityId, point: Optional[Tuple[float, float]] = None,
+                target: int = 0, queue: bool = False) -> int:
+        """ Apply one raw unit command, returning an ActionResult. Succeeds if any of the units took it. """
+        self.commands += 1
+        self.digest.update(f"{self.loop}|{owner}|{sorted(tags)}|{ability}|{point}|{target}|{queue}".encode())
+        results = [self._command(unit, ability, point, target, queue)
+                   for tag in tags if (unit := self.units.get(tag)) is not None and unit.owner == owner]
+        if not results:
+            return error_pb2.CantTargetThatUnit
+        return SUCCESS if SUCCESS in results else results[0]
+
+    def _give(self, unit: SimUnit, order: Order, queue: bool) -> int:
+        if unit.structure and not unit.flying and order.kind in ("move", "attack"):
+            return error_pb2.NotSupported
+        if queue and unit.orders:
+            unit.orders.append(order)
+        else:
+            unit.orders = [order]
+        unit.engaged = 0
+        return SUCCESS
+
+    def _command(self, unit: SimUnit, ability: AbilityId, point, target_tag: int, queue: bool) -> int:
+        if unit.progress < 1:
+            return error_pb2.Error
+        target = self.units.get(target_tag)
+        kind = generic(ability)
+        if ability.name.startswith("RALLY"):
+            return SUCCESS
+        if kind in (A.STOP, A.HOLDPOSITION):
+            # A queued stop only ends the queue
+            if not unit.structure and not queue:
+                unit.orders = []
+            return SUCCESS
+        if kind in (A.CANCEL, A.CANCEL_LAST):
+            return self._cancel(unit)
+        if kind == A.SMART:
+            if target is not None and unit.type in WORKERS | {U.MULE} and self._resource(unit, target):
+                kind = A.HARVEST_GATHER
+            elif target is not None and target.owner not in (0, unit.owner):
+                kind = A.ATTACK
+            else:
+                kind = A.MOVE
+        if kind in (A.MOVE, A.PATROL):
+            if unit.flying or not unit.structure:
+                return self._give(unit, Order(ability, "move", point, target_tag), queue)
+            return error_pb2.NotSupported
+        if kind in (A.ATTACK, A.SCAN_MOVE):
+            if not stats(unit.type).weapons:
+                return error_pb2.NotSupported
+            return self._give(unit, Order(ability, "attack", point, target_tag), queue)
+        if kind == A.HARVEST_GATHER:
+            if target is None or not self._resource(unit, target):
+                return error_pb2.MustTargetResources
+            return self._give(unit, Order(ability, "gather", tag=target_tag), queue)
+        if kind == A.HARVEST_RETURN:
+            return SUCCESS
+        if kind == A.LIFT:
+            if unit.type not in FLYING or unit.orders:
+                return error_pb2.Error
+            self._block(unit, False)
+            unit.type, unit.flying, unit.add_on = FLYING[unit.type], True, 0
+            return SUCCESS
+        if kind == A.LAND:
+            if unit.type not in LANDED or point is None:
+                return error_pb2.Error
+            return self._give(unit, Order(ability, "land", point), queue)
+        if ability in (A.MORPH_SUPPLYDEPOT_LOWER, A.MORPH_SUPPLYDEPOT_RAISE):
+            unit.type = U.SUPPLYDEPOTLOWERED if ability == A.MORPH_SUPPLYDEPOT_LOWER else U.SUPPLYDEPOT
+            return SUCCESS
+        if ability in (A.EFFECT_CHRONOBOOSTENERGYCOST, A.CALLDOWNMULE_CALLDOWNMULE, A.EFFECT_INJECTLARVA,
+                       A.KD8CHARGE_KD8CHARGE):
+            return self._cast(unit, ability, point, target)
+
+        found = recipe(unit.type, ability, frozenset(self.players[unit.owner].upgrades))
+        if found is None:
+            return error_pb2.Error
+        what, item, info = found
+        if what == "upgrade":
+            return self._research(unit, item, info)
+        if unit.type == U.LARVA:
+            return self._larva(unit, item, info)
+        if unit.type == U.WARPGATE:
+            return self._warp_in(unit, item, info, point)
+        if unit.type in WORKERS and item in STRUCTURES:
+            return self._build(unit, item, info, point, target, queue)
+        if item in ADDONS:
+            return self._addon(unit, item, info)
+        if item in STRUCTURES:
+            return self._morph(unit, item, info)
+        if unit.structure:
+            return self._train(unit, item, info)
+        return error_pb2.NotSupported
+
+    def _resource(self, worker: SimUnit, target: SimUnit) -> bool:
+        if target.type in MINERALS:
+            return True
+        return target.type in GAS_BUILDINGS and target.owner == worker.owner and target.progress >= 1
+
+    def _cancel(self, unit: SimUnit) -> int:
+        if not unit.orders:
+            return error_pb2.Error
+        order = unit.orders.pop()
+        if order.kind in ("train", "research", "morph", "egg", "addon"):
+            self._refund(unit.owner, order.cost)
+        if order.kind == "egg":
+            unit.type = U.LARVA
+        elif order.kind == "addon" and order.tag in self.units:
+            self.remove(self.units[order.tag], died=False)
+            unit.add_on = 0
+        return SUCCESS
+
+    def _cast(self, unit: SimUnit, ability: AbilityId, point, target: Optional[SimUnit]) -> int:
+        if ability == A.KD8CHARGE_KD8CHARGE:
+            if unit.ready_at.get(ability, 0) > self.loop:
+                return error_pb2.Cooldown
+            spot = point or (target.pos if target else None)
+            if spot is None or unit.distance(spot) > 5 + unit.radius + 0.5:
+                return error_pb2.TargetIsOutOfRange
+            unit.ready_at[ability] = self.loop + loops(KD8_COOLDOWN)
+            for other in list(self.units.values()):
+                if other.owner not in (0, unit.owner) and not other.flying and other.distance(spot) <= 1 + other.radius:
+                    self._damage(other, 5)
+            return SUCCESS
+        energy = 25 if ability == A.EFFECT_INJECTLARVA else 50
+        if unit.energy < energy:
+            return error_pb2.NotEnoughEnergy
+        if ability == A.CALLDOWNMULE_CALLDOWNMULE:
+            x, y = target.pos if target else point
+            mule = self.spawn(U.MULE, unit.owner, *self.map.clamp(x, y - 1.5))
+            mule.expires = self.loop + loops(MULE_TIME)
+            mineral = target if target is not None and target.type in MINERALS else \
+                self._nearest(mule, lambda u: u.type in MINERALS, 12)
+            if mineral is not None:
+                mule.orders = [Order(A.HARVEST_GATHER, "gather", tag=mineral.tag)]
+        else:
+            if target is None or target.owner != unit.owner or not target.structure:
+                return error_pb2.MustTargetUnit
+            if ability == A.EFFECT_INJECTLARVA:
+                if target.type not in (U.HATCHERY, U.LAIR, U.HIVE) or BuffId.QUEENSPAWNLARVATIMER.value in target.buffs:
+                    return error_pb2.CantTargetThatUnit
+                target.buffs[BuffId.QUEENSPAWNLARVATIMER.value] = self.loop + loops(INJECT_TIME)
+            else:
+                target.buffs[BuffId.CHRONOBOOSTENERGYCOST.value] = self.loop + loops(CHRONO_TIME)
+        unit.energy -= energy
+        return SUCCESS
+
+    def _train(self, unit: SimUnit, item: UnitTypeId, info: dict) -> int:
+        if unit.flying or unit.type in LANDED:
+            return error_pb2.NotSupported
+        if len(unit.orders) >= 5:
+            return error_pb2.QueueIsFull
+        error = self._requirements(unit, info)
+        if error != SUCCESS:
+            return error
+        cost, s = self.cost(unit.owner, item), stats(item)
+        error = self._pay(unit.owner, *cost, s.food)
+        if error == SUCCESS:
+            unit.orders.append(Order(info["ability"], "train", item=item, left=loops(s.time), total=loops(s.time),
+                                     food=s.food, cost=cost))
+        return error
+
+    def _research(self, unit: SimUnit, upgrade: UpgradeId, info: dict) -> int:
+        busy = any(o.item == upgrade for u in self.owned(unit.owner) for o in u.orders)
+        if busy or upgrade in self.players[unit.owner].upgrades:
+            return error_pb2.Error
+        if len(unit.orders) >= 5:
+            return error_pb2.QueueIsFull
+        error = self._requirements(unit, info)
+        if error != SUCCESS:
+            return error
+        minerals, vespene, seconds = upgrade_cost(upgrade)
+        error = self._pay(unit.owner, minerals, vespene)
+        if error == SUCCESS:
+            unit.orders.append(Order(info["ability"], "research", item=upgrade, left=loops(seconds),
+                                     total=loops(seconds), cost=(minerals, vespene)))
+        return error
+
+    def _morph(self, unit: SimUnit, item: UnitTypeId, info: dict) -> int:
+        if unit.orders:
+            return error_pb2.QueueIsFull
+        error = self._requirements(unit, info)
+        if error != SUCCESS:
+            return error
+        cost = self.cost(unit.owner, item)
+        error = self._pay(unit.owner, *cost)
+        if error == SUCCESS:
+            duration = loops(stats(item).time)
+            unit.orders.append(Order(info["ability"], "morph", item=item, left=duration, total=duration, cost=cost))
+        return error
+
+    def _larva(self, larva: SimUnit, item: UnitTypeId, info: dict) -> int:
+        error = self._requirements(larva, info)
+        if error != SUCCESS:
+            return error
+        s = stats(item)
+        count = 2 if item == U.ZERGLING else 1
+        cost = (s.minerals * count, s.vespene * count)
+        error = self._pay(larva.owner, *cost, s.food * count)
+        if error == SUCCESS:
+            larva.type = U.EGG
+            larva.hp = larva.hp_max = stats(U.EGG).hp
+            larva.orders = [Order(info["ability"], "egg", item=item, left=loops(s.time), total=loops(s.time),
+                                  food=s.food * count, cost=cost)]
+        return error
+
+    def _warp_in(self, gate: SimUnit, item: UnitTypeId, info: dict, point) -> int:
+        if gate.ready_at.get(A.MORPH_WARPGATE, 0) > self.loop:
+            return error_pb2.Cooldown
+        if point is None or not self.map.in_bounds(*point):
+            return error_pb2.CantBuildLocationInvalid
+        if not self.powered(gate.owner, *point):
+            return error_pb2.CantTrainTooFarFromTrainPowerSource
+        if self.blocked[int(point[1]), int(point[0])] or not self.map.pathing[int(point[1]), int(point[0])]:
+            return error_pb2.CantBuildLocationInvalid
+        error = self._requirements(gate, info)
+        if error != SUCCESS:
+            return error
+        s = stats(item)
+        error = self._pay(gate.owner, *self.cost(gate.owner, item), s.food)
+        if error == SUCCESS:
+            unit = self.spawn(item, gate.owner, *point, progress=0.0)
+            unit.build_time = loops(WARP_IN_TIME)
+            gate.ready_at[A.MORPH_WARPGATE] = self.loop + loops(s.time)
+        return error
+
+    def _addon(self, unit: SimUnit, item: UnitTypeId, info: dict) -> int:
+        if unit.flying or unit.add_on or unit.orders:
+            return error_pb2.Error
+        x, y = unit.x + 2.5, unit.y - 0.5
+        error = self.placement_error(unit.owner, item, x, y)
+        if error != SUCCESS:
+            return error
+        cost = self.cost(unit.owner, item)
+        error = self._pay(unit.owner, *cost)
+        if error == SUCCESS:
+            addon = self.spawn(item, unit.owner, x, y, progress=0.0)
+            unit.add_on = addon.tag
+            unit.orders = [Order(info["ability"], "addon", tag=addon.tag, cost=cost)]
+        return error
+
+    def _build(self, worker: SimUnit, item: UnitTypeId, info: dict, point, target: Optional[SimUnit], queue: bool) -> int:
+        if item in GAS_BUILDINGS:
+            if target is None or target.type not in GEYSERS or self._gas_on(target) is not None:
+                return error_pb2.CantBuildLocationInvalid
+            point = target.pos
+        elif point is None:
+            return error_pb2.CantBuildLocationInvalid
+        else:
+            error = self.placement_error(worker.owner, item, *point)
+            if error != SUCCESS:
+                return error
+        error = self._requirements(worker, info)
+        if error != SUCCESS:
+            return error
+        # Checked now, paid once the worker places it like in game
+        cost = self.cost(worker.owner, item)
+        player = self.players[worker.owner]
+        if player.minerals < cost[0]:
+            return error_pb2.NotEnoughMinerals
+        if player.vespene < cost[1]:
+            return error_pb2.NotEnoughVespene
+        return self._give(worker, Order(info["ability"], "build", point, target.tag if target else 0, item, cost=cost),
+                          queue)
+
+    def _gas_on(self, geyser: SimUnit) -> Optional[SimUnit]:
+        for unit in self.units.values():
+            if unit.type in GAS_BUILDINGS and unit.x == geyser.x and unit.y == geyser.y:
+                return unit
+        return None
+
+    # Simulation
+
+    def advance(self, count: int):
+        """ Run count game loops. """
+        for _ in range(count):
+            if self.result is not None:
+                return
+            self._tick()
+
+    def _tick(self):
+        self.loop += 1
+        self._last_miners, self._miners = self._miners, Counter()
+        self._by_owner = {p: self.owned(p) for p in self.players}
+        for unit in list(self.units.values()):
+            if unit.tag in self.units:
+                self._update(unit)
+        if self.loop % int(loops(AI_INTERVAL)) == 0:
+            self.ai.act()
+        if self.loop % 16 == 0:
+            self._check_end()
+
+    def _check_end(self):
+        alive = {p: any(u.structure for u in self._by_owner[p] if u.tag in self.units) for p in self.players}
+        if all(alive.values()) and self.loop < self.max_loops:
+            return
+        if all(alive.values()) or not any(alive.values()):
+            self.result = {p: sc2api_pb2.Tie for p in self.players}
+        else:
+            self.result = {p: sc2api_pb2.Victory if alive[p] else sc2api_pb2.Defeat for p in self.players}
+
+    def _update(self, unit: SimUnit):
+        if unit.expires and self.loop >= unit.expires:
+            self.remove(unit)
+            return
+        if unit.cooldown > 0:
+            unit.cooldown -= 1
+        if unit.energy_max and unit.progress >= 1:
+            unit.energy = min(unit.energy_max, unit.energy + ENERGY_REGEN / LOOPS_PER_SECOND)
+        if unit.buffs:
+            self._buffs(unit)
+        if unit.progress < 1:
+            unit.progress = min(1.0, unit.progress + 1 / max(unit.build_time, 1))
+            unit.hp = min(unit.hp_max, unit.hp + 0.9 * unit.hp_max / max(unit.build_time, 1))
+            if unit.progress >= 1:
+                self._completed(unit)
+            return
+        if unit.type in (U.HATCHERY, U.LAIR, U.HIVE):
+            unit.timer += 1
+            if unit.timer >= loops(LARVA_INTERVAL):
+                unit.timer = 0
+                if sum(1 for u in self._by_owner[unit.owner] if u.home == unit.tag and u.tag in self.units) < 3:
+                    self._spawn_larva(unit)
+        if not unit.orders:
+            if unit.owner and stats(unit.type).weapons and unit.type not in WORKERS and self.loop % 4 == unit.tag % 4:
+                self._auto_attack(unit)
+            return
+
+        order = unit.orders[0]
+        if order.kind in ("train", "research", "morph"):
+            rate = 1.5 if BuffId.CHRONOBOOSTENERGYCOST.value in unit.buffs else 1.0
+            addon = self.units.get(unit.add_on)
+            parallel = 2 if addon is not None and addon.type in REACTORS and addon.progress >= 1 else 1
+            for order in unit.orders[:parallel]:
+                if order.kind in ("train", "research", "morph"):
+                    order.left -= rate
+            for order in [o for o in unit.orders[:parallel] if o.left <= 0]:
+                unit.orders.remove(order)
+                self._produced(unit, order)
+        elif order.kind == "egg":
+            order.left -= 1
+            if order.left <= 0:
+                self._hatch(unit, order)
+        elif order.kind == "move":
+            spot = self._spot(order)
+            if spot is None or self._move(unit, spot, 0.5 if order.point else unit.radius + 1):
+                unit.orders.pop(0)
+        elif order.kind == "attack":
+            self._attack(unit, order)
+        elif order.kind == "gather":
+            self._gather(unit, order)
+        elif order.kind == "build":
+            self._construct(unit, order)
+        elif order.kind == "land":
+            self._land(unit, order)
+        elif order.kind == "construct" and order.tag not in self.units:
+            unit.orders.pop(0)
+        elif order.kind == "addon" and order.tag not in self.units:
+            unit.orders.pop(0)
+            unit.add_on = 0
+
+    def _buffs(self, unit: SimUnit):
+        for buff, until in list(unit.buffs.items()):
+            if self.loop >= until:
+                del unit.buffs[buff]
+                if buff == BuffId.QUEENSPAWNLARVATIMER.value:
+                    for _ in range(3):
+                        self._spawn_larva(unit)
+
+    def _completed(self, unit: SimUnit):
+        unit.hp = unit.hp_max
+        self._release(unit)
+
+    def _release(self, unit: SimUnit):
+        """ Drop the construct and addon orders on a structure that is done or gone. """
+        for other in self._by_owner.get(unit.owner, []):
+            for order in list(other.orders):
+                if order.tag == unit.tag and order.kind in ("construct", "addon"):
+                    other.orders.remove(order)
+
+    def _produced(self, producer: SimUnit, order: Order):
+        player = self.players[producer.owner]
+        if order.kind == "research":
+            player.upgrades.add(order.item)
+        elif order.kind == "morph":
+            s = stats(order.item)
+            producer.type = order.item
+            producer.hp_max, producer.shield_max = s.hp, s.shield
+            if s.energy and not producer.energy_max:
+                producer.energy, producer.energy_max = s.energy, 200
+        else:
+            angle = self.rng.uniform(0, 2 * math.pi)
+            distance = producer.radius + stats(order.item).radius + 0.5
+            x, y = self.map.clamp(producer.x + distance * math.cos(angle), producer.y + distance * math.sin(angle))
+            unit = self.spawn(order.item, producer.owner, x, y)
+            if unit.type in WORKERS:
+                mineral = self._nearest(unit, lambda u: u.type in MINERALS, 12)
+                if mineral is not None:
+                    unit.orders = [Order(A.HARVEST_GATHER, "gather", tag=mineral.tag)]
+
+    def _hatch(self, egg: SimUnit, order: Order):
+        # The egg turns into the (first) unit and keeps its tag, the second zergling is new
+        self.remove(egg, died=False)
+        for i in range(2 if order.item == U.ZERGLING else 1):
+            self.spawn(order.item, egg.owner, egg.x + 0.4 * i, egg.y, tag=None if i else egg.tag)
+
+    def _spot(self, order: Order) -> Optional[Tuple[float, float]]:
+        if order.point is not None:
+            return order.point
+        target = self.units.get(order.tag)
+        return target.pos if target is not None else None
+
+    def _move(self, unit: SimUnit, spot: Tuple[float, float], arrive: float) -> bool:
+        """ Step toward spot, True once within arrive of it. """
+        distance = unit.distance(spot)
+        if distance <= arrive:
+            return True
+        speed = stats(VARIANTS.get(unit.type, unit.type)).speed or (1.0 if unit.flying else 0)
+        step = speed * 1.4 / LOOPS_PER_SECOND
+        if step <= 0:
+            return True
+        f = min(1.0, step / distance)
+        unit.x, unit.y = self.map.clamp(unit.x + (spot[0] - unit.x) * f, unit.y + (spot[1] - unit.y) * f)
+        return distance - step <= arrive
+
+    # Combat
+
+    def _weapon(self, unit: SimUnit, target: SimUnit):
+        for weapon in stats(unit.type).weapons:
+            if weapon.target == ANY or (weapon.target == AIR) == target.flying:
+                return weapon
+        return None
+
+    def _in_range(self, unit: SimUnit, target: SimUnit, weapon) -> bool:
+        return unit.distance(target) <= weapon.range + unit.radius + target.radius
+
+    def _fire(self, unit: SimUnit, target: SimUnit, weapon):
+        if unit.cooldown > 0:
+            return
+        unit.cooldown = weapon.cooldown * LOOPS_PER_SECOND
+        damage = weapon.damage
+        if weapon.bonus and weapon.bonus[0] in stats(target.type).attributes:
+            damage += weapon.bonus[1]
+        self._damage(target, weapon.attacks * max(0.5, damage - stats(target.type).armor))
+
+    def _damage(self, target: SimUnit, amount: float):
+        absorbed = min(target.shield, amount)
+        target.shield -= absorbed
+        target.hp -= amount - absorbed
+        if target.hp <= 0:
+            self.remove(target)
+
+    def _enemy_near(self, unit: SimUnit, radius: float) -> Optional[SimUnit]:
+        best, best_distance = None, radius
+        for owner, units in self._by_owner.items():
+            if owner == unit.owner:
+                continue
+            for other in units:
+                if other.tag in self.units and self._weapon(unit, other) is not None:
+                    d = unit.distance(other) - other.radius
+                    if d < best_distance:
+                        best, best_distance = other, d
+        return best
+
+    def _auto_attack(self, unit: SimUnit):
+        reach = max(w.range for w in stats(unit.type).weapons) + unit.radius + (0.5 if unit.structure else 2)
+        enemy = self._enemy_near(unit, reach)
+        if enemy is None:
+            return
+        weapon = self._weapon(unit, enemy)
+        if self._in_range(unit, enemy, weapon):
+            self._fire(unit, enemy, weapon)
+        elif not unit.structure:
+            self._move(unit, enemy.pos, 0)
+
+    def _attack(self, unit: SimUnit, order: Order):
+        if order.tag:
+            target = self.units.get(order.tag)
+            weapon = self._weapon(unit, target) if target is not None else None
+            if weapon is None:
+                unit.orders.pop(0)
+            elif self._in_range(unit, target, weapon):
+                self._fire(unit, target, weapon)
+            else:
+                self._move(unit, target.pos, 0)
+            return
+        target = self.units.get(unit.engaged)
+        if target is None or unit.distance(target) > 12:
+            target = self._enemy_near(unit, 10) if self.loop % 4 == unit.tag % 4 else None
+            unit.engaged = target.tag if target is not None else 0
+        if target is not None:
+            weapon = self._weapon(unit, target)
+            if self._in_range(unit, target, weapon):
+                self._fire(unit, target, weapon)
+            else:
+                self._move(unit, target.pos, 0)
+        elif self._move(unit, order.point, 1):
+            unit.orders.pop(0)
+
+    # Economy
+
+    def _gather(self, worker: SimUnit, order: Order):
+        resource = self.units.get(order.tag)
+        if resource is None:
+            resource = self._nearest(worker, lambda u: u.type in MINERALS, 12)
+            if resource is None:
+                worker.orders.pop(0)
+                return
+            order.tag = resource.tag
+        if not self._move(worker, resource.pos, resource.radius + worker.radius + 0.3):
+            return
+        player = self.players[worker.owner]
+        if resource.type in MINERALS:
+            if worker.type == U.MULE:
+                rate = MULE_RATE
+            else:
+                if self._miners[resource.tag] >= 2 and self._bounce(worker, order, resource):
+                    return
+                self._miners[resource.tag] += 1
+                n = self._miners[resource.tag]
+                rate = MINERAL_RATE if n <= 2 else MINERAL_RATE_OVERSATURATED if n == 3 else 0
+            amount = min(rate / LOOPS_PER_SECOND, resource.minerals)
+            resource.minerals -= amount
+            player.minerals += amount
+            player.collected[0] += amount
+            if resource.minerals <= 0:
+                self.remove(resource)
+        else:
+            self._miners[resource.tag] += 1
+            rate = GAS_RATE if self._miners[resource.tag] <= WORKERS_PER_GAS else 0
+            amount = min(rate / LOOPS_PER_SECOND, resource.vespene)
+            resource.vespene -= amount
+            player.vespene += amount
+            player.collected[1] += amount
+
+    def _bounce(self, worker: SimUnit, order: Order, mineral: SimUnit) -> bool:
+        """ Move on to a nearby patch with room, like workers spread over a mineral line in game. """
+        def free(u: SimUnit) -> bool:
+            return u.type in MINERALS and max(self._miners[u.tag], self._last_miners[u.tag]) < 2
+
+        other = self._nearest(mineral, free, 8)
+        if other is None:
+            return False
+        order.tag = other.tag
+        self._miners[other.tag] += 1
+        return True
+
+    def _construct(self, worker: SimUnit, order: Order):
+        item = order.item
+        if not self._move(worker, order.point, stats(item).radius + worker.radius + 0.5):
+            return
+        worker.orders.pop(0)
+        geyser = self.units.get(order.tag)
+        if item in GAS_BUILDINGS:
+            ok = geyser is not None and self._gas_on(geyser) is None
+        else:
+            ok = self.placement_error(worker.owner, item, *order.point) == SUCCESS
+        if not ok or self._pay(worker.owner, *order.cost) != SUCCESS:
+            return
+        race = self.players[worker.owner].race
+        tag = None
+        if race == ZERG:
+            self.remove(worker, died=False)
+            tag = worker.tag
+        structure = self.spawn(item, worker.owner, *order.point, progress=0.0, tag=tag)
+        if geyser is not None:
+            structure.vespene = geyser.vespene
+        if race == TERRAN:
+            worker.orders.insert(0, Order(order.ability, "construct", order.point, structure.tag))
+
+    def _land(self, unit: SimUnit, order: Order):
+        if not self._move(unit, order.point, 0.1):
+            return
+        unit.orders.pop(0)
+        landed = LANDED[unit.type]
+        if self.placement_error(unit.owner, landed, *order.point) != SUCCESS:
+            return
+        unit.type, unit.flying = landed, False
+        unit.x, unit.y = order.point
+        self._block(unit, True)
+        for other in self._by_owner.get(unit.owner, []):
+            if other.type in ADDONS and other.x == unit.x + 2.5 and other.y == unit.y - 0.5:
+                unit.add_on = other.tag
+
+    # Observation
+
+    def harvesters(self, unit: SimUnit) -> Tuple[int, int]:
+        """ (assigned, ideal) like the game reports for townhalls and gas buildings. """
+        gathering = [o.tag for u in self._by_owner.get(unit.owner, []) if u.type in WORKERS for o in u.orders[:1]
+                     if o.kind == "gather"]
+        if unit.progress < 1:
+            return 0, 0
+        if unit.type in GAS_BUILDINGS:
+            return gathering.count(unit.tag), WORKERS_PER_GAS if unit.vespene > 0 else 0
+        patches = [u.tag for u in self.units.values() if u.type in MINERALS and unit.distance(u) < 10]
+        return sum(1 for tag in gathering if tag in patches), 2 * len(patches)
+
+    def available_abilities(self, unit: SimUnit, ignore_resources: bool = True) -> List[AbilityId]:
+        if unit.progress < 1 or unit.owner == 0:
+            return []
+        abilities = []
+        if not unit.structure:
+            abilities += [A.SMART, A.MOVE, A.STOP, A.HOLDPOSITION, A.PATROL]
+            if stats(unit.type).weapons:
+                abilities.append(A.ATTACK)
+            if unit.type in WORKERS:
+                abilities += [A.HARVEST_GATHER, A.HARVEST_RETURN]
+        player = self.players[unit.owner]
+        items = {**TRAIN_INFO.get(unit.type, {}), **EXTRA_INFO.get(unit.type, {})}
+        if not unit.flying and not (unit.structure and unit.orders and unit.type not in TRAIN_INFO):
+            for item, info in items.items():
+                if unit.type == U.WARPGATE and unit.ready_at.get(A.MORPH_WARPGATE, 0) > self.loop:
+                    break
+                if self._requirements(unit, info) != SUCCESS:
+                    continue
+                if not ignore_resources:
+                    minerals, vespene = self.cost(unit.owner, item)
+                    if player.minerals < minerals or player.vespene < vespene:
+                        continue
+                abilities.append(info["ability"])
+            busy = {o.item for u in self._by_owner.get(unit.owner, []) for o in u.orders}
+            for upgrade, info in RESEARCH_INFO.get(unit.type, {}).items():
+                if upgrade not in player.upgrades and upgrade not in busy and self._requirements(unit, info) == SUCCESS:
+                    abilities.append(info["ability"])
+        if unit.type in FLYING and not unit.orders:
+            abilities.append(getattr(A, f"LIFT_{unit.type.name}"))
+        if unit.type in LANDED:
+            abilities.append(getattr(A, f"LAND_{LANDED[unit.type].name}"))
+        if unit.type == U.SUPPLYDEPOT:
+            abilities.append(A.MORPH_SUPPLYDEPOT_LOWER)
+        if unit.type == U.SUPPLYDEPOTLOWERED:
+            abilities.append(A.MORPH_SUPPLYDEPOT_RAISE)
+        if unit.type == U.ORBITALCOMMAND and unit.energy >= 50:
+            abilities.append(A.CALLDOWNMULE_CALLDOWNMULE)
+        if unit.type == U.NEXUS and unit.energy >= 50:
+            abilities.append(A.EFFECT_CHRONOBOOSTENERGYCOST)
+        if unit.type == U.QUEEN and unit.energy >= 25:
+            abilities.append(A.EFFECT_INJECTLARVA)
+        if unit.type == U.REAPER and unit.ready_at.get(A.KD8CHARGE_KD8CHARGE, 0) <= self.loop:
+            abilities.append(A.KD8CHARGE_KD8CHARGE)
+        return abilities
+
+    def _unit_proto(self, unit: SimUnit, player: int) -> raw_pb2.Unit:
+        """ Proto of unit as player sees it, reused while nothing it shows changed. Building protos is most of an
+        observation's cost with the pure python protobuf runtime. """
+        powered = unit.structure and unit.owner != 0 and self.players[unit.owner].race == PROTOSS \
+            and self.powered(unit.owner, unit.x, unit.y)
+        harvesters = self.harvesters(unit) if unit.owner == player and (
+            unit.type in TOWNHALLS or unit.type in GAS_BUILDINGS) else None
+        key = (player, unit.type, unit.x, unit.y, unit.hp, unit.shield, unit.energy, unit.progress, int(unit.minerals),
+               int(unit.vespene), unit.cooldown, unit.add_on, unit.flying, powered, harvesters,
+               tuple((o.ability, o.progress, o.point, o.tag) for o in unit.orders),
+               tuple(unit.buffs.items()) and (self.loop, tuple(unit.buffs.items())))
+        cached = self._protos.get(unit.tag)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        height = -16 + 32 * float(self.map.terrain[int(unit.y), int(unit.x)]) / 255
+        proto = raw_pb2.Unit(
+            display_type=raw_pb2.Visible, tag=unit.tag, unit_type=unit.type.value, owner=unit.owner or 16,
+            alliance=raw_pb2.Self if unit.owner == player else raw_pb2.Neutral if unit.owner == 0 else raw_pb2.Enemy,
+            pos=common_pb2.Point(x=unit.x, y=unit.y, z=height + (3 if unit.flying else 0)), facing=0,
+            radius=unit.radius, build_progress=unit.progress, cloak=raw_pb2.NotCloaked, is_flying=unit.flying,
+            health=max(unit.hp, 0), health_max=unit.hp_max, shield=unit.shield, shield_max=unit.shield_max,
+            energy=unit.energy, energy_max=unit.energy_max, weapon_cooldown=max(unit.cooldown, 0),
+            add_on_tag=unit.add_on, is_powered=powered,
+        )
+        if unit.type in MINERALS:
+            proto.mineral_contents = int(unit.minerals)
+        if unit.type in GEYSERS or unit.type in GAS_BUILDINGS:
+            proto.vespene_contents = int(unit.vespene)
+        if unit.owner == player:
+            proto.is_active = any(o.kind in ("train", "research", "morph") for o in unit.orders)
+            for order in unit.orders:
+                o = proto.orders.add(ability_id=order.ability.value, progress=order.progress)
+                if order.point is not None:
+                    o.target_world_space_pos.x, o.target_world_space_pos.y = order.point
+                elif order.tag:
+                    o.target_unit_tag = order.tag
+            if harvesters is not None:
+                proto.assigned_harvesters, proto.ideal_harvesters = harvesters
+        for buff, until in unit.buffs.items():
+            proto.buff_ids.append(buff)
+            proto.buff_duration_remain = int(until - self.loop)
+        self._protos[unit.tag] = (key, proto)
+        return proto
+
+    def observation(self, player: int) -> sc2api_pb2.ResponseObservation:
+        self._by_owner = {p: self.owned(p) for p in self.players}
+        state = self.players[player]
+        response = sc2api_pb2.ResponseObservation()
+        obs = response.observation
+        obs.game_loop = self.loop
+        own = self._by_owner[player]
+        workers = [u for u in own if u.type in WORKERS]
+        army = [u for u in own if not u.structure and u.type not in WORKERS | {U.LARVA, U.EGG, U.OVERLORD, U.MULE}]
+        food_workers = sum(stats(u.type).food for u in workers)
+        food_used = self.food_used(player)
+        obs.player_common.CopyFrom(sc2api_pb2.PlayerCommon(
+            player_id=player, minerals=int(state.minerals), vespene=int(state.vespene),
+            food_cap=int(self.food_cap(player)), food_used=int(food_used), food_workers=int(food_workers),
+            food_army=int(food_used - food_workers), idle_worker_count=sum(1 for u in workers if not u.orders),
+            army_count=len(army), warp_gate_count=sum(1 for u in own if u.type == U.WARPGATE),
+            larva_count=sum(1 for u in own if u.type == U.LARVA),
+        ))
+        score = obs.score
+        score.score_type = 2
+        score.score = int(state.collected[0] + state.collected[1])
+        details = score.score_details
+        details.collected_minerals, details.collected_vespene = state.collected
+        details.spent_minerals, details.spent_vespene = state.spent
+        details.killed_value_units, details.killed_value_structures = state.killed
+        for unit in own:
+            s = stats(unit.type)
+            if unit.structure:
+                details.total_value_structures += s.minerals + s.vespene
+            else:
+                details.total_value_units += s.minerals + s.vespene
+
+        raw = obs.raw_data
+        raw.player.upgrade_ids.extend(u.value for u in sorted(state.upgrades, key=lambda u: u.value))
+        raw.player.camera.x, raw.player.camera.y = state.start
+        for unit in own:
+            if unit.type == U.PYLON and unit.progress >= 1:
+                raw.player.power_sources.add(pos=common_pb2.Point(x=unit.x, y=unit.y), radius=PYLON_RADIUS,
+                                             tag=unit.tag)
+        raw.units.extend(self._unit_proto(u, player) for u in self.units.values())
+        raw.event.dead_units.extend(state.dead)
+        state.dead.clear()
+        raw.map_state.visibility.CopyFrom(_image(np.where(self.map.pathing, 2, 0).astype(np.uint8), 8))
+        raw.map_state.creep.CopyFrom(_image(self.creep(), 1))
+        if self.result is not None:
+            for p, result in sorted(self.result.items()):
+                response.player_result.add(player_id=p, result=result)
+        return response
+
+    def game_info(self, player: int, local_map_path: str = "", options=None) -> sc2api_pb2.ResponseGameInfo:
+        info = sc2api_pb2.ResponseGameInfo(map_name=self.map.name, local_map_path=local_map_path)
+        for p, state in sorted(self.players.items()):
+            entry = info.player_info.add(player_id=p, race_requested=state.race, race_actual=state.race)
+            if p == self.ai.player:
+                entry.type, entry.difficulty = sc2api_pb2.Computer, self.ai.difficulty
+            else:
+                entry.type = sc2api_pb2.Participant
+        raw = info.start_raw
+        raw.map_size.x = raw.map_size.y = self.map.size
+        raw.pathing_grid.CopyFrom(_image(self.pathing(), 1))
+        raw.placement_grid.CopyFrom(_image(self.map.placement, 1))
+        raw.terrain_height.CopyFrom(_image(self.map.terrain, 8))
+        x0, y0, x1, y1 = self.map.playable
+        raw.playable_area.p0.x, raw.playable_area.p0.y, raw.playable_area.p1.x, raw.playable_area.p1.y = x0, y0, x1, y1
+        for p, state in sorted(self.players.items()):
+            if p != player:
+                raw.start_locations.add(x=state.start[0], y=state.start[1])
+        if options is not None:
+            info.options.CopyFrom(options)
+        return info
+
+    def replay(self) -> bytes:
+        """ Stand-in replay: the setup, the outcome and a digest of every command, equal digests mean equal games. """
+        summary = {
+            "map": self.map.name, "seed": self.seed, "loops": self.loop, "commands": self.commands,
+            "races": {p: s.race for p, s in self.players.items()}, "difficulty": self.ai.difficulty,
+            "result": self.result, "digest": self.digest.hexdigest(),
+        }
+        return b"FAKE_SC2_REPLAY\n" + json.dumps(summary, sort_keys=True).encode()
+
+
+def _image(grid: np.ndarray, bits: int) -> common_pb2.ImageData:
+    """ ImageData of a [y, x] grid, 1 bit per pixel for bool grids like the game sends them. """
+    data = np.packbits(grid.astype(bool)).tobytes() if bits == 1 else grid.astype(np.uint8).tobytes()
+    return common_pb2.ImageData(bits_per_pixel=bits, size=common_pb2.Size2DI(x=grid.shape[1], y=grid.shape[0]),
+                                data=data)
+
+
+class ScriptedOpponent:
+    """ Built-in AI stand-in: saturates one base, keeps supply up, builds a few production buildings of its race's
+    basic unit and attacks in waves. Higher difficulties build more production and attack with bigger waves. """
+
+    def __init__(self, world: World, player: int, difficulty: int = 3):
+        self.world = world
+        self.player = player
+        self.difficulty = difficulty
+        self.race = world.players[player].race
+        self.production = 1 + difficulty // 2
+        self.wave = 8 + 2 * difficulty
+        self.attacking = False
+
+    def _site(self, unit_type: UnitTypeId, near: Tuple[float, float]) -> Optional[Tuple[float, float]]:
+        world = self.world
+        center = world.map.size / 2
+        toward = math.atan2(center - near[1], center - near[0])
+        offset = 0.5 if stats(unit_type).size % 2 else 0.0
+        for radius in range(5, 14):
+            for k in range(10):
+                angle = toward + (k - 4.5) * 0.35 + world.rng.uniform(-0.1, 0.1)
+                x = math.floor(near[0] + radius * math.cos(angle)) + offset
+                y = math.floor(near[1] + radius * math.sin(angle)) + offset
+                if world.placement_error(self.player, unit_type, x, y) == SUCCESS:
+                    return x, y
+        return None
+
+    def _build(self, unit_type: UnitTypeId, workers: List[SimUnit], near):
+        world = self.world
+        if not workers or sum(world.cost(self.player, unit_type)) > world.players[self.player].minerals:
+            return
+        site = self._site(unit_type, near)
+        if site is not None:
+            worker = workers.pop()
+            ability = TRAIN_INFO[worker.type][unit_type]["ability"]
+            world.command(self.player, [worker.tag], ability, point=site)
+
+    def act(self):
+        world, p = self.world, self.player
+        townhall_type, worker_type, supply_type, production_type, army_type = RACE_UNITS[self.race]
+        own = world.owned(p)
+        halls = [u for u in own if u.type in TOWNHALLS]
+        if not halls:
+            return
+        hall = halls[0]
+        workers = [u for u in own if u.type == worker_type]
+        idle = [u for u in workers if not u.orders]
+        for worker in idle:
+            mineral = world._nearest(worker, lambda u: u.type in MINERALS, 15)  # pylint: disable=W0212
+            if mineral is not None:
+                world.command(p, [worker.tag], A.HARVEST_GATHER, target=mineral.tag)
+        builders = [u for u in workers if u.orders and u.orders[0].kind == "gather"]
+        pending = Counter(o.item for u in own for o in u.orders if o.kind in ("build", "egg", "train"))
+        pending.update(u.type for u in own if u.progress < 1)
+        larva = [u for u in own if u.type == U.LARVA]
+
+        def make(unit_type: UnitTypeId):
+            if self.race == ZERG:
+                if larva:
+                    world.command(p, [larva.pop().tag], TRAIN_INFO[U.LARVA][unit_type]["ability"])
+            else:
+                for producer in own:
+                    if producer.progress >= 1 and not producer.orders and unit_type in TRAIN_INFO.get(producer.type, {}):
+                        world.command(p, [producer.tag], TRAIN_INFO[producer.type][unit_type]["ability"])
+                        return
+
+        # Supply first, then workers, production and army
+        if world.food_cap(p) - world.food_used(p) < 4 and not pending[supply_type] and world.food_cap(p) < 200:
+            if self.race == ZERG:
+                make(supply_type)
+            else:
+                self._build(supply_type, builders, hall.pos)
+        if len(workers) + pending[worker_type] < 16:
+            make(worker_type)
+        productions = [u for u in own if u.type == production_type]
+        if len(productions) + pending[production_type] < self.production:
+            near = hall.pos
+            if self.race == PROTOSS:
+                pylons = [u for u in own if u.type == U.PYLON and u.progress >= 1]
+                near = pylons[0].pos if pylons else None
+            if near is not None:
+                self._build(production_type, builders, near)
+        if any(u.progress >= 1 for u in productions):
+            for _ in range(3 if self.race == ZERG else len(productions)):
+                make(army_type)
+
+        # Defend the base, otherwise attack in waves
+        army = [u for u in own if u.type == army_type and u.progress >= 1]
+        enemies = [u for o, units in world._by_owner.items() if o != p for u in units  # pylint: disable=W0212
+                   if u.tag in world.units and hall.distance(u) < 20]
+        if enemies and army:
+            target = min(enemies, key=hall.distance)
+            world.command(p, [u.tag for u in army], A.ATTACK, point=target.pos)
+        elif len(army) >= self.wave or (self.attacking and army):
+            self.attacking = True
+            idle_army = [u.tag for u in army if not u.orders]
+            if idle_army:
+                targets = [u for o, units in world._by_owner.items() if o not in (0, p)  # pylint: disable=W0212
+                           for u in units if u.structure and u.tag in world.units]
+                spot = targets[0].pos if targets else world.players[3 - p].start
+                world.command(p, idle_army, A.ATTACK, point=spot)
+
+
+class Session:
+    """ One websocket connection, like one SC2 process: launched -> init_game -> in_game -> ended -> launched. """
+
+    def __init__(self, server: "FakeSC2Server"):
+        self.server = server
+        self.status = sc2api_pb2.launched
+        self.world: Optional[World] = None
+        self.setup: Optional[sc2api_pb2.RequestCreateGame] = None
+        self.options = None
+        self.game = 0
+        self.crash_at: Optional[int] = None
+        self.closing = False
+
+    def handle(self, request: sc2api_pb2.Request) -> sc2api_pb2.Response:
+        kind = request.WhichOneof("request")
+        response = sc2api_pb2.Response(id=request.id)
+        started = time.perf_counter()
+        handler = getattr(self, f"_{kind}", None)
+        if handler is None:
+            response.error.append(f"Request {kind} is not supported by the fake server")
+        else:
+            handler(getattr(request, kind), response)
+        response.status = self.status
+        self.server.record(kind, time.perf_counter() - started)
+        return response
+
+    def _need_game(self, response) -> bool:
+        if self.world is None:
+            response.error.append("No game running")
+            return False
+        return True
+
+    def _ping(self, request, response):
+        response.ping.game_version = "5.0.14.fake"
+        response.ping.data_version = "fake"
+        response.ping.data_build = BASE_BUILD
+        response.ping.base_build = BASE_BUILD
+
+    def _create_game(self, request, response):
+        types = sorted(p.type for p in request.player_setup)
+        if self.status != sc2api_pb2.launched:
+            response.create_game.error = sc2api_pb2.ResponseCreateGame.InvalidMapData
+            response.create_game.error_details = "A game is already running, leave it first"
+        elif types != [sc2api_pb2.Participant, sc2api_pb2.Computer]:
+            response.create_game.error = sc2api_pb2.ResponseCreateGame.InvalidPlayerSetup
+            response.create_game.error_details = "The fake server hosts one bot against the built-in AI"
+        else:
+            response.create_game.SetInParent()
+            self.setup = request
+            self.status = sc2api_pb2.init_game
+
+    def _join_game(self, request, response):
+        if self.status != sc2api_pb2.init_game:
+            response.error.append("No game created")
+            return
+        computer = next(p for p in self.setup.player_setup if p.type == sc2api_pb2.Computer)
+        self.world = World(self.server.map, {1: request.race, 2: computer.race}, computer.difficulty,
+                           self.setup.random_seed, self.server.max_loops)
+        self.options = request.options
+        self.game = self.server.game_started()
+        if self.server.crash_every and self.game % self.server.crash_every == 0:
+            self.crash_at = self.server.crash_loop
+        response.join_game.player_id = 1
+        self.status = sc2api_pb2.in_game
+
+    def _game_info(self, request, response):
+        if self._need_game(response):
+            response.game_info.CopyFrom(self.world.game_info(1, self.setup.local_map.map_path, self.options))
+
+    def _data(self, request, response):
+        response.data.CopyFrom(game_data())
+
+    def _observation(self, request, response):
+        if not self._need_game(response):
+            return
+        if request.game_loop > self.world.loop:
+            self._advance(request.game_loop - self.world.loop)
+        response.observation.CopyFrom(self.world.observation(1))
+
+    def _advance(self, count: int):
+        started = time.perf_counter()
+        before = self.world.loop
+        self.world.advance(count)
+        self.server.simulated(self.world.loop - before, time.perf_counter() - started)
+        if self.world.result is not None and self.status == sc2api_pb2.in_game:
+            self.status = sc2api_pb2.ended
+            self.server.game_ended(self)
+
+    def _step(self, request, response):
+        if not self._need_game(response):
+            return
+        if self.status == sc2api_pb2.ended:
+            response.error.append("Game has already ended")
+            return
+        self._advance(max(request.count, 1))
+        response.step.simulation_loop = self.world.loop
+        if self.crash_at is not None and self.world.loop >= self.crash_at:
+            self.closing = True
+
+    def _action(self, request, response):
+        response.action.SetInParent()
+        for action in request.actions:
+            result = SUCCESS
+            if self.world is not None and action.HasField("action_raw") and action.action_raw.HasField("unit_command"):
+                command = action.action_raw.unit_command
+                point = (command.target_world_space_pos.x, command.target_world_space_pos.y) \
+                    if command.HasField("target_world_space_pos") else None
+                try:
+                    ability = AbilityId(command.ability_id)
+                except ValueError:
+                    result = error_pb2.NotSupported
+                else:
+                    result = self.world.command(1, list(command.unit_tags), ability, point, command.target_unit_tag,
+                                                command.queue_command)
+            response.action.result.append(result)
+
+    def _query(self, request, response):
+        response.query.SetInParent()
+        if not self._need_game(response):
+            return
+        world = self.world
+        pathing = world.pathing()
+        for q in request.pathing:
+            unit = world.units.get(q.unit_tag)
+            start = unit.pos if unit is not None else (q.start_pos.x, q.start_pos.y)
+            end = (q.end_pos.x, q.end_pos.y)
+            reachable = world.map.in_bounds(*end) and (pathing[int(end[1]), int(end[0])]
+                                                       or (unit is not None and unit.flying))
+            response.query.pathing.add(distance=math.hypot(end[0] - start[0], end[1] - start[1]) if reachable else 0)
+        for q in request.abilities:
+            unit = world.units.get(q.unit_tag)
+            entry = response.query.abilities.add(unit_tag=q.unit_tag)
+            if unit is not None and unit.owner == 1:
+                entry.unit_type_id = unit.type.value
+                for ability in world.available_abilities(unit, request.ignore_resource_requirements):
+                    entry.abilities.add(ability_id=ability.value)
+        for q in request.placements:
+            unit_type = _placed_type(q.ability_id)
+            result = error_pb2.Error if unit_type is None else world.placement_error(1, unit_type, q.target_pos.x,
+                                                                                     q.target_pos.y)
+            response.query.placements.add(result=result)
+
+    def _debug(self, request, response):
+        # Like SC2, draws are refused once the game was left
+        if self._need_game(response):
+            response.debug.SetInParent()
+
+    def _save_replay(self, request, response):
+        if self._need_game(response):
+            response.save_replay.data = self.world.replay()
+
+    def _leave_game(self, request, response):
+        response.leave_game.SetInParent()
+        if self.world is not None and self.world.result is None:
+            self.server.game_ended(self, left=True)
+        self.world = None
+        self.crash_at = None
+        self.status = sc2api_pb2.launched
+
+    def _quit(self, request, response):
+        response.quit.SetInParent()
+        self.status = sc2api_pb2.quit
+        self.closing = True
+
+    def _available_maps(self, request, response):
+        response.available_maps.local_map_paths.append(f"{self.server.map.name}.SC2Map")
+
+
+_PLACED: Dict[int, UnitTypeId] = {}
+
+
+def _placed_type(ability_id: int) -> Optional[UnitTypeId]:
+    """ Structure a placement query's ability builds or lands. """
+    if not _PLACED:
+        for producer, items in TRAIN_INFO.items():
+            for item, info in items.items():
+                if item in STRUCTURES and producer in WORKERS:
+                    _PLACED.setdefault(info["ability"].value, item)
+                    _PLACED.setdefault(generic(info["ability"]).value, item)
+        for flying, landed in LANDED.items():
+            _PLACED[getattr(A, f"LAND_{landed.name}").value] = landed
+    return _PLACED.get(ability_id)
+
+
+class FakeSC2Server:
+    """ Serves the s2clientprotocol websocket API at /sc2api backed by World, plus GET /stats with request counts,
+    server side time per request type and simulation speed.
+
+    Each connection is one fake SC2 process hosting one game at a time, so runner.py --server host:port (and the
+    client pool) work unchanged. crash_every=n drops the connection of every n-th game once it reaches crash_loop,
+    like a game process dying mid game. """
+
+    def __init__(self, fake_map: Optional[FakeMap] = None, max_loops: int = int(loops(30 * 60)), crash_every: int = 0,
+                 crash_loop: int = 2000):
+        self.map = fake_map or FakeMap()
+        self.max_loops = max_loops
+        self.crash_every = crash_every
+        self.crash_loop = crash_loop
+        self.games = 0
+        self.finished = 0
+        self.crashes = 0
+        self.results: Counter = Counter()
+        self.requests: Counter = Counter()
+        self.request_seconds: Dict[str, float] = defaultdict(float)
+        self.loops = 0
+        self.sim_seconds = 0.0
+        self.app = web.Application()
+        self.app.add_routes([web.get("/sc2api", self._websocket), web.get("/stats", self._stats)])
+
+    def record(self, kind: str, seconds: float):
+        self.requests[kind] += 1
+        self.request_seconds[kind] += seconds
+
+    def simulated(self, loops_run: int, seconds: float):
+        self.loops += loops_run
+        self.sim_seconds += seconds
+
+    def game_started(self) -> int:
+        self.games += 1
+        return self.games
+
+    def game_ended(self, session: Session, left: bool = False):
+        world = session.world
+        self.finished += 1
+        outcome = "Left" if left else sc2api_pb2.Result.Name(world.result[1])
+        self.results[outcome] += 1
+        logger.info(f"Fake game {session.game} ended at loop {world.loop}: {outcome}, {world.commands} commands")
+
+    def stats(self) -> dict:
+        return {
+            "games": self.games, "finished": self.finished, "crashes": self.crashes, "results": dict(self.results),
+            "loops": self.loops, "sim_seconds": round(self.sim_seconds, 3),
+            "loops_per_second": round(self.loops / self.sim_seconds, 1) if self.sim_seconds else None,
+            "requests": {k: {"count": n, "seconds": round(self.request_seconds[k], 3)}
+                         for k, n in self.requests.most_common()},
+        }
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=64 * 1024 * 1024)
+        await ws.prepare(request)
+        session = Session(self)
+        async for message in ws:
+            if message.type != WSMsgType.BINARY:
+                continue
+            response = session.handle(sc2api_pb2.Request.FromString(message.data))
+            if session.closing and session.status != sc2api_pb2.quit:
+                # Injected crash, the client sees the connection drop without an answer
+                self.crashes += 1
+                logger.info(f"Fake game {session.game}: crashing at loop {session.world.loop}")
+                await ws.close(code=WSCloseCode.INTERNAL_ERROR)
+                break
+            await ws.send_bytes(response.SerializeToString())
+            if session.closing:
+                await ws.close()
+                break
+        return ws
+
+    async def start(self, host: str = "127.0.0.1", port: int = 5000) -> web.AppRunner:
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Fake SC2 server on ws://{host}:{port}/sc2api")
+        return runner
+
+    def serve(self, host: str = "127.0.0.1", port: int = 5000):
+        """ Serve until interrupted, blocking. """
+        async def run():
+            runner = await self.start(host, port)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await runner.cleanup()
+
+        asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake SC2 server for offline end to end runs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--minutes", type=float, default=30, help="Game time before a game ends in a tie")
+    parser.add_argument("--crash-every", type=int, default=0, help="Drop the connection of every n-th game")
+    parser.add_argument("--crash-loop", type=int, default=2000, help="Game loop the injected crashes happen at")
+    parser.add_argument("--sc2path", default=None, help="Create a minimal SC2PATH with the fake map here first")
+    args = parser.parse_args()
+    if args.sc2path:
+        print(f"export SC2PATH={os.path.abspath(make_sc2path(args.sc2path))}")
+    server = FakeSC2Server(max_loops=int(loops(args.minutes * 60)), crash_every=args.crash_every,
+                           crash_loop=args.crash_loop)
+    server.serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
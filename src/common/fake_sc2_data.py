@@ -0,0 +1,349 @@
+# SC2 imports
+from sc2.dicts.generic_redirect_abilities import GENERIC_REDIRECT_ABILITIES
+from sc2.dicts.unit_research_abilities import RESEARCH_INFO
+from sc2.dicts.unit_train_build_abilities import TRAIN_INFO
+from sc2.ids.ability_id import AbilityId
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.ids.upgrade_id import UpgradeId
+
+# Base imports
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Additional imports
+from s2clientprotocol import common_pb2, data_pb2, sc2api_pb2
+
+LOOPS_PER_SECOND = 22.4
+
+# Attributes
+LIGHT = data_pb2.Light
+ARMORED = data_pb2.Armored
+BIO = data_pb2.Biological
+MECH = data_pb2.Mechanical
+MASSIVE = data_pb2.Massive
+STRUCTURE = data_pb2.Structure
+
+GROUND = data_pb2.Weapon.Ground
+AIR = data_pb2.Weapon.Air
+ANY = data_pb2.Weapon.Any
+
+
+@dataclass
+class WeaponStats:
+    """ cooldown is in seconds on faster speed, like the ladder's unit pages. """
+    target: int
+    damage: float
+    range: float
+    cooldown: float
+    attacks: int = 1
+    bonus: Optional[Tuple[int, float]] = None
+
+
+@dataclass
+class UnitStats:
+    """ What the fake server needs of a unit type. Costs, times and supply follow economy_sim's table; zerg
+    structures include the drone the way the game data does. size is the footprint side of structures. """
+    minerals: int = 0
+    vespene: int = 0
+    time: float = 0
+    food: float = 0
+    provides: float = 0
+    hp: float = 100
+    shield: float = 0
+    armor: float = 0
+    speed: float = 0
+    radius: float = 0.5
+    attributes: Tuple[int, ...] = ()
+    weapons: List[WeaponStats] = field(default_factory=list)
+    size: int = 0
+    energy: float = 0
+    flying: bool = False
+
+
+def _unit(m, g, t, food, hp, armor, speed, radius, attributes, *weapons, shield=0, energy=0, flying=False,
+          provides=0):
+    return UnitStats(m, g, t, food, provides, hp, shield, armor, speed, radius, attributes, list(weapons),
+                     energy=energy, flying=flying)
+
+
+def _structure(m, g, t, size, hp, shield=0, armor=1, provides=0, attributes=(ARMORED,), weapons=(), energy=0):
+    radius = {2: 1.0, 3: 1.8125, 5: 2.75}[size]
+    return UnitStats(m, g, t, 0, provides, hp, shield, armor, 0, radius, attributes + (STRUCTURE,), list(weapons),
+                     size=size, energy=energy)
+
+
+U = UnitTypeId
+W = WeaponStats
+STATS: Dict[UnitTypeId, UnitStats] = {
+    # Terran
+    U.SCV: _unit(50, 0, 12, 1, 45, 0, 2.8125, 0.375, (LIGHT, BIO, MECH), W(GROUND, 5, 0.1, 1.07)),
+    U.MULE: _unit(0, 0, 0, 0, 60, 0, 2.8125, 0.375, (LIGHT, MECH)),
+    U.MARINE: _unit(50, 0, 18, 1, 45, 0, 2.25, 0.375, (LIGHT, BIO), W(ANY, 6, 5, 0.61)),
+    U.MARAUDER: _unit(100, 25, 21, 2, 125, 1, 2.25, 0.5625, (ARMORED, BIO), W(GROUND, 10, 6, 1.07, bonus=(ARMORED, 10))),
+    U.REAPER: _unit(50, 50, 32, 1, 60, 0, 3.75, 0.375, (LIGHT, BIO), W(GROUND, 4, 5, 0.79, attacks=2)),
+    U.VIKINGFIGHTER: _unit(150, 75, 30, 2, 135, 0, 2.75, 0.75, (ARMORED, MECH),
+                           W(AIR, 10, 9, 1.43, attacks=2, bonus=(ARMORED, 4)), flying=True),
+    U.MEDIVAC: _unit(100, 100, 30, 2, 150, 1, 2.5, 0.75, (ARMORED, MECH), energy=50, flying=True),
+    U.BATTLECRUISER: _unit(400, 300, 64, 6, 550, 3, 1.875, 1.25, (ARMORED, MECH, MASSIVE),
+                           W(GROUND, 8, 6, 0.16), W(AIR, 5, 6, 0.16), flying=True),
+    U.COMMANDCENTER: _structure(400, 0, 71, 5, 1500, provides=15),
+    U.ORBITALCOMMAND: _structure(550, 0, 25, 5, 1500, provides=15, energy=50),
+    U.PLANETARYFORTRESS: _structure(550, 150, 36, 5, 1500, armor=3, provides=15, weapons=(W(GROUND, 40, 6, 1.43),)),
+    U.SUPPLYDEPOT: _structure(100, 0, 21, 2, 400, provides=8),
+    U.REFINERY: _structure(75, 0, 21, 3, 500),
+    U.BARRACKS: _structure(150, 0, 46, 3, 1000),
+    U.FACTORY: _structure(150, 100, 43, 3, 1250),
+    U.STARPORT: _structure(150, 100, 36, 3, 1300),
+    U.FUSIONCORE: _structure(150, 150, 46, 3, 750),
+    U.ENGINEERINGBAY: _structure(125, 0, 25, 3, 850),
+    U.ARMORY: _structure(150, 100, 46, 3, 750),
+    U.GHOSTACADEMY: _structure(150, 50, 29, 3, 1250),
+    U.BUNKER: _structure(100, 0, 29, 3, 400),
+    U.MISSILETURRET: _structure(100, 0, 18, 2, 250, weapons=(W(AIR, 12, 7, 0.61, attacks=2),)),
+    U.BARRACKSTECHLAB: _structure(50, 25, 18, 2, 400),
+    U.FACTORYTECHLAB: _structure(50, 25, 18, 2, 400),
+    U.STARPORTTECHLAB: _structure(50, 25, 18, 2, 400),
+    U.BARRACKSREACTOR: _structure(50, 50, 36, 2, 400),
+    U.FACTORYREACTOR: _structure(50, 50, 36, 2, 400),
+    U.STARPORTREACTOR: _structure(50, 50, 36, 2, 400),
+    # Protoss
+    U.PROBE: _unit(50, 0, 12, 1, 20, 0, 2.8125, 0.375, (LIGHT, MECH), W(GROUND, 5, 0.1, 1.07), shield=20),
+    U.ZEALOT: _unit(100, 0, 27, 2, 100, 1, 2.25, 0.5, (LIGHT, BIO), W(GROUND, 8, 0.1, 0.86, attacks=2), shield=50),
+    U.STALKER: _unit(125, 50, 30, 2, 80, 1, 2.95, 0.625, (ARMORED, MECH), W(ANY, 13, 6, 1.34, bonus=(ARMORED, 5)),
+                     shield=80),
+    U.ADEPT: _unit(100, 25, 27, 2, 70, 1, 2.5, 0.5, (LIGHT, BIO), W(GROUND, 10, 4, 1.61, bonus=(LIGHT, 12)), shield=70),
+    U.SENTRY: _unit(50, 100, 26, 2, 40, 1, 2.25, 0.5, (LIGHT, MECH), W(ANY, 6, 5, 0.71), shield=40, energy=50),
+    U.IMMORTAL: _unit(275, 100, 39, 4, 200, 1, 2.25, 0.75, (ARMORED, MECH), W(GROUND, 20, 6, 1.04, bonus=(ARMORED, 30)),
+                      shield=100),
+    U.VOIDRAY: _unit(250, 150, 43, 4, 150, 0, 2.75, 1.0, (ARMORED, MECH), W(ANY, 6, 6, 0.36, bonus=(ARMORED, 4)),
+                     shield=100, flying=True),
+    U.NEXUS: _structure(400, 0, 71, 5, 1000, shield=1000, provides=15, energy=50),
+    U.PYLON: _structure(100, 0, 18, 2, 200, shield=200, provides=8),
+    U.ASSIMILATOR: _structure(75, 0, 21, 3, 300, shield=300),
+    U.GATEWAY: _structure(150, 0, 46, 3, 500, shield=500),
+    U.WARPGATE: _structure(150, 0, 7, 3, 500, shield=500),
+    U.CYBERNETICSCORE: _structure(150, 0, 36, 3, 550, shield=550),
+    U.FORGE: _structure(150, 0, 32, 3, 400, shield=400),
+    U.TWILIGHTCOUNCIL: _structure(150, 100, 36, 3, 500, shield=500),
+    U.ROBOTICSFACILITY: _structure(150, 100, 46, 3, 450, shield=450),
+    U.STARGATE: _structure(150, 150, 43, 3, 600, shield=600),
+    U.PHOTONCANNON: _structure(150, 0, 29, 2, 150, shield=150, weapons=(W(ANY, 20, 7, 0.89),)),
+    U.SHIELDBATTERY: _structure(100, 0, 29, 2, 150, shield=150),
+    # Zerg
+    U.LARVA: _unit(0, 0, 0, 0, 25, 10, 0.56, 0.25, (LIGHT, BIO)),
+    U.EGG: _unit(0, 0, 0, 0, 200, 10, 0, 0.25, (BIO,)),
+    U.DRONE: _unit(50, 0, 12, 1, 40, 0, 2.8125, 0.375, (LIGHT, BIO), W(GROUND, 5, 0.1, 1.07)),
+    U.OVERLORD: _unit(100, 0, 18, 0, 200, 0, 0.64, 1.0, (ARMORED, BIO), flying=True, provides=8),
+    U.ZERGLING: _unit(25, 0, 17, 0.5, 35, 0, 2.95, 0.375, (LIGHT, BIO), W(GROUND, 5, 0.1, 0.497)),
+    U.QUEEN: _unit(150, 0, 36, 2, 175, 1, 0.94, 0.875, (BIO,), W(GROUND, 4, 5, 0.71, attacks=2), W(AIR, 9, 7, 0.71),
+                   energy=25),
+    U.ROACH: _unit(75, 25, 19, 2, 145, 1, 2.25, 0.625, (ARMORED, BIO), W(GROUND, 16, 4, 1.43)),
+    U.HATCHERY: _structure(350, 0, 71, 5, 1500, provides=6, attributes=(ARMORED, BIO)),
+    U.LAIR: _structure(500, 100, 57, 5, 2000, provides=6, attributes=(ARMORED, BIO)),
+    U.EXTRACTOR: _structure(75, 0, 21, 3, 500, attributes=(ARMORED, BIO)),
+    U.SPAWNINGPOOL: _structure(250, 0, 46, 3, 1000, attributes=(ARMORED, BIO)),
+    U.EVOLUTIONCHAMBER: _structure(125, 0, 25, 3, 750, attributes=(ARMORED, BIO)),
+    U.ROACHWARREN: _structure(200, 0, 39, 3, 850, attributes=(ARMORED, BIO)),
+    U.BANELINGNEST: _structure(150, 50, 43, 3, 850, attributes=(ARMORED, BIO)),
+    U.SPINECRAWLER: _structure(150, 0, 36, 2, 300, armor=2, attributes=(ARMORED, BIO),
+                               weapons=(W(GROUND, 25, 7, 1.32, bonus=(ARMORED, 5)),)),
+    U.SPORECRAWLER: _structure(125, 0, 21, 2, 400, attributes=(ARMORED, BIO), weapons=(W(AIR, 15, 7, 0.61, bonus=(BIO, 15)),)),
+    # Neutral
+    U.MINERALFIELD: UnitStats(hp=10000, radius=1.125, attributes=(STRUCTURE,)),
+    U.MINERALFIELD750: UnitStats(hp=10000, radius=1.125, attributes=(STRUCTURE,)),
+    U.VESPENEGEYSER: UnitStats(hp=10000, radius=1.8125, attributes=(STRUCTURE,), size=3),
+}
+
+# Flying and lowered variants share the stats of the base type
+VARIANTS = {
+    U.COMMANDCENTERFLYING: U.COMMANDCENTER,
+    U.ORBITALCOMMANDFLYING: U.ORBITALCOMMAND,
+    U.BARRACKSFLYING: U.BARRACKS,
+    U.FACTORYFLYING: U.FACTORY,
+    U.STARPORTFLYING: U.STARPORT,
+    U.SUPPLYDEPOTLOWERED: U.SUPPLYDEPOT,
+}
+# Morphs, the library subtracts the alias' cost to get the morph cost
+TECH_ALIAS = {
+    U.ORBITALCOMMAND: (U.COMMANDCENTER,),
+    U.PLANETARYFORTRESS: (U.COMMANDCENTER,),
+    U.WARPGATE: (U.GATEWAY,),
+    U.LAIR: (U.HATCHERY,),
+    U.HIVE: (U.HATCHERY, U.LAIR),
+}
+LANDED = {flying: base for flying, base in VARIANTS.items() if flying != U.SUPPLYDEPOTLOWERED}
+FLYING = {base: flying for flying, base in LANDED.items()}
+
+UPGRADE_COSTS: Dict[UpgradeId, Tuple[int, int, float]] = {
+    UpgradeId.WARPGATERESEARCH: (50, 50, 100),
+    UpgradeId.ZERGLINGMOVEMENTSPEED: (100, 100, 79),
+    UpgradeId.STIMPACK: (100, 100, 100),
+    UpgradeId.SHIELDWALL: (100, 100, 79),
+    UpgradeId.PUNISHERGRENADES: (50, 50, 43),
+    UpgradeId.BATTLECRUISERENABLESPECIALIZATIONS: (150, 150, 100),
+}
+
+# Units made by a worker that are structures, plus structures only reached by morphs or add-ons
+WORKERS = {U.SCV, U.PROBE, U.DRONE}
+MINERALS = {U.MINERALFIELD, U.MINERALFIELD750}
+GEYSERS = {U.VESPENEGEYSER}
+GAS_BUILDINGS = {U.REFINERY, U.ASSIMILATOR, U.EXTRACTOR}
+TOWNHALLS = {U.COMMANDCENTER, U.ORBITALCOMMAND, U.PLANETARYFORTRESS, U.NEXUS, U.HATCHERY, U.LAIR}
+ADDONS = {U.BARRACKSTECHLAB, U.FACTORYTECHLAB, U.STARPORTTECHLAB, U.BARRACKSREACTOR, U.FACTORYREACTOR,
+          U.STARPORTREACTOR}
+# Add-ons and the warp gate morph aren't in the library's train info
+EXTRA_INFO = {
+    producer: {
+        getattr(U, f"{producer.name}TECHLAB"): {"ability": getattr(AbilityId, f"BUILD_TECHLAB_{producer.name}")},
+        getattr(U, f"{producer.name}REACTOR"): {"ability": getattr(AbilityId, f"BUILD_REACTOR_{producer.name}")},
+    }
+    for producer in (U.BARRACKS, U.FACTORY, U.STARPORT)
+}
+EXTRA_INFO[U.GATEWAY] = {U.WARPGATE: {"ability": AbilityId.MORPH_WARPGATE, "required_upgrade": UpgradeId.WARPGATERESEARCH}}
+TECHLABS = {U.BARRACKSTECHLAB, U.FACTORYTECHLAB, U.STARPORTTECHLAB}
+REACTORS = {U.BARRACKSREACTOR, U.FACTORYREACTOR, U.STARPORTREACTOR}
+STRUCTURES = ({item for worker in WORKERS for item in TRAIN_INFO.get(worker, {})}
+              | set(STATS) - {t for t, s in STATS.items() if not s.size and t not in MINERALS}
+              | set(VARIANTS) | ADDONS | {U.HIVE, U.GREATERSPIRE})
+# Everything Protoss needs power for, besides these
+UNPOWERED = {U.NEXUS, U.PYLON, U.ASSIMILATOR}
+CREEPLESS = {U.HATCHERY, U.EXTRACTOR}
+
+
+def stats(unit_type: UnitTypeId) -> UnitStats:
+    """ Stats of a type, with a generic fallback for the long tail nobody in this repo builds. """
+    unit_type = VARIANTS.get(unit_type, unit_type)
+    if unit_type in STATS:
+        return STATS[unit_type]
+    if unit_type in STRUCTURES:
+        return _structure(150, 100, 46, 3, 1000)
+    return _unit(100, 50, 30, 2, 100, 0, 2.25, 0.5, (ARMORED,), W(GROUND, 10, 5, 1.0))
+
+
+def generic(ability: AbilityId) -> AbilityId:
+    return GENERIC_REDIRECT_ABILITIES.get(ability, ability)
+
+
+def recipe(producer: UnitTypeId, ability: AbilityId, done=frozenset()) -> Optional[Tuple[str, object, dict]]:
+    """ ("unit", UnitTypeId, info) or ("upgrade", UpgradeId, info) the producer makes with ability, matching the
+    exact id or its generic one the way the game does. Generic research picks the first level not in done. """
+    for item, info in {**TRAIN_INFO.get(producer, {}), **EXTRA_INFO.get(producer, {})}.items():
+        if ability in (info["ability"], generic(info["ability"])):
+            return "unit", item, info
+    for upgrade, info in RESEARCH_INFO.get(producer, {}).items():
+        if upgrade not in done and ability in (info["ability"], generic(info["ability"])):
+            return "upgrade", upgrade, info
+    return None
+
+
+def _label(name: str) -> str:
+    return " ".join(part.capitalize() for part in name.split("_"))
+
+
+@lru_cache(maxsize=1)
+def game_data() -> sc2api_pb2.ResponseData:
+    """ ResponseData covering every ability, unit type and upgrade id the library knows, so GameData lookups of
+    anything the simulation reports never miss. """
+    creation: Dict[UnitTypeId, dict] = {}
+    for producer, items in list(TRAIN_INFO.items()) + list(EXTRA_INFO.items()):
+        for item, info in items.items():
+            creation.setdefault(item, info)
+    research: Dict[UpgradeId, AbilityId] = {}
+    for items in RESEARCH_INFO.values():
+        for upgrade, info in items.items():
+            research.setdefault(upgrade, info["ability"])
+
+    # Abilities, the target type only matters for can_cast, placement and the library's target checks. Workers
+    # place structures, warp gates warp in on a point, other production, morphs and add-ons take no target
+    builds = {info["ability"]: item for worker in WORKERS for item, info in TRAIN_INFO.get(worker, {}).items()}
+    untargeted = {a for info in creation.values() for a in (info["ability"], generic(info["ability"]))}
+    untargeted |= {a for ability in research.values() for a in (ability, generic(ability))}
+    abilities = []
+    for ability in AbilityId:
+        if ability.value == 0:
+            continue
+        proto = data_pb2.AbilityData(ability_id=ability.value, link_name=_label(ability.name),
+                                     button_name=_label(ability.name), friendly_name=_label(ability.name),
+                                     available=True, target=data_pb2.AbilityData.PointOrUnit)
+        if generic(ability) != ability:
+            proto.remaps_to_ability_id = generic(ability).value
+        if ability in builds:
+            item = builds[ability]
+            proto.is_building = True
+            proto.target = data_pb2.AbilityData.Unit if item in GAS_BUILDINGS else data_pb2.AbilityData.Point
+            proto.footprint_radius = stats(item).size / 2
+        elif "WARPGATETRAIN_" in ability.name or ability.name.startswith("TRAINWARP_"):
+            proto.target = data_pb2.AbilityData.Point
+        elif ability in untargeted or ability.name.startswith(("MORPH", "STOP", "LIFT", "CANCEL", "RESEARCH")) \
+                or "UPGRADETO" in ability.name:
+            proto.target = data_pb2.AbilityData.Target.Value("None")
+        if ability == AbilityId.KD8CHARGE_KD8CHARGE:
+            proto.cast_range = 5
+        abilities.append(proto)
+
+    units = []
+    for unit_type in UnitTypeId:
+        if unit_type.value == 0:
+            continue
+        s = stats(unit_type)
+        info = creation.get(VARIANTS.get(unit_type, unit_type), {})
+        proto = data_pb2.UnitTypeData(
+            unit_id=unit_type.value, name=_label(unit_type.name).replace(" ", ""), available=True,
+            mineral_cost=s.minerals, vespene_cost=s.vespene, food_required=s.food, food_provided=s.provides,
+            build_time=s.time * LOOPS_PER_SECOND, race=_race(unit_type), movement_speed=s.speed, armor=s.armor,
+            has_minerals=unit_type in MINERALS, has_vespene=unit_type in GEYSERS | GAS_BUILDINGS,
+            attributes=list(s.attributes), sight_range=9,
+        )
+        if "ability" in info:
+            proto.ability_id = info["ability"].value
+        if "required_building" in info:
+            proto.tech_requirement = info["required_building"].value
+        proto.require_attached = bool(info.get("requires_techlab"))
+        proto.tech_alias.extend(t.value for t in TECH_ALIAS.get(unit_type, ()))
+        if unit_type in VARIANTS:
+            proto.unit_alias = VARIANTS[unit_type].value
+        for w in s.weapons:
+            weapon = proto.weapons.add(type=w.target, damage=w.damage, attacks=w.attacks, range=w.range,
+                                       speed=w.cooldown)
+            if w.bonus:
+                weapon.damage_bonus.add(attribute=w.bonus[0], bonus=w.bonus[1])
+        units.append(proto)
+
+    upgrades = []
+    for upgrade in UpgradeId:
+        if upgrade.value == 0:
+            continue
+        minerals, vespene, seconds = UPGRADE_COSTS.get(upgrade, (100, 100, 100))
+        proto = data_pb2.UpgradeData(upgrade_id=upgrade.value, name=_label(upgrade.name).replace(" ", ""),
+                                     mineral_cost=minerals, vespene_cost=vespene,
+                                     research_time=seconds * LOOPS_PER_SECOND)
+        if upgrade in research:
+            proto.ability_id = research[upgrade].value
+        upgrades.append(proto)
+    return sc2api_pb2.ResponseData(abilities=abilities, units=units, upgrades=upgrades)
+
+
+def upgrade_cost(upgrade: UpgradeId) -> Tuple[int, int, float]:
+    return UPGRADE_COSTS.get(upgrade, (100, 100, 100))
+
+
+_RACE_OF = {item: race for worker, race in ((U.SCV, common_pb2.Terran), (U.PROBE, common_pb2.Protoss),
+                                            (U.DRONE, common_pb2.Zerg)) for item in TRAIN_INFO[worker]}
+
+
+def _race(unit_type: UnitTypeId) -> int:
+    """ Best effort race of a type, from who builds it or the producer chain. """
+    unit_type = VARIANTS.get(unit_type, unit_type)
+    if unit_type in _RACE_OF:
+        return _RACE_OF[unit_type]
+    for producer, items in TRAIN_INFO.items():
+        if unit_type in items and producer in _RACE_OF:
+            return _RACE_OF[producer]
+    if unit_type in (U.SCV, U.MULE):
+        return common_pb2.Terran
+    if unit_type == U.PROBE:
+        return common_pb2.Protoss
+    if unit_type in (U.DRONE, U.LARVA, U.EGG):
+        return common_pb2.Zerg
+    return common_pb2.NoRace
@@ -0,0 +1,271 @@
+# Base imports
+import argparse
+import itertools
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Additional imports
+import numpy as np
+from loguru import logger
+
+# Queue sentinels, handled in order with the records around them
+_FLUSH = object()
+_STOP = object()
+
+# Per game file of the calling task when several games share the event loop (runner.py --concurrent)
+_game_log: ContextVar[Optional[str]] = ContextVar("game_log", default=None)
+_game_ids = itertools.count()
+
+
+def compact(record: dict) -> str:
+    """ One short line per record: seconds since start, level initial, module:line, message. """
+    return (f"{record['elapsed'].total_seconds():.3f} {record['level'].name[0]} "
+            f"{record['name']}:{record['line']} {record['message']}\n")
+
+
+class BatchedSink:
+    """ loguru sink that only enqueues the record on the caller's thread; a writer thread formats, drains the queue
+    and writes whole batches to the current file.
+
+    A batch is written once batch_size lines are waiting or flush_interval seconds passed, whichever comes first.
+    rotate() switches to a new file between games, records logged before it still land in the old one, and the old
+    file is closed. Records
+    logged from a task bound to a game file with start_game_log(concurrent=True) go to that file instead, so games
+    sharing the process keep separate logs. """
+
+    def __init__(self, path: Optional[str] = None, batch_size: int = 512, flush_interval: float = 0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.path = path
+        # Where records go between games
+        self.base_path = path
+        self.written = 0
+        self.batches = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._file = open(path, "a") if path else None
+        self._routed: Dict[str, object] = {}
+        self._flushed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message):
+        # Formatting happens on the writer thread
+        path = _game_log.get()
+        self._queue.put(message.record if path is None else (path, message.record))
+
+    def _write(self, lines: List[str], file=None):
+        file = file or self._file
+        if lines and file:
+            file.write("".join(lines))
+            file.flush()
+            self.written += len(lines)
+            self.batches += 1
+        lines.clear()
+
+    def _write_routed(self, routed: Dict[str, List[str]]):
+        for path, lines in routed.items():
+            if lines:
+                if path not in self._routed:
+                    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                    self._routed[path] = open(path, "a")
+                self._write(lines, self._routed[path])
+
+    def _run(self):
+        lines: List[str] = []
+        routed: Dict[str, List[str]] = {}
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+            if isinstance(item, dict):
+                lines.append(compact(item))
+                if len(lines) < self.batch_size:
+                    continue
+            elif isinstance(item, tuple) and len(item) == 2:
+                path, record = item
+                if record is not None:
+                    routed.setdefault(path, []).append(compact(record))
+                    if len(routed[path]) < self.batch_size:
+                        continue
+                else:
+                    # The game is over, write what is left and close its file
+                    self._write_routed({path: routed.pop(path, [])})
+                    file = self._routed.pop(path, None)
+                    if file:
+                        file.close()
+                    continue
+            elif isinstance(item, tuple):
+                # Rotation, finish the old file first
+                self._write(lines)
+                if self._file:
+                    self._file.close()
+                self.path = item[0]
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a")
+                continue
+            self._write(lines)
+            self._write_routed(routed)
+            deadline = time.monotonic() + self.flush_interval
+            if item is _FLUSH:
+                self._flushed.set()
+            elif item is _STOP:
+                for file in [self._file, *self._routed.values()]:
+                    if file:
+                        file.close()
+                return
+
+    def rotate(self, path: str):
+        """ Start writing to path, used once per game. """
+        self._queue.put((path,))
+
+    def release(self, path: str):
+        """ Close a per game file once its game is over. """
+        self._queue.put((path, None))
+
+    def flush(self, timeout: float = 5.0):
+        """ Block until everything logged so far is on disk, for the end of a game or tests. """
+        self._flushed.clear()
+        self._queue.put(_FLUSH)
+        self._flushed.wait(timeout)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+
+class _SlowFile:
+    """ File wrapper adding a fixed stall to every write, stands in for a busy or network disk in the benchmark. """
+
+    def __init__(self, path: str, delay: float):
+        self._file = open(path, "a")
+        self.delay = delay
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+        self._file.write(text)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+_sink: Optional[BatchedSink] = None
+
+
+def setup_logging(log_dir: str, level: str = "INFO", console_level: Optional[str] = "WARNING",
+                  batch_size: int = 512, flush_interval: float = 0.5) -> BatchedSink:
+    """ Route loguru through a BatchedSink, replacing the default stderr handler. Records go to
+    log_dir/void_bot.log until the first game rotates to its own file; only console_level and up still reach the
+    console directly. """
+    global _sink
+    logger.remove()
+    if _sink is not None:
+        _sink.close()
+    os.makedirs(log_dir, exist_ok=True)
+    _sink = BatchedSink(os.path.join(log_dir, "void_bot.log"), batch_size=batch_size, flush_interval=flush_interval)
+    logger.add(_sink, level=level, format="{message}")
+    if console_level:
+        logger.add(sys.stderr, level=console_level)
+    return _sink
+
+
+def start_game_log(name: str, concurrent: bool = False) -> Optional[str]:
+    """ Rotate the batched sink to a per game file next to the current one, no-op when setup_logging wasn't called.
+    With concurrent the file is only bound to the calling task, the other games on the event loop keep theirs. """
+    if _sink is None or _sink.path is None:
+        return None
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if concurrent:
+        path = os.path.join(os.path.dirname(_sink.path), f"{name}_{timestamp}_{next(_game_ids)}.log")
+        _game_log.set(path)
+    else:
+        path = os.path.join(os.path.dirname(_sink.path), f"{name}_{timestamp}.log")
+        _sink.rotate(path)
+    return path
+
+
+def end_game_log():
+    """ Close the per game file: the calling task's if start_game_log bound one, otherwise rotate back to the file
+    records go to between games. """
+    if _sink is None:
+        return
+    path = _game_log.get()
+    if path is not None:
+        _sink.release(path)
+        _game_log.set(None)
+    elif _sink.base_path is not None:
+        _sink.rotate(_sink.base_path)
+
+
+def flush_logs():
+    if _sink is not None:
+        _sink.flush()
+
+
+def bench(steps: int = 2000, logs_per_step: int = 50, work_us: float = 200.0, write_delay_ms: float = 0.0) -> dict:
+    """ Step latency in ms (p50, p99, max) for a fake step doing work_us of work plus logs_per_step debug logs,
+    with logging off, a plain loguru file sink and the batched sink. write_delay_ms stalls every file write. """
+    def run(label: str) -> dict:
+        samples = np.zeros(steps)
+        for i in range(steps):
+            t0 = time.perf_counter()
+            end = t0 + work_us / 1e6
+            while time.perf_counter() < end:
+                pass
+            for j in range(logs_per_step):
+                logger.debug(f"step {i} unit {j} at ({i * 0.5:.2f}, {j * 0.25:.2f}) hp 45/45")
+            samples[i] = time.perf_counter() - t0
+        ms = samples * 1e3
+        return {"mode": label, "p50": round(float(np.percentile(ms, 50)), 3),
+                "p99": round(float(np.percentile(ms, 99)), 3), "max": round(float(ms.max()), 3)}
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        logger.remove()
+        results.append(run("off"))
+
+        plain = _SlowFile(os.path.join(tmp, "plain.log"), write_delay_ms / 1000)
+        handler = logger.add(plain, level="DEBUG")
+        results.append(run("loguru file"))
+        logger.remove(handler)
+        plain.close()
+
+        sink = BatchedSink()
+        sink.rotate(os.path.join(tmp, "batched.log"))
+        sink.flush()
+        sink._file = _SlowFile(sink.path, write_delay_ms / 1000)  # pylint: disable=W0212
+        handler = logger.add(sink, level="DEBUG", format="{message}")
+        results.append(run("batched"))
+        logger.remove(handler)
+        sink.close()
+    logger.add(sys.stderr)
+    return {"steps": steps, "logs_per_step": logs_per_step, "write_delay_ms": write_delay_ms, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Step latency with logging off, plain loguru and the batched sink")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--logs-per-step", type=int, default=50)
+    parser.add_argument("--work-us", type=float, default=200.0, help="Busy work per fake step in microseconds")
+    parser.add_argument("--write-delay-ms", type=float, default=0.0, help="Simulated stall per file write")
+    args = parser.parse_args()
+    report = bench(args.steps, args.logs_per_step, args.work_us, args.write_delay_ms)
+    print(f"{report['steps']} steps, {report['logs_per_step']} debug logs per step, "
+          f"{report['write_delay_ms']} ms per write")
+    for r in report["results"]:
+        print(f"  {r['mode']:12s} p50 {r['p50']:7.3f} ms  p99 {r['p99']:7.3f} ms  max {r['max']:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
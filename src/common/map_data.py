@@ -0,0 +1,141 @@
+# SC2 imports
+from sc2.game_info import GameInfo
+
+# Base imports
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+# Additional imports
+import numpy as np
+from loguru import logger
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# Radius around a start location made walkable, the starting townhall blocks it in the pathing grid
+START_CLEARANCE = 3
+
+
+def map_key(game_info: GameInfo) -> str:
+    """ Map name plus a hash of the static grids, map versions with the same name get separate entries. """
+    name = "".join(c if c.isalnum() else "_" for c in game_info.map_name)
+    digest = hashlib.sha1(game_info.pathing_grid.data_numpy.tobytes())
+    digest.update(game_info.placement_grid.data_numpy.tobytes())
+    return f"{name}_{digest.hexdigest()[:12]}"
+
+
+def ground_distances(pathable: np.ndarray, sources: List[tuple]) -> np.ndarray:
+    """ (len(sources), height, width) walking distance from each (x, y) source, inf where it can't be reached. """
+    height, width = pathable.shape
+    walk = pathable.copy()
+    ys, xs = np.ogrid[:height, :width]
+    for x, y in sources:
+        walk |= (xs + 0.5 - x) ** 2 + (ys + 0.5 - y) ** 2 <= START_CLEARANCE ** 2
+
+    # 8 connected grid graph over walkable cells, diagonals cost sqrt 2
+    index = np.arange(height * width).reshape(height, width)
+    rows, cols, costs = [], [], []
+    for dy, dx, cost in ((0, 1, 1.0), (1, 0, 1.0), (1, 1, 2 ** 0.5), (1, -1, 2 ** 0.5)):
+        a = walk[max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)]
+        b = walk[max(dy, 0):, max(dx, 0):][:a.shape[0], :a.shape[1]]
+        ok = a & b
+        src = index[max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)][ok]
+        dst = index[max(dy, 0):, max(dx, 0):][:a.shape[0], :a.shape[1]][ok]
+        rows += [src, dst]
+        cols += [dst, src]
+        costs += [np.full(len(src), cost)] * 2
+    graph = coo_matrix((np.concatenate(costs), (np.concatenate(rows), np.concatenate(cols))),
+                       shape=(height * width, height * width)).tocsr()
+    starts = [min(int(y), height - 1) * width + min(int(x), width - 1) for x, y in sources]
+    distances = dijkstra(graph, indices=starts)
+    return distances.reshape(len(sources), height, width).astype(np.float32)
+
+
+class MapData:
+    """ Static per map rasters, derived once and shared read-only by every game on the same map.
+
+    Arrays live as .npy files under cache_dir/<map key>/ and are opened with mmap, so concurrent games and bot
+    processes on a node read the same page cache pages instead of each holding a copy. The first game on a map
+    derives and publishes them (written to a temp dir, then renamed into place); later games attach. All arrays are
+    read-only numpy views indexed [y, x]:
+
+    pathing, placement: bool grids at game start
+    terrain: terrain height
+    start_distance: (n, height, width) ground distance from each start location, our own and the enemy's """
+
+    FILES = ("pathing", "placement", "terrain", "start_distance")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: dict, path: Optional[str] = None):
+        for array in arrays.values():
+            array.flags.writeable = False
+        self.pathing: np.ndarray = arrays["pathing"]
+        self.placement: np.ndarray = arrays["placement"]
+        self.terrain: np.ndarray = arrays["terrain"]
+        self.start_distance: np.ndarray = arrays["start_distance"]
+        self.meta = meta
+        self.path = path
+
+    @property
+    def start_locations(self) -> List[tuple]:
+        return [tuple(p) for p in self.meta["start_locations"]]
+
+    @staticmethod
+    def derive(game_info: GameInfo, starts: List[tuple]) -> Dict[str, np.ndarray]:
+        pathing = game_info.pathing_grid.data_numpy.astype(bool)
+        return {
+            "pathing": pathing,
+            "placement": game_info.placement_grid.data_numpy.astype(bool),
+            "terrain": game_info.terrain_height.data_numpy.copy(),
+            "start_distance": ground_distances(pathing, starts),
+        }
+
+    @classmethod
+    def _meta(cls, game_info: GameInfo) -> dict:
+        starts = [tuple(p) for p in game_info.start_locations] + [tuple(game_info.player_start_location)]
+        return {"map_name": game_info.map_name, "start_locations": [list(p) for p in sorted(set(starts))]}
+
+    @classmethod
+    def load(cls, game_info: GameInfo, cache_dir: Optional[str] = None) -> "MapData":
+        """ Attach to the published data for this map, deriving and publishing it first if nobody has. Without a
+        cache_dir the data is derived in memory for this game only. """
+        meta = cls._meta(game_info)
+        if not cache_dir:
+            return cls(cls.derive(game_info, meta["start_locations"]), meta)
+
+        path = os.path.join(cache_dir, map_key(game_info))
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            cls.publish(game_info, path, meta)
+        return cls.attach(path)
+
+    @classmethod
+    def publish(cls, game_info: GameInfo, path: str, meta: Optional[dict] = None):
+        meta = meta or cls._meta(game_info)
+        # Distance fields follow the sorted start locations, independent of which side published them
+        arrays = cls.derive(game_info, meta["start_locations"])
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix=".publish_")
+        try:
+            for name in cls.FILES:
+                np.save(os.path.join(tmp, name + ".npy"), arrays[name])
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            os.rename(tmp, path)
+            logger.info(f"Published map data for {meta['map_name']} to {path}")
+        except OSError:
+            # Another game published the same map first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @classmethod
+    def attach(cls, path: str) -> "MapData":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in cls.FILES}
+        return cls(arrays, meta, path)
+
+    def distance_from(self, start) -> np.ndarray:
+        """ Ground distance field from the start location at start, a Point2 or (x, y). """
+        return self.start_distance[self.start_locations.index((start[0], start[1]))]
@@ -0,0 +1,219 @@
+# Base imports
+import asyncio
+import bisect
+import itertools
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence
+
+# Additional imports
+import psutil
+from aiohttp import web
+from loguru import logger
+
+# Upper bounds of the step duration buckets, the last bucket (+Inf) catches everything slower
+STEP_BUCKETS_MS = (1, 2, 5, 10, 20, 40, 80, 160, 320, 1000)
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def quantile(bounds: Sequence[float], counts: Sequence[int], q: float, largest: float) -> float:
+    """ q-quantile of a bucketed distribution, interpolated linearly inside the bucket like histogram_quantile.
+    counts has one more entry than bounds, the +Inf bucket, which reads as largest. """
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if count and seen + count >= rank:
+            if i == len(bounds):
+                return largest
+            lower = bounds[i - 1] if i else 0.0
+            return min(lower + (bounds[i] - lower) * (rank - seen) / count, largest)
+        seen += count
+    return largest
+
+
+class StepHistogram:
+    """ Step durations of one game in fixed buckets, cheap to fill every step and to merge across games. """
+
+    def __init__(self, bounds: Sequence[float] = STEP_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def summary(self) -> dict:
+        """ The game record's step_ms: bucket counts (STEP_BUCKETS_MS then +Inf), sum, max and percentiles. """
+        summary = {"counts": self.counts, "sum": round(self.total, 3), "max": round(self.max, 3)}
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}"] = round(quantile(self.bounds, self.counts, q, self.max), 3)
+        return summary
+
+
+def sc2_process_count() -> int:
+    """ SC2 processes below this one, launched directly or through Wine. """
+    try:
+        return sum("sc2" in p.name().lower() for p in psutil.Process().children(recursive=True))
+    except psutil.Error:
+        return 0
+
+
+def _labels(**labels) -> str:
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+class TournamentMetrics:
+    """ Counters of a runner.py run, updated as games start and finish and rendered in Prometheus text format.
+
+    Games are keyed while they run, by job id on the coordinator: a job leased again before its record came back
+    counts as failed, its worker is presumed dead. A finished game counts as completed unless SC2 crashed; step
+    durations come from the step_ms histogram in each record and are summed per bot. Updates take a lock, scrapes
+    come from the server thread. """
+
+    def __init__(self, pool=None):
+        self.pool = pool
+        self.started = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.results: Dict[str, Counter] = defaultdict(Counter)
+        # Key -> bot of the games in flight
+        self.running: Dict[object, str] = {}
+        self.step_counts: Dict[str, List[int]] = {}
+        self.step_sum: Dict[str, float] = defaultdict(float)
+        self.step_max: Dict[str, float] = defaultdict(float)
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+
+    def game_started(self, bot: str, key=None):
+        """ Returns the key to finish the game with. """
+        with self._lock:
+            key = next(self._keys) if key is None else key
+            if key in self.running:
+                self.failed += 1
+            self.running[key] = bot
+            return key
+
+    def game_finished(self, key, record: dict):
+        with self._lock:
+            self.running.pop(key, None)
+            bot = record["bot"]
+            self.results[bot][record["result"]] += 1
+            if record["result"] == "Crash":
+                self.failed += 1
+            else:
+                self.completed += 1
+            step_ms = record.get("step_ms")
+            if step_ms:
+                counts = self.step_counts.setdefault(bot, [0] * len(step_ms["counts"]))
+                for i, count in enumerate(step_ms["counts"]):
+                    counts[i] += count
+                self.step_sum[bot] += step_ms["sum"]
+                self.step_max[bot] = max(self.step_max[bot], step_ms["max"])
+
+    def render(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, text: str, samples):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(**labels) if labels else ''} {value}")
+
+        with self._lock:
+            uptime = time.time() - self.started
+            metric("void_bot_uptime_seconds", "gauge", "Seconds since the run started", [({}, uptime)])
+            metric("void_bot_games_completed_total", "counter", "Games finished with a result", [({}, self.completed)])
+            metric("void_bot_games_failed_total", "counter", "Games lost to a crashed game server or a dead worker",
+                   [({}, self.failed)])
+            metric("void_bot_games_running", "gauge", "Games in flight", [({}, len(self.running))])
+            metric("void_bot_games_per_hour", "gauge", "Completed games per hour since the run started",
+                   [({}, 3600 * self.completed / max(uptime, 1e-9))])
+            metric("void_bot_games_total", "counter", "Finished games per bot and result",
+                   [({"bot": b, "result": r}, n) for b, results in sorted(self.results.items())
+                    for r, n in sorted(results.items())])
+            win_rates = []
+            for bot, results in sorted(self.results.items()):
+                played = sum(n for r, n in results.items() if r != "Crash")
+                if played:
+                    win_rates.append(({"bot": bot}, results["Victory"] / played))
+            metric("void_bot_win_rate", "gauge", "Victories over completed games per bot", win_rates)
+
+            bounds = [f"{b / 1000:g}" for b in STEP_BUCKETS_MS] + ["+Inf"]
+            buckets, sums, totals, quantiles, maxima = [], [], [], [], []
+            for bot, counts in sorted(self.step_counts.items()):
+                for le, cumulative in zip(bounds, itertools.accumulate(counts)):
+                    buckets.append(({"bot": bot, "le": le}, cumulative))
+                sums.append(({"bot": bot}, self.step_sum[bot] / 1000))
+                totals.append(({"bot": bot}, sum(counts)))
+                quantiles += [({"bot": bot, "quantile": f"{q:g}"},
+                               quantile(STEP_BUCKETS_MS, counts, q, self.step_max[bot]) / 1000) for q in QUANTILES]
+                maxima.append(({"bot": bot}, self.step_max[bot] / 1000))
+            lines.append("# HELP void_bot_step_seconds Bot step durations reported by finished games")
+            lines.append("# TYPE void_bot_step_seconds histogram")
+            lines += [f"void_bot_step_seconds_bucket{_labels(**l)} {v}" for l, v in buckets]
+            lines += [f"void_bot_step_seconds_sum{_labels(**l)} {v}" for l, v in sums]
+            lines += [f"void_bot_step_seconds_count{_labels(**l)} {v}" for l, v in totals]
+            metric("void_bot_step_latency_seconds", "gauge", "Step duration percentiles over finished games",
+                   quantiles)
+            metric("void_bot_step_max_seconds", "gauge", "Slowest step of any finished game", maxima)
+
+        metric("void_bot_sc2_processes", "gauge", "SC2 processes running below the runner",
+               [({}, sc2_process_count())])
+        if self.pool is not None:
+            # Read without the pool's lock, a scrape may be off by one game being handed out
+            idle = len(self.pool._idle)  # pylint: disable=W0212
+            free = len(self.pool._free_slots)  # pylint: disable=W0212
+            metric("void_bot_pool_clients", "gauge", "Client pool slots by state",
+                   [({"state": "busy"}, self.pool.size - idle - free), ({"state": "idle"}, idle),
+                    ({"state": "free"}, free)])
+            metric("void_bot_pool_launches_total", "counter", "SC2 processes launched by the pool",
+                   [({}, self.pool.launched)])
+            metric("void_bot_pool_recycles_total", "counter", "SC2 processes retired by the pool",
+                   [({}, self.pool.recycled)])
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """ Serves GET /metrics on its own thread and event loop, so scrapes are answered while the runner blocks in a
+    game or in the coordinator's loop. """
+
+    def __init__(self, metrics: TournamentMetrics):
+        self.metrics = metrics
+        self.app = web.Application()
+        self.app.add_routes([web.get("/metrics", self._metrics)])
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.metrics.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    def start(self, host: str, port: int):
+        """ Bind, then serve in the background. Raises here if the port is taken. """
+        self._loop = asyncio.new_event_loop()
+        self._runner = web.AppRunner(self.app)
+        self._loop.run_until_complete(self._runner.setup())
+        self._loop.run_until_complete(web.TCPSite(self._runner, host, port).start())
+        self._thread = threading.Thread(target=self._loop.run_forever, name="metrics", daemon=True)
+        self._thread.start()
+        logger.info(f"Metrics on http://{host}:{port}/metrics")
+
+    def close(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
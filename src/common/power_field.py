@@ -0,0 +1,142 @@
+# SC2 imports
+from sc2.bot_ai import BotAI
+from sc2.position import Point2
+
+# Base imports
+from typing import List, Optional
+
+# Additional imports
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class PowerField:
+    """ Cached raster of the psionic matrix for picking warp-in spots and building sites without server queries.
+
+    The powered mask is rebuilt only when the set of power sources (pylons, phasing warp prisms) changes. Each step
+    it is intersected with the live pathing grid, the placement grid, creep and cells taken by units or pending
+    buildings, and all positions needed for the step are chosen at once with numpy. """
+
+    def __init__(self, bot: BotAI):
+        self.bot = bot
+        self.powered: Optional[np.ndarray] = None
+        self._sources_key = None
+        self._free_key = None
+        self._walkable: Optional[np.ndarray] = None
+        self._buildable: Optional[np.ndarray] = None
+        self._placement: Optional[np.ndarray] = None
+        self.rebuilds = 0
+
+    def _placement_grid(self) -> np.ndarray:
+        """ The shared map cache's placement grid on VoidBotBase bots, the game info's one on plain BotAI bots
+        or while the map data is still loading. """
+        if self._placement is None:
+            map_data = getattr(self.bot, "map_data", None)
+            self._placement = map_data.placement if map_data is not None \
+                else self.bot.game_info.placement_grid.data_numpy.astype(bool)
+        return self._placement
+
+    def _update_powered(self):
+        sources = self.bot.state.psionic_matrix.sources
+        key = (self.bot.game_info.pathing_grid.data_numpy.shape,
+               tuple(sorted((s.unit_tag, s.position.x, s.position.y, s.radius) for s in sources)))
+        if key == self._sources_key:
+            return
+        self._sources_key = key
+        self.rebuilds += 1
+
+        height, width = key[0]
+        powered = np.zeros((height, width), dtype=bool)
+        for source in sources:
+            x, y, r = source.position.x, source.position.y, source.radius
+            # Only touch the bounding box of each disc, cell centers are at +0.5
+            x0, x1 = max(int(x - r), 0), min(int(x + r) + 1, width)
+            y0, y1 = max(int(y - r), 0), min(int(y + r) + 1, height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            ys, xs = np.ogrid[y0:y1, x0:x1]
+            powered[y0:y1, x0:x1] |= (xs + 0.5 - x) ** 2 + (ys + 0.5 - y) ** 2 <= r * r
+        self.powered = powered
+
+    def _occupied(self) -> np.ndarray:
+        """ Cells under ground units and pending building sites, which the static grids don't know about. """
+        shape = self.powered.shape
+        occupied = np.zeros(shape, dtype=bool)
+
+        ground = [u for u in self.bot.all_units if not u.is_structure and not u.is_flying]
+        if ground:
+            pos = np.array([u.position_tuple for u in ground])
+            rad = np.array([max(u.radius, 0.5) for u in ground])
+            # Mark the cells each unit's bounding square touches
+            lo = np.floor(pos - rad[:, None]).astype(int)
+            hi = np.floor(pos + rad[:, None]).astype(int)
+            for (x0, y0), (x1, y1) in zip(lo, hi):
+                occupied[max(y0, 0):y1 + 1, max(x0, 0):x1 + 1] = True
+
+        # Building orders still walking to their site, and placeholders of queued buildings
+        pending = [(p.position, p.footprint_radius or 1) for p in self.bot.placeholders]
+        for worker in self.bot.workers:
+            for order in worker.orders:
+                if isinstance(order.target, Point2) and order.ability.button_name.startswith("Build"):
+                    pending.append((order.target, 1.5))
+        for center, r in pending:
+            x0, y0 = int(center.x - r), int(center.y - r)
+            occupied[max(y0, 0):int(center.y + r), max(x0, 0):int(center.x + r)] = True
+        return occupied
+
+    def _update_free(self):
+        loop = self.bot.state.game_loop
+        if self._free_key == (loop, self._sources_key):
+            return
+        self._free_key = (loop, self._sources_key)
+        # The pathing grid is refreshed every step and already excludes structures, minerals and rocks
+        pathable = self.bot.game_info.pathing_grid.data_numpy.astype(bool)
+        free = self.powered & pathable & ~self._occupied()
+        self._walkable = free
+        self._buildable = free & self._placement_grid() & (self.bot.state.creep.data_numpy == 0)
+
+    def update(self):
+        """ Bring the raster up to date with this step's observation, cheap when nothing changed. """
+        self._update_powered()
+        self._update_free()
+
+    @staticmethod
+    def _pick(centers: np.ndarray, near: Point2, count: int, spacing: float,
+              min_distance: float, max_distance: Optional[float]) -> List[Point2]:
+        if not len(centers):
+            return []
+        dist = np.hypot(centers[:, 0] - near.x, centers[:, 1] - near.y)
+        keep = dist >= min_distance
+        if max_distance is not None:
+            keep &= dist <= max_distance
+        centers, dist = centers[keep], dist[keep]
+        centers = centers[np.argsort(dist, kind="stable")]
+
+        # Greedy closest first, dropping every candidate within spacing of a pick
+        picks = []
+        while len(picks) < count and len(centers):
+            c = centers[0]
+            picks.append(Point2((float(c[0]), float(c[1]))))
+            far = (np.abs(centers[:, 0] - c[0]) >= spacing) | (np.abs(centers[:, 1] - c[1]) >= spacing)
+            centers = centers[far]
+        return picks
+
+    def warp_in_positions(self, count: int, near: Point2, spacing: float = 1.5,
+                          min_distance: float = 0, max_distance: Optional[float] = None) -> List[Point2]:
+        """ Up to count powered, pathable, unoccupied warp-in spots, closest to near first. """
+        self.update()
+        ys, xs = np.nonzero(self._walkable)
+        centers = np.column_stack((xs + 0.5, ys + 0.5))
+        return self._pick(centers, near, count, spacing, min_distance, max_distance)
+
+    def building_positions(self, count: int, near: Point2, size: int = 2, spacing: float = 0,
+                           min_distance: float = 0, max_distance: Optional[float] = None) -> List[Point2]:
+        """ Up to count non overlapping sites for size x size powered buildings, closest to near first. """
+        self.update()
+        if self._buildable.shape[0] < size or self._buildable.shape[1] < size:
+            return []
+        # A site is valid when its whole footprint is buildable
+        fits = sliding_window_view(self._buildable, (size, size)).all(axis=(2, 3))
+        ys, xs = np.nonzero(fits)
+        centers = np.column_stack((xs + size / 2, ys + size / 2))
+        return self._pick(centers, near, count, size + spacing, min_distance, max_distance)
@@ -0,0 +1,398 @@
+# Base imports
+import argparse
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Additional imports
+from loguru import logger
+
+# Local imports
+from common.replay_index import parse_replay
+
+# Advisory file locks are POSIX only, elsewhere appends are serialized within the process alone
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Roll over to a new segment file past this many bytes
+SEGMENT_BYTES = 1 << 30
+
+# Queue sentinels for the writer thread
+_FLUSH = object()
+_STOP = object()
+
+# Replay header and details metadata kept on each games row, the columns ReplayIndex has for loose replays. map is
+# the runner's map name, replay_map the one the replay details spell out
+METADATA = (("replay_map", "TEXT"), ("build", "INTEGER"), ("base_build", "INTEGER"), ("version", "TEXT"),
+            ("game_loops", "INTEGER"), ("duration", "REAL"), ("played_at", "TEXT"), ("players", "TEXT"),
+            ("error", "TEXT"))
+
+# runner.py names replays {bot}_{map}_{timestamp}[_{n}].SC2Replay
+_NAME = re.compile(r"^(?P<bot>[a-z]+(?:_[a-z]+)*)_(?P<map>.+)_(?P<date>\d{8}_\d{6})(?:_\d+)?\.SC2Replay$")
+
+
+class ReplayArchive:
+    """ Replays packed into large append-only segment files, addressed by the sha1 of their content.
+
+    Each distinct replay is stored once, zlib compressed when that makes it smaller, at an (segment, offset, length)
+    recorded in a SQLite index. A second table maps every archived game (bot, map, opponent, result, date, the runner
+    record and the replay's own metadata, see METADATA) to its blob, so fetching one replay is one index lookup and
+    one seek, and a filtered batch is read in segment order with one open per segment. The index is the source of
+    truth; bytes appended by a process that died before committing its index row are never referenced. It is also
+    the replay index of archived games, ReplayIndex only sees the loose files runner.py --archive deletes.
+
+    Several processes may share one archive: put() holds an exclusive lock on segments/.lock while it picks the
+    current segment from the index, appends and commits the blob's row, so offsets never overlap. """
+
+    def __init__(self, root: str, segment_bytes: int = SEGMENT_BYTES, level: int = 6):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.level = level
+        os.makedirs(os.path.join(root, "segments"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS blobs (
+            sha1 TEXT PRIMARY KEY, segment INTEGER, offset INTEGER, length INTEGER, size INTEGER, codec TEXT)""")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS games (
+            id INTEGER PRIMARY KEY, sha1 TEXT, name TEXT, bot TEXT, map TEXT, opponent TEXT, result TEXT,
+            date TEXT, record TEXT)""")
+        # Archives created before the metadata columns get them added, their games read as not parsed yet
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(games)")}
+        for column, kind in METADATA:
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE games ADD COLUMN {column} {kind}")
+        for columns in ("bot, map", "result", "date", "name", "sha1"):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS games_{columns.replace(', ', '_')} ON games ({columns})")
+        self._db.commit()
+        row = self._db.execute("SELECT MAX(segment) FROM blobs").fetchone()
+        self._segment = row[0] or 1
+        self._file = None
+        self._lock_file = open(os.path.join(root, "segments", ".lock"), "ab")
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.root, "segments", f"{segment:06d}.pack")
+
+    @contextmanager
+    def _exclusive(self):
+        """ Hold the archive's file lock, shared with every other process writing to it. """
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _append(self, blob: bytes) -> Tuple[int, int]:
+        """ Append to the current segment, rolling over when it is full, returns (segment, offset). Call it under
+        _exclusive(), another process may have rolled over to a newer segment since the last append. """
+        latest = self._db.execute("SELECT MAX(segment) FROM blobs").fetchone()[0] or 1
+        if latest > self._segment:
+            if self._file:
+                self._file.close()
+                self._file = None
+            self._segment = latest
+        if self._file is None:
+            self._file = open(self._segment_path(self._segment), "ab")
+        offset = self._file.seek(0, os.SEEK_END)
+        if offset and offset + len(blob) > self.segment_bytes:
+            self._file.close()
+            self._segment += 1
+            self._file = open(self._segment_path(self._segment), "ab")
+            offset = 0
+        self._file.write(blob)
+        self._file.flush()
+        return self._segment, offset
+
+    def put(self, data: bytes, record: Optional[dict] = None, name: Optional[str] = None) -> str:
+        """ Archive one replay and the game it came from, returns its sha1. Known content is not stored again. """
+        record = record or {}
+        digest = hashlib.sha1(data).hexdigest()
+        metadata = _metadata(data)
+        with self._lock, self._exclusive():
+            if self._db.execute("SELECT 1 FROM blobs WHERE sha1 = ?", (digest,)).fetchone() is None:
+                packed = zlib.compress(data, self.level)
+                codec = "zlib" if len(packed) < len(data) else "raw"
+                blob = packed if codec == "zlib" else data
+                segment, offset = self._append(blob)
+                self._db.execute("INSERT INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                                 (digest, segment, offset, len(blob), len(data), codec))
+            columns = ["sha1", "name", "bot", "map", "opponent", "result", "date", "record"] + list(metadata)
+            self._db.execute(
+                f"INSERT INTO games ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                (digest, name, record.get("bot"), record.get("map"), record.get("opponent"), record.get("result"),
+                 record.get("started"), json.dumps(record), *metadata.values()))
+            self._db.commit()
+        return digest
+
+    def backfill(self) -> int:
+        """ Parse the metadata of games archived before it was kept, returns how many replays were parsed. """
+        with self._lock:
+            pending = self._db.execute(
+                "SELECT DISTINCT sha1 FROM games WHERE game_loops IS NULL AND error IS NULL").fetchall()
+        for (digest,) in pending:
+            metadata = _metadata(self.get(digest))
+            with self._lock:
+                self._db.execute(f"UPDATE games SET {', '.join(f'{c} = ?' for c in metadata)} WHERE sha1 = ?",
+                                 (*metadata.values(), digest))
+                self._db.commit()
+        return len(pending)
+
+    def _read(self, f, offset: int, length: int, codec: str) -> bytes:
+        f.seek(offset)
+        blob = f.read(length)
+        return zlib.decompress(blob) if codec == "zlib" else blob
+
+    def get(self, key: str) -> Optional[bytes]:
+        """ Replay bytes by sha1 or by original file name, None if not archived. """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT segment, offset, length, codec FROM blobs WHERE sha1 = ? OR sha1 = "
+                "(SELECT sha1 FROM games WHERE name = ? LIMIT 1)", (key, os.path.basename(key))).fetchone()
+        if row is None:
+            return None
+        segment, offset, length, codec = row
+        with open(self._segment_path(segment), "rb") as f:
+            return self._read(f, offset, length, codec)
+
+    def query(self, bot: Optional[str] = None, map_name: Optional[str] = None, opponent: Optional[str] = None,
+              result: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              limit: Optional[int] = None) -> List[dict]:
+        """ Archived games matching every given filter, dates as ISO strings (since inclusive, until exclusive). """
+        where, args = [], []
+        for column, op, value in (("bot", "=", bot), ("map", "=", map_name), ("opponent", "=", opponent),
+                                  ("result", "=", result), ("date", ">=", since), ("date", "<", until)):
+            if value is not None:
+                where.append(f"g.{column} {op} ?")
+                args.append(value)
+        sql = ("SELECT g.id, g.sha1, g.name, g.bot, g.map, g.opponent, g.result, g.date, "
+               + "".join(f"g.{column}, " for column, _ in METADATA)
+               + "b.segment, b.offset, b.length, b.size, b.codec FROM games g JOIN blobs b ON b.sha1 = g.sha1")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY g.date, g.id"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            cursor = self._db.execute(sql, args)
+            columns = [c[0] for c in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor]
+        for row in rows:
+            row["players"] = json.loads(row["players"]) if row["players"] else None
+        return rows
+
+    def fetch(self, rows: Iterable[dict]) -> Iterator[Tuple[dict, bytes]]:
+        """ (row, replay bytes) for rows from query(), read in segment and offset order. """
+        f, open_segment = None, None
+        try:
+            for row in sorted(rows, key=lambda r: (r["segment"], r["offset"])):
+                if row["segment"] != open_segment:
+                    if f:
+                        f.close()
+                    f, open_segment = open(self._segment_path(row["segment"]), "rb"), row["segment"]
+                yield row, self._read(f, row["offset"], row["length"], row["codec"])
+        finally:
+            if f:
+                f.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            games = self._db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+            blobs, size, stored, segments = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0), COUNT(DISTINCT segment) "
+                "FROM blobs").fetchone()
+        return {"games": games, "replays": blobs, "bytes": size, "stored_bytes": stored, "segments": segments}
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+            self._lock_file.close()
+            self._db.close()
+
+
+def _metadata(data: bytes) -> Dict[str, object]:
+    """ METADATA column values of one replay, a replay that doesn't parse keeps its error instead. """
+    try:
+        meta = parse_replay(data)
+    # Corrupt or truncated replays are archived all the same
+    except Exception as error:  # pylint: disable=W0718
+        return {"error": f"{type(error).__name__}: {error}"}
+    values = {column: meta[column] for column, _ in METADATA if column in meta}
+    values["replay_map"] = meta["map"]
+    values["players"] = json.dumps(meta["players"])
+    return values
+
+
+class ArchiveWriter:
+    """ Moves finished replays into a ReplayArchive on a background thread, so games never wait on the disk.
+
+    submit() only enqueues the path and its record. The thread reads, hashes, compresses and appends the replay, and
+    deletes the loose file once its index row is committed. A file that isn't there yet is retried a few times,
+    SC2 can still be writing it when the game record is already done. """
+
+    def __init__(self, archive: ReplayArchive, retries: int = 5, retry_delay: float = 1.0):
+        self.archive = archive
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.archived = 0
+        self.failed = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._flushed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replay-archiver", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, record: Optional[dict] = None, delete: bool = True):
+        self._queue.put((path, record, delete))
+
+    def _archive(self, path: str, record: Optional[dict], delete: bool):
+        for attempt in range(self.retries + 1):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                break
+            except FileNotFoundError:
+                if attempt == self.retries:
+                    logger.warning(f"Replay {path} never appeared, not archived")
+                    self.failed += 1
+                    return
+                time.sleep(self.retry_delay)
+        self.archive.put(data, record, name=os.path.basename(path))
+        self.archived += 1
+        if delete:
+            os.remove(path)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _FLUSH:
+                self._flushed.set()
+                continue
+            if item is _STOP:
+                return
+            try:
+                self._archive(*item)
+            except Exception as error:  # pylint: disable=W0718
+                logger.error(f"Archiving {item[0]} failed: {error!r}")
+                self.failed += 1
+
+    def flush(self, timeout: Optional[float] = None):
+        """ Block until everything submitted so far is archived. """
+        self._flushed.clear()
+        self._queue.put(_FLUSH)
+        self._flushed.wait(timeout)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+
+def records_by_name(results_path: str) -> Dict[str, dict]:
+    """ runner.py records from game_results.jsonl keyed by replay file name. """
+    records = {}
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("replay"):
+                    records[os.path.basename(record["replay"])] = record
+    return records
+
+
+def import_dir(archive: ReplayArchive, replay_dir: str, records: Dict[str, dict], delete: bool = False) -> int:
+    """ Archive every loose replay under replay_dir, with its runner record or what its file name tells. """
+    count = 0
+    for root, _dirs, files in os.walk(replay_dir):
+        for name in files:
+            if not name.endswith(".SC2Replay"):
+                continue
+            record = records.get(name)
+            if record is None:
+                match = _NAME.match(name)
+                record = {}
+                if match:
+                    started = datetime.strptime(match["date"], "%Y%m%d_%H%M%S").isoformat(timespec="seconds")
+                    record = {"bot": match["bot"], "map": match["map"], "started": started}
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                archive.put(f.read(), record, name=name)
+            if delete:
+                os.remove(path)
+            count += 1
+    return count
+
+
+def main():
+    home = os.getenv("VOID_BOT_HOME", ".")
+    parser = argparse.ArgumentParser(description="Packed, content-addressed replay archive")
+    parser.add_argument("--archive", default=os.path.join(home, "replay_archive"), help="Archive directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    imp = commands.add_parser("import", help="Archive a directory of loose replays")
+    imp.add_argument("replay_dir")
+    imp.add_argument("--results", default=os.path.join(home, "logs", "game_results.jsonl"),
+                     help="runner.py records to take bot, opponent and result from")
+    imp.add_argument("--delete", action="store_true", help="Remove the loose files once archived")
+    find = commands.add_parser("query", help="List archived games, optionally extracting their replays")
+    find.add_argument("--bot")
+    find.add_argument("--map")
+    find.add_argument("--opponent")
+    find.add_argument("--result")
+    find.add_argument("--since", help="ISO date, inclusive")
+    find.add_argument("--until", help="ISO date, exclusive")
+    find.add_argument("--limit", type=int)
+    find.add_argument("--out", help="Write the matching replays into this directory")
+    get = commands.add_parser("get", help="Extract one replay by sha1 or original file name")
+    get.add_argument("key")
+    get.add_argument("--out", default=".", help="Directory to write it to")
+    commands.add_parser("stats", help="Games, distinct replays and sizes")
+    commands.add_parser("backfill", help="Parse the replay metadata of games archived before it was kept")
+    args = parser.parse_args()
+
+    archive = ReplayArchive(args.archive)
+    if args.command == "import":
+        count = import_dir(archive, args.replay_dir, records_by_name(args.results), delete=args.delete)
+        print(f"Archived {count} replays")
+    elif args.command == "query":
+        rows = archive.query(args.bot, args.map, args.opponent, args.result, args.since, args.until, args.limit)
+        for row in rows:
+            duration = f"{row['duration']:7.1f}s" if row["duration"] is not None else " " * 8
+            print(f"{row['sha1'][:12]}  {row['date'] or '':19s}  {row['bot'] or '':14s}  {row['map'] or '':24s}  "
+                  f"{row['opponent'] or '':36s}  {duration}  {row['result'] or ''}")
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            for row, data in archive.fetch(rows):
+                with open(os.path.join(args.out, row["name"] or f"{row['sha1']}.SC2Replay"), "wb") as f:
+                    f.write(data)
+        print(f"{len(rows)} games")
+    elif args.command == "get":
+        data = archive.get(args.key)
+        if data is None:
+            raise SystemExit(f"{args.key} is not archived")
+        name = os.path.basename(args.key) if args.key.endswith(".SC2Replay") else f"{args.key}.SC2Replay"
+        os.makedirs(args.out, exist_ok=True)
+        with open(os.path.join(args.out, name), "wb") as f:
+            f.write(data)
+        print(f"Wrote {os.path.join(args.out, name)}")
+    elif args.command == "backfill":
+        print(f"Parsed {archive.backfill()} replays")
+    else:
+        print(", ".join(f"{k}: {v}" for k, v in archive.stats().items()))
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
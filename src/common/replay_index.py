@@ -0,0 +1,285 @@
+# Base imports
+import argparse
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# Additional imports
+import mpyq
+
+# Game loops per real second on "faster" game speed
+GAME_LOOPS_PER_SECOND = 22.4
+
+# Result enum used by replay.details
+DETAILS_RESULTS = {0: "Undecided", 1: "Victory", 2: "Defeat", 3: "Tie"}
+
+# Hashes already in the index, handed to each pool worker once through the initializer
+_known_hashes = frozenset()
+
+
+class VersionedDecoder:
+    """ Schema-less decoder for the self-describing "versioned" encoding used by the replay header and details.
+
+    Structs come back as dicts keyed by field tag, so no per-build protocol module is needed. """
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._pos = 0
+
+    def _read(self, count: int) -> bytes:
+        chunk = self._data[self._pos:self._pos + count]
+        if len(chunk) != count:
+            raise ValueError("Truncated versioned data")
+        self._pos += count
+        return chunk
+
+    def _byte(self) -> int:
+        return self._read(1)[0]
+
+    def _vint(self) -> int:
+        b = self._byte()
+        negative = b & 1
+        result = (b >> 1) & 0x3f
+        bits = 6
+        while b & 0x80:
+            b = self._byte()
+            result |= (b & 0x7f) << bits
+            bits += 7
+        return -result if negative else result
+
+    def decode(self):
+        kind = self._byte()
+        # Array
+        if kind == 0:
+            return [self.decode() for _ in range(self._vint())]
+        # Bit array, returned as (bit count, bytes)
+        if kind == 1:
+            length = self._vint()
+            return length, self._read((length + 7) // 8)
+        # Blob
+        if kind == 2:
+            return self._read(self._vint())
+        # Choice, returned as {tag: value}
+        if kind == 3:
+            tag = self._vint()
+            return {tag: self.decode()}
+        # Optional
+        if kind == 4:
+            return self.decode() if self._byte() else None
+        # Struct, returned as {tag: value}
+        if kind == 5:
+            fields = {}
+            for _ in range(self._vint()):
+                tag = self._vint()
+                fields[tag] = self.decode()
+            return fields
+        # Fixed width values
+        if kind == 6:
+            return self._byte()
+        if kind == 7:
+            return struct.unpack(">I", self._read(4))[0]
+        if kind == 8:
+            return struct.unpack(">Q", self._read(8))[0]
+        # Variable length int
+        if kind == 9:
+            return self._vint()
+        raise ValueError(f"Unknown versioned type {kind}")
+
+
+def _text(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return "" if value is None else str(value)
+
+
+def _filetime_to_iso(filetime) -> str:
+    # replay.details stores Windows FILETIME, 100ns ticks since 1601
+    if not isinstance(filetime, int) or filetime <= 0:
+        return ""
+    stamp = datetime(1601, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=filetime // 10)
+    return stamp.isoformat()
+
+
+def parse_replay(data: bytes) -> dict:
+    """ Pull header and details metadata out of raw .SC2Replay bytes. """
+    archive = mpyq.MPQArchive(io.BytesIO(data), listfile=False)
+
+    # Header lives in the MPQ user data block
+    header = VersionedDecoder(archive.header["user_data_header"]["content"]).decode()
+    version = header.get(1, {})
+    game_loops = header.get(3, 0)
+
+    details = VersionedDecoder(archive.read_file("replay.details")).decode()
+    players = []
+    for player in details.get(0) or []:
+        players.append({
+            "name": _text(player.get(0)),
+            "race": _text(player.get(2)),
+            "team": player.get(5),
+            "result": DETAILS_RESULTS.get(player.get(8), "Undecided"),
+        })
+
+    return {
+        "map": _text(details.get(1)),
+        "build": version.get(4),
+        "base_build": version.get(5),
+        "version": ".".join(str(version.get(i, 0)) for i in range(1, 4)),
+        "game_loops": game_loops,
+        "duration": round(game_loops / GAME_LOOPS_PER_SECOND, 1),
+        "played_at": _filetime_to_iso(details.get(5)),
+        "players": players,
+    }
+
+
+def _init_worker(known_hashes):
+    global _known_hashes
+    _known_hashes = known_hashes
+
+
+def _index_file(job):
+    """ Pool worker: hash the file and parse it unless the hash is already indexed. """
+    path, size, mtime = job
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return path, size, mtime, None, None, str(e)
+
+    digest = hashlib.sha1(data).hexdigest()
+    if digest in _known_hashes:
+        return path, size, mtime, digest, None, None
+
+    try:
+        return path, size, mtime, digest, parse_replay(data), None
+    # Corrupt or truncated replays are recorded with their error, not fatal
+    except Exception as e:  # pylint: disable=W0718
+        return path, size, mtime, digest, None, f"{type(e).__name__}: {e}"
+
+
+class ReplayIndex:
+    """ SQLite index of replay metadata, keyed by path and content hash.
+
+    Covers loose replay files. Replays runner.py --archive moves into the ReplayArchive are indexed there, with the
+    same metadata on their games rows; a scan drops the rows of files archived away. """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.db = sqlite3.connect(db_path)
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS replays (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                sha1 TEXT,
+                map TEXT,
+                build INTEGER,
+                base_build INTEGER,
+                version TEXT,
+                game_loops INTEGER,
+                duration REAL,
+                played_at TEXT,
+                players TEXT,
+                error TEXT
+            )"""
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS replays_sha1 ON replays (sha1)")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def scan(self, replay_dir: str, workers: int = None, chunksize: int = 64) -> dict:
+        """ Index every new or changed replay under replay_dir, returns counts per outcome. """
+        stats = {"seen": 0, "unchanged": 0, "rehashed": 0, "parsed": 0, "failed": 0, "removed": 0}
+
+        # Files whose size and mtime match the index are skipped without being opened
+        indexed = {row[0]: (row[1], row[2]) for row in self.db.execute("SELECT path, size, mtime FROM replays")}
+        jobs = []
+        on_disk = set()
+        for root, _dirs, files in os.walk(replay_dir):
+            for name in files:
+                if not name.endswith(".SC2Replay"):
+                    continue
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                on_disk.add(path)
+                stats["seen"] += 1
+                if indexed.get(path) == (st.st_size, st.st_mtime):
+                    stats["unchanged"] += 1
+                else:
+                    jobs.append((path, st.st_size, st.st_mtime))
+
+        # Drop entries for replays that no longer exist
+        removed = [(path,) for path in indexed if path not in on_disk and path.startswith(replay_dir)]
+        self.db.executemany("DELETE FROM replays WHERE path = ?", removed)
+        stats["removed"] = len(removed)
+
+        if jobs:
+            known = frozenset(row[0] for row in self.db.execute("SELECT DISTINCT sha1 FROM replays WHERE error IS NULL"))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(known,)) as pool:
+                for path, size, mtime, digest, meta, error in pool.map(_index_file, jobs, chunksize=chunksize):
+                    if meta is None and error is None:
+                        # Touched or copied file with known content, reuse the existing metadata
+                        self.db.execute(
+                            """INSERT OR REPLACE INTO replays
+                               SELECT ?, ?, ?, sha1, map, build, base_build, version, game_loops, duration,
+                                      played_at, players, error
+                               FROM replays WHERE sha1 = ? LIMIT 1""",
+                            (path, size, mtime, digest),
+                        )
+                        stats["rehashed"] += 1
+                    elif error is not None:
+                        self.db.execute(
+                            "INSERT OR REPLACE INTO replays (path, size, mtime, sha1, error) VALUES (?, ?, ?, ?, ?)",
+                            (path, size, mtime, digest, error),
+                        )
+                        stats["failed"] += 1
+                    else:
+                        self.db.execute(
+                            "INSERT OR REPLACE INTO replays VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+                            (
+                                path, size, mtime, digest, meta["map"], meta["build"], meta["base_build"],
+                                meta["version"], meta["game_loops"], meta["duration"], meta["played_at"],
+                                json.dumps(meta["players"]),
+                            ),
+                        )
+                        stats["parsed"] += 1
+
+        self.db.commit()
+        return stats
+
+    def rows(self):
+        """ Yield every successfully indexed replay as a dict. """
+        cursor = self.db.execute(
+            """SELECT path, sha1, map, build, base_build, version, game_loops, duration, played_at, players
+               FROM replays WHERE error IS NULL ORDER BY path"""
+        )
+        columns = [c[0] for c in cursor.description]
+        for row in cursor:
+            entry = dict(zip(columns, row))
+            entry["players"] = json.loads(entry["players"])
+            yield entry
+
+
+def main():
+    home = os.getenv("VOID_BOT_HOME", ".")
+    parser = argparse.ArgumentParser(description="Index replay metadata without launching SC2")
+    parser.add_argument("--replay-dir", default=os.path.join(home, "replays"), help="Directory to scan for replays")
+    parser.add_argument("--index", default=os.path.join(home, "logs", "replay_index.sqlite"), help="Index database")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.index)), exist_ok=True)
+    index = ReplayIndex(args.index)
+    stats = index.scan(os.path.abspath(args.replay_dir), workers=args.workers)
+    index.close()
+    print(", ".join(f"{k}: {v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Base imports
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# Additional imports
+import psutil
+
+
+class ResourceMonitor:
+    """ Samples RSS, CPU time and thread counts of this Python process and its SC2 children on a background thread.
+
+    Start it right before a game and stop it right after; stop() returns a summary with the raw samples, the
+    memory growth of each side over the game, and a leak flag when either grew by more than the threshold.
+
+    sc2_pids returns the game process pids at each sample (a pooled client is launched or recycled while the
+    monitor runs), without it SC2 is looked up among this process' children. Samples that found no SC2 process
+    keep its fields as None, and a summary without any reports sc2_measured False instead of zero usage. """
+
+    def __init__(self, interval: float = 1.0, growth_threshold_mb: float = 200.0,
+                 sc2_pids: Optional[Callable[[], List[int]]] = None):
+        self.interval = interval
+        self.growth_threshold_mb = growth_threshold_mb
+        self.sc2_pids = sc2_pids
+        self.samples: List[Dict[str, float]] = []
+        self._me = psutil.Process(os.getpid())
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._t0 = 0.0
+
+    def _sc2_processes(self) -> List[psutil.Process]:
+        if self.sc2_pids is not None:
+            procs = []
+            for pid in self.sc2_pids():
+                try:
+                    proc = psutil.Process(pid)
+                    procs += [proc] + proc.children(recursive=True)
+                except psutil.Error:
+                    pass
+            return procs
+        # SC2 is launched as a child of the runner, directly or through Wine
+        try:
+            return [p for p in self._me.children(recursive=True) if "sc2" in p.name().lower()]
+        except psutil.Error:
+            return []
+
+    @staticmethod
+    def _measure(procs: List[psutil.Process]):
+        rss = cpu = threads = 0
+        for proc in procs:
+            try:
+                with proc.oneshot():
+                    rss += proc.memory_info().rss
+                    times = proc.cpu_times()
+                    cpu += times.user + times.system
+                    threads += proc.num_threads()
+            except psutil.Error:
+                continue
+        return rss / 2**20, cpu, threads
+
+    def sample(self):
+        py_rss, py_cpu, py_threads = self._measure([self._me])
+        sc2 = self._sc2_processes()
+        sc2_rss, sc2_cpu, sc2_threads = self._measure(sc2)
+        self.samples.append({
+            "t": round(time.perf_counter() - self._t0, 3),
+            "py_rss_mb": round(py_rss, 1),
+            "py_cpu_s": round(py_cpu, 3),
+            "py_threads": py_threads,
+            "sc2_rss_mb": round(sc2_rss, 1) if sc2 else None,
+            "sc2_cpu_s": round(sc2_cpu, 3) if sc2 else None,
+            "sc2_threads": sc2_threads if sc2 else None,
+        })
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.samples = []
+        self._stop.clear()
+        self._t0 = time.perf_counter()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="resource-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sample()
+        return self.summary()
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"samples": []}
+        first, last = self.samples[0], self.samples[-1]
+        # SC2 may not be up yet at the first sample, so its baseline is the first sample it shows up in
+        sc2_seen = [s for s in self.samples if s["sc2_rss_mb"] is not None]
+        py_growth = last["py_rss_mb"] - first["py_rss_mb"]
+        summary = {
+            "py_rss_peak_mb": max(s["py_rss_mb"] for s in self.samples),
+            "py_rss_growth_mb": round(py_growth, 1),
+            "py_cpu_s": round(last["py_cpu_s"] - first["py_cpu_s"], 3),
+            "sc2_measured": bool(sc2_seen),
+            "leak_suspect": py_growth > self.growth_threshold_mb,
+            "samples": self.samples,
+        }
+        if sc2_seen:
+            sc2_growth = sc2_seen[-1]["sc2_rss_mb"] - sc2_seen[0]["sc2_rss_mb"]
+            summary.update({
+                "sc2_rss_peak_mb": max(s["sc2_rss_mb"] for s in sc2_seen),
+                "sc2_rss_growth_mb": round(sc2_growth, 1),
+                "sc2_cpu_s": round(sc2_seen[-1]["sc2_cpu_s"] - sc2_seen[0]["sc2_cpu_s"], 3),
+            })
+            summary["leak_suspect"] |= sc2_growth > self.growth_threshold_mb
+        return summary
@@ -0,0 +1,174 @@
+# Base imports
+import argparse
+import glob
+import os
+import signal
+import sys
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Additional imports
+from loguru import logger
+
+# Trim these from file names so frames read like sc2/bot_ai.py:already_pending
+_PREFIXES = sorted({p for p in sys.path if p and os.path.isdir(p)}, key=len, reverse=True)
+
+
+def short_path(path: str) -> str:
+    """ path relative to the sys.path entry it was imported from. """
+    for prefix in _PREFIXES:
+        if path.startswith(prefix):
+            return path[len(prefix):].lstrip(os.sep)
+    return path
+
+
+def _label(code) -> str:
+    return f"{short_path(code.co_filename)}:{code.co_name}"
+
+
+# Profiler of the game whose task is running, each game sharing the event loop (runner.py --concurrent) runs in its
+# own task and context. The handler runs between two bytecodes of the interrupted task and reads that task's value
+_resumed: ContextVar[Optional["SamplingProfiler"]] = ContextVar("resumed_profiler", default=None)
+
+
+class SamplingProfiler:
+    """ Samples the Python stack of the main thread, the one running the bot, every interval of CPU time while resumed.
+
+    The bot resumes it at the start of on_step and pauses it at the end, so only step time is sampled. SIGPROF from
+    setitimer interrupts the bot's own thread, the handler sees the exact frame it was in; a sampling thread would
+    only get the GIL, and see the stack, when the bot releases it around socket I/O. Games sharing a process each
+    have their own profiler and resume it in their own task: a sample goes to the profiler of the task interrupted, and
+    the process wide timer stays on while any game is inside a step, so a step awaiting the server while another
+    game steps still gets its samples. Samples are kept as collapsed stacks
+    (root;...;leaf -> count), the input format of flamegraph.pl, speedscope and inferno. Unix only. """
+
+    # Profilers resumed, the timer runs while there is one
+    _active = 0
+
+    def __init__(self, interval_ms: float = 5.0):
+        self.interval = interval_ms / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._labels: Dict[object, str] = {}
+        signal.signal(signal.SIGPROF, SamplingProfiler._sample)
+
+    @staticmethod
+    def _sample(signum, frame):
+        profiler = _resumed.get()
+        if profiler is not None and frame is not None:
+            profiler.stacks[profiler._collapse(frame)] += 1  # pylint: disable=W0212
+            profiler.samples += 1
+
+    def _collapse(self, frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _label(code)
+            names.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def resume(self):
+        _resumed.set(self)
+        SamplingProfiler._active += 1
+        if SamplingProfiler._active == 1:
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def pause(self):
+        _resumed.set(None)
+        SamplingProfiler._active -= 1
+        if not SamplingProfiler._active:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        write_collapsed(self.stacks, path)
+
+    @classmethod
+    def from_env(cls) -> Optional["SamplingProfiler"]:
+        """ Profiler sampling every VOID_BOT_PROFILE ms, None when the variable is unset (runner.py --profile). """
+        interval = os.getenv("VOID_BOT_PROFILE")
+        if not interval:
+            return None
+        if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+            logger.warning("Sampling profiler needs setitimer and the main thread, profiling disabled")
+            return None
+        return cls(float(interval))
+
+
+def profile_path(bot_name: str, map_name: str) -> str:
+    """ One collapsed stack file per game, grouped in a folder per bot and map. """
+    root = os.getenv("VOID_BOT_PROFILE_DIR") or os.path.join(os.getenv("VOID_BOT_HOME", "."), "profiles")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(root, f"{bot_name}_{map_name.replace(' ', '_')}", f"{timestamp}_{os.getpid()}.collapsed")
+
+
+def write_collapsed(stacks: Counter, path: str):
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def read_collapsed(path: str) -> Counter:
+    stacks: Counter = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def merge(paths: Iterable[str]) -> Counter:
+    """ Sum collapsed stacks over many games. Directories are searched recursively for .collapsed files. """
+    stacks: Counter = Counter()
+    for path in paths:
+        files = glob.glob(os.path.join(path, "**", "*.collapsed"), recursive=True) if os.path.isdir(path) else [path]
+        for file in files:
+            stacks.update(read_collapsed(file))
+    return stacks
+
+
+def hot_paths(stacks: Counter, top: int = 20) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+    """ (self samples, inclusive samples) of the top frames, a frame counts once per stack for inclusive. """
+    own: Counter = Counter()
+    inclusive: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    return own.most_common(top), inclusive.most_common(top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge collapsed stack profiles and print the hot paths")
+    parser.add_argument("paths", nargs="+", help="Profile files or directories (searched recursively)")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", default=None, help="Write the merged collapsed stacks here, for a flame graph")
+    args = parser.parse_args()
+    stacks = merge(args.paths)
+    total = sum(stacks.values())
+    if not total:
+        print("No samples found")
+        return
+    if args.out:
+        write_collapsed(stacks, args.out)
+    own, inclusive = hot_paths(stacks, args.top)
+    print(f"{total} samples in {len(stacks)} distinct stacks")
+    for title, rows in (("Self", own), ("Inclusive", inclusive)):
+        print(f"\n{title}:")
+        for frame, count in rows:
+            print(f"  {100 * count / total:6.2f}%  {count:8d}  {frame}")
+    print("\nHottest stacks:")
+    for stack, count in stacks.most_common(min(args.top, 10)):
+        print(f"  {100 * count / total:6.2f}%  {stack.split(';')[-1]}  <-  {';'.join(stack.split(';')[-4:-1])}")
+
+
+if __name__ == "__main__":
+    main()
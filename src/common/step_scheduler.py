@@ -0,0 +1,62 @@
+# Base imports
+import inspect
+import time
+from collections import Counter
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Callable, List
+
+
+class Priority(IntEnum):
+    """ Lower runs first. CRITICAL always runs, the others only while the step is within budget. """
+    CRITICAL = 0
+    MACRO = 1
+    DEBUG = 2
+
+
+@dataclass
+class StepTask:
+    name: str
+    fn: Callable
+    priority: Priority
+    # Consecutive steps this task was skipped for
+    waiting: int = 0
+
+
+class StepScheduler:
+    """ Runs the bot's tasks each step within a time budget measured from the start of the step.
+
+    Critical tasks always run. Macro and debug tasks run in priority order, longest waiting first, until the budget
+    is spent; the rest are deferred to the next step. A task deferred max_defer steps in a row runs regardless of the
+    budget so it can't starve. deferred counts every skipped run per task for the whole game. """
+
+    def __init__(self, budget_ms: float = 40.0, max_defer: int = 8):
+        self.budget = budget_ms / 1000
+        self.max_defer = max_defer
+        self.tasks: List[StepTask] = []
+        self.deferred: Counter = Counter()
+        self.forced = 0
+
+    @property
+    def deferred_total(self) -> int:
+        return sum(self.deferred.values())
+
+    def add(self, name: str, fn: Callable, priority: Priority = Priority.MACRO):
+        """ fn takes no arguments and may be a coroutine function. """
+        self.tasks.append(StepTask(name, fn, priority))
+
+    async def run(self, started: float):
+        """ Run this step's tasks, started is the time.perf_counter() the step began at. """
+        order = sorted(self.tasks, key=lambda t: (t.priority, -t.waiting))
+        for task in order:
+            over = time.perf_counter() - started > self.budget
+            if over and task.priority != Priority.CRITICAL:
+                if task.waiting < self.max_defer:
+                    task.waiting += 1
+                    self.deferred[task.name] += 1
+                    continue
+                self.forced += 1
+            task.waiting = 0
+            result = task.fn()
+            if inspect.isawaitable(result):
+                await result
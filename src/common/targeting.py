@@ -0,0 +1,127 @@
+# SC2 imports
+from sc2.bot_ai import BotAI
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.unit import Unit
+from sc2.units import Units
+
+# Base imports
+from typing import Dict, Iterable, Optional, Tuple
+
+# Additional imports
+import numpy as np
+
+# Units whose attack isn't a weapon in the game data, (ground dps, air dps) on normal speed like the weapon values
+ABILITY_ATTACK_DPS = {
+    UnitTypeId.BATTLECRUISER: (35.7, 22.3),
+    UnitTypeId.ORACLE: (24.6, 0.0),
+}
+
+
+def unit_dps(unit: Unit) -> Tuple[float, float]:
+    """ (ground dps, air dps) of a unit without upgrades. """
+    if unit.type_id in ABILITY_ATTACK_DPS:
+        return ABILITY_ATTACK_DPS[unit.type_id]
+    return unit.ground_dps, unit.air_dps
+
+
+def unit_range(unit: Unit) -> Tuple[float, float]:
+    return unit.ground_range, unit.air_range
+
+
+class TargetingEngine:
+    """ Shared focus-fire target assignment.
+
+    The attackable enemy set is built once per game loop. assign() scores every attacker x target pair at once
+    (time to get in range, time to kill, target threat) and hands out targets cheapest first, moving attackers
+    to the next target once enough damage is committed to kill the current one, so damage is focused instead of
+    spread over whatever happens to be closest. """
+
+    def __init__(self, bot: BotAI, hp_weight: float = 0.05, threat_weight: float = 0.05, horizon: float = 2.0,
+                 overkill_penalty: float = 1000.0):
+        self.bot = bot
+        self.hp_weight = hp_weight
+        self.threat_weight = threat_weight
+        self.horizon = horizon
+        self.overkill_penalty = overkill_penalty
+        self._loop = -1
+        self._targets: Units = Units([], bot)
+        self._target_columns = None
+
+    @property
+    def targets(self) -> Units:
+        """ Attackable enemy units and structures, built once per game loop. """
+        self._refresh()
+        return self._targets
+
+    def _refresh(self):
+        loop = self.bot.state.game_loop
+        if loop == self._loop:
+            return
+        self._loop = loop
+        self._targets = (self.bot.enemy_units | self.bot.enemy_structures).filter(lambda unit: unit.can_be_attacked)
+        targets = self._targets
+        if not targets:
+            self._target_columns = None
+            return
+        dps = np.array([unit_dps(t) for t in targets], dtype=float)
+        self._target_columns = {
+            "pos": np.array([t.position_tuple for t in targets], dtype=float),
+            "radius": np.array([t.radius for t in targets], dtype=float),
+            "ehp": np.array([t.health + t.shield for t in targets], dtype=float),
+            "flying": np.array([t.is_flying for t in targets], dtype=bool),
+            "threat": dps.max(axis=1),
+        }
+
+    def cost_matrix(self, attackers: Iterable[Unit], max_distance: Optional[float] = None):
+        """ attacker x target cost matrix plus the per pair dps, inf where the attacker can't hit the target. """
+        self._refresh()
+        attackers = list(attackers)
+        cols = self._target_columns
+        if not attackers or cols is None:
+            return np.zeros((len(attackers), 0)), np.zeros((len(attackers), 0))
+
+        pos = np.array([a.position_tuple for a in attackers], dtype=float)
+        radius = np.array([a.radius for a in attackers], dtype=float)
+        speed = np.maximum(np.array([a.real_speed for a in attackers], dtype=float), 0.1)
+        dps_ga = np.array([unit_dps(a) for a in attackers], dtype=float)
+        rng_ga = np.array([unit_range(a) for a in attackers], dtype=float)
+
+        # Pick the ground or air column per target
+        flying = cols["flying"][None, :]
+        dps = np.where(flying, dps_ga[:, 1:2], dps_ga[:, 0:1])
+        rng = np.where(flying, rng_ga[:, 1:2], rng_ga[:, 0:1])
+
+        delta = pos[:, None, :] - cols["pos"][None, :, :]
+        dist = np.sqrt((delta ** 2).sum(axis=2))
+        gap = np.maximum(dist - rng - radius[:, None] - cols["radius"][None, :], 0)
+
+        with np.errstate(divide="ignore"):
+            cost = gap / speed[:, None] + self.hp_weight * cols["ehp"][None, :] / dps \
+                - self.threat_weight * cols["threat"][None, :]
+        cost[dps <= 0] = np.inf
+        if max_distance is not None:
+            cost[dist > max_distance] = np.inf
+        return cost, dps
+
+    def assign(self, attackers: Iterable[Unit], max_distance: Optional[float] = None) -> Dict[int, Unit]:
+        """ Focus-fire assignment, attacker tag -> target. Attackers without a reachable target are left out. """
+        attackers = list(attackers)
+        cost, dps = self.cost_matrix(attackers, max_distance)
+        if cost.size == 0:
+            return {}
+
+        targets = self._targets
+        remaining = self._target_columns["ehp"].copy()
+        penalty = np.zeros(cost.shape[1])
+        assignment: Dict[int, Unit] = {}
+        # Attackers closest to a good target commit first
+        for i in np.argsort(cost.min(axis=1), kind="stable"):
+            row = cost[i] + penalty
+            j = int(np.argmin(row))
+            if not np.isfinite(row[j]):
+                continue
+            assignment[attackers[i].tag] = targets[j]
+            remaining[j] -= dps[i, j] * self.horizon
+            if remaining[j] <= 0:
+                penalty[j] = self.overkill_penalty
+        return assignment
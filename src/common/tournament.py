@@ -0,0 +1,301 @@
+# Base imports
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import time
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Additional imports
+from aiohttp import web
+from loguru import logger
+
+
+@dataclass
+class Job:
+    """ One game to play. opponent is "<Race>:<Difficulty>", the built-in AI. """
+    id: str
+    bot: str
+    map: str
+    opponent: str
+    seed: int
+
+
+def make_jobs(bots: Iterable[str], maps: Iterable[str], opponents: Iterable[str], games: int = 1,
+              seed: int = 0) -> List[Job]:
+    """ Every bot x map x opponent cell games times. Ids and seeds only depend on the cell and the game number, so
+    every node building the same list agrees on it. """
+    jobs = []
+    for bot in bots:
+        for map_name in maps:
+            for opponent in opponents:
+                for game in range(games):
+                    key = f"{bot}|{map_name}|{opponent}|{game}|{seed}"
+                    digest = hashlib.sha1(key.encode()).hexdigest()
+                    jobs.append(Job(digest[:16], bot, map_name, opponent, int(digest[16:24], 16)))
+    return sorted(jobs, key=lambda j: j.id)
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """ "i/n" -> (i, n), shards are numbered from 0. """
+    index, count = (int(v) for v in text.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"Shard {text}: index must be in [0, {count})")
+    return index, count
+
+
+def shard(jobs: List[Job], index: int, count: int) -> List[Job]:
+    """ Static split for clusters without shared storage, every job lands in exactly one shard. """
+    return [job for i, job in enumerate(sorted(jobs, key=lambda j: j.id)) if i % count == index]
+
+
+class JobQueue:
+    """ SQLite backed job table with leases.
+
+    lease() hands out a pending job, or one whose lease ran out because its worker died, inside an immediate
+    transaction so concurrent workers on the same file (shared storage) or the coordinator's handlers never get the
+    same job. Jobs are inserted with INSERT OR IGNORE, restarting the coordinator on the same file resumes the
+    tournament. A job whose lease ran out max_attempts times (it keeps killing its workers) is not handed out again,
+    it is failed with a Crash record instead. """
+
+    def __init__(self, path: str, replay_dir: Optional[str] = None, max_attempts: int = 3):
+        self.path = path
+        self.replay_dir = replay_dir
+        self.max_attempts = max_attempts
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, bot TEXT, map TEXT, opponent TEXT, seed INTEGER,
+            state TEXT DEFAULT 'pending', worker TEXT, lease_until REAL, attempts INTEGER DEFAULT 0, result TEXT)""")
+
+    def add(self, jobs: Iterable[Job]) -> int:
+        before = self._db.total_changes
+        self._db.executemany("INSERT OR IGNORE INTO jobs (id, bot, map, opponent, seed) VALUES (?, ?, ?, ?, ?)",
+                             [(j.id, j.bot, j.map, j.opponent, j.seed) for j in jobs])
+        return self._db.total_changes - before
+
+    def give_up(self) -> List[dict]:
+        """ Fail the jobs whose last allowed lease ran out, returns their Crash records. """
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._db.execute(
+                "SELECT id, bot, map, opponent, seed, worker, attempts FROM jobs "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?", (now, self.max_attempts)).fetchall()
+            records = [{"bot": bot, "map": map_name, "opponent": opponent, "seed": seed, "result": "Crash",
+                        "job": job_id, "worker": worker, "attempts": attempts}
+                       for job_id, bot, map_name, opponent, seed, worker, attempts in rows]
+            self._db.executemany("UPDATE jobs SET state = 'failed', result = ? WHERE id = ?",
+                                 [(json.dumps(record), record["job"]) for record in records])
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        for record in records:
+            logger.warning(f"Job {record['job']} failed after {record['attempts']} leases ran out")
+        return records
+
+    def lease(self, worker: str, timeout: float) -> Optional[Job]:
+        self.give_up()
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                "SELECT id, bot, map, opponent, seed FROM jobs WHERE state = 'pending' "
+                "OR (state = 'leased' AND lease_until < ? AND attempts < ?) ORDER BY attempts, id LIMIT 1",
+                (now, self.max_attempts)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, "
+                                 "attempts = attempts + 1 WHERE id = ?", (worker, now + timeout, row[0]))
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        return Job(*row) if row else None
+
+    def complete(self, job_id: str, worker: str, record: dict) -> bool:
+        """ Store the result row, False when the lease was lost and another worker already finished the job. A late
+        result still replaces the Crash record of a job failed meanwhile. """
+        cursor = self._db.execute("UPDATE jobs SET state = 'done', worker = ?, result = ? "
+                                  "WHERE id = ? AND state != 'done'", (worker, json.dumps(record), job_id))
+        return cursor.rowcount == 1
+
+    def upload_replay(self, job_id: str, path: str):
+        """ Copy the replay next to the queue, a no-op when it's already there (shared storage). """
+        if self.replay_dir and os.path.exists(path):
+            os.makedirs(self.replay_dir, exist_ok=True)
+            target = os.path.join(self.replay_dir, f"{job_id}.SC2Replay")
+            if os.path.abspath(path) != os.path.abspath(target):
+                shutil.copyfile(path, target)
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def results(self) -> List[dict]:
+        """ Records of the done and failed jobs. """
+        return [json.loads(r[0]) for r in self._db.execute(
+            "SELECT result FROM jobs WHERE state IN ('done', 'failed') ORDER BY id")]
+
+    def finished(self) -> bool:
+        counts = self.counts()
+        return sum(counts.values()) == counts.get("done", 0) + counts.get("failed", 0)
+
+
+class Coordinator:
+    """ Small HTTP front end over a JobQueue for workers on other machines.
+
+    POST /lease {"worker", "timeout"} -> job json, 204 when nothing is left to lease
+    POST /complete/<id> {"worker", "record"} -> 200, 409 if another worker finished it first
+    PUT /replay/<id> raw replay bytes, stored under the queue's replay_dir
+    GET /status -> job counts per state (pending, leased, done, failed)
+
+    Leases and completed records also update metrics, a TournamentMetrics, when given. """
+
+    def __init__(self, queue: JobQueue, metrics=None):
+        self.queue = queue
+        self.metrics = metrics
+        self.app = web.Application(client_max_size=256 * 1024 * 1024)
+        self.app.add_routes([
+            web.post("/lease", self._lease),
+            web.post("/complete/{job}", self._complete),
+            web.put("/replay/{job}", self._replay),
+            web.get("/status", self._status),
+        ])
+
+    async def _lease(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if self.metrics is not None:
+            for record in self.queue.give_up():
+                self.metrics.game_finished(record["job"], record)
+        job = self.queue.lease(body["worker"], float(body.get("timeout", 1800)))
+        if job is None:
+            return web.Response(status=204)
+        logger.info(f"Leased {job.id} ({job.bot} on {job.map} vs {job.opponent}) to {body['worker']}")
+        if self.metrics is not None:
+            self.metrics.game_started(job.bot, key=job.id)
+        return web.json_response(asdict(job))
+
+    async def _complete(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        ok = self.queue.complete(request.match_info["job"], body["worker"], body["record"])
+        if ok and self.metrics is not None:
+            self.metrics.game_finished(request.match_info["job"], body["record"])
+        return web.Response(status=200 if ok else 409)
+
+    async def _replay(self, request: web.Request) -> web.Response:
+        os.makedirs(self.queue.replay_dir, exist_ok=True)
+        path = os.path.join(self.queue.replay_dir, f"{request.match_info['job']}.SC2Replay")
+        with open(path, "wb") as f:
+            async for chunk in request.content.iter_chunked(1 << 16):
+                f.write(chunk)
+        return web.Response(status=200)
+
+    async def _status(self, request: web.Request) -> web.Response:
+        return web.json_response(self.queue.counts())
+
+    def serve(self, host: str, port: int, stop_when_done: bool = True, poll: float = 5.0):
+        """ Serve until every job is done (or forever), blocking. """
+        async def run():
+            runner = web.AppRunner(self.app)
+            await runner.setup()
+            await web.TCPSite(runner, host, port).start()
+            logger.info(f"Coordinator on {host}:{port}, {self.queue.counts()}")
+            try:
+                while not (stop_when_done and self.queue.finished()):
+                    await asyncio.sleep(poll)
+            finally:
+                await runner.cleanup()
+
+        asyncio.run(run())
+
+
+class WorkerClient:
+    """ Worker side of the Coordinator protocol, plain urllib so a worker needs nothing beyond the runner. """
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, data: Optional[bytes] = None,
+                 content_type: str = "application/json") -> Tuple[int, bytes]:
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, b""
+
+    def lease(self, worker: str, timeout: float) -> Optional[Job]:
+        status, body = self._request("POST", "/lease", json.dumps({"worker": worker, "timeout": timeout}).encode())
+        return Job(**json.loads(body)) if status == 200 else None
+
+    def complete(self, job_id: str, worker: str, record: dict) -> bool:
+        payload = json.dumps({"worker": worker, "record": record}).encode()
+        return self._request("POST", f"/complete/{job_id}", payload)[0] == 200
+
+    def finished(self) -> bool:
+        status, body = self._request("GET", "/status")
+        if status != 200:
+            # Not a sign the tournament is over, count it as a failed poll
+            raise urllib.error.URLError(f"/status answered {status}")
+        counts = json.loads(body)
+        return sum(counts.values()) == counts.get("done", 0) + counts.get("failed", 0)
+
+    def upload_replay(self, job_id: str, path: str):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self._request("PUT", f"/replay/{job_id}", f.read(), "application/octet-stream")
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(source, play: Callable[[Job], Tuple[dict, Optional[str]]], worker: Optional[str] = None,
+               lease_timeout: float = 1800.0, poll: float = 10.0, max_failures: int = 6) -> int:
+    """ Lease jobs from source (a JobQueue on shared storage or a WorkerClient) until every job is done, play each
+    one and hand back its record and replay. play(job) returns (record, replay path or None), a job it raises on is
+    reported as a Crash. While other workers
+    still hold leases this one waits, in case they die and their jobs come back. Gives up after max_failures
+    unreachable coordinator polls in a row, it shuts down once the tournament is over. Returns games played. """
+    worker = worker or worker_name()
+    played = 0
+    failures = 0
+    while True:
+        try:
+            job = source.lease(worker, lease_timeout)
+            if job is None and source.finished():
+                return played
+        except (OSError, urllib.error.URLError) as error:
+            failures += 1
+            if failures >= max_failures:
+                logger.info(f"Worker {worker}: coordinator unreachable ({error}), assuming the tournament is over")
+                return played
+            time.sleep(poll)
+            continue
+        failures = 0
+        if job is None:
+            time.sleep(poll)
+            continue
+        try:
+            record, replay = play(job)
+        except Exception as error:
+            # One broken game must not take the worker down with the rest of the tournament
+            logger.exception(f"Worker {worker}: {job.id} ({job.bot} on {job.map} vs {job.opponent}) failed")
+            record = {"bot": job.bot, "map": job.map, "opponent": job.opponent, "seed": job.seed, "result": "Crash",
+                      "error": repr(error)}
+            replay = None
+        record["job"] = job.id
+        record["worker"] = worker
+        if replay:
+            source.upload_replay(job.id, replay)
+        if not source.complete(job.id, worker, record):
+            logger.info(f"Worker {worker}: {job.id} was already finished elsewhere after the lease ran out")
+        played += 1
@@ -0,0 +1,361 @@
+# SC2 imports
+from sc2.bot_ai import BotAI
+from sc2.constants import CREATION_ABILITY_FIX, TERRAN_STRUCTURES_REQUIRE_SCV
+from sc2.dicts.unit_trained_from import UNIT_TRAINED_FROM
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.ids.upgrade_id import UpgradeId
+from sc2.position import Point2
+from sc2.unit import Unit
+from sc2.unit_command import UnitCommand
+
+# Base imports
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple, Union
+
+# Additional imports
+from loguru import logger
+
+Item = Union[UnitTypeId, UpgradeId]
+
+# Workers inside refineries and units inside transports drop out of the observation without dying
+UNOBSERVED_WHILE_ALIVE = {UnitTypeId.SCV, UnitTypeId.PROBE, UnitTypeId.DRONE, UnitTypeId.MULE}
+
+# The egg turns into the unit keeping the larva's tag, its command resolves on that type change. The second
+# zergling of a pair is a new unit and must not take another egg's command
+FROM_LARVA = {t for t, producers in UNIT_TRAINED_FROM.items() if producers == {UnitTypeId.LARVA}}
+
+
+class UnitCounters:
+    """ Live counts of own units, structures and upgrades, kept up to date from the event hooks.
+
+    existing: finished units and structures (and completed upgrades)
+    in_progress: structures under construction and units still warping in
+    ordered: commands issued from this bot that did not turn into a unit, structure or upgrade yet
+
+    A Terran structure under construction is pending only while an SCV holds its build order, like for
+    already_pending: the SCV's command resolves when construction starts and the SCV becomes the structure's
+    builder, one pulled away (or killed) leaves it unattended until an SCV takes the build order up again.
+
+    Lookups are dict reads instead of the scans behind already_pending and self.structures(...).amount. Issued
+    commands are recorded from self.actions at the end of each step and resolved by the created / construction /
+    type changed / upgrade events. Commands the server dropped (no money, blocked placement, replaced orders) are
+    pruned every reconcile_loops game loops by checking only the units that hold outstanding commands. With check
+    enabled every count is compared against the library calls each step and differences are logged. """
+
+    def __init__(self, bot: BotAI, check: bool = False, reconcile_loops: int = 8):
+        self.bot = bot
+        self.check = check
+        self.reconcile_loops = reconcile_loops
+        self.mismatches = 0
+        self.existing: Counter = Counter()
+        self.in_progress: Counter = Counter()
+        self.ordered: Counter = Counter()
+        self._units: Dict[int, Tuple[UnitTypeId, bool]] = {}
+        # unit tag -> [item, command ability, game loop issued, target point or None]
+        self._orders: Dict[int, List[list]] = defaultdict(list)
+        self._warping: set = set()
+        # Terran structure under construction -> tag of the SCV constructing it, None while unattended
+        self._builders: Dict[int, Optional[int]] = {}
+        self._last_reconcile = 0
+        self._build_ability_maps()
+        for unit in bot.units | bot.structures:
+            self._add(unit)
+
+    def _build_ability_maps(self):
+        """ Command ability -> created item, from the same creation abilities already_pending uses. """
+        game_data = self.bot.game_data
+        self._exact: Dict[int, Item] = {}
+        self._generic: Dict[int, List[UnitTypeId]] = defaultdict(list)
+        # Types sharing their creation ability with another (lowered depots, lifted buildings) -> the type the
+        # command is recorded as, already_pending counts the same orders for both
+        self._same_order: Dict[UnitTypeId, Item] = {}
+        # Types already_pending can answer for, it logs an error for the others (larva, eggs)
+        self._pendable = set(CREATION_ABILITY_FIX)
+        for unit_id, unit_data in game_data.units.items():
+            ability = unit_data.creation_ability
+            if ability is None:
+                continue
+            try:
+                type_id = UnitTypeId(unit_id)
+            except ValueError:
+                continue
+            self._pendable.add(type_id)
+            claimed = self._exact.setdefault(ability.exact_id, type_id)
+            if claimed != type_id:
+                self._same_order[type_id] = claimed
+            elif ability.id != ability.exact_id:
+                self._generic[ability.id].append(type_id)
+        for upgrade_id, upgrade_data in game_data.upgrades.items():
+            ability = upgrade_data.research_ability
+            if ability is None:
+                continue
+            try:
+                self._exact.setdefault(ability.exact_id, UpgradeId(upgrade_id))
+            except ValueError:
+                continue
+
+    def _item_for(self, command: UnitCommand) -> Optional[Item]:
+        item = self._exact.get(command.ability)
+        if item is not None:
+            return item
+        candidates = self._generic.get(command.ability, [])
+        if len(candidates) == 1:
+            return candidates[0]
+        # Generic addon abilities are shared between producers, STARPORT + BUILD_TECHLAB -> STARPORTTECHLAB
+        producer = command.unit.type_id.name.replace("FLYING", "")
+        for candidate in candidates:
+            if candidate.name.startswith(producer):
+                return candidate
+        return None
+
+    # Lookups
+
+    def ready(self, item: Item) -> int:
+        """ Like self.structures(item).ready.amount, or 1 if the upgrade is complete. """
+        return self.existing[item]
+
+    def amount(self, item: UnitTypeId) -> int:
+        """ Like self.structures(item).amount or self.units(item).amount, finished and under construction. """
+        return self.existing[item] + self.in_progress[item]
+
+    def pending(self, item: Item) -> int:
+        """ Like already_pending, under construction or warping in plus commanded but not started. """
+        item = self._same_order.get(item, item)
+        unattended = sum(1 for tag, builder in self._builders.items() if builder is None and self._units[tag][0] == item)
+        return self.in_progress[item] - unattended + self.ordered[item]
+
+    def researching(self, upgrade: UpgradeId) -> bool:
+        return self.ordered[upgrade] > 0
+
+    def started(self, upgrade: UpgradeId) -> bool:
+        """ Researching or complete, like already_pending_upgrade(upgrade) > 0. """
+        return self.researching(upgrade) or self.existing[upgrade] > 0
+
+    # Event hooks
+
+    def _add(self, unit: Unit):
+        known = self._units.get(unit.tag)
+        if known is not None:
+            if known[0] == unit.type_id:
+                return
+            # Zerg buildings keep the tag of the drone that became them, move its count to the new type
+            self._forget(unit.tag)
+        ready = unit.is_ready
+        self._units[unit.tag] = (unit.type_id, ready)
+        if ready:
+            self.existing[unit.type_id] += 1
+        else:
+            self.in_progress[unit.type_id] += 1
+            if not unit.is_structure:
+                self._warping.add(unit.tag)
+
+    def _forget(self, tag: int):
+        type_id, ready = self._units.pop(tag)
+        (self.existing if ready else self.in_progress)[type_id] -= 1
+        self._warping.discard(tag)
+        self._builders.pop(tag, None)
+
+    def _set_ready(self, tag: int):
+        type_id, ready = self._units[tag]
+        if not ready:
+            self._units[tag] = (type_id, True)
+            self.in_progress[type_id] -= 1
+            self.existing[type_id] += 1
+        self._warping.discard(tag)
+
+    def _resolve(self, item: Item, tag: Optional[int] = None):
+        """ Drop one outstanding command for item, the one on tag if it has one. """
+        tags = [tag] if tag in self._orders else []
+        for candidate in tags + list(self._orders):
+            entries = self._orders[candidate]
+            for i, entry in enumerate(entries):
+                if entry[0] == item:
+                    del entries[i]
+                    self.ordered[item] -= 1
+                    if not entries:
+                        del self._orders[candidate]
+                    return
+
+    def _resolve_all(self, item: Item):
+        for tag in list(self._orders):
+            for entry in [e for e in self._orders[tag] if e[0] == item]:
+                self._orders[tag].remove(entry)
+                self.ordered[item] -= 1
+            if not self._orders[tag]:
+                del self._orders[tag]
+
+    def _ordered_at(self, item: Item, position: Point2) -> Optional[int]:
+        """ Tag of the worker ordered to build item at position, None if no command targeted it. When several
+        were sent to the same spot, the one whose order is gone placed it (a probe) and the others walk on. """
+        tags = [tag for tag, entries in self._orders.items()
+                if any(e[0] == item and e[3] is not None and e[3].distance_to(position) < 1 for e in entries)]
+        if len(tags) > 1:
+            for worker in self.bot.workers.tags_in(tags):
+                if not any(isinstance(order.target, Point2) and order.target.distance_to(position) < 1
+                           for order in worker.orders):
+                    return worker.tag
+        return tags[0] if tags else None
+
+    def _drop_orders(self, tag: int) -> bool:
+        entries = self._orders.pop(tag, [])
+        for entry in entries:
+            self.ordered[entry[0]] -= 1
+        return bool(entries)
+
+    def on_unit_created(self, unit: Unit):
+        self._add(unit)
+        if unit.type_id not in FROM_LARVA:
+            self._resolve(unit.type_id)
+
+    def on_building_construction_started(self, unit: Unit):
+        self._add(unit)
+        # The command of the worker that placed it, an SCV keeps its build order while constructing and must not
+        # stay counted as ordered too. A drone became the building and has its tag
+        builder = unit.tag if unit.tag in self._orders else self._ordered_at(unit.type_id, unit.position)
+        self._resolve(unit.type_id, builder)
+        if unit.type_id in TERRAN_STRUCTURES_REQUIRE_SCV:
+            self._builders[unit.tag] = builder if builder is not None else self._constructing(unit)
+
+    def on_building_construction_complete(self, unit: Unit):
+        self._builders.pop(unit.tag, None)
+        if unit.tag not in self._units:
+            # Starting townhall, first seen already complete
+            self._add(unit)
+        else:
+            self._set_ready(unit.tag)
+
+    def on_unit_type_changed(self, unit: Unit, previous_type: UnitTypeId):
+        if unit.tag not in self._units:
+            self._add(unit)
+            return
+        _, ready = self._units[unit.tag]
+        counter = self.existing if ready else self.in_progress
+        counter[previous_type] -= 1
+        counter[unit.type_id] += 1
+        self._units[unit.tag] = (unit.type_id, ready)
+        # Morphs: gateway -> warp gate, larva -> egg -> unit, command center -> orbital
+        self._resolve(unit.type_id, unit.tag)
+
+    def on_unit_destroyed(self, unit_tag: int):
+        if unit_tag in self._units:
+            self._forget(unit_tag)
+        self._drop_orders(unit_tag)
+        self._leave_construction(unit_tag)
+
+    def on_upgrade_complete(self, upgrade: UpgradeId):
+        self._resolve_all(upgrade)
+        self.existing[upgrade] = 1
+
+    # Per step
+
+    def record(self, actions: List[UnitCommand]) -> bool:
+        """ Count this step's commands, called after the bot's step with self.actions. True when a train, build or
+        research was ordered, or dropped by a unit given another command. """
+        loop = self.bot.state.game_loop
+        changed = False
+        for command in actions:
+            if not self.bot.prevent_double_actions(command):
+                # Repeats the unit's current order, never sent to the server
+                continue
+            if not command.queue and not command.unit.is_structure:
+                # A direct command replaces whatever the unit was doing, production queues only grow
+                changed |= self._drop_orders(command.unit.tag)
+                changed |= self._leave_construction(command.unit.tag)
+            item = self._item_for(command)
+            if item is None:
+                continue
+            target = command.target if isinstance(command.target, Point2) else None
+            self._orders[command.unit.tag].append([item, command.ability, loop, target])
+            self.ordered[item] += 1
+            changed = True
+        return changed
+
+    def _leave_construction(self, tag: int) -> bool:
+        """ The SCV tag stopped constructing, True if it was. """
+        for structure, builder in self._builders.items():
+            if builder == tag:
+                self._builders[structure] = None
+                return True
+        return False
+
+    def _creation_ability(self, type_id: UnitTypeId):
+        return self.bot.game_data.units[type_id.value].creation_ability.exact_id
+
+    def _constructing(self, structure: Unit) -> Optional[int]:
+        """ Tag of the SCV whose build order targets structure, its position while placing or its tag when
+        resuming, None if there is none. An SCV still walking there with a command of its own counts as ordered. """
+        ability = self._creation_ability(structure.type_id)
+        for worker in self.bot.workers:
+            if any(entry[0] == structure.type_id for entry in self._orders.get(worker.tag, ())):
+                continue
+            for order in worker.orders:
+                if order.ability.exact_id == ability and order.target in (structure.tag, structure.position):
+                    return worker.tag
+        return None
+
+    def _reconcile(self):
+        loop = self.bot.state.game_loop
+        holders = {}
+        for unit in self.bot.units | self.bot.structures:
+            if unit.tag in self._orders:
+                holders[unit.tag] = unit
+            if unit.tag in self._warping and unit.is_ready:
+                self._set_ready(unit.tag)
+            if unit.tag in self._builders:
+                # Builders the server stopped, and SCVs sent back to an unattended structure
+                self._builders[unit.tag] = self._constructing(unit)
+
+        for tag in list(self._orders):
+            unit = holders.get(tag)
+            if unit is None:
+                # Out of sight inside a refinery or transport, keep its commands until it is back
+                continue
+            live = Counter()
+            for order in unit.orders:
+                live[order.ability.id] += 1
+                if order.ability.exact_id != order.ability.id:
+                    live[order.ability.exact_id] += 1
+            kept = []
+            for entry in self._orders[tag]:
+                item, ability, issued, _ = entry
+                if issued >= loop or live[ability] > 0:
+                    live[ability] -= 1
+                    kept.append(entry)
+                else:
+                    self.ordered[item] -= 1
+            if kept:
+                self._orders[tag] = kept
+            else:
+                del self._orders[tag]
+
+    def step(self):
+        """ Called at the start of each step, after the events of this observation were issued. """
+        loop = self.bot.state.game_loop
+        if loop - self._last_reconcile >= self.reconcile_loops or self.check:
+            self._last_reconcile = loop
+            self._reconcile()
+        if self.check:
+            self.cross_check()
+
+    def cross_check(self) -> int:
+        """ Compare every tracked count with the library calls, log and return the number of differences. """
+        bot = self.bot
+        found = 0
+        items = set(self.existing) | set(self.in_progress) | set(self.ordered)
+        for item in items:
+            if isinstance(item, UpgradeId):
+                expected = bot.already_pending_upgrade(item)
+                checks = [("ready", self.ready(item), int(expected == 1)),
+                          ("researching", self.researching(item), 0 < expected < 1)]
+            else:
+                own = bot.units(item) | bot.structures(item)
+                checks = [("pending", self.pending(item), bot.already_pending(item))] if item in self._pendable else []
+                if item not in UNOBSERVED_WHILE_ALIVE:
+                    checks += [("ready", self.ready(item), own.ready.amount), ("amount", self.amount(item), own.amount)]
+            for name, got, expected in checks:
+                if got != expected:
+                    found += 1
+                    logger.warning(f"Counter mismatch at loop {bot.state.game_loop}: {name}({item.name}) "
+                                   f"counted {got}, library says {expected}")
+        self.mismatches += found
+        return found
@@ -0,0 +1,116 @@
+# SC2 imports
+from sc2.bot_ai import BotAI
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.unit import Unit
+from sc2.units import Units
+
+# Base imports
+from typing import Dict, List
+
+# Additional imports
+import numpy as np
+
+# Bits of the flags column
+FLYING = 1
+STRUCTURE = 2
+READY = 4
+ATTACK_GROUND = 8
+ATTACK_AIR = 16
+IDLE = 32
+ENEMY = 64
+
+UNIT_DTYPE = np.dtype([
+    ("tag", np.uint64),
+    ("type", np.uint32),
+    ("x", np.float32),
+    ("y", np.float32),
+    ("radius", np.float32),
+    ("hp", np.float32),
+    ("hp_max", np.float32),
+    ("shield", np.float32),
+    ("shield_max", np.float32),
+    ("cooldown", np.float32),
+    ("flags", np.uint16),
+    ("order", np.uint32),
+])
+
+
+class UnitSnapshot:
+    """ One numpy structured array row per own unit / structure and visible or remembered enemy, built once per game
+    loop straight from the protobuf fields.
+
+    Hot loops read columns (data["x"], data["cooldown"], flags masks) instead of going through the Unit properties,
+    which decode the proto again on every access. rows maps tags to row indexes and units holds the Unit of each
+    row, for turning the picked rows back into objects to command. Own rows come first, enemy rows after them. """
+
+    def __init__(self, bot: BotAI):
+        self.bot = bot
+        self.game_loop = -1
+        self.data = np.zeros(0, dtype=UNIT_DTYPE)
+        self.units: List[Unit] = []
+        self.rows: Dict[int, int] = {}
+        self.n_own = 0
+        self._type_flags: Dict[UnitTypeId, int] = {}
+
+    def _static_flags(self, unit: Unit) -> int:
+        """ Flags that only depend on the unit type. """
+        flags = self._type_flags.get(unit.type_id)
+        if flags is None:
+            flags = (ATTACK_GROUND if unit.can_attack_ground else 0) | (ATTACK_AIR if unit.can_attack_air else 0)
+            flags |= STRUCTURE if unit.is_structure else 0
+            self._type_flags[unit.type_id] = flags
+        return flags
+
+    def build(self):
+        bot = self.bot
+        own = list(bot.units) + list(bot.structures)
+        enemy = list(bot.enemy_units) + list(bot.enemy_structures)
+        self.units = own + enemy
+        n_own = len(own)
+
+        rows = []
+        for i, unit in enumerate(self.units):
+            proto = unit._proto  # pylint: disable=W0212
+            flags = self._static_flags(unit)
+            if proto.is_flying:
+                flags |= FLYING
+            if proto.build_progress == 1:
+                flags |= READY
+            if not proto.orders:
+                flags |= IDLE
+            if i >= n_own:
+                flags |= ENEMY
+            rows.append((
+                proto.tag, proto.unit_type, proto.pos.x, proto.pos.y, proto.radius, proto.health, proto.health_max,
+                proto.shield, proto.shield_max, proto.weapon_cooldown, flags,
+                proto.orders[0].ability_id if proto.orders else 0,
+            ))
+        self.data = np.array(rows, dtype=UNIT_DTYPE)
+        self.rows = {unit.tag: i for i, unit in enumerate(self.units)}
+        self.n_own = n_own
+        self.game_loop = bot.state.game_loop
+
+    # Selections
+
+    def mask(self, all_of: int = 0, none_of: int = 0) -> np.ndarray:
+        """ Rows with every bit of all_of set and no bit of none_of. """
+        flags = self.data["flags"]
+        return ((flags & all_of) == all_of) & ((flags & none_of) == 0)
+
+    def of_type(self, *types: UnitTypeId) -> np.ndarray:
+        return np.isin(self.data["type"], [t.value for t in types])
+
+    def xy(self, rows=slice(None)) -> np.ndarray:
+        """ (n, 2) positions of the given rows, a mask, index array or slice. """
+        picked = self.data[rows]
+        return np.stack([picked["x"], picked["y"]], axis=-1)
+
+    def distances(self, rows_a, rows_b) -> np.ndarray:
+        """ Center to center distances between two row selections, like Unit.distance_to. """
+        a, b = self.xy(rows_a), self.xy(rows_b)
+        return np.hypot(a[:, None, 0] - b[None, :, 0], a[:, None, 1] - b[None, :, 1])
+
+    def select(self, rows) -> Units:
+        """ Units of the given rows. """
+        index = np.flatnonzero(rows) if np.asarray(rows).dtype == bool else rows
+        return Units([self.units[i] for i in index], self.bot)
@@ -4,14 +4,43 @@ from sc2.bot_ai import BotAI
 # Base imports
 from loguru import logger
 from datetime import datetime
+import asyncio
 import os
 import json
+import time
+from contextlib import nullcontext
+from copy import copy
+from typing import Optional
 
 # Additional imports
 import pandas as pd
 
+# Local imports
+from common.alloc_tracker import AllocationTracker, alloc_path, log_summary
+from common.background import BackgroundExecutor
+from common.base_index import BaseIndex
+from common.build_order import ORDERS, STRUCTURES, UNITS, UPGRADES, StateVersions
+from common.combat_sim import CombatSimulator
+from common.decidedness import DecidednessDetector
+from common.distance_tuner import DistanceTuner
+from common.economy_sim import EconomyData
+from common.log_sink import end_game_log, start_game_log
+from common.map_data import MapData
+from common.metrics import StepHistogram
+from common.sampling_profiler import SamplingProfiler, profile_path
+from common.step_scheduler import Priority, StepScheduler
+from common.targeting import TargetingEngine
+from common.unit_counters import UnitCounters
+from common.unit_snapshot import UnitSnapshot
+
 class VoidBotBase(BotAI):
 
+    # Time per step for macro and debug tasks, realtime games and the ladder drop frames past ~44 ms
+    step_budget_ms = 40.0
+
+    # Pick burnysc2's distance backend from measurements on the live state, off keeps distance_calculation_method
+    tune_distances = True
+
     # Each bot optionally overrides this
     async def custom_on_start(self):
         pass
@@ -19,6 +48,55 @@ class VoidBotBase(BotAI):
     # Default on start, sets up logging
     async def on_start(self):
 
+        # Per game log file when the runner set up the batched sink, bound to this game's task under --concurrent
+        start_game_log(f"{self.__class__.__name__}_{self.game_info.map_name.replace(' ', '_')}",
+                       concurrent=bool(os.getenv("VOID_BOT_CONCURRENT")))
+
+        # Shared focus-fire target assignment
+        self.targeting = TargetingEngine(self)
+
+        # Engage / retreat estimates
+        self.combat = CombatSimulator(self)
+
+        # State versions bumped from the event hooks below, read by build order steps
+        self.state_versions = StateVersions()
+
+        # Live per type counts, CHECK_COUNTERS cross-checks them against the library every step
+        self.counters = UnitCounters(self, check=bool(os.getenv("CHECK_COUNTERS")))
+
+        # Minerals and geysers per expansion, answers "resources of this townhall" without a distance scan
+        self.bases = BaseIndex(self)
+
+        # Switches distance_calculation_method to the fastest backend for the current unit count
+        self.distance_tuner = DistanceTuner(self) if self.tune_distances else None
+
+        # Column view of all units, rebuilt on first use each game loop
+        self._snapshot = UnitSnapshot(self)
+
+        # Heavy analysis and file writes run here, results are stamped with the game loop they were started at
+        self.background = BackgroundExecutor(self)
+
+        # Static grids and distance fields, shared through VOID_BOT_MAP_CACHE by every game on this map. The first game
+        # on a map runs dijkstra from every start location, off the loop; the library swaps game_info's pathing grid
+        # every step, a shallow copy keeps the start one for the job
+        self.background.submit("map data", MapData.load, copy(self.game_info), os.getenv("VOID_BOT_MAP_CACHE"))
+
+        # Prioritized tasks run after custom_on_step, bots register them with add_task in custom_on_start
+        self.tasks = StepScheduler(self.step_budget_ms)
+
+        # Stack samples of on_step only, when the runner was started with --profile
+        self.profiler = SamplingProfiler.from_env()
+
+        # Allocation sites and GC pauses per step section, when the runner was started with --alloc
+        self.alloc = AllocationTracker.from_env()
+
+        # Duration of every on_step, the runner puts the buckets and percentiles in the game record
+        self.step_times = StepHistogram()
+
+        # Leave settled games early under runner.py --end-decided, the verdict replaces SC2's result in the record
+        self.decider = DecidednessDetector.from_env(self)
+        self.decided = None
+
         if os.getenv("DEV"):
             # Setup log paths
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -28,6 +106,11 @@ class VoidBotBase(BotAI):
             os.makedirs(log_dir, exist_ok=True)
             self.pandas_csv_path = os.path.join(log_dir, base_filename + ".csv")
 
+            # Keep a dump of the game data around for offline build order searches
+            economy_path = os.path.join(log_dir, "economy_data.json")
+            if not os.path.exists(economy_path):
+                self.background.submit("economy data", EconomyData.from_game_data(self.game_data).save, economy_path)
+
             # Get stat keys from score summary
             self.stat_keys = [stat[0] for stat in self.state.score.summary]
 
@@ -39,33 +122,155 @@ class VoidBotBase(BotAI):
 
     # Default on step, calls custom on step
     async def on_step(self, iteration):
-    
+        started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.resume()
+        if self.alloc is not None:
+            self.alloc.resume(self.state.game_loop)
+        try:
+            await self._step(iteration)
+        finally:
+            if self.alloc is not None:
+                self.alloc.pause()
+            if self.profiler is not None:
+                self.profiler.pause()
+            self.step_times.observe((time.perf_counter() - started) * 1e3)
+
+    async def _step(self, iteration):
+        started = time.perf_counter()
+
         if os.getenv("DEV"):
-            # Current stats
-            stats = {stat[0]: float(stat[1]) for stat in self.state.score.summary}
-            row = {"game_time": self.time}
-            row.update(stats)
+            with self.alloc_section("stats"):
+                # Current stats
+                stats = {stat[0]: float(stat[1]) for stat in self.state.score.summary}
+                row = {"game_time": self.time}
+                row.update(stats)
+
+                # Append row
+                self.df.loc[len(self.df)] = row
 
-            # Append row
-            self.df.loc[len(self.df)] = row
+        with self.alloc_section("counters"):
+            self.counters.step()
+
+            if self.distance_tuner is not None:
+                self.distance_tuner.step()
+
+        if self.decider is not None and (verdict := self.decider.check()) is not None:
+            # Left in _after_step, once the library is done sending this step's requests
+            logger.info(f"Leaving decided game: {verdict}")
+            self.decided = verdict
+            self.actions.clear()
+            return
 
         # Call custom on step
-        await self.custom_on_step(iteration)
+        with self.alloc_section("custom_on_step"):
+            await self.custom_on_step(iteration)
+
+        # Macro and debug tasks are deferred once the step is over budget
+        with self.alloc_section("tasks"):
+            await self.tasks.run(started)
+
+        # Only train, build and research commands change pending counts, moving and attacking units don't
+        if self.actions and self.counters.record(self.actions):
+            self.state_versions.bump(ORDERS)
+
+    async def _after_step(self) -> int:
+        """ The library's end of step, which sends the actions and debug draws, then leaves a decided game. The game
+        loop in sc2.main sees the client is no longer in the game and ends it without another request. """
+        game_loop = await super()._after_step()
+        if self.decided is not None and self.client.in_game:
+            await self.client.leave()
+        return game_loop
 
     # Custom on step, can be overridden by each bot
     async def custom_on_step(self, iteration):
         pass
 
+    def alloc_section(self, name):
+        """ Context manager charging the block's allocations and collections to name under runner.py --alloc. """
+        return nullcontext() if self.alloc is None else self.alloc.section(name)
+
+    def alloc_mark(self, name):
+        """ Charge the rest of the current section to name under runner.py --alloc, see AllocationTracker. """
+        if self.alloc is not None:
+            self.alloc.mark(name)
+
+    @property
+    def map_data(self) -> Optional[MapData]:
+        """ Shared map grids and distance fields, None until the background load is done. """
+        loaded = self.background.latest("map data")
+        return loaded.value if loaded is not None else None
+
+    @property
+    def snapshot(self) -> UnitSnapshot:
+        """ Structured array of our units and the enemy's for this game loop, see UnitSnapshot. """
+        if self._snapshot.game_loop != self.state.game_loop:
+            self._snapshot.build()
+        return self._snapshot
+
+    def add_task(self, name, fn, priority=Priority.MACRO):
+        """ Run fn every step after custom_on_step, skipped when the step is over budget unless CRITICAL. """
+        self.tasks.add(name, fn, priority)
+
+    # Event hooks, bots overriding these must call super() so the counters and build order steps see the change
+    async def on_unit_created(self, unit):
+        self.counters.on_unit_created(unit)
+        self.state_versions.bump(UNITS)
+
+    async def on_unit_destroyed(self, unit_tag):
+        self.counters.on_unit_destroyed(unit_tag)
+        self.bases.on_unit_destroyed(unit_tag)
+        self.state_versions.bump(UNITS, STRUCTURES)
+
+    async def on_unit_type_changed(self, unit, previous_type):
+        self.counters.on_unit_type_changed(unit, previous_type)
+        self.bases.on_unit_type_changed(unit)
+        self.state_versions.bump(UNITS, STRUCTURES)
+
+    async def on_building_construction_started(self, unit):
+        self.counters.on_building_construction_started(unit)
+        self.state_versions.bump(STRUCTURES)
+
+    async def on_building_construction_complete(self, unit):
+        self.counters.on_building_construction_complete(unit)
+        self.bases.on_building_construction_complete(unit)
+        self.state_versions.bump(STRUCTURES)
+
+    async def on_upgrade_complete(self, upgrade):
+        self.counters.on_upgrade_complete(upgrade)
+        self.state_versions.bump(UPGRADES)
+
     # Default on end fcn, mostly does logging
     async def on_end(self, game_result):
 
+        if self.tasks.deferred_total:
+            logger.info(f"Deferred {self.tasks.deferred_total} tasks over budget, {self.tasks.forced} forced: "
+                        f"{dict(self.tasks.deferred)}")
+
         if os.getenv("DEV"):
-            # Save to CSV
-            self.df.to_parquet(self.pandas_csv_path.replace(".csv", ".parquet"), index=False)
+            # Save to parquet without blocking the loop, other games may share it
+            path = self.pandas_csv_path.replace(".csv", ".parquet")
+            await asyncio.wrap_future(self.background.submit("parquet", self.df.to_parquet, path, index=False))
 
         # Get and specific bot logic
         await self.custom_on_end(game_result)
 
+        # Analysis still running is of no use anymore
+        self.background.shutdown(wait=False)
+
+        if self.profiler is not None:
+            path = profile_path(self.__class__.__name__, self.game_info.map_name)
+            self.profiler.write(path)
+            logger.info(f"Wrote {self.profiler.samples} stack samples to {path}")
+
+        if self.alloc is not None:
+            path = alloc_path(self.__class__.__name__, self.game_info.map_name)
+            log_summary(self.alloc.write(path))
+            self.alloc.close()
+            logger.info(f"Wrote allocation report of {self.alloc.steps} steps to {path}")
+
+        end_game_log()
+
     # Each bot optionally overrides this
     async def custom_on_end(self, game_result):
         pass
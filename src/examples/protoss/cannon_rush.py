@@ -7,9 +7,14 @@ from sc2.ids.unit_typeid import UnitTypeId
 from sc2.main import run_game
 from sc2.player import Bot, Computer
 
+from common.power_field import PowerField
+
 
 class CannonRushBot(BotAI):
 
+    async def on_start(self):
+        self.power_field = PowerField(self)
+
     # pylint: disable=R0912
     async def on_step(self, iteration):
         if iteration == 0:
@@ -52,13 +57,19 @@ class CannonRushBot(BotAI):
                 pylon = self.structures(UnitTypeId.PYLON).closer_than(20, self.enemy_start_locations[0]).random
                 await self.build(UnitTypeId.PHOTONCANNON, near=pylon)
 
-        # Decide if we should make pylon or cannons, then build them at random location near enemy spawn
+        # Put cannons on every free powered site near enemy spawn at once, extend the field with a pylon when none is left
         elif self.can_afford(UnitTypeId.PYLON) and self.can_afford(UnitTypeId.PHOTONCANNON):
-            # Ensure "fair" decision
-            for _ in range(20):
+            sites = self.power_field.building_positions(
+                self.minerals // 150, near=self.enemy_start_locations[0], min_distance=5, max_distance=12
+            )
+            for pos in sites:
+                worker = self.select_build_worker(pos)
+                if worker is None or not self.can_afford(UnitTypeId.PHOTONCANNON):
+                    break
+                worker.build(UnitTypeId.PHOTONCANNON, pos)
+            if not sites:
                 pos = self.enemy_start_locations[0].random_on_distance(random.randrange(5, 12))
-                building = UnitTypeId.PHOTONCANNON if self.state.psionic_matrix.covers(pos) else UnitTypeId.PYLON
-                await self.build(building, near=pos)
+                await self.build(UnitTypeId.PYLON, near=pos)
 
 
 def main():
@@ -1,3 +1,4 @@
+import os
 import random
 from typing import FrozenSet, Set
 
@@ -15,6 +16,8 @@ from sc2.position import Point2, Point3
 from sc2.unit import Unit
 from sc2.units import Units
 
+from common.log_sink import setup_logging
+
 
 class RampWallBot(BotAI):
 
@@ -281,6 +284,8 @@ def main():
         ]
     )
     _map = "PillarsofGoldLE"
+    # Realtime game, keep log writes out of the step
+    setup_logging(os.path.join(os.getenv("VOID_BOT_HOME", "."), "logs"))
     run_game(
         maps.get(_map),
         [Bot(Race.Terran, RampWallBot()), Computer(Race.Zerg, Difficulty.Hard)],
@@ -4,11 +4,17 @@ from sc2.bot_ai import BotAI
 from sc2.data import Difficulty, Race
 from sc2.main import run_game
 from sc2.player import Bot, Computer
+from sc2.protocol import ConnectionAlreadyClosedError, ProtocolError
 
 # Base imports
+import asyncio
 import os
 from datetime import datetime
 import argparse
+import itertools
+import json
+import time
+from dataclasses import asdict
 
 # Additional imports
 import pandas as pd
@@ -20,26 +26,90 @@ from bots.proxy_rax import ProxyRaxBot
 from bots.mass_reaper import MassReaperBot
 from bots.one_base_battlecruiser import BCRushBot
 from bots.zerg_rush import ZergRushBot
-import pandas as pd
+from common.adaptive_schedule import AdaptiveScheduler
+from common.client_pool import ClientPool, ExternalProcess
+from common.concurrent_games import run_concurrent
+from common.log_sink import setup_logging
+from common.metrics import MetricsServer, TournamentMetrics
+from common.replay_archive import ArchiveWriter, ReplayArchive
+from common.resource_monitor import ResourceMonitor
+from common.tournament import Coordinator, JobQueue, WorkerClient, make_jobs, parse_shard, run_worker, shard
 
 if __name__ == "__main__":
 
     # Get passed in args
     parser = argparse.ArgumentParser()
     parser.add_argument("--dev", action="store_true", help="Run in dev mode (no logging)")
+    parser.add_argument("--games", type=int, default=1, help="Games per bot x map cell (the average budget with --adaptive)")
+    parser.add_argument("--adaptive", action="store_true", help="Stop cells early once their win rate is decided")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Credible interval used by --adaptive")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Win rate the interval is tested against")
+    parser.add_argument("--min-games", type=int, default=3, help="Games before a cell can be decided")
+    parser.add_argument("--max-games", type=int, default=None, help="Cap per cell with --adaptive (default 3x --games)")
+    parser.add_argument("--early-stop", action="store_true", help="With --adaptive, save the games decided cells didn't need instead of moving them to close cells")
+    parser.add_argument("--pool", type=int, default=0, help="Keep this many SC2 processes warm and reuse them across games")
+    parser.add_argument("--recycle-after", type=int, default=20, help="Games before a pooled SC2 process is restarted")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=None, help="Restart a pooled SC2 process past this RSS growth")
+    parser.add_argument("--concurrent", type=int, default=1, help="Games in flight at once on one event loop, each on its own pooled server")
+    parser.add_argument("--server", action="append", default=[], help="host:port of an already running server to pool instead of launching SC2 (repeatable)")
+    parser.add_argument("--resource-interval", type=float, default=1.0, help="Seconds between memory/CPU samples, 0 disables")
+    parser.add_argument("--leak-threshold-mb", type=float, default=200.0, help="Flag games whose RSS grew more than this")
+    parser.add_argument("--map-cache", default=None, help="Directory for map data shared by all games (default $VOID_BOT_HOME/map_cache)")
+    parser.add_argument("--opponent", action="append", default=None, help="Built-in AI as Race:Difficulty, repeatable (default Protoss:Medium)")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed the distributed job list and game seeds derive from")
+    parser.add_argument("--coordinator", default=None, help="host:port to serve the job queue on for --worker runners")
+    parser.add_argument("--worker", default=None, help="Coordinator URL to lease jobs from, e.g. http://host:8765")
+    parser.add_argument("--queue", default=None, help="SQLite job queue on shared storage, workers lease from it directly")
+    parser.add_argument("--shard", default=None, help="Play only shard i/n of the job list, for nodes without shared storage")
+    parser.add_argument("--lease-timeout", type=float, default=1800.0, help="Seconds before a leased job goes back to the queue")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Leases a job may run out before it is failed as a Crash")
+    parser.add_argument("--log-level", default="INFO", help="Level written by the batched log sink, DEBUG is safe in long runs")
+    parser.add_argument("--profile", action="store_true", help="Sample bot stacks during on_step into per bot x map collapsed stack files")
+    parser.add_argument("--profile-interval-ms", type=float, default=5.0, help="Milliseconds between --profile stack samples")
+    parser.add_argument("--alloc", action="store_true", help="Track allocation sites and GC pauses per on_step section into per game reports")
+    parser.add_argument("--alloc-every", type=int, default=10, help="Steps between --alloc tracemalloc snapshots, 0 records GC pauses only")
+    parser.add_argument("--archive", action="store_true", help="Move replays into the packed archive under $VOID_BOT_HOME/replay_archive in the background")
+    parser.add_argument("--metrics", default=None, metavar="HOST:PORT", help="Serve live Prometheus metrics at http://HOST:PORT/metrics, e.g. 127.0.0.1:9108")
+    parser.add_argument("--end-decided", type=float, default=None, metavar="CONFIDENCE", help="Leave games once the outcome is settled at this confidence, e.g. 0.95")
     args = parser.parse_args()
+    args.opponent = args.opponent or ["Protoss:Medium"]
+    # The budget is --games per cell on average, below --min-games no cell could ever be decided
+    if args.adaptive and args.games < args.min_games:
+        parser.error(f"--adaptive needs --games >= --min-games ({args.min_games}), got {args.games}")
+    # Only the job list of the distributed modes has an opponent per game, scheduler cells are bot x map
+    if len(args.opponent) > 1 and not (args.coordinator or args.worker or args.queue or args.shard):
+        parser.error("Several --opponent need --coordinator, --worker, --queue or --shard")
 
     # Set a process-level environment variable
     if args.dev:
         os.environ["DEV"] = "1"
 
-    # Declare our bots in a tuple with bot and strat
+    # Bots read these in on_start, one collapsed stack file per game under $VOID_BOT_HOME/profiles/<bot>_<map>
+    if args.profile:
+        os.environ["VOID_BOT_PROFILE"] = str(args.profile_interval_ms)
+
+    # One allocation report per game under $VOID_BOT_HOME/allocations/<bot>_<map>
+    if args.alloc:
+        os.environ["VOID_BOT_ALLOC"] = str(args.alloc_every)
+
+    # Bots read this in on_start and record a verdict instead of playing out settled games
+    if args.end_decided:
+        os.environ["VOID_BOT_DECIDED"] = str(args.end_decided)
+
+    # Several games share the process, bots bind their log file to their own task
+    if args.concurrent > 1:
+        os.environ["VOID_BOT_CONCURRENT"] = "1"
+
+    # Per map grids and distance fields are published here once and memory mapped read-only by every game
+    os.environ["VOID_BOT_MAP_CACHE"] = args.map_cache or os.path.join(os.getenv("VOID_BOT_HOME"), "map_cache")
+
+    # Declare our bots in a tuple with race, bot class and strat, every game gets a fresh instance
     bots = [
-            (Bot(Race.Protoss, WarpGateBot()), "warpgate_push"),
-            (Bot(Race.Terran, ProxyRaxBot()), "proxy_rax"),
-            (Bot(Race.Terran, MassReaperBot()), "reaper_rush"),
-            (Bot(Race.Terran, BCRushBot()), "bc_rush"),
-            (Bot(Race.Zerg, ZergRushBot()), "zergling_rush"),
+            (Race.Protoss, WarpGateBot, "warpgate_push"),
+            (Race.Terran, ProxyRaxBot, "proxy_rax"),
+            (Race.Terran, MassReaperBot, "reaper_rush"),
+            (Race.Terran, BCRushBot, "bc_rush"),
+            (Race.Zerg, ZergRushBot, "zergling_rush"),
             ]
 
     # Collect all the maps for SC2 AI Arena in 2025 Season 2
@@ -54,39 +124,262 @@ if __name__ == "__main__":
     log_dir = os.path.join(os.getenv("VOID_BOT_HOME"), "logs")
     os.makedirs(log_dir, exist_ok=True)
     master_csv_path = os.path.join(log_dir, "master_results.csv")
+    game_log_path = os.path.join(log_dir, "game_results.jsonl")
+
+    # Bot logs are queued and written in batches off the game loop, one file per game
+    log_sink = setup_logging(log_dir, level=args.log_level)
+
+    # Finished replays are packed into segment files by a background thread instead of piling up one file per game
+    archiver = None
+    if args.archive:
+        archiver = ArchiveWriter(ReplayArchive(os.path.join(os.getenv("VOID_BOT_HOME"), "replay_archive")))
 
     # Create DataFrame that will hold our results
     rows = [m.split(".")[0] for m in ladder_maps]
-    columns = [b[1] for b in bots]
+    columns = [b[2] for b in bots]
     data = np.zeros(len(rows) * len(columns)).reshape(len(rows), len(columns))
     df = pd.DataFrame(data, index=rows, columns=columns)
 
+    # Pick which cell to play next, adaptive mode moves games from decided cells to close ones
+    bot_lookup = {b[2]: b[:2] for b in bots}
+    scheduler = AdaptiveScheduler(
+        [(b[2], m.split(".")[0]) for b in bots for m in ladder_maps],
+        games_per_cell=args.games,
+        adaptive=args.adaptive,
+        confidence=args.confidence,
+        threshold=args.threshold,
+        min_games=args.min_games,
+        max_games=args.max_games,
+        early_stop=args.early_stop,
+    )
+
+    # Optionally reuse warm SC2 processes, a persistent event loop keeps them alive between games
+    pool = None
+    if args.pool or args.server or args.concurrent > 1:
+        process_factory = None
+        if args.server:
+            servers = [a.rsplit(":", 1) for a in args.server]
+            process_factory = lambda slot: ExternalProcess(servers[slot][0], int(servers[slot][1]))
+        if args.server and len(args.server) < args.concurrent:
+            parser.error(f"--concurrent {args.concurrent} needs as many --server addresses, got {len(args.server)}")
+        pool = ClientPool(
+            size=len(args.server) or max(args.pool, args.concurrent),
+            recycle_after=args.recycle_after,
+            max_rss_growth_mb=args.max_rss_growth_mb,
+            process_factory=process_factory,
+        )
+        loop = asyncio.new_event_loop()
+
+    # Live counters for a Prometheus scraper, served from their own thread while games block this one
+    metrics = metrics_server = None
+    if args.metrics:
+        metrics = TournamentMetrics(pool)
+        metrics_server = MetricsServer(metrics)
+        metrics_host, metrics_port = args.metrics.rsplit(":", 1)
+        metrics_server.start(metrics_host, int(metrics_port))
+
+    def new_game(bot_name: str, opponent: str):
+        """ Fresh bot instance and built-in AI for one game, no state carries over from earlier or concurrent games. """
+        bot_race, bot_class = bot_lookup[bot_name]
+        race, difficulty = opponent.split(":")
+        return [Bot(bot_race, bot_class()), Computer(Race[race], Difficulty[difficulty])]
+
+    game_ids = itertools.count()
+
+    def new_replay_path(bot_name: str, map_name: str) -> str:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Concurrent games of the same cell can start within the same second
+        suffix = f"_{next(game_ids)}" if args.concurrent > 1 else ""
+        return os.path.join(os.getenv("VOID_BOT_HOME"), "replays", f'{bot_name}_{map_name}_{timestamp}{suffix}.SC2Replay')
+
+    async def play_pooled(bot_name: str, map_name: str, players, replay_path: str, seed=None) -> str:
+        try:
+            result = await pool.play(maps.get(map_name), players, realtime=False, save_replay_as=replay_path,
+                                     random_seed=seed)
+            return result.name
+        except (ProtocolError, ConnectionAlreadyClosedError, ConnectionResetError, asyncio.TimeoutError) as error:
+            # The pool already retired the client, count the game as lost and keep going
+            print(f"Game server died during {bot_name} on {map_name}: {error!r}")
+            return "Crash"
+
+    def play(bot_name: str, map_name: str, opponent: str, seed=None) -> dict:
+        """ Play one game, append its record to game_results.jsonl and return it. """
+        print('----------------------------------------------------------------------------------------')
+
+        # Sample bot and SC2 memory/CPU while the game runs
+        monitor = None
+        if args.resource_interval > 0:
+            # A pooled game process is no child of this game, only the pool knows its pid
+            monitor = ResourceMonitor(interval=args.resource_interval, growth_threshold_mb=args.leak_threshold_mb,
+                                      sc2_pids=pool.pids if pool else None)
+            monitor.start()
+        started = time.time()
+        key = metrics.game_started(bot_name) if metrics else None
+
+        # Run the game
+        players = new_game(bot_name, opponent)
+        replay_path = new_replay_path(bot_name, map_name)
+        if pool:
+            result = loop.run_until_complete(play_pooled(bot_name, map_name, players, replay_path, seed))
+        else:
+            result = run_game(maps.get(map_name), players, realtime=False, save_replay_as=replay_path, random_seed=seed).name
+        return log_game(bot_name, map_name, players, seed, result, started, replay_path, monitor, key)
+
+    async def play_concurrent(bot_name: str, map_name: str, opponent: str, seed=None) -> dict:
+        """ play() for one of several games in flight on the shared loop. The resource monitor is left out, it
+        samples the whole process and would mix all the games in flight. """
+        print(f"Starting {bot_name} on {map_name} vs {opponent}")
+        started = time.time()
+        key = metrics.game_started(bot_name) if metrics else None
+        players = new_game(bot_name, opponent)
+        replay_path = new_replay_path(bot_name, map_name)
+        result = await play_pooled(bot_name, map_name, players, replay_path, seed)
+        return log_game(bot_name, map_name, players, seed, result, started, replay_path, key=key)
+
+    def log_game(bot_name: str, map_name: str, players, seed, result: str, started: float, replay_path: str,
+                 monitor=None, key=None) -> dict:
+        # Append the per game record, resource samples included so leaks can be bisected later
+        record = {
+            "bot": bot_name,
+            "map": map_name,
+            "opponent": str(players[1]),
+            "seed": seed,
+            "result": result,
+            "started": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+            "wall_s": round(time.time() - started, 2),
+            "replay": replay_path,
+        }
+        decided = getattr(players[0].ai, "decided", None)
+        if decided is not None:
+            # Leaving counts as a defeat for SC2, the verdict says who actually won
+            record["result"] = "Victory" if decided.winner == "us" else "Defeat"
+            record["decided"] = dict(asdict(decided), sc2_result=result)
+        tasks = getattr(players[0].ai, "tasks", None)
+        if tasks is not None:
+            record["deferred_tasks"] = tasks.deferred_total
+        step_times = getattr(players[0].ai, "step_times", None)
+        if step_times is not None:
+            record["step_ms"] = step_times.summary()
+        if monitor:
+            record["resources"] = monitor.stop()
+            if record["resources"]["leak_suspect"]:
+                print(f"Memory growth above {args.leak_threshold_mb} MB in {bot_name} on {map_name}")
+        with open(game_log_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        if archiver:
+            # Workers still upload the loose file after the game, keep it for them
+            archiver.submit(replay_path, record, delete=not (args.worker or args.queue))
+        if metrics:
+            metrics.game_finished(key, record)
+        return record
+
+    def store(record: dict):
+        if record["result"] == "Victory":
+            df.at[record["map"], record["bot"]] += 1
+        scheduler.record((record["bot"], record["map"]), record["result"] == "Victory")
+
+    # Distributed modes work on a fixed job list, identical on every node
+    jobs = make_jobs(columns, rows, args.opponent, games=args.games, seed=args.seed)
+    replay_dir = os.path.join(os.getenv("VOID_BOT_HOME"), "replays")
+
     # Run games
     total_games = 0
-    for bot in bots:
-        for ladder_map in ladder_maps:
-            print('----------------------------------------------------------------------------------------')
-            
-            # Get info
-            map_name = ladder_map.split(".")[0]
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-            # Run the game
-            result = run_game(
-                maps.get(map_name),
-                [bot[0], Computer(Race.Protoss, Difficulty.Medium)],
-                realtime=False,
-                save_replay_as=os.path.join(os.getenv("VOID_BOT_HOME"), "replays", f'{bot[1]}_{map_name}_{timestamp}.SC2Replay'),
-            )
-
-            # Store result
-            if result.name == "Victory":
-                df.at[map_name, bot[1]] += 1
+    run_started = time.time()
+    if args.coordinator:
+        # Hand out jobs to --worker runners until every one is done, nothing is played here
+        host, port = args.coordinator.rsplit(":", 1)
+        queue = JobQueue(os.path.join(log_dir, "tournament.sqlite"), replay_dir=replay_dir,
+                         max_attempts=args.max_attempts)
+        print(f"Queued {queue.add(jobs)} new jobs, {queue.counts()}")
+        Coordinator(queue, metrics=metrics).serve(host, int(port))
+        for record in queue.results():
+            with open(game_log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            store(record)
+            total_games += 1
+    elif args.worker or args.queue:
+        # Lease jobs from a coordinator, or straight from a queue file on shared storage
+        if args.worker:
+            source = WorkerClient(args.worker)
+        else:
+            source = JobQueue(args.queue, replay_dir=os.path.join(os.path.dirname(os.path.abspath(args.queue)), "replays"),
+                              max_attempts=args.max_attempts)
+            source.add(jobs)
+
+        def play_job(job):
+            record = play(job.bot, job.map, job.opponent, job.seed)
+            store(record)
+            return record, record["replay"]
+
+        total_games = run_worker(source, play_job, lease_timeout=args.lease_timeout)
+    elif args.shard and args.concurrent > 1:
+        index, count = parse_shard(args.shard)
+        pending = iter(shard(jobs, index, count))
+        total_games = loop.run_until_complete(run_concurrent(
+            lambda: next(pending, None),
+            lambda job: play_concurrent(job.bot, job.map, job.opponent, job.seed),
+            args.concurrent,
+            lambda job, record: store(record),
+        ))
+    elif args.shard:
+        # Static split, every node plays its own slice and keeps its own results
+        index, count = parse_shard(args.shard)
+        for job in shard(jobs, index, count):
+            store(play(job.bot, job.map, job.opponent, job.seed))
+            total_games += 1
+    elif args.concurrent > 1:
+        # K games in flight on one event loop, each finished game frees its lane for the scheduler's next cell
+        def next_cell():
+            cell = scheduler.next_cell()
+            if cell is not None:
+                scheduler.start(cell)
+            return cell
+
+        total_games = loop.run_until_complete(run_concurrent(
+            next_cell,
+            lambda cell: play_concurrent(cell[0], cell[1], args.opponent[0]),
+            args.concurrent,
+            lambda cell, record: store(record),
+        ))
+    else:
+        while (cell := scheduler.next_cell()) is not None:
+            bot_name, map_name = cell
+            store(play(bot_name, map_name, args.opponent[0]))
             total_games += 1
 
+    if args.profile:
+        print(f"Profiles in {os.path.join(os.getenv('VOID_BOT_HOME'), 'profiles')}, "
+              f"top hot paths with: python -m common.sampling_profiler <dir>")
+    if args.alloc:
+        print(f"Allocation reports in {os.path.join(os.getenv('VOID_BOT_HOME'), 'allocations')}, "
+              f"top sites with: python -m common.alloc_tracker <dir>")
+
+    if archiver:
+        archiver.close()
+        print(f"Archived {archiver.archived} replays ({archiver.failed} failed), "
+              f"{archiver.archive.stats()['segments']} segment files, query with: python -m common.replay_archive query")
+        archiver.archive.close()
+
+    if metrics_server:
+        metrics_server.close()
+
+    if pool:
+        loop.run_until_complete(pool.close())
+        loop.close()
+        print(f"Client pool: {pool.launched} launches, {pool.recycled} recycles")
+
     # Save master results
     #df = df / total_games
     df.to_csv(master_csv_path)
+
+    # Save per cell games played, credible intervals and verdicts
+    summary = pd.DataFrame(scheduler.summary())
+    summary[["bot", "map"]] = pd.DataFrame(summary.pop("cell").tolist(), index=summary.index)
+    summary.to_csv(os.path.join(log_dir, "master_summary.csv"), index=False)
+    wall = time.time() - run_started
+    print(f"Played {total_games} games over {len(scheduler.cells)} cells in {wall:.0f} s, "
+          f"{3600 * total_games / max(wall, 1e-9):.1f} games/hour with {args.concurrent} in flight")
+    log_sink.close()
                 
             
 
@@ -0,0 +1,78 @@
+# Base imports
+import struct
+from datetime import datetime, timezone
+
+# Additional imports
+import mpyq
+import pytest
+
+MPQ_FILE_EXISTS = 0x80000000
+MPQ_FILE_SINGLE_UNIT = 0x01000000
+
+
+def _vint(value: int) -> bytes:
+    """ Versioned variable length int: sign in the low bit, 6 bits in the first byte, then 7 bits per byte. """
+    rest = abs(value)
+    first = ((rest & 0x3f) << 1) | (value < 0)
+    rest >>= 6
+    out = bytearray([first | (0x80 if rest else 0)])
+    while rest:
+        byte = rest & 0x7f
+        rest >>= 7
+        out.append(byte | (0x80 if rest else 0))
+    return bytes(out)
+
+
+def encode(value) -> bytes:
+    """ Versioned encoding of ints, blobs, arrays, structs ({tag: value}) and absent optionals. """
+    if value is None:
+        return bytes([4, 0])
+    if isinstance(value, int):
+        return bytes([9]) + _vint(value)
+    if isinstance(value, bytes):
+        return bytes([2]) + _vint(len(value)) + value
+    if isinstance(value, list):
+        return bytes([0]) + _vint(len(value)) + b"".join(encode(v) for v in value)
+    return bytes([5]) + _vint(len(value)) + b"".join(_vint(tag) + encode(v) for tag, v in value.items())
+
+
+def _encrypt(data: bytes, key: int) -> bytes:
+    """ The inverse of MPQArchive._decrypt, for the hash and block tables. """
+    seed1, seed2 = key, 0xEEEEEEEE
+    out = []
+    for (value,) in struct.iter_unpack("<I", data):
+        seed2 = (seed2 + mpyq.MPQArchive.encryption_table[0x400 + (seed1 & 0xFF)]) & 0xFFFFFFFF
+        out.append(struct.pack("<I", (value ^ (seed1 + seed2)) & 0xFFFFFFFF))
+        seed1 = (((~seed1 << 0x15) + 0x11111111) | (seed1 >> 0x0B)) & 0xFFFFFFFF
+        seed2 = (value + seed2 + (seed2 << 5) + 3) & 0xFFFFFFFF
+    return b"".join(out)
+
+
+def _hash(name: str, kind: str) -> int:
+    return mpyq.MPQArchive._hash(mpyq.MPQArchive, name, kind)  # pylint: disable=W0212
+
+
+def build_replay(map_name: str = "Fake Map", game_loops: int = 6720, played_at: datetime = None,
+                 players=((b"VoidBot", b"Terran", 1), (b"A.I. 1 (Easy)", b"Protoss", 2)),
+                 build: int = 93333) -> bytes:
+    """ Smallest .SC2Replay parse_replay reads: the header in the MPQ user data block and replay.details as the only
+    file. players are (name, race, details result) tuples. """
+    played_at = played_at or datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    filetime = int((played_at - datetime(1601, 1, 1, tzinfo=timezone.utc)).total_seconds()) * 10_000_000
+    header = encode({1: {1: 5, 2: 0, 3: 14, 4: build, 5: build}, 3: game_loops})
+    details = encode({0: [{0: name, 2: race, 5: team, 8: result} for team, (name, race, result) in enumerate(players)],
+                      1: map_name.encode(), 5: filetime})
+
+    hash_table = _encrypt(struct.pack("<2I2HI", _hash("replay.details", "HASH_A"), _hash("replay.details", "HASH_B"),
+                                      0, 0, 0), _hash("(hash table)", "TABLE"))
+    block_table = _encrypt(struct.pack("<4I", 32, len(details), len(details), MPQ_FILE_EXISTS | MPQ_FILE_SINGLE_UNIT),
+                           _hash("(block table)", "TABLE"))
+    archive_size = 32 + len(details) + len(hash_table) + len(block_table)
+    mpq = struct.pack("<4s2I2H4I", b"MPQ\x1a", 32, archive_size, 0, 3, 32 + len(details),
+                      32 + len(details) + len(hash_table), 1, 1) + details + hash_table + block_table
+    return struct.pack("<4s3I", b"MPQ\x1b", 512, 16 + len(header), len(header)) + header + mpq
+
+
+@pytest.fixture
+def make_replay():
+    return build_replay
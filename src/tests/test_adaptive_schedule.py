@@ -0,0 +1,51 @@
+# Local imports
+from common.adaptive_schedule import AdaptiveScheduler
+
+
+def _play(scheduler: AdaptiveScheduler, wins) -> int:
+    """ Run the scheduler to the end, wins(key, n) says whether the n-th game of that cell is won. """
+    played = 0
+    while (key := scheduler.next_cell()) is not None:
+        scheduler.record(key, wins(key, scheduler.cells[key].games))
+        played += 1
+    return played
+
+
+def test_fixed_mode_interleaves_cells():
+    scheduler = AdaptiveScheduler(["a", "b", "c"], games_per_cell=2)
+    order = []
+    while (key := scheduler.next_cell()) is not None:
+        order.append(key)
+        scheduler.record(key, True)
+    assert order == ["a", "b", "c", "a", "b", "c"]
+    assert all(cell.games == 2 and cell.decided for cell in scheduler.cells.values())
+
+
+def test_adaptive_moves_saved_games_to_close_cells():
+    """ A cell that keeps winning is decided early, its games go to the 50/50 cell up to max_games. """
+    scheduler = AdaptiveScheduler(["easy", "close"], games_per_cell=8, adaptive=True, min_games=3, max_games=12)
+    played = _play(scheduler, lambda key, n: key == "easy" or n % 2 == 0)
+    easy, close = scheduler.cells["easy"], scheduler.cells["close"]
+    assert easy.verdict == "above" and easy.games < 8
+    assert close.games == 16 - easy.games
+    assert played == scheduler.budget == 16
+
+
+def test_early_stop_saves_the_games_of_decided_cells():
+    scheduler = AdaptiveScheduler(["easy", "hard", "close"], games_per_cell=8, adaptive=True, early_stop=True)
+    played = _play(scheduler, lambda key, n: key == "easy" or (key == "close" and n % 2 == 0))
+    verdicts = {row["cell"]: row["verdict"] for row in scheduler.summary()}
+    assert verdicts == {"easy": "above", "hard": "below", "close": "capped"}
+    assert scheduler.cells["close"].games == 8
+    assert played < scheduler.budget
+
+
+def test_games_in_flight_count_against_the_cap():
+    scheduler = AdaptiveScheduler(["a"], games_per_cell=2)
+    for _ in range(2):
+        key = scheduler.next_cell()
+        scheduler.start(key)
+    assert scheduler.next_cell() is None
+    scheduler.record("a", True)
+    scheduler.record("a", False)
+    assert scheduler.pending == 0 and scheduler.games_played == 2
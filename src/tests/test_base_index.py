@@ -0,0 +1,116 @@
+# SC2 imports
+from s2clientprotocol import common_pb2, raw_pb2
+from sc2.data import Race
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.position import Point2
+from sc2.unit import Unit
+from sc2.units import Units
+
+# Base imports
+from types import SimpleNamespace
+
+# Additional imports
+import numpy as np
+
+# Local imports
+from common.base_index import BaseIndex
+
+MINERAL = UnitTypeId.MINERALFIELD
+GEYSER = UnitTypeId.VESPENEGEYSER
+BASES = [Point2((20, 20)), Point2((60, 20))]
+
+
+class _Bot(SimpleNamespace):
+    """ The parts of a bot BaseIndex reads, every game loop makes new Unit objects like the library does. """
+
+    def __init__(self, name: str):
+        grid = SimpleNamespace(data_numpy=np.zeros((2, 2)))
+        super().__init__(race=Race.Terran, expansion_locations_list=BASES, placed={}, townhalls=[],
+                         state=SimpleNamespace(game_loop=0),
+                         game_info=SimpleNamespace(map_name=name, pathing_grid=grid, placement_grid=grid),
+                         game_data=SimpleNamespace(units={
+                             MINERAL.value: SimpleNamespace(has_minerals=True),
+                             GEYSER.value: SimpleNamespace(has_minerals=False)}))
+
+    def _units(self, type_id):
+        return Units([Unit(raw_pb2.Unit(tag=tag, unit_type=type_id.value, mineral_contents=contents,
+                                        pos=common_pb2.Point(x=x, y=y)), self)
+                      for tag, (t, x, y, contents) in self.placed.items() if t == type_id], self)
+
+    @property
+    def mineral_field(self):
+        return self._units(MINERAL)
+
+    @property
+    def vespene_geyser(self):
+        return self._units(GEYSER)
+
+    @property
+    def resources(self):
+        return self.mineral_field | self.vespene_geyser
+
+    def add(self, tag: int, type_id: UnitTypeId, x: float, y: float, contents: int = 0):
+        self.placed[tag] = (type_id, x, y, contents)
+
+    def step(self):
+        self.state.game_loop += 1
+
+
+def _townhall(bot: _Bot, tag: int, x: float, y: float, flying: bool = False) -> Unit:
+    type_id = UnitTypeId.COMMANDCENTERFLYING if flying else UnitTypeId.COMMANDCENTER
+    return Unit(raw_pb2.Unit(tag=tag, unit_type=type_id.value, is_flying=flying, pos=common_pb2.Point(x=x, y=y)), bot)
+
+
+def _index(name: str) -> BaseIndex:
+    bot = _Bot(name)
+    for i, contents in enumerate((900, 1800, 1500)):
+        bot.add(1 + i, MINERAL, 14 + i, 14, contents)
+    bot.add(10, GEYSER, 27, 20)
+    bot.add(20, MINERAL, 66, 14, 1800)
+    bot.add(30, MINERAL, 40, 60, 1800)
+    return BaseIndex(bot)
+
+
+def test_resources_are_grouped_by_base_and_sorted_richest_first():
+    index = _index("grouped")
+    bot = index.bot
+    assert [f.tag for f in index.minerals(BASES[0])] == [2, 3, 1]
+    assert index.geysers(Point2((21, 21))).tags == {10}
+    assert index.minerals(BASES[1]).tags == {20}
+    # Far from every base
+    assert not index.minerals(Point2((40, 60))) and index.base_of(Point2((40, 60))) is None
+    # The current game loop's objects, not the ones of the loop the buckets were filled in
+    first = index.minerals(BASES[0]).first
+    bot.step()
+    assert index.minerals(BASES[0]).first is not first and index.minerals(BASES[0]).first.tag == first.tag
+
+
+def test_depleted_fields_leave_and_snapshot_tags_are_replaced():
+    index = _index("depleted")
+    bot = index.bot
+    assert len(index.minerals(BASES[0])) == 3
+    del bot.placed[2]
+    index.on_unit_destroyed(2)
+    bot.step()
+    assert [f.tag for f in index.minerals(BASES[0])] == [3, 1]
+    # A snapshot seen again comes back with another tag and without a death event
+    del bot.placed[3]
+    bot.add(4, MINERAL, 15, 14, 1500)
+    bot.step()
+    assert [f.tag for f in index.minerals(BASES[0])] == [4, 1]
+    assert 3 not in index._resource_tags
+
+
+def test_townhalls_follow_the_hooks():
+    index = _index("townhalls")
+    bot = index.bot
+    command_center = _townhall(bot, 100, 21, 21)
+    index.on_building_construction_complete(command_center)
+    assert index.base_of(command_center) == BASES[0]
+    index.on_unit_type_changed(_townhall(bot, 100, 21, 21, flying=True))
+    assert 100 not in index._townhall_base
+    landed = _townhall(bot, 100, 60, 21)
+    index.on_unit_type_changed(landed)
+    assert index.minerals(landed).tags == {20}
+    index.on_unit_destroyed(100)
+    assert not index._townhall_base
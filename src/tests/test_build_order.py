@@ -0,0 +1,113 @@
+# SC2 imports
+from sc2.ids.unit_typeid import UnitTypeId
+
+# Base imports
+import asyncio
+from types import SimpleNamespace
+
+# Local imports
+from common.build_order import ORDERS, STRUCTURES, UNITS, BuildOrder, BuildStep, StateVersions
+
+
+class _Bot(SimpleNamespace):
+    """ The parts of a bot BuildOrder reads, every build is recorded instead of sent. """
+
+    def __init__(self):
+        super().__init__(state=SimpleNamespace(game_loop=0), state_versions=StateVersions(), minerals=1000,
+                         vespene=1000, supply_left=10, built=[])
+
+    def calculate_cost(self, item):
+        return SimpleNamespace(minerals=150, vespene=0)
+
+    def calculate_supply_cost(self, item):
+        return 0
+
+    def can_afford(self, item):
+        return self.minerals >= 150
+
+    async def build(self, item, near=None):
+        self.built.append(item)
+
+
+def _counting(result=True):
+    calls = []
+
+    def check(bot):
+        calls.append(bot.state.game_loop)
+        return result
+    return check, calls
+
+
+def _run(order: BuildOrder, loops: int = 1, step: int = 1):
+    for _ in range(loops):
+        asyncio.run(order.run())
+        order.bot.state.game_loop += step
+
+
+def test_conditions_are_cached_until_a_watched_channel_changes():
+    bot = _Bot()
+    guard, calls = _counting(False)
+    order = BuildOrder(bot, [BuildStep("barracks", UnitTypeId.BARRACKS, guard=guard, depends=(STRUCTURES,))],
+                       refresh_loops=1000)
+    _run(order, 5)
+    assert len(calls) == 1 and order.cache_hits == 4
+
+    bot.state_versions.bump(UNITS)
+    _run(order)
+    assert len(calls) == 1
+
+    bot.state_versions.bump(STRUCTURES)
+    _run(order)
+    assert len(calls) == 2
+
+
+def test_watch_values_and_affordability_are_part_of_the_key():
+    bot = _Bot()
+    guard, calls = _counting(False)
+    order = BuildOrder(bot, [BuildStep("depot", UnitTypeId.SUPPLYDEPOT, guard=guard, depends=(),
+                                       watch=(lambda bot: bot.supply_left,))], refresh_loops=1000)
+    _run(order, 2)
+    assert len(calls) == 1
+    bot.supply_left = 2
+    _run(order)
+    assert len(calls) == 2
+    bot.minerals = 100
+    _run(order)
+    assert len(calls) == 3
+
+
+def test_refresh_loops_re_checks_everything():
+    bot = _Bot()
+    guard, calls = _counting(False)
+    order = BuildOrder(bot, [BuildStep("barracks", UnitTypeId.BARRACKS, guard=guard, depends=())], refresh_loops=22)
+    _run(order, 12, step=4)
+    assert calls == [0, 24]
+
+
+def test_acting_bumps_the_orders_channel():
+    """ The first step's build changes what the second one reads, it must not answer from its cache. """
+    bot = _Bot()
+    guard, calls = _counting(False)
+    order = BuildOrder(bot, [
+        BuildStep("barracks", UnitTypeId.BARRACKS, near=lambda bot: None, depends=()),
+        BuildStep("depot", UnitTypeId.SUPPLYDEPOT, guard=guard, depends=(ORDERS,)),
+    ], refresh_loops=1000)
+    _run(order, 3)
+    assert bot.built == [UnitTypeId.BARRACKS] * 3
+    assert len(calls) == 3
+
+
+def test_chain_and_halt():
+    bot = _Bot()
+    second, calls = _counting()
+    chained = BuildOrder(bot, [
+        BuildStep("gated", UnitTypeId.BARRACKS, condition=lambda bot: False),
+        BuildStep("skipped", UnitTypeId.FACTORY, guard=second),
+    ], chain=True)
+    assert asyncio.run(chained.run()) is False
+    assert not calls and not bot.built
+
+    halting = BuildOrder(bot, [BuildStep("stop", UnitTypeId.BARRACKS, afford=True, halt=True)])
+    bot.minerals = 0
+    assert asyncio.run(halting.run()) is True
+    assert not bot.built
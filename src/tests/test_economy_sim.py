@@ -0,0 +1,64 @@
+# SC2 imports
+from sc2.ids.unit_typeid import UnitTypeId
+
+# Base imports
+import math
+import os
+
+# Additional imports
+import pytest
+
+# Local imports
+from common.economy_sim import BUILD_TRAVEL, MINERAL_RATE, EconomyData, EconomySimulator
+
+DATA = EconomyData.default()
+
+
+def test_requirements_are_deepest_first():
+    assert DATA.requirements(UnitTypeId.BATTLECRUISER) == [
+        UnitTypeId.SUPPLYDEPOT, UnitTypeId.BARRACKS, UnitTypeId.FACTORY, UnitTypeId.STARPORT, UnitTypeId.FUSIONCORE,
+        UnitTypeId.STARPORTTECHLAB]
+    assert DATA.requirements(UnitTypeId.STALKER) == [UnitTypeId.PYLON, UnitTypeId.GATEWAY, UnitTypeId.CYBERNETICSCORE]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = os.path.join(tmp_path, "economy.json")
+    DATA.save(path)
+    assert EconomyData.load(path).items == DATA.items
+
+
+def test_waits_for_money_and_requirements():
+    sim = EconomySimulator(DATA)
+    result = sim.run([UnitTypeId.SUPPLYDEPOT, UnitTypeId.BARRACKS])
+    # 50 of the 100 minerals are banked, the rest comes from 12 miners
+    depot = 50 / (12 * MINERAL_RATE)
+    assert result.starts[0] == pytest.approx(depot)
+    # The barracks is paid for long before the depot it requires is done
+    assert result.starts[1] == pytest.approx(depot + 21 + BUILD_TRAVEL / 2)
+    # A probe only walks to the site, the pylon finishes without it
+    protoss = EconomySimulator(DATA, UnitTypeId.PROBE).run([UnitTypeId.PYLON, UnitTypeId.GATEWAY])
+    assert protoss.starts[1] == pytest.approx(depot + 18 + BUILD_TRAVEL / 2)
+
+
+def test_goal_time_counts_completions():
+    result = EconomySimulator(DATA).run([UnitTypeId.SCV], goal=UnitTypeId.SCV, goal_count=13)
+    assert result.feasible and result.starts == [0.0] and result.goal_time == 12.0
+
+
+def test_infeasible_orders():
+    sim = EconomySimulator(DATA)
+    # Supply blocked at 15 without a depot
+    supply = sim.run([UnitTypeId.SCV] * 4)
+    assert not supply.feasible and len(supply.starts) == 3
+    # No gas building, no vespene for the factory
+    assert not sim.run([UnitTypeId.SUPPLYDEPOT, UnitTypeId.BARRACKS, UnitTypeId.FACTORY]).feasible
+    # Not in the data at all
+    assert not sim.run([UnitTypeId.HATCHERY]).feasible
+
+
+def test_gas_and_max_time():
+    order = [UnitTypeId.REFINERY, UnitTypeId.SUPPLYDEPOT, UnitTypeId.BARRACKS, UnitTypeId.FACTORY]
+    result = EconomySimulator(DATA).run(order, goal=UnitTypeId.FACTORY, goal_count=1)
+    assert result.feasible and result.goal_time == pytest.approx(result.starts[-1] + 43 + BUILD_TRAVEL / 2)
+    short = EconomySimulator(DATA, max_time=60).run(order, goal=UnitTypeId.FACTORY, goal_count=1)
+    assert not short.feasible and short.goal_time == math.inf
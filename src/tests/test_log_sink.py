@@ -0,0 +1,100 @@
+# Base imports
+import asyncio
+import os
+import time
+
+# Additional imports
+from loguru import logger
+
+# Local imports
+from common import log_sink
+from common.log_sink import BatchedSink
+
+
+def _messages(path: str):
+    with open(path) as f:
+        return [line.rstrip("\n").split(" ", 3)[3] for line in f]
+
+
+def _sink(path: str, monkeypatch=None, **kwargs) -> BatchedSink:
+    sink = BatchedSink(path, **kwargs)
+    if monkeypatch is not None:
+        monkeypatch.setattr(log_sink, "_sink", sink)
+    return sink
+
+
+def test_records_are_written_in_batches(tmp_path):
+    path = os.path.join(tmp_path, "bot.log")
+    sink = _sink(path, batch_size=3, flush_interval=60)
+    handler = logger.add(sink, format="{message}")
+    try:
+        for i in range(7):
+            logger.info(f"line {i}")
+        sink.flush()
+        assert _messages(path) == [f"line {i}" for i in range(7)]
+        assert sink.written == 7 and sink.batches == 3
+    finally:
+        logger.remove(handler)
+        sink.close()
+
+
+def test_a_partial_batch_goes_out_after_flush_interval(tmp_path):
+    path = os.path.join(tmp_path, "bot.log")
+    sink = _sink(path, flush_interval=0.05)
+    handler = logger.add(sink, format="{message}")
+    try:
+        logger.info("alone")
+        deadline = time.monotonic() + 5
+        while not sink.written and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert _messages(path) == ["alone"]
+    finally:
+        logger.remove(handler)
+        sink.close()
+
+
+def test_sequential_games_rotate_and_come_back(tmp_path, monkeypatch):
+    base = os.path.join(tmp_path, "void_bot.log")
+    sink = _sink(base, monkeypatch)
+    handler = logger.add(sink, format="{message}")
+    try:
+        logger.info("before")
+        game = log_sink.start_game_log("game")
+        logger.info("during")
+        log_sink.end_game_log()
+        logger.info("after")
+        sink.flush()
+        assert _messages(base) == ["before", "after"]
+        assert _messages(game) == ["during"]
+    finally:
+        logger.remove(handler)
+        sink.close()
+
+
+def test_concurrent_games_keep_separate_files(tmp_path, monkeypatch):
+    base = os.path.join(tmp_path, "void_bot.log")
+    sink = _sink(base, monkeypatch)
+    handler = logger.add(sink, format="{message}")
+
+    async def game(name: str) -> str:
+        path = log_sink.start_game_log(name, concurrent=True)
+        for i in range(3):
+            logger.info(f"{name} {i}")
+            await asyncio.sleep(0)
+        log_sink.end_game_log()
+        return path
+
+    async def both():
+        return await asyncio.gather(game("a"), game("b"))
+
+    try:
+        paths = asyncio.run(both())
+        logger.info("between games")
+        sink.flush()
+        assert [_messages(p) for p in paths] == [[f"{name} {i}" for i in range(3)] for name in "ab"]
+        assert _messages(base) == ["between games"]
+        # Released files are closed on the writer thread
+        assert not sink._routed
+    finally:
+        logger.remove(handler)
+        sink.close()
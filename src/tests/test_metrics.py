@@ -0,0 +1,43 @@
+# Local imports
+from common.metrics import StepHistogram, TournamentMetrics, quantile
+
+
+def test_quantile_interpolates_inside_the_bucket():
+    bounds, counts = (1, 2, 5), [2, 2, 0, 0]
+    assert quantile(bounds, counts, 0.5, 10.0) == 1.0
+    assert quantile(bounds, counts, 0.75, 10.0) == 1.5
+    # Never above the slowest step seen
+    assert quantile(bounds, counts, 0.75, 1.2) == 1.2
+    # The +Inf bucket reads as the largest value, an empty histogram as 0
+    assert quantile(bounds, [0, 0, 0, 1], 0.5, 7.0) == 7.0
+    assert quantile(bounds, [0, 0, 0, 0], 0.5, 7.0) == 0.0
+
+
+def test_step_histogram_summary():
+    histogram = StepHistogram()
+    for ms in (0.5, 1.0, 3.0, 2000.0):
+        histogram.observe(ms)
+    summary = histogram.summary()
+    assert summary["counts"] == [2, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1]
+    assert summary["sum"] == 2004.5 and summary["max"] == 2000.0
+    assert summary["p50"] == 1.0 and summary["p99"] == 2000.0
+
+
+def test_render_merges_the_step_histograms_of_finished_games():
+    metrics = TournamentMetrics()
+    for _ in range(2):
+        histogram = StepHistogram()
+        histogram.observe(3.0)
+        key = metrics.game_started("bot")
+        metrics.game_finished(key, {"bot": "bot", "result": "Victory", "step_ms": histogram.summary()})
+    # Leased again while its record is still out, the first worker is presumed dead
+    metrics.game_started("bot", key="job")
+    metrics.game_started("bot", key="job")
+    metrics.game_finished("job", {"bot": "bot", "result": "Crash"})
+    text = metrics.render()
+    assert metrics.completed == 2 and metrics.failed == 2
+    assert 'void_bot_games_total{bot="bot",result="Victory"} 2' in text
+    assert 'void_bot_win_rate{bot="bot"} 1.0' in text
+    assert 'void_bot_step_seconds_bucket{bot="bot",le="0.005"} 2' in text
+    assert 'void_bot_step_seconds_count{bot="bot"} 2' in text
+    assert "void_bot_games_running 0" in text
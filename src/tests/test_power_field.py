@@ -0,0 +1,40 @@
+# SC2 imports
+from sc2.bot_ai import BotAI
+from sc2.position import Point2
+
+# Base imports
+from types import SimpleNamespace
+
+# Additional imports
+import numpy as np
+
+# Local imports
+from common.power_field import PowerField
+
+
+def _grid(array: np.ndarray) -> SimpleNamespace:
+    return SimpleNamespace(data_numpy=array)
+
+
+def test_building_positions_on_plain_bot_ai():
+    """ CannonRushBot is a plain BotAI without map_data, the placement grid comes from game_info. """
+    bot = BotAI()
+    assert not hasattr(bot, "map_data")
+    size = 32
+    placement = np.zeros((size, size), dtype=np.uint8)
+    placement[8:24, 8:24] = 1
+    bot.game_info = SimpleNamespace(pathing_grid=_grid(np.ones((size, size), dtype=np.uint8)),
+                                    placement_grid=_grid(placement))
+    pylon = SimpleNamespace(unit_tag=1, position=Point2((16, 16)), radius=6.5)
+    bot.state = SimpleNamespace(psionic_matrix=SimpleNamespace(sources=[pylon]), game_loop=0,
+                                creep=_grid(np.zeros((size, size), dtype=np.uint8)))
+    bot.all_units = []
+    bot.workers = []
+    bot.placeholders = []
+
+    sites = PowerField(bot).building_positions(4, near=Point2((16, 16)))
+
+    assert len(sites) == 4
+    for site in sites:
+        assert placement[int(site.y), int(site.x)]
+        assert site.distance_to(pylon.position) <= pylon.radius
@@ -0,0 +1,94 @@
+# Base imports
+import os
+
+# Local imports
+from common.replay_archive import ArchiveWriter, ReplayArchive, import_dir
+
+
+def _record(bot: str = "mass_reaper", result: str = "Victory", started: str = "2025-01-02T03:04:05", **kwargs):
+    return dict(bot=bot, map="FakeMap", opponent="Protoss:Easy", result=result, started=started, **kwargs)
+
+
+def test_put_get_and_query(tmp_path, make_replay):
+    archive = ReplayArchive(os.path.join(tmp_path, "archive"))
+    try:
+        first, second = make_replay(), make_replay(game_loops=100)
+        sha1 = archive.put(first, _record(), name="first.SC2Replay")
+        archive.put(second, _record("zerg_rush", "Defeat", "2025-01-03T00:00:00"), name="second.SC2Replay")
+        assert archive.get(sha1) == first
+        assert archive.get("/elsewhere/second.SC2Replay") == second
+        assert archive.get("missing") is None
+
+        [row] = archive.query(bot="mass_reaper")
+        assert row["sha1"] == sha1 and row["result"] == "Victory"
+        assert row["replay_map"] == "Fake Map" and row["game_loops"] == 6720 and row["error"] is None
+        assert [p["name"] for p in row["players"]] == ["VoidBot", "A.I. 1 (Easy)"]
+        assert [r["name"] for r in archive.query(since="2025-01-03")] == ["second.SC2Replay"]
+        assert [r["name"] for r in archive.query(until="2025-01-03")] == ["first.SC2Replay"]
+        assert [data for _, data in archive.fetch(archive.query())] == [first, second]
+    finally:
+        archive.close()
+
+
+def test_same_content_is_stored_once_and_segments_roll_over(tmp_path, make_replay):
+    archive = ReplayArchive(os.path.join(tmp_path, "archive"), segment_bytes=64, level=0)
+    try:
+        replays = [make_replay(game_loops=n) for n in (1, 2, 3)]
+        for data in replays + replays[:1]:
+            archive.put(data, _record())
+        stats = archive.stats()
+        assert stats["games"] == 4 and stats["replays"] == 3 and stats["segments"] == 3
+        assert [archive.get(r["sha1"]) for r in archive.query()] == replays + replays[:1]
+    finally:
+        archive.close()
+
+
+def test_unparsable_replays_keep_their_error(tmp_path):
+    archive = ReplayArchive(os.path.join(tmp_path, "archive"))
+    try:
+        archive.put(b"not a replay", _record())
+        [row] = archive.query()
+        assert row["error"].startswith("ValueError") and row["game_loops"] is None
+    finally:
+        archive.close()
+
+
+def test_two_archives_on_one_directory_never_overlap(tmp_path, make_replay):
+    """ Like two runner processes: each appends after what the other wrote, the index says where. """
+    root = os.path.join(tmp_path, "archive")
+    a, b = ReplayArchive(root, segment_bytes=1 << 20), ReplayArchive(root, segment_bytes=1 << 20)
+    try:
+        replays = [make_replay(game_loops=n) for n in range(6)]
+        for i, data in enumerate(replays):
+            (a if i % 2 else b).put(data, _record())
+        assert [a.get(r["sha1"]) for r in a.query()] == replays
+    finally:
+        a.close()
+        b.close()
+
+
+def test_writer_and_import_move_loose_files_in(tmp_path, make_replay):
+    archive = ReplayArchive(os.path.join(tmp_path, "archive"))
+    loose = os.path.join(tmp_path, "replays")
+    os.makedirs(loose)
+    try:
+        path = os.path.join(loose, "mass_reaper_FakeMap_20250102_030405.SC2Replay")
+        with open(path, "wb") as f:
+            f.write(make_replay())
+        writer = ArchiveWriter(archive, retries=0)
+        writer.submit(path, _record())
+        writer.submit(os.path.join(loose, "never_written.SC2Replay"))
+        writer.flush()
+        writer.close()
+        assert (writer.archived, writer.failed) == (1, 1)
+        assert not os.path.exists(path)
+
+        with open(path, "wb") as f:
+            f.write(make_replay(game_loops=10))
+        assert import_dir(archive, loose, {}) == 1
+        # Without a runner record, bot, map and date come from the file name
+        imported = archive.query()[-1]
+        assert imported["game_loops"] == 10 and imported["opponent"] is None
+        assert (imported["bot"], imported["map"], imported["date"]) == ("mass_reaper", "FakeMap", "2025-01-02T03:04:05")
+    finally:
+        archive.close()
@@ -0,0 +1,71 @@
+# Base imports
+import os
+
+# Additional imports
+import pytest
+
+# Local imports
+from common.replay_index import ReplayIndex, VersionedDecoder, parse_replay
+
+
+def _decode(data: bytes):
+    return VersionedDecoder(data).decode()
+
+
+def test_decoder_reads_every_kind():
+    # vint: sign in the low bit, 6 bits then 7 bits per byte
+    assert _decode(bytes([9, 0x0a])) == 5
+    assert _decode(bytes([9, 0x0b])) == -5
+    assert _decode(bytes([9, 0x80 | 0x02, 0x02])) == 1 + (2 << 6)
+    assert _decode(bytes([6, 200])) == 200
+    assert _decode(bytes([7, 0, 0, 1, 0])) == 256
+    assert _decode(bytes([8]) + (1 << 40).to_bytes(8, "big")) == 1 << 40
+    assert _decode(bytes([2, 0x06]) + b"map") == b"map"
+    assert _decode(bytes([1, 0x12, 0xff, 0x01])) == (9, b"\xff\x01")
+    assert _decode(bytes([0, 0x04, 9, 0x02, 9, 0x04])) == [1, 2]
+    assert _decode(bytes([3, 0x06, 9, 0x02])) == {3: 1}
+    assert _decode(bytes([4, 0])) is None and _decode(bytes([4, 1, 6, 7])) == 7
+    # Struct fields by tag
+    assert _decode(bytes([5, 0x04, 0x02, 6, 1, 0x0a, 2, 0x02]) + b"x") == {1: 1, 5: b"x"}
+
+
+def test_decoder_rejects_bad_data():
+    with pytest.raises(ValueError, match="Truncated"):
+        _decode(bytes([2, 0x0a, 1]))
+    with pytest.raises(ValueError, match="Unknown"):
+        _decode(bytes([12]))
+
+
+def test_parse_replay(make_replay):
+    meta = parse_replay(make_replay(map_name="Fake Map", game_loops=6720))
+    assert meta["map"] == "Fake Map"
+    assert meta["version"] == "5.0.14" and meta["build"] == meta["base_build"] == 93333
+    assert meta["game_loops"] == 6720 and meta["duration"] == 300.0
+    assert meta["played_at"] == "2025-01-02T03:04:05+00:00"
+    assert meta["players"] == [{"name": "VoidBot", "race": "Terran", "team": 0, "result": "Victory"},
+                               {"name": "A.I. 1 (Easy)", "race": "Protoss", "team": 1, "result": "Defeat"}]
+
+
+def test_scan_parses_new_files_and_reuses_known_content(tmp_path, make_replay):
+    replays = os.path.join(tmp_path, "replays")
+    os.makedirs(replays)
+    for name, data in (("a.SC2Replay", make_replay()), ("b.SC2Replay", make_replay(game_loops=100)),
+                       ("broken.SC2Replay", b"not a replay")):
+        with open(os.path.join(replays, name), "wb") as f:
+            f.write(data)
+    index = ReplayIndex(os.path.join(tmp_path, "index.sqlite"))
+    try:
+        stats = index.scan(replays, workers=1)
+        assert (stats["parsed"], stats["failed"]) == (2, 1)
+        assert [row["game_loops"] for row in index.rows()] == [6720, 100]
+
+        # A copy of known content is not parsed again, an untouched file is not even opened
+        with open(os.path.join(replays, "a.SC2Replay"), "rb") as f, \
+                open(os.path.join(replays, "c.SC2Replay"), "wb") as copy:
+            copy.write(f.read())
+        os.remove(os.path.join(replays, "b.SC2Replay"))
+        stats = index.scan(replays, workers=1)
+        assert (stats["rehashed"], stats["unchanged"], stats["removed"]) == (1, 2, 1)
+        assert [os.path.basename(row["path"]) for row in index.rows()] == ["a.SC2Replay", "c.SC2Replay"]
+    finally:
+        index.close()
@@ -0,0 +1,63 @@
+# Base imports
+import asyncio
+import time
+
+# Local imports
+from common.step_scheduler import Priority, StepScheduler
+
+
+def _step(scheduler: StepScheduler, spent_ms: float = 0.0):
+    """ Run one step as if spent_ms of it already went by before the tasks. """
+    asyncio.run(scheduler.run(time.perf_counter() - spent_ms / 1000))
+
+
+def test_priority_order_within_budget():
+    scheduler = StepScheduler(budget_ms=40)
+    ran = []
+    scheduler.add("debug", lambda: ran.append("debug"), Priority.DEBUG)
+    scheduler.add("macro", lambda: ran.append("macro"))
+    scheduler.add("critical", lambda: ran.append("critical"), Priority.CRITICAL)
+
+    async def coroutine():
+        ran.append("async")
+    scheduler.add("async", coroutine)
+    _step(scheduler)
+    assert ran == ["critical", "macro", "async", "debug"]
+    assert scheduler.deferred_total == 0
+
+
+def test_over_budget_sheds_all_but_critical():
+    scheduler = StepScheduler(budget_ms=40)
+    ran = []
+    scheduler.add("critical", lambda: ran.append("critical"), Priority.CRITICAL)
+    scheduler.add("macro", lambda: ran.append("macro"))
+    scheduler.add("debug", lambda: ran.append("debug"), Priority.DEBUG)
+    _step(scheduler, spent_ms=50)
+    assert ran == ["critical"]
+    assert scheduler.deferred == {"macro": 1, "debug": 1}
+
+
+def test_a_task_spending_the_budget_defers_the_rest():
+    scheduler = StepScheduler(budget_ms=5)
+    ran = []
+    scheduler.add("slow", lambda: (ran.append("slow"), time.sleep(0.01)))
+    scheduler.add("next", lambda: ran.append("next"))
+    _step(scheduler)
+    assert ran == ["slow"]
+    # The deferred task waited longest, it goes first next step
+    ran.clear()
+    _step(scheduler)
+    assert ran == ["next", "slow"]
+
+
+def test_starving_task_is_forced_after_max_defer():
+    scheduler = StepScheduler(budget_ms=40, max_defer=3)
+    ran = []
+    scheduler.add("macro", lambda: ran.append("macro"))
+    for _ in range(3):
+        _step(scheduler, spent_ms=50)
+    assert not ran and scheduler.tasks[0].waiting == 3
+    _step(scheduler, spent_ms=50)
+    assert ran == ["macro"]
+    assert scheduler.forced == 1 and scheduler.tasks[0].waiting == 0
+    assert scheduler.deferred["macro"] == 3
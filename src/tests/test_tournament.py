@@ -0,0 +1,69 @@
+# Base imports
+import os
+import time
+
+# Local imports
+from common.tournament import JobQueue, make_jobs, parse_shard, run_worker, shard
+
+
+def _queue(tmp_path, games: int = 1, **kwargs) -> JobQueue:
+    queue = JobQueue(os.path.join(tmp_path, "queue.sqlite"), **kwargs)
+    queue.add(make_jobs(["bot"], ["map"], ["Zerg:Easy"], games=games))
+    return queue
+
+
+def test_jobs_and_shards_are_stable():
+    jobs = make_jobs(["a", "b"], ["x", "y"], ["Zerg:Easy"], games=2)
+    assert jobs == make_jobs(["a", "b"], ["x", "y"], ["Zerg:Easy"], games=2)
+    assert len({j.id for j in jobs}) == 8
+    shards = [shard(jobs, i, 3) for i in range(3)]
+    assert sorted(j.id for s in shards for j in s) == sorted(j.id for j in jobs)
+    assert parse_shard("1/3") == (1, 3)
+
+
+def test_a_leased_job_is_not_handed_out_twice(tmp_path):
+    queue = _queue(tmp_path, games=2)
+    first, second = queue.lease("w1", 60), queue.lease("w2", 60)
+    assert first.id != second.id
+    assert queue.lease("w3", 60) is None
+    assert queue.counts() == {"leased": 2}
+    # Adding the same list again (a restarted coordinator) keeps the table as it is
+    assert queue.add(make_jobs(["bot"], ["map"], ["Zerg:Easy"], games=2)) == 0
+
+
+def test_expired_lease_is_leased_again_and_late_result_is_rejected(tmp_path):
+    queue = _queue(tmp_path)
+    job = queue.lease("dead", 0.01)
+    time.sleep(0.02)
+    again = queue.lease("alive", 60)
+    assert again.id == job.id
+    assert queue.complete(job.id, "alive", {"result": "Victory"})
+    assert not queue.complete(job.id, "dead", {"result": "Defeat"})
+    assert queue.results() == [{"result": "Victory"}]
+    assert queue.finished()
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    queue = _queue(tmp_path, max_attempts=2)
+    for worker in ("w1", "w2"):
+        assert queue.lease(worker, -1) is not None
+    assert queue.lease("w3", 60) is None
+    assert queue.counts() == {"failed": 1}
+    [record] = queue.results()
+    assert record["result"] == "Crash" and record["attempts"] == 2
+    assert queue.finished()
+
+
+def test_worker_reports_a_crashing_game_and_carries_on(tmp_path):
+    queue = _queue(tmp_path, games=3)
+    calls = []
+
+    def play(job):
+        calls.append(job.id)
+        if len(calls) == 2:
+            raise RuntimeError("game broke")
+        return {"result": "Victory"}, None
+
+    assert run_worker(queue, play, worker="w", poll=0.01) == 3
+    assert sorted(r["result"] for r in queue.results()) == ["Crash", "Victory", "Victory"]
+    assert all(r["worker"] == "w" for r in queue.results())
@@ -0,0 +1,164 @@
+# SC2 imports
+from sc2 import maps
+from sc2.data import Difficulty, Race
+from sc2.ids.ability_id import AbilityId
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.player import Bot, Computer
+from sc2.position import Point2
+from sc2.units import Units
+
+# Base imports
+import asyncio
+from types import SimpleNamespace
+
+# Local imports
+from common.client_pool import ClientPool, ExternalProcess
+from common.fake_sc2 import FAKE_MAP, FakeSC2Server, loops, make_sc2path
+from common.unit_counters import UnitCounters
+
+CREATION = {
+    UnitTypeId.SCV: AbilityId.COMMANDCENTERTRAIN_SCV,
+    UnitTypeId.BARRACKS: AbilityId.TERRANBUILD_BARRACKS,
+    UnitTypeId.SUPPLYDEPOT: AbilityId.TERRANBUILD_SUPPLYDEPOT,
+    UnitTypeId.SUPPLYDEPOTLOWERED: AbilityId.TERRANBUILD_SUPPLYDEPOT,
+    UnitTypeId.MARINE: AbilityId.BARRACKSTRAIN_MARINE,
+}
+
+
+def _ability(ability: AbilityId):
+    return SimpleNamespace(id=ability, exact_id=ability)
+
+
+class _Bot(SimpleNamespace):
+    """ The parts of a bot UnitCounters reads, with already_pending answering from the test's own numbers. """
+
+    def __init__(self, *units):
+        super().__init__(state=SimpleNamespace(game_loop=1), pending={}, asked=[],
+                         game_data=SimpleNamespace(upgrades={}, units={
+                             t.value: SimpleNamespace(creation_ability=_ability(a)) for t, a in CREATION.items()}))
+        self.all = list(units)
+
+    @property
+    def units(self):
+        return Units([u for u in self.all if not u.is_structure], self)
+
+    @property
+    def structures(self):
+        return Units([u for u in self.all if u.is_structure], self)
+
+    @property
+    def workers(self):
+        return self.units(UnitTypeId.SCV)
+
+    def prevent_double_actions(self, command):
+        return not any(order.ability.exact_id == command.ability and order.target == command.target
+                       for order in command.unit.orders)
+
+    def already_pending(self, item):
+        self.asked.append(item)
+        return self.pending.get(item, 0)
+
+
+def _unit(tag: int, type_id: UnitTypeId, structure: bool = False, ready: bool = True, position=(10, 10)):
+    return SimpleNamespace(tag=tag, type_id=type_id, is_structure=structure, is_ready=ready,
+                           position=Point2(position), orders=[])
+
+
+def _command(ability: AbilityId, unit, target, queue: bool = False):
+    return SimpleNamespace(ability=ability, unit=unit, target=target, queue=queue)
+
+
+def _order(ability: AbilityId, target):
+    return SimpleNamespace(ability=_ability(ability), target=target)
+
+
+def test_scv_build_order_hands_off_to_the_construction():
+    scv = _unit(1, UnitTypeId.SCV)
+    bot = _Bot(scv)
+    counters = UnitCounters(bot)
+    spot = Point2((20, 20))
+    counters.record([_command(AbilityId.TERRANBUILD_BARRACKS, scv, spot)])
+    assert counters.pending(UnitTypeId.BARRACKS) == 1 and counters.ordered[UnitTypeId.BARRACKS] == 1
+
+    # The SCV keeps its build order while constructing, the command resolves and the structure counts once
+    barracks = _unit(2, UnitTypeId.BARRACKS, structure=True, ready=False, position=spot)
+    bot.all.append(barracks)
+    scv.orders = [_order(AbilityId.TERRANBUILD_BARRACKS, barracks.tag)]
+    counters.on_building_construction_started(barracks)
+    assert counters.ordered[UnitTypeId.BARRACKS] == 0
+    assert counters.pending(UnitTypeId.BARRACKS) == 1 and counters.amount(UnitTypeId.BARRACKS) == 1
+
+    # Pulled away it leaves the structure unattended, sent back it is pending again
+    scv.orders = []
+    counters.record([_command(AbilityId.MOVE, scv, Point2((5, 5)))])
+    assert counters.pending(UnitTypeId.BARRACKS) == 0 and counters.amount(UnitTypeId.BARRACKS) == 1
+    scv.orders = [_order(AbilityId.TERRANBUILD_BARRACKS, barracks.tag)]
+    counters._reconcile()
+    assert counters.pending(UnitTypeId.BARRACKS) == 1
+
+    barracks.is_ready = True
+    counters.on_building_construction_complete(barracks)
+    assert counters.pending(UnitTypeId.BARRACKS) == 0 and counters.ready(UnitTypeId.BARRACKS) == 1
+
+
+def test_builder_killed_leaves_the_structure_unattended():
+    scv = _unit(1, UnitTypeId.SCV)
+    bot = _Bot(scv)
+    counters = UnitCounters(bot)
+    counters.record([_command(AbilityId.TERRANBUILD_SUPPLYDEPOT, scv, Point2((20, 20)))])
+    depot = _unit(2, UnitTypeId.SUPPLYDEPOT, structure=True, ready=False, position=(20, 20))
+    bot.all.append(depot)
+    counters.on_building_construction_started(depot)
+    bot.all.remove(scv)
+    counters.on_unit_destroyed(scv.tag)
+    assert counters.pending(UnitTypeId.SUPPLYDEPOT) == 0 and counters.amount(UnitTypeId.SUPPLYDEPOT) == 1
+
+
+def test_lowered_depot_shares_the_depot_orders():
+    scv = _unit(1, UnitTypeId.SCV)
+    counters = UnitCounters(_Bot(scv))
+    counters.record([_command(AbilityId.TERRANBUILD_SUPPLYDEPOT, scv, Point2((20, 20)))])
+    assert counters.pending(UnitTypeId.SUPPLYDEPOTLOWERED) == counters.pending(UnitTypeId.SUPPLYDEPOT) == 1
+
+
+def test_repeated_order_is_not_counted_twice():
+    scv = _unit(1, UnitTypeId.SCV)
+    counters = UnitCounters(_Bot(scv))
+    spot = Point2((20, 20))
+    scv.orders = [_order(AbilityId.TERRANBUILD_BARRACKS, spot)]
+    assert not counters.record([_command(AbilityId.TERRANBUILD_BARRACKS, scv, spot)])
+    assert counters.pending(UnitTypeId.BARRACKS) == 0
+
+
+def test_cross_check_skips_types_already_pending_cannot_answer():
+    bot = _Bot(_unit(1, UnitTypeId.LARVA), _unit(2, UnitTypeId.MARINE))
+    counters = UnitCounters(bot)
+    assert counters.cross_check() == 0
+    assert bot.asked == [UnitTypeId.MARINE]
+    bot.pending[UnitTypeId.MARINE] = 1
+    assert counters.cross_check() == 1 and counters.mismatches == 1
+
+
+def test_counters_match_the_library_in_a_fake_game(tmp_path, monkeypatch):
+    """ A Terran bot through its build order on the fake server, every step cross checked. """
+    from bots.proxy_rax import ProxyRaxBot
+
+    monkeypatch.setenv("SC2PATH", make_sc2path(str(tmp_path)))
+    monkeypatch.setenv("VOID_BOT_HOME", str(tmp_path))
+    monkeypatch.setenv("CHECK_COUNTERS", "1")
+    bot = ProxyRaxBot()
+
+    async def play():
+        server = await FakeSC2Server(max_loops=int(loops(120))).start(port=5596)
+        pool = ClientPool(size=1, process_factory=lambda slot: ExternalProcess("127.0.0.1", 5596))
+        try:
+            players = [Bot(Race.Terran, bot), Computer(Race.Protoss, Difficulty.Easy)]
+            await pool.play(maps.get(FAKE_MAP), players)
+        finally:
+            await pool.close()
+            await server.cleanup()
+
+    asyncio.run(play())
+    assert bot.state.game_loop > 0
+    assert bot.counters.ready(UnitTypeId.BARRACKS) > 0
+    assert bot.counters.mismatches == 0